@@ -0,0 +1,93 @@
+"""Shared helpers for the OniLock benchmarks."""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+
+def bootstrap() -> Path:
+    """
+    Point OniLock at a throwaway home directory before it is imported.
+
+    Returns the temporary directory. Must be called before importing `onilock`.
+    """
+    from cryptography.fernet import Fernet
+
+    home = Path(tempfile.mkdtemp(prefix="onilock_bench_"))
+    os.environ["HOME"] = str(home)
+    # A source checkout keeps its vault under the project by default.
+    os.environ["ONI_VAULT_DIR"] = str(home / ".onilock" / "vault")
+    os.environ.setdefault("ONI_SECRET_KEY", Fernet.generate_key().decode())
+    os.environ.setdefault("ONI_GPG_PASSPHRASE", "benchmark")
+    os.environ.setdefault("ONI_DEFAULT_KEYSTORE_BACKEND", "vault")
+    os.environ.setdefault("ONI_DB_NAME", "benchmark")
+
+    repo_root = str(Path(__file__).resolve().parent.parent)
+    if repo_root not in sys.path:
+        sys.path.insert(0, repo_root)
+    return home
+
+
+def synthetic_profile(accounts: int) -> dict:
+    """Build a profile dict shaped like a real vault with `accounts` entries."""
+    return {
+        "name": "benchmark",
+        "master_password": "$2b$12$" + "x" * 53,
+        "vault_version": "1.8.3",
+        "creation_timestamp": 1700000000.0,
+        "accounts": [
+            {
+                "id": f"account-{i}",
+                "encrypted_password": "gAAAAAB" + "k" * 93,
+                "username": f"user{i}@example.com",
+                "url": f"https://service-{i % 500}.example.com/login",
+                "description": "Synthetic benchmark account",
+                "created_at": 1700000000 + i,
+                "is_weak_password": i % 7 == 0,
+            }
+            for i in range(accounts)
+        ],
+        "files": [],
+    }
+
+
+def fill_vault(accounts: int) -> None:
+    """Replace the accounts of the initialized vault with `accounts` real ones."""
+    import base64
+
+    from onilock.account_manager import get_profile_engine
+    from onilock.core.keys import data_cipher
+    from onilock.core.passwords import password_fingerprint
+    from onilock.core.similarity import password_sketch
+
+    cipher = data_cipher()
+    engine = get_profile_engine()
+    rows = []
+    for i in range(accounts):
+        password = f"pH$zJ?+k51XM-{i}"
+        rows.append(
+            {
+                "id": f"account-{i}",
+                "encrypted_password": base64.b64encode(
+                    cipher.encrypt(password.encode())
+                ).decode(),
+                "username": f"user{i}@example.com",
+                "url": f"https://service-{i % 500}.example.com/login",
+                "created_at": 1700000000 + i,
+                "is_weak_password": False,
+                "password_fingerprint": password_fingerprint(password),
+                "password_sketch": password_sketch(password),
+            }
+        )
+    engine.write({**engine.read(), "accounts": rows})
+
+
+def format_table(headers: list, rows: list) -> str:
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    lines = [
+        "  ".join(str(cell).rjust(width) for cell, width in zip(row, widths))
+        for row in [headers, *rows]
+    ]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return "\n".join(lines)
@@ -0,0 +1,92 @@
+"""
+Measure `onilock copy` latency with and without an agent.
+
+Reports the round-trip of a `get` request to a running agent, and the wall
+time of a whole `onilock copy` process answered by the agent against one
+that imports the CLI and decrypts the vault itself. The clipboard is stubbed
+out in the agent; without the agent, `copy` fails at the clipboard step when
+no clipboard is available, after all the work being measured.
+
+    python benchmarks/agent.py
+    python benchmarks/agent.py --accounts 10000 --requests 2000 --runs 20
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from _common import bootstrap, fill_vault, format_table
+
+
+def percentile(samples: list, fraction: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def copy_process_ms(runs: int) -> list:
+    command = [sys.executable, "-m", "onilock.cli", "copy", "account-1"]
+    env = {**os.environ, "PYTHONPATH": str(Path(__file__).resolve().parent.parent)}
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, capture_output=True, env=env)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    home = bootstrap()
+    os.environ["ONI_AGENT_SOCKET"] = str(home / "agent" / "agent.sock")
+    from onilock.account_manager import initialize
+    from onilock.agent import Agent
+    from onilock.core.agent import request
+
+    initialize("benchmark-master-password")
+    fill_vault(args.accounts)
+
+    table = [["copy process, no agent", *_summary(copy_process_ms(args.runs))]]
+
+    agent = Agent()
+    ready = threading.Event()
+    with patch("onilock.agent.pyperclip"), patch("onilock.agent.audit"):
+        thread = threading.Thread(target=agent.serve, args=(ready.set,))
+        thread.start()
+        ready.wait()
+        try:
+            request("get", id="account-1")
+            samples = []
+            for i in range(args.requests):
+                start = time.perf_counter()
+                request("get", id=f"account-{i % args.accounts}")
+                samples.append((time.perf_counter() - start) * 1000)
+            table.append(["get request to agent", *_summary(samples)])
+            table.append(["copy process, agent", *_summary(copy_process_ms(args.runs))])
+        finally:
+            request("stop")
+            thread.join()
+
+    print(f"{args.accounts} accounts")
+    print(format_table(["", "p50 ms", "p99 ms"], table))
+
+
+def _summary(samples: list) -> list:
+    return [
+        f"{statistics.median(samples):.2f}",
+        f"{percentile(samples, 0.99):.2f}",
+    ]
+
+
+if __name__ == "__main__":
+    main()
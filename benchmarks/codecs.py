@@ -0,0 +1,57 @@
+"""
+Compare vault payload codecs on synthetic profiles.
+
+Reports encode/decode time and payload size for every installed codec.
+
+    python benchmarks/codecs.py
+    python benchmarks/codecs.py --sizes 1000 --repeat 20
+"""
+
+import argparse
+import timeit
+
+from _common import bootstrap, format_table, synthetic_profile
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    bootstrap()
+    from onilock.db.codecs import CODECS
+    from onilock.db.models import Profile
+
+    rows = []
+    for size in args.sizes:
+        # Validate through the model so the payload matches what the app writes.
+        data = Profile(**synthetic_profile(size)).model_dump()
+        for codec in CODECS.values():
+            if not codec.available:
+                rows.append([size, codec.name, "-", "-", "not installed"])
+                continue
+            payload = codec.dumps(data)
+            dumps = min(
+                timeit.repeat(lambda: codec.dumps(data), number=1, repeat=args.repeat)
+            )
+            loads = min(
+                timeit.repeat(
+                    lambda: codec.loads(payload), number=1, repeat=args.repeat
+                )
+            )
+            rows.append(
+                [
+                    size,
+                    codec.name,
+                    f"{dumps * 1000:.1f}",
+                    f"{loads * 1000:.1f}",
+                    f"{len(payload) / 1024:.0f}",
+                ]
+            )
+
+    print(format_table(["accounts", "codec", "dumps ms", "loads ms", "KiB"], rows))
+
+
+if __name__ == "__main__":
+    main()
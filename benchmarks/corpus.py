@@ -0,0 +1,128 @@
+"""
+Measure compiled password corpus size, compile time and lookup latency.
+
+A SHA-1 hash list of random entries is generated for each size, compiled into
+the sorted layout and a Bloom filter, then queried through the memory map.
+Resident memory is read from /proc/self/status before and after the lookups,
+split into anonymous memory (heap) and clean file pages of the mapping, which
+the kernel can drop at any time.
+
+    python benchmarks/corpus.py
+    python benchmarks/corpus.py --sizes 1000000 10000000 --lookups 20000
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from _common import bootstrap, format_table
+
+
+def resident_bytes() -> tuple:
+    """Anonymous and file-backed resident bytes of this process."""
+    fields = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("RssAnon", "RssFile"):
+                    fields[key] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    return fields.get("RssAnon", 0), fields.get("RssFile", 0)
+
+
+def write_hash_list(path: str, entries: int) -> list:
+    samples = []
+    with open(path, "w") as f:
+        for i in range(entries):
+            value = os.urandom(20)
+            f.write(value.hex().upper() + ":1\n")
+            if i % max(1, entries // 1000) == 0:
+                samples.append(value)
+    return samples
+
+
+def measure(workdir: str, entries: int, lookups: int, bloom) -> dict:
+    from onilock.core.corpus import Corpus, compile_corpus
+
+    source = os.path.join(workdir, "hashes.txt")
+    output = os.path.join(workdir, "hashes.corpus")
+    members = write_hash_list(source, entries)
+
+    start = time.perf_counter()
+    compile_corpus(source, output, hashed=True, bloom_error_rate=bloom)
+    compile_seconds = time.perf_counter() - start
+    os.remove(source)
+
+    queries = [random.choice(members) for _ in range(lookups // 2)]
+    queries += [os.urandom(20) for _ in range(lookups - len(queries))]
+
+    rss_before = resident_bytes()
+    with Corpus(output) as corpus:
+        start = time.perf_counter()
+        hits = sum(corpus.contains_digest(query) for query in queries)
+        elapsed = time.perf_counter() - start
+        rss_after = resident_bytes()
+    assert hits >= lookups // 2, hits
+
+    result = {
+        "size_mb": os.path.getsize(output) / 1e6,
+        "compile_s": compile_seconds,
+        "lookup_us": elapsed / lookups * 1e6,
+        "anon_mb": (rss_after[0] - rss_before[0]) / 1e6,
+        "file_mb": (rss_after[1] - rss_before[1]) / 1e6,
+    }
+    os.remove(output)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100000, 1000000])
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--bloom", type=float, default=0.001)
+    args = parser.parse_args()
+
+    bootstrap()
+    workdir = tempfile.mkdtemp(prefix="onilock_corpus_")
+    rows = []
+    try:
+        for entries in args.sizes:
+            for layout, bloom in (("sorted", None), ("bloom", args.bloom)):
+                result = measure(workdir, entries, args.lookups, bloom)
+                rows.append(
+                    [
+                        entries,
+                        layout,
+                        f"{result['size_mb']:.1f}",
+                        f"{result['compile_s']:.1f}",
+                        f"{result['lookup_us']:.1f}",
+                        f"{result['anon_mb']:.1f}",
+                        f"{result['file_mb']:.1f}",
+                    ]
+                )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(
+        format_table(
+            [
+                "entries",
+                "layout",
+                "MB",
+                "compile s",
+                "lookup us",
+                "anon +MB",
+                "file +MB",
+            ],
+            rows,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
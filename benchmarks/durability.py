@@ -0,0 +1,108 @@
+"""
+Compare write throughput and tail latency across durability modes.
+
+Every mode writes the same small vault repeatedly through `EncryptedJsonEngine`
+in each target directory. Pass directories on different filesystems (e.g. a
+tmpfs and an ext4 disk) to see what fsync costs on each; the filesystem type is
+read from /proc/mounts when available.
+
+    python benchmarks/durability.py
+    python benchmarks/durability.py --dirs /dev/shm /var/tmp --writes 500
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from _common import bootstrap, format_table, synthetic_profile
+
+
+def filesystem_type(path: str) -> str:
+    """Type of the filesystem holding `path`, from /proc/mounts."""
+    path = os.path.realpath(path)
+    best, fstype = "", "?"
+    try:
+        with open("/proc/mounts") as f:
+            for line in f:
+                _, mount_point, kind = line.split()[:3]
+                inside = path == mount_point or path.startswith(
+                    mount_point.rstrip("/") + "/"
+                )
+                if inside and len(mount_point) > len(best):
+                    best, fstype = mount_point, kind
+    except OSError:
+        pass
+    return fstype
+
+
+def measure(directory: str, mode: str, writes: int, accounts: int) -> dict:
+    from onilock.core import fileio
+    from onilock.core.settings import settings
+    from onilock.db.engines import EncryptedJsonEngine
+
+    settings.DURABILITY = mode
+    workdir = tempfile.mkdtemp(prefix="onilock_durability_", dir=directory)
+    engine = EncryptedJsonEngine(os.path.join(workdir, "vault.oni"))
+    data = synthetic_profile(accounts)
+
+    latencies = []
+    start = time.perf_counter()
+    for i in range(writes):
+        data["name"] = f"benchmark-{i}"
+        begin = time.perf_counter()
+        engine.write(data)
+        latencies.append(time.perf_counter() - begin)
+    # Pending batched writes are only durable once flushed.
+    fileio.flush()
+    elapsed = time.perf_counter() - start
+
+    for name in os.listdir(workdir):
+        os.remove(os.path.join(workdir, name))
+    os.rmdir(workdir)
+
+    latencies.sort()
+    return {
+        "writes_per_sec": writes / elapsed,
+        "median_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dirs", nargs="+", help="directories to write in")
+    parser.add_argument("--modes", nargs="+", default=["strict", "batched", "fast"])
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--accounts", type=int, default=100)
+    args = parser.parse_args()
+
+    home = bootstrap()
+    directories = args.dirs or [d for d in ("/dev/shm", str(home)) if os.path.isdir(d)]
+
+    rows = []
+    for directory in directories:
+        fstype = filesystem_type(directory)
+        for mode in args.modes:
+            result = measure(directory, mode, args.writes, args.accounts)
+            rows.append(
+                [
+                    directory,
+                    fstype,
+                    mode,
+                    f"{result['writes_per_sec']:.0f}",
+                    f"{result['median_ms']:.2f}",
+                    f"{result['p99_ms']:.2f}",
+                ]
+            )
+
+    print(
+        format_table(
+            ["directory", "fs", "mode", "writes/s", "median ms", "p99 ms"], rows
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
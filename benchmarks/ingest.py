@@ -0,0 +1,87 @@
+"""
+Measure bulk account ingestion (`onilock new --from`) throughput.
+
+A fresh vault is initialized in a throwaway home, then a generated CSV or JSONL
+file is imported into it; rows/s covers parsing, health checks, encryption and
+the single vault write.
+
+    python benchmarks/ingest.py
+    python benchmarks/ingest.py --rows 1000 10000 --format csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import tempfile
+import time
+
+from _common import bootstrap, format_table
+
+
+def write_source(path: str, rows: int, fmt: str) -> None:
+    records = (
+        {
+            "name": f"account-{i}",
+            "password": f"pH$zJ?+k51XM-{i}",
+            "username": f"user{i}@example.com",
+            "url": f"https://service-{i % 500}.example.com/login",
+        }
+        for i in range(rows)
+    )
+    with open(path, "w", newline="") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, ["name", "password", "username", "url"])
+            writer.writeheader()
+            writer.writerows(records)
+        else:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+
+
+def measure(rows: int, fmt: str) -> dict:
+    from onilock.account_manager import get_profile_engine, new_accounts_from
+
+    engine = get_profile_engine()
+    engine.write({**engine.read(), "accounts": []})
+
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    write_source(path, rows, fmt)
+    try:
+        start = time.perf_counter()
+        result = new_accounts_from(path, fmt)
+        elapsed = time.perf_counter() - start
+    finally:
+        os.remove(path)
+
+    assert result["added"] == rows, result
+    return {"rows_per_sec": rows / elapsed, "seconds": elapsed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", nargs="+", type=int, default=[1000, 10000])
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="jsonl")
+    args = parser.parse_args()
+
+    bootstrap()
+    from onilock.account_manager import initialize
+
+    initialize("benchmark-master-password")
+
+    table = []
+    for rows in args.rows:
+        result = measure(rows, args.format)
+        table.append(
+            [
+                rows,
+                args.format,
+                f"{result['rows_per_sec']:.0f}",
+                f"{result['seconds']:.2f}",
+            ]
+        )
+    print(format_table(["rows", "format", "rows/s", "seconds"], table))
+
+
+if __name__ == "__main__":
+    main()
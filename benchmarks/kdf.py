@@ -0,0 +1,58 @@
+"""
+Measure master password hashing cost per algorithm.
+
+For bcrypt, scrypt and Argon2id, reports the parameters `onilock
+kdf-calibrate` picks for the target latency and memory budget, and the time
+of one master password check with them.
+
+    python benchmarks/kdf.py
+    python benchmarks/kdf.py --target-ms 500 --memory 256 --repeat 5
+"""
+
+import argparse
+import statistics
+import time
+
+from _common import bootstrap, format_table
+
+
+def memory_mib(name: str, params: dict) -> int:
+    if name == "scrypt":
+        return 128 * params["r"] * 2 ** params["ln"] >> 20
+    if name == "argon2id":
+        return params["m"] >> 10
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--target-ms", type=float, default=300)
+    parser.add_argument("--memory", type=int, default=64, help="MiB")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    bootstrap()
+    from onilock.core import kdf
+
+    table = []
+    for name in kdf.PASSWORD_HASHES:
+        algorithm = kdf.get_kdf(name)
+        if not algorithm.available:
+            table.append([name, "unavailable", "", ""])
+            continue
+        calibration = kdf.calibrate(name, args.target_ms, args.memory * 1024)
+        encoded = algorithm.hash(b"benchmark", calibration["params"])
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            kdf.verify_password(b"benchmark", encoded)
+            samples.append((time.perf_counter() - start) * 1000)
+        memory = memory_mib(name, calibration["params"])
+        params = ",".join(f"{k}={v}" for k, v in calibration["params"].items())
+        table.append([name, params, f"{statistics.median(samples):.1f}", memory])
+    print(f"target {args.target_ms:g} ms, {args.memory} MiB")
+    print(format_table(["algorithm", "parameters", "check ms", "MiB"], table))
+
+
+if __name__ == "__main__":
+    main()
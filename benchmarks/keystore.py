@@ -0,0 +1,69 @@
+"""
+Measure the file keystore used when no system keyring is available.
+
+Reports the time of a first `get_password` (the file is read and decrypted),
+of later ones (served from the cache), and of storing N secrets one by one
+and in a single transaction.
+
+    python benchmarks/keystore.py
+    python benchmarks/keystore.py --secrets 50 --repeat 200
+"""
+
+import argparse
+import statistics
+import time
+
+from _common import bootstrap, format_table
+
+
+def median_ms(repeat: int, operation) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--secrets", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    bootstrap()
+    from onilock.core.keystore import VaultKeyStore
+
+    store = VaultKeyStore("benchmark")
+    names = [f"secret-{i}" for i in range(args.secrets)]
+    runs = iter(range(1 << 30))
+
+    # Every run stores new values: unchanged ones are not written.
+    def store_each():
+        value = f"{next(runs):044d}"
+        for name in names:
+            store.set_password(name, value)
+
+    def store_batch():
+        value = f"{next(runs):044d}"
+        with store.transaction():
+            for name in names:
+                store.set_password(name, value)
+
+    table = [
+        [f"set x{args.secrets}", f"{median_ms(5, store_each):.2f}"],
+        [f"set x{args.secrets} in a transaction", f"{median_ms(5, store_batch):.2f}"],
+        [
+            "get, first",
+            f"{median_ms(args.repeat, lambda: VaultKeyStore('benchmark').get_password(names[0])):.3f}",
+        ],
+        [
+            "get, cached",
+            f"{median_ms(args.repeat, lambda: store.get_password(names[0])):.3f}",
+        ],
+    ]
+    print(format_table(["operation", "ms"], table))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Measure secret rotation against a full data-key re-key.
+
+For each vault size, reports the time of `keys rotate-secret`, which only
+re-wraps the data key, and of `keys rekey`, which re-encrypts every password
+and reseals the vault under a new data key.
+
+    python benchmarks/rekey.py
+    python benchmarks/rekey.py --sizes 1000 10000 --workers 4
+"""
+
+import argparse
+import time
+from unittest.mock import patch
+
+from _common import bootstrap, fill_vault, format_table
+
+
+def measure(accounts: int, workers: int) -> dict:
+    from onilock.account_manager import rekey_vault, rotate_secret_key
+
+    fill_vault(accounts)
+    with patch("onilock.account_manager.audit"):
+        start = time.perf_counter()
+        rotate_secret_key()
+        rotate = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = rekey_vault(workers=workers)
+        rekey = time.perf_counter() - start
+
+    assert result["reencrypted"] == accounts, result
+    return {"rotate": rotate, "rekey": rekey}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    bootstrap()
+    from onilock.account_manager import initialize
+
+    initialize("benchmark-master-password")
+
+    table = []
+    for accounts in args.sizes:
+        result = measure(accounts, args.workers)
+        table.append(
+            [
+                accounts,
+                f"{result['rotate'] * 1000:.1f}",
+                f"{result['rekey']:.2f}",
+            ]
+        )
+    print(format_table(["accounts", "rotate-secret ms", "rekey s"], table))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measure master password verification with and without a session ticket.
+
+Reports the time of `verify_master_password` checked with bcrypt at each
+cost, and within a session started by `onilock unlock`, where the ticket
+stands in for the password. Costs are only ever raised, so list them in
+increasing order.
+
+    python benchmarks/session.py
+    python benchmarks/session.py --rounds 12 14 --repeat 20
+"""
+
+import argparse
+import os
+import statistics
+import time
+from typing import Optional
+from unittest.mock import patch
+
+from _common import bootstrap, format_table
+
+
+def verify_ms(repeat: int, password: Optional[str]) -> float:
+    from onilock.account_manager import verify_master_password
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        assert verify_master_password(password)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, nargs="+", default=[12])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    home = bootstrap()
+    os.environ["XDG_RUNTIME_DIR"] = str(home / "run")
+    from onilock.account_manager import initialize
+    from onilock.core import session
+    from onilock.core.settings import settings
+
+    password = "benchmark-master-password"
+    table = []
+    with patch("onilock.account_manager.audit"):
+        initialize(password)
+        for rounds in args.rounds:
+            settings.BCRYPT_ROUNDS = rounds
+            with patch.object(settings, "SESSION_TTL", 0):
+                session.revoke(settings.DB_NAME)
+                # The first verification re-hashes at the new cost.
+                verify_ms(1, password)
+                bcrypt_ms = verify_ms(args.repeat, password)
+            verify_ms(1, password)
+            ticket_ms = verify_ms(args.repeat, None)
+            table.append([rounds, f"{bcrypt_ms:.1f}", f"{ticket_ms:.2f}"])
+    print(format_table(["bcrypt rounds", "bcrypt ms", "session ms"], table))
+
+
+if __name__ == "__main__":
+    main()
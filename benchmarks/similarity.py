@@ -0,0 +1,98 @@
+"""
+Measure near-duplicate password detection.
+
+For each vault size, reports the time to sketch every password, the time to
+cluster the sketches through locality-sensitive hashing, the number of
+sketch comparisons made against the n*(n-1)/2 an all-pairs scan needs, and
+whether the planted near-duplicate pairs were all found.
+
+    python benchmarks/similarity.py
+    python benchmarks/similarity.py --sizes 1000 10000 --pairs 50
+"""
+
+import argparse
+import random
+import string
+import time
+
+from _common import bootstrap, format_table
+
+
+def sample_passwords(count: int, pairs: int) -> dict:
+    alphabet = string.ascii_letters + string.digits + "!@#$%^&*"
+    passwords = {
+        f"acct{i}": "".join(random.choice(alphabet) for _ in range(16))
+        for i in range(count - 2 * pairs)
+    }
+    for i in range(pairs):
+        base = "".join(random.choice(alphabet) for _ in range(12))
+        passwords[f"pair{i}a"] = f"{base}2023!"
+        passwords[f"pair{i}b"] = f"{base}2024!"
+    return passwords
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--pairs", type=int, default=20)
+    args = parser.parse_args()
+
+    bootstrap()
+    from onilock.core import similarity
+
+    rows = []
+    for size in args.sizes:
+        passwords = sample_passwords(size, args.pairs)
+
+        start = time.perf_counter()
+        sketches = {key: similarity.password_sketch(p) for key, p in passwords.items()}
+        sketch_s = time.perf_counter() - start
+
+        compare = similarity.similarity
+        comparisons = 0
+
+        def counting(a, b):
+            nonlocal comparisons
+            comparisons += 1
+            return compare(a, b)
+
+        similarity.similarity = counting
+        try:
+            start = time.perf_counter()
+            clusters = similarity.cluster(sketches)
+            cluster_s = time.perf_counter() - start
+        finally:
+            similarity.similarity = compare
+
+        found = {tuple(sorted(members)) for members in clusters}
+        planted = {(f"pair{i}a", f"pair{i}b") for i in range(args.pairs)}
+        rows.append(
+            [
+                size,
+                f"{sketch_s:.2f}",
+                f"{cluster_s:.2f}",
+                comparisons,
+                size * (size - 1) // 2,
+                f"{len(planted & found)}/{len(planted)}",
+                len(found - planted),
+            ]
+        )
+
+    print(
+        format_table(
+            [
+                "passwords",
+                "sketch s",
+                "cluster s",
+                "comparisons",
+                "all pairs",
+                "pairs found",
+                "false",
+            ],
+            rows,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
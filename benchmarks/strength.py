@@ -0,0 +1,78 @@
+"""
+Measure the pattern-aware strength estimator.
+
+Reports the time to build the matcher tables from the wordlists, to load them
+back from their serialized form, and the mean and p99 time to estimate one
+password for a mix of random and human-style passwords.
+
+    python benchmarks/strength.py
+    python benchmarks/strength.py --passwords 50000
+"""
+
+import argparse
+import random
+import statistics
+import string
+import time
+
+from _common import bootstrap, format_table
+
+
+def sample_passwords(count: int) -> list:
+    words = ["summer", "dragon", "monkey", "password", "football", "princess"]
+    alphabet = string.ascii_letters + string.digits + "!@#$%^&*"
+    passwords = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            length = random.randint(10, 24)
+            passwords.append("".join(random.choice(alphabet) for _ in range(length)))
+        elif kind == 1:
+            word = random.choice(words).capitalize()
+            passwords.append(f"{word}{random.randint(1950, 2030)}!")
+        else:
+            passwords.append(random.choice(["qwerty", "asdfgh", "zxcvbn"]) + "123456")
+    return passwords
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--passwords", type=int, default=10000)
+    args = parser.parse_args()
+
+    bootstrap()
+    from onilock.core import strength
+
+    start = time.perf_counter()
+    strength.tables()
+    build_ms = (time.perf_counter() - start) * 1000
+
+    strength.tables.cache_clear()
+    start = time.perf_counter()
+    strength.tables()
+    load_ms = (time.perf_counter() - start) * 1000
+
+    timings = []
+    for password in sample_passwords(args.passwords):
+        begin = time.perf_counter()
+        strength.estimate(password)
+        timings.append((time.perf_counter() - begin) * 1e6)
+    timings.sort()
+
+    print(
+        format_table(
+            ["build ms", "load ms", "mean us", "p99 us"],
+            [
+                [
+                    f"{build_ms:.1f}",
+                    f"{load_ms:.1f}",
+                    f"{statistics.mean(timings):.1f}",
+                    f"{timings[int(len(timings) * 0.99)]:.1f}",
+                ]
+            ],
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
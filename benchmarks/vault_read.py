@@ -0,0 +1,117 @@
+"""
+Compare vault read latency and peak RSS across vault formats.
+
+Each (format, size) pair is measured in a fresh interpreter so the peak RSS
+reported by `getrusage` belongs to that read alone.
+
+    python benchmarks/vault_read.py
+    python benchmarks/vault_read.py --sizes 1000 10000 --formats v2 v4 --repeat 3
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from _common import bootstrap, format_table, synthetic_profile
+
+
+def _engine(path: str):
+    from onilock.db.engines import EncryptedJsonEngine
+
+    return EncryptedJsonEngine(path)
+
+
+def prepare(fmt: str, size: int, path: str) -> None:
+    from onilock.core.settings import settings
+
+    settings.VAULT_FORMAT = fmt
+    _engine(path).write(synthetic_profile(size))
+
+
+def measure(path: str, repeat: int) -> dict:
+    engine = _engine(path)
+    baseline_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    for _ in range(repeat):
+        engine.invalidate_cache()
+        start = time.perf_counter()
+        engine.read()
+        timings.append(time.perf_counter() - start)
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "best_ms": min(timings) * 1000,
+        "peak_rss_mib": peak_kib / 1024,
+        "read_rss_mib": (peak_kib - baseline_kib) / 1024,
+        "file_kib": os.path.getsize(path) / 1024,
+    }
+
+
+def _child(*args: str) -> str:
+    result = subprocess.run(
+        [sys.executable, __file__, *args],
+        check=True,
+        capture_output=True,
+        text=True,
+        env=os.environ.copy(),
+    )
+    return result.stdout
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--formats", nargs="+", default=["v2", "v3", "v4"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--prepare", nargs=3, help=argparse.SUPPRESS)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    home = bootstrap()
+    if args.prepare:
+        fmt, size, path = args.prepare
+        prepare(fmt, int(size), path)
+        return
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.repeat)))
+        return
+
+    rows = []
+    for size in args.sizes:
+        for fmt in args.formats:
+            path = str(Path(home) / f"vault-{fmt}-{size}.oni")
+            _child("--prepare", fmt, str(size), path)
+            result = json.loads(_child("--measure", path, "--repeat", str(args.repeat)))
+            rows.append(
+                [
+                    size,
+                    fmt,
+                    f"{result['file_kib']:.0f}",
+                    f"{result['best_ms']:.1f}",
+                    f"{result['peak_rss_mib']:.1f}",
+                    f"{result['read_rss_mib']:.1f}",
+                ]
+            )
+            os.remove(path)
+
+    print(
+        format_table(
+            [
+                "accounts",
+                "format",
+                "file KiB",
+                "read ms",
+                "peak RSS MiB",
+                "read RSS MiB",
+            ],
+            rows,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,52 @@
+from collections import Counter, defaultdict
 from datetime import datetime
 from pathlib import Path
 import shutil
 import uuid
 import multiprocessing
 import os
-from typing import Optional
+from functools import partial
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, List, Optional
 import base64
 
-from cryptography.fernet import Fernet
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 import pyperclip
-import bcrypt
 
 from rich.table import Table
 
+from onilock.core.agent import request as agent_request
 from onilock.core.decorators import pre_post_hooks
+from onilock.core.fileio import remove_lock_file, strict_durability
+from onilock.core.keys import (
+    CURRENT,
+    PENDING,
+    PREVIOUS,
+    begin_rekey,
+    data_cipher,
+    data_key,
+    data_keys,
+    forget_previous,
+    journal,
+    promote_pending,
+    record,
+    sealed_with,
+    wrap_for,
+)
 from onilock.core.keystore import keystore
 from onilock.core.settings import settings
 from onilock.core.logging_manager import logger
 from onilock.core.audit import audit
 from onilock.core.auth import is_locked, record_failure, clear_failures, rate_limit_delay
 from onilock.core.ui import console, success, error, warning, info
-from onilock.core.profiles import register_profile, remove_profile
+from onilock.core import kdf, session, spawns
+from onilock.core.profiles import (
+    list_profiles,
+    register_profile,
+    remove_profile,
+    setup_filepath,
+)
 from onilock.core.gpg import (
     delete_pgp_key,
 )
@@ -33,18 +59,37 @@ from onilock.core.utils import (
     best_effort_zero_bytes,
     naive_utcnow,
 )
-from onilock.core.passwords import password_health
+from onilock.core.ingest import batched, guess_format, iter_rows, open_source
+from onilock.core.passwords import (
+    analyse_passwords,
+    map_batches,
+    password_fingerprint,
+    password_health,
+    policy_version,
+    with_reuse,
+    with_similar,
+)
+from onilock.core.similarity import cluster, password_sketch
 from onilock.db import DatabaseManager
-from onilock.db.models import Profile, Account
+
+# The models import pydantic, which is slow to load: they are imported where
+# they are used, so that commands which do not need them start faster.
+if TYPE_CHECKING:
+    from onilock.db.models import Account, Profile
 
 
 __all__ = [
     "initialize",
     "new_account",
+    "new_accounts_from",
+    "audit_passwords",
     "copy_account_password",
     "remove_account",
     "delete_profile",
     "rotate_secret_key",
+    "rekey_vault",
+    "unlock",
+    "lock",
 ]
 
 
@@ -56,12 +101,20 @@ def post_command():
     logger.debug("Starting post-command hook.")
 
 
-def verify_master_password(master_password: str):
+def verify_master_password(
+    master_password: Optional[str], ttl: Optional[float] = None
+):
     """
     Verify that the provided master password is valid.
 
+    Within a session (see `onilock.core.session`), the password may be
+    omitted and the session ticket stands in for it; a password that is
+    given is always checked against the hash, and a successful check starts
+    a new session.
+
     Args:
-        master_password (str): The master password.
+        master_password (Optional[str]): The master password, if one was given.
+        ttl (Optional[float]): Lifetime of the minted ticket, `ONI_SESSION_TTL` if omitted.
     """
     locked, remaining = is_locked(settings.DB_NAME)
     if locked:
@@ -75,18 +128,20 @@ def verify_master_password(master_password: str):
             "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
         )
         exit(1)
-    data = engine.read()
-    if not data:
+    header = engine.read_header()
+    if not header:
         error(
             "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
         )
         exit(1)
 
-    profile = Profile(**data)
-    hashed_master_password = base64.b64decode(profile.master_password)
+    if master_password is None:
+        return session.is_valid(settings.DB_NAME, header["master_password"])
+
+    hashed_master_password = base64.b64decode(header["master_password"])
     pwd_buf = bytearray(master_password.encode())
     try:
-        ok = bcrypt.checkpw(bytes(pwd_buf), hashed_master_password)
+        ok = kdf.verify_password(bytes(pwd_buf), hashed_master_password)
     finally:
         best_effort_zero_bytes(pwd_buf)
 
@@ -98,25 +153,68 @@ def verify_master_password(master_password: str):
 
     clear_failures(settings.DB_NAME)
 
-    # Upgrade bcrypt cost if below current target.
-    target_rounds = _get_bcrypt_rounds()
-    try:
-        current_rounds = int(hashed_master_password.decode().split("$")[2])
-    except Exception:
-        current_rounds = target_rounds
-
-    if current_rounds < target_rounds:
-        new_hash = bcrypt.hashpw(
-            master_password.encode(),
-            bcrypt.gensalt(rounds=target_rounds),
+    # Re-hash if below the current target algorithm or cost.
+    credential = header["master_password"]
+    if kdf.needs_rehash(hashed_master_password):
+        new_hash = kdf.hash_password(master_password.encode())
+        credential = base64.b64encode(new_hash).decode()
+        engine.update_header(master_password=credential)
+        audit(
+            "auth.kdf.upgrade",
+            from_kdf=kdf.describe(hashed_master_password),
+            to_kdf=kdf.describe(new_hash),
         )
-        profile.master_password = base64.b64encode(new_hash).decode()
-        engine.write(profile.model_dump())
-        audit("auth.kdf.upgrade", from_rounds=current_rounds, to_rounds=target_rounds)
 
+    session.mint(settings.DB_NAME, credential, ttl)
     return True
 
 
+def is_unlocked() -> bool:
+    """Whether a live session ticket stands in for the master password."""
+    engine = get_profile_engine()
+    header = engine.read_header() if engine else None
+    return bool(header) and session.is_valid(
+        settings.DB_NAME, header["master_password"]
+    )
+
+
+@pre_post_hooks(pre_command, post_command)
+def unlock(master_password: str, ttl: Optional[float] = None) -> Optional[float]:
+    """
+    Verify the master password and start a session.
+
+    Args:
+        master_password (str): The master password.
+        ttl (Optional[float]): Session length in seconds, `ONI_SESSION_TTL` if omitted.
+
+    Returns:
+        Optional[float]: When the session expires, None if sessions are disabled.
+    """
+    # Verify the password itself, even within a session.
+    session.revoke(settings.DB_NAME)
+    if not verify_master_password(master_password, ttl):
+        error("Invalid master password.")
+        exit(1)
+    audit("session.unlocked")
+    return session.expires_at(settings.DB_NAME)
+
+
+@pre_post_hooks(pre_command, post_command)
+def lock() -> bool:
+    """
+    End the session and stop the agent, if any.
+
+    Returns:
+        bool: Whether there was anything to lock.
+    """
+    revoked = session.revoke(settings.DB_NAME)
+    response = agent_request("stop")
+    stopped = bool(response and response.get("ok"))
+    if revoked or stopped:
+        audit("session.locked", ticket=revoked, agent=stopped)
+    return revoked or stopped
+
+
 def _load_setup_data(setup_engine):
     try:
         return setup_engine.read()
@@ -134,19 +232,10 @@ def _load_setup_data(setup_engine):
         raise
 
 
-def _get_bcrypt_rounds() -> int:
-    rounds = getattr(settings, "BCRYPT_ROUNDS", 12)
-    try:
-        rounds = int(rounds)
-    except (TypeError, ValueError):
-        rounds = 12
-    return rounds if rounds >= 4 else 12
-
-
 def get_profile_engine():
     """Get user config engine."""
 
-    cipher = Fernet(settings.SECRET_KEY.encode())
+    cipher = data_cipher()
     db_manager = DatabaseManager(
         database_url=settings.SETUP_FILEPATH, is_encrypted=True
     )
@@ -157,7 +246,9 @@ def get_profile_engine():
     b64encrypted_config_filepath = setup_data[settings.DB_NAME]["filepath"]
     encrypted_filepath = base64.b64decode(b64encrypted_config_filepath)
     config_filepath = cipher.decrypt(encrypted_filepath).decode()
-    return db_manager.add_engine("data", config_filepath, is_encrypted=True)
+    return db_manager.add_engine(
+        "data", config_filepath, is_encrypted=True, backend=settings.DB_BACKEND
+    )
 
 
 @pre_post_hooks(pre_command, post_command)
@@ -168,6 +259,8 @@ def initialize(master_password: Optional[str] = None):
     Args:
         master_password (Optional[str]): The master password used to secure all the other accounts.
     """
+    from onilock.db.models import Profile
+
     logger.debug("Initializing database with a master password.")
 
     name = settings.DB_NAME
@@ -175,7 +268,9 @@ def initialize(master_password: Optional[str] = None):
     filename = generate_random_password(12, include_special_characters=False) + ".oni"
     filepath = str(settings.VAULT_DIR / filename)
 
-    db_manager = DatabaseManager(database_url=filepath, is_encrypted=True)
+    db_manager = DatabaseManager(
+        database_url=filepath, is_encrypted=True, backend=settings.DB_BACKEND
+    )
     engine = db_manager.get_engine()
     setup_engine = db_manager.add_engine(
         "setup", settings.SETUP_FILEPATH, is_encrypted=True
@@ -202,9 +297,7 @@ def initialize(master_password: Optional[str] = None):
     else:
         pass
 
-    hashed_master_password = bcrypt.hashpw(
-        master_password.encode(), bcrypt.gensalt(rounds=_get_bcrypt_rounds())
-    )
+    hashed_master_password = kdf.hash_password(master_password.encode())
     b64_hashed_master_password = base64.b64encode(hashed_master_password).decode()
 
     profile = Profile(
@@ -220,7 +313,7 @@ def initialize(master_password: Optional[str] = None):
 
     logger.info("Updating the current setup file.")
 
-    cipher = Fernet(settings.SECRET_KEY.encode())
+    cipher = data_cipher()
     logger.debug("Encrypting filepath.")
     encrypted_filepath = cipher.encrypt(filepath.encode())
     b64_encrypted_filepath = base64.b64encode(encrypted_filepath).decode()
@@ -236,6 +329,120 @@ def initialize(master_password: Optional[str] = None):
     return master_password
 
 
+# Rows validated, health-checked and encrypted together by `new_accounts_from`.
+INGEST_BATCH_SIZE = 1000
+# Passwords decrypted and handed to a health worker together by `audit_passwords`.
+AUDIT_BATCH_SIZE = 256
+# Below this many passwords to analyse, starting a process pool costs more
+# than it saves.
+AUDIT_PARALLEL_MIN = 2048
+# Passwords re-encrypted by `rekey_vault` between two vault writes, so an
+# interrupted re-key loses at most this much work.
+REKEY_CHECKPOINT = 4096
+
+
+def _password_keys_batch(cipher: MultiFernet, key: str, tokens: List[str]) -> list:
+    """
+    Fingerprint and sketch under `key` of the password behind each token,
+    None for tokens that do not decrypt.
+    """
+    results = []
+    for token in tokens:
+        try:
+            password = cipher.decrypt(base64.b64decode(token)).decode()
+        except Exception:
+            results.append(None)
+            continue
+        results.append(
+            (password_fingerprint(password, key), password_sketch(password, key))
+        )
+    return results
+
+
+def _needs_password_keys(account: "Account") -> bool:
+    """
+    Whether an account predates password fingerprints or sketches. Accounts
+    whose password did not decrypt hold empty ones and are not retried.
+    """
+    return account.password_fingerprint is None or account.password_sketch is None
+
+
+def _backfill_password_keys(profile: "Profile", cipher: MultiFernet) -> bool:
+    """
+    Fingerprint and sketch accounts stored before password fingerprints or
+    similarity sketches existed.
+
+    Their passwords are decrypted once, in a short-lived worker process, so
+    the plaintexts never enter this one; once the caller saves the profile,
+    reuse and similarity checks never need to decrypt them again. Accounts
+    whose password does not decrypt get an empty fingerprint and sketch, so
+    they are only tried once. Returns True if any account was updated.
+    """
+    missing = [acct for acct in profile.accounts if _needs_password_keys(acct)]
+    if not missing:
+        return False
+
+    logger.debug(f"Fingerprinting {len(missing)} legacy account passwords.")
+    tokens = [acct.encrypted_password for acct in missing]
+    with ProcessPoolExecutor(max_workers=1) as worker:
+        future = worker.submit(_password_keys_batch, cipher, data_key(), tokens)
+        results = future.result()
+    for acct, keys in zip(missing, results):
+        fingerprint, sketch = keys or ("", "")
+        profile.update_account(
+            acct, password_fingerprint=fingerprint, password_sketch=sketch
+        )
+    return True
+
+
+def _similarity_clusters(accounts) -> list:
+    """Fingerprints of near-duplicate passwords, grouped, from stored sketches."""
+    sketches = {}
+    for acct in accounts:
+        if acct.password_fingerprint and acct.password_sketch:
+            sketches.setdefault(acct.password_fingerprint, acct.password_sketch)
+    return cluster(sketches)
+
+
+def _similar_to(profile: "Profile", sketch: str, fingerprint: str) -> list:
+    """Accounts with a near-duplicate, but not identical, password."""
+    return [
+        acct
+        for acct in profile.similar_accounts(sketch)
+        if acct.password_fingerprint != fingerprint
+    ]
+
+
+def _load_profile_for_update(engine) -> "Profile":
+    from onilock.db.models import Profile
+
+    if not engine:
+        error(
+            "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
+        )
+        exit(1)
+    data = engine.read()
+    if not data:
+        error(
+            "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
+        )
+        exit(1)
+    return Profile(**data)
+
+
+def _load_accounts_for_insert(engine) -> "Profile":
+    """The profile header and accounts, without reading the stored files."""
+    from onilock.db.models import Profile
+
+    header = engine.read_header() if engine else None
+    if not header:
+        error(
+            "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
+        )
+        exit(1)
+    return Profile(**header, accounts=engine.read_collection("accounts"))
+
+
 @pre_post_hooks(pre_command, post_command)
 def new_account(
     name: str,
@@ -254,40 +461,41 @@ def new_account(
         url (Optional[str]): The url / service where the password is used.
         description (Optional[str]): A password description.
     """
+    from onilock.db.models import Account
+
     engine = get_profile_engine()
-    if not engine:
-        error(
-            "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
-        )
-        exit(1)
-    data = engine.read()
-    if not data:
-        error(
-            "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
-        )
+    profile = _load_accounts_for_insert(engine)
+    if profile.get_account(name) is not None:
+        error(f"Account [bold]{name}[/bold] already exists.")
         exit(1)
 
-    profile = Profile(**data)
-
     if not password:
         logger.warning("Password not provided, generating it randomly.")
         password = generate_random_password()
 
-    cipher = Fernet(settings.SECRET_KEY.encode())
+    cipher = data_cipher()
     logger.debug("Encrypting the password.")
     encrypted_password = cipher.encrypt(password.encode())
     logger.debug(f"Encrypted password: {encrypted_password.decode()}")
     b64_encrypted_password = base64.b64encode(encrypted_password).decode()
     logger.debug(f"B64 Encrypted password: {b64_encrypted_password}")
-    existing_passwords = []
-    for acct in profile.accounts:
-        try:
-            encrypted = base64.b64decode(acct.encrypted_password)
-            existing_passwords.append(cipher.decrypt(encrypted).decode())
-        except Exception:
-            continue
-
-    health = password_health(password, existing_passwords)
+    if any(_needs_password_keys(acct) for acct in profile.accounts):
+        # Only once for a vault from before fingerprints: store them with a
+        # full write, then every later `new` writes its own record only.
+        profile = _load_profile_for_update(engine)
+        if _backfill_password_keys(profile, cipher):
+            engine.write(profile.model_dump())
+    fingerprint = password_fingerprint(password)
+    sketch = password_sketch(password)
+    is_reused = bool(profile.accounts_with_password(fingerprint))
+    similar = _similar_to(profile, sketch, fingerprint)
+
+    health = password_health(password, is_reused=is_reused, is_similar=bool(similar))
+    if similar:
+        warning(
+            "Password is similar to the one of: "
+            + ", ".join(acct.id for acct in similar)
+        )
     if health["strength"] != "strong":
         warning(
             "Password health warning: "
@@ -298,14 +506,18 @@ def new_account(
     password_model = Account(
         id=name,
         encrypted_password=b64_encrypted_password,
+        password_fingerprint=fingerprint,
+        password_sketch=sketch,
         username=username or "",
         url=url,
         description=description,
         is_weak_password=health["strength"] != "strong",
         created_at=int(naive_utcnow().timestamp()),
     )
-    profile.accounts.append(password_model)
-    engine.write(profile.model_dump())
+    if not engine.insert_record("accounts", password_model.model_dump()):
+        # Added by another process since the check above.
+        error(f"Account [bold]{name}[/bold] already exists.")
+        exit(1)
     logger.info("Password saved successfully.")
     success(f"Account [bold]{name}[/bold] added to the vault.")
     audit("account.added", account=name)
@@ -313,38 +525,277 @@ def new_account(
 
 
 @pre_post_hooks(pre_command, post_command)
-def list_accounts():
-    """List all available accounts."""
+def new_accounts_from(source: str, fmt: Optional[str] = None) -> dict:
+    """
+    Register accounts in bulk from a CSV or JSONL file, or `-` for stdin.
+
+    Rows are streamed and validated, health-checked and encrypted in batches.
+    Near-duplicate passwords are looked for once every row is in, in a single
+    clustering pass. Invalid rows are reported and skipped; all valid rows are
+    committed in a single vault write.
+
+    Args:
+        source (str): Path of the input file, or `-` to read standard input.
+        fmt (Optional[str]): `csv` or `jsonl`. Guessed from the extension if omitted.
+
+    Returns:
+        dict: Counts of `added`, `weak` and `failed` rows.
+    """
+    from onilock.db.models import Account
 
     engine = get_profile_engine()
-    if not engine:
-        info(
-            "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
+    profile = _load_profile_for_update(engine)
+    cipher = data_cipher()
+    changed = _backfill_password_keys(profile, cipher)
+
+    added, weak, failed = 0, 0, 0
+    seen = set()
+    new_accounts = []
+    with open_source(source) as stream:
+        rows = iter_rows(stream, fmt or guess_format(source))
+        for batch in batched(rows, INGEST_BATCH_SIZE):
+            created_at = int(naive_utcnow().timestamp())
+            for row in batch:
+                name = row.fields.get("name", "")
+                reason = row.error
+                if reason is None and (
+                    name.lower() in seen or profile.get_account(name) is not None
+                ):
+                    reason = f"account '{name}' already exists"
+                if reason is not None:
+                    error(f"Row {row.number}: {reason}")
+                    failed += 1
+                    continue
+
+                password = row.fields.get("password") or generate_random_password()
+                fingerprint = password_fingerprint(password)
+                health = password_health(
+                    password,
+                    is_reused=bool(profile.accounts_with_password(fingerprint)),
+                )
+                encrypted_password = cipher.encrypt(password.encode())
+                account = Account(
+                    id=name,
+                    encrypted_password=base64.b64encode(encrypted_password).decode(),
+                    password_fingerprint=fingerprint,
+                    password_sketch=password_sketch(password),
+                    username=row.fields.get("username", ""),
+                    url=row.fields.get("url") or None,
+                    description=row.fields.get("description") or None,
+                    is_weak_password=health["strength"] != "strong",
+                    created_at=created_at,
+                )
+                profile.add_account(account)
+                new_accounts.append(account)
+                seen.add(name.lower())
+                added += 1
+                weak += health["strength"] != "strong"
+
+    if new_accounts:
+        clusters = _similarity_clusters(profile.accounts)
+        similar = {fp for members in clusters for fp in members}
+        for account in new_accounts:
+            if account.password_fingerprint in similar and not account.is_weak_password:
+                profile.update_account(account, is_weak_password=True)
+                weak += 1
+
+    if added or changed:
+        engine.write(profile.model_dump())
+    if added:
+        audit("account.bulk_added", count=added, failed=failed)
+
+    success(f"{added} accounts added to the vault.")
+    if weak:
+        warning(f"{weak} of them have weak passwords.")
+    if failed:
+        warning(f"{failed} rows were skipped.")
+    return {"added": added, "weak": weak, "failed": failed}
+
+
+def _health_cache_engine(engine):
+    """Encrypted sidecar caching health results by fingerprint and policy."""
+    return DatabaseManager(
+        database_url=f"{engine.db_url}.health", is_encrypted=True
+    ).get_engine()
+
+
+def _load_health_cache(cache_engine, policy: str) -> dict:
+    try:
+        data = cache_engine.read()
+    except Exception:
+        # Unreadable (e.g. sealed with a rotated key): start over.
+        logger.debug("Discarding unreadable password health cache.")
+        return {}
+    if data.get("policy") != policy:
+        return {}
+    return data.get("results", {})
+
+
+def _decrypted_batches(accounts, cipher: MultiFernet, unreadable: list):
+    for batch in batched(accounts, AUDIT_BATCH_SIZE):
+        readable, passwords = [], []
+        for acct in batch:
+            try:
+                encrypted = base64.b64decode(acct.encrypted_password)
+                passwords.append(cipher.decrypt(encrypted).decode())
+            except Exception:
+                unreadable.append(acct.id)
+                continue
+            readable.append(acct)
+        yield readable, passwords
+
+
+@pre_post_hooks(pre_command, post_command)
+def audit_passwords(workers: Optional[int] = None) -> dict:
+    """
+    Re-evaluate the health of every password in the vault.
+
+    Health results are cached per password fingerprint and policy version,
+    so only passwords that are new, changed or judged under an older policy
+    are decrypted and analysed. Near-duplicate passwords are clustered from
+    their stored similarity sketches, without decrypting anything. Stale
+    `is_weak_password` flags are refreshed in a single vault write.
+
+    Args:
+        workers (Optional[int]): Analysis processes, `ONI_AUDIT_WORKERS` (or every CPU) if omitted.
+
+    Returns:
+        dict: The policy version, a summary, one report per account and the clusters of accounts with similar passwords.
+    """
+    engine = get_profile_engine()
+    profile = _load_profile_for_update(engine)
+    cipher = data_cipher()
+    changed = _backfill_password_keys(profile, cipher)
+
+    policy = policy_version()
+    cache_engine = _health_cache_engine(engine)
+    cached = _load_health_cache(cache_engine, policy)
+
+    owners = Counter(
+        acct.password_fingerprint
+        for acct in profile.accounts
+        if acct.password_fingerprint
+    )
+    results = {fp: cached[fp] for fp in owners if fp in cached}
+    from_cache = len(results)
+    pending = {}
+    for acct in profile.accounts:
+        fp = acct.password_fingerprint
+        if fp and fp not in results:
+            pending.setdefault(fp, acct)
+
+    workers = _worker_count(workers, len(pending))
+    logger.debug(f"Analysing {len(pending)} passwords with {workers} workers.")
+
+    unreadable = []
+    batches = _decrypted_batches(pending.values(), cipher, unreadable)
+    for readable, healths in analyse_passwords(batches, workers):
+        for acct, health in zip(readable, healths):
+            results[acct.password_fingerprint] = health
+
+    clusters = _similarity_clusters(profile.accounts)
+    similar = {fp for members in clusters for fp in members}
+
+    reports = []
+    summary = {"strong": 0, "medium": 0, "weak": 0, "unreadable": 0}
+    updated = 0
+    for acct in profile.accounts:
+        health = results.get(acct.password_fingerprint)
+        if health is None:
+            summary["unreadable"] += 1
+            reports.append({"id": acct.id, "strength": None, "error": "unreadable"})
+            continue
+        if owners[acct.password_fingerprint] > 1:
+            health = with_reuse(health)
+        if acct.password_fingerprint in similar:
+            health = with_similar(health)
+        summary[health["strength"]] += 1
+
+        is_weak = health["strength"] != "strong"
+        if acct.is_weak_password != is_weak:
+            acct.is_weak_password = is_weak
+            updated += 1
+        reports.append(
+            {"id": acct.id, "username": acct.username, "url": acct.url, **health}
         )
-        return
-    data = engine.read()
+
+    if updated or changed:
+        engine.write(profile.model_dump())
+    if pending or results.keys() != cached.keys():
+        cache_engine.write({"policy": policy, "results": results})
+
+    summary.update(
+        accounts=len(profile.accounts),
+        analysed=len(results) - from_cache,
+        cached=from_cache,
+        updated=updated,
+        similar_clusters=len(clusters),
+    )
+    ids_by_fingerprint = defaultdict(list)
+    for acct in profile.accounts:
+        ids_by_fingerprint[acct.password_fingerprint].append(acct.id)
+    audit("passwords.audited", **summary)
+    return {
+        "policy_version": policy,
+        "summary": summary,
+        "accounts": reports,
+        "similar": [
+            [id for fp in members for id in ids_by_fingerprint[fp]]
+            for members in clusters
+        ],
+    }
+
+
+def _listed_accounts() -> Optional[tuple]:
+    """Profile name and account rows to list, or None if not initialized."""
+    from onilock.db.models import Profile
+
+    # A running agent holds the decrypted profile already.
+    response = agent_request("list")
+    if response and response.get("ok"):
+        return response["profile"], [
+            SimpleNamespace(**row) for row in response["accounts"]
+        ]
+
+    engine = get_profile_engine()
+    if not engine:
+        return None
+    # Only the accounts are needed; segmented vaults skip decrypting the files.
+    data = engine.read_header()
     if not data:
+        return None
+    data["accounts"] = engine.read_collection("accounts")
+    profile = Profile(**{"accounts": [], **data})
+    return profile.name, profile.accounts
+
+
+@pre_post_hooks(pre_command, post_command)
+def list_accounts():
+    """List all available accounts."""
+
+    listed = _listed_accounts()
+    if listed is None:
         info(
             "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
         )
         return
-    profile = Profile(**data)
+    name, accounts = listed
 
-    if not profile.accounts:
+    if not accounts:
         info(
-            f"No accounts found in [bold]{profile.name}[/bold]. "
+            f"No accounts found in [bold]{name}[/bold]. "
             "Use [bold]onilock new[/bold] to add one."
         )
         return
 
-    table = Table(title=f"Accounts — {profile.name}", show_lines=True)
+    table = Table(title=f"Accounts — {name}", show_lines=True)
     table.add_column("#", style="dim", width=4, justify="right")
     table.add_column("Name", style="bold cyan")
     table.add_column("Username", style="green")
     table.add_column("URL", style="blue")
     table.add_column("Created", style="dim")
 
-    for index, account in enumerate(profile.accounts):
+    for index, account in enumerate(accounts):
         created_date = datetime.fromtimestamp(account.created_at).strftime("%Y-%m-%d")
         table.add_row(
             str(index + 1),
@@ -360,6 +811,7 @@ def list_accounts():
 @pre_post_hooks(pre_command, post_command)
 def list_files():
     """List all available files."""
+    from onilock.db.models import Profile
 
     engine = get_profile_engine()
     if not engine:
@@ -367,13 +819,15 @@ def list_files():
             "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
         )
         return
-    data = engine.read()
+    # Only the files are needed; segmented vaults skip decrypting the accounts.
+    data = engine.read_header()
     if not data:
         info(
             "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
         )
         return
-    profile = Profile(**data)
+    data["files"] = engine.read_collection("files")
+    profile = Profile(**{"accounts": [], **data})
 
     if not profile.files:
         info(
@@ -410,32 +864,32 @@ def copy_account_password(id: str | int):
     Args:
         id (str | int): The target password identifier or 0-based index.
     """
+    from onilock.db.models import Account
+
     engine = get_profile_engine()
     if not engine:
         error(
             "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
         )
         exit(1)
-    data = engine.read()
-    if not data:
+    if not engine.read_header():
         error(
             "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
         )
         exit(1)
 
-    profile = Profile(**data)
-
-    account = profile.get_account(id)
-    if not account:
+    account_data = engine.get_record("accounts", id)
+    if not account_data:
         error(
             f"Account [bold]{id}[/bold] not found. "
             "Run [bold]onilock list[/bold] to see available accounts."
         )
         exit(1)
+    account = Account(**account_data)
 
     logger.debug(f"Raw password: {account.encrypted_password}")
     logger.debug("Decrypting the password.")
-    cipher = Fernet(settings.SECRET_KEY.encode())
+    cipher = data_cipher()
     encrypted_password = base64.b64decode(account.encrypted_password)
     decrypted_password = cipher.decrypt(encrypted_password).decode()
     if not settings.CLIPBOARD_ENABLED:
@@ -462,6 +916,8 @@ def copy_account_password(id: str | int):
     )
     process.start()
 
+    # `os._exit` skips the end of command hooks.
+    spawns.report()
     os._exit(0)
 
 
@@ -479,37 +935,30 @@ def remove_account(name: str):
             "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
         )
         exit(1)
-    data = engine.read()
-    if not data:
+    if not engine.read_header():
         error(
             "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
         )
         exit(1)
 
-    profile = Profile(**data)
-
-    account = profile.get_account(name)
-
-    if not account:
+    if not engine.delete_record("accounts", name):
         error(
             f"Account [bold]{name}[/bold] not found. "
             "Run [bold]onilock list[/bold] to see available accounts."
         )
         exit(1)
 
-    profile.remove_account(name)
-    engine.write(profile.model_dump())
     success(f"Account [bold]{name}[/bold] removed.")
     audit("account.removed", account=name)
 
 
 @pre_post_hooks(pre_command, post_command)
-def delete_profile(master_password: str):
+def delete_profile(master_password: Optional[str]):
     """
     Delete all profile data.
 
     Args:
-        master_password (str): Profile master password.
+        master_password (Optional[str]): Profile master password, None within a session.
     """
     master_password_match = verify_master_password(master_password)
     if not master_password_match:
@@ -527,6 +976,7 @@ def delete_profile(master_password: str):
     )
 
     shutil.rmtree(settings.VAULT_DIR)
+    session.revoke(settings.DB_NAME)
     success("All user data has been permanently deleted.")
     profile_name = getattr(settings, "DB_NAME", None)
     if isinstance(profile_name, str) and profile_name:
@@ -538,52 +988,287 @@ def delete_profile(master_password: str):
 
 def rotate_secret_key():
     """
-    Rotate the vault secret key and re-encrypt stored passwords.
+    Rotate the keystore secret.
+
+    The secret only wraps the data key (see `onilock.core.keys`), so this
+    re-wraps one small file and leaves the vault untouched. Use `rekey_vault`
+    to replace the data key itself.
     """
     engine = get_profile_engine()
-    if not engine:
+    if not engine or not engine.read_header():
         error(
             "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
         )
         exit(1)
 
+    old_key = settings.SECRET_KEY
+    new_key = Fernet.generate_key().decode()
+    # Both secrets open the data key until the keystore holds the new one, so
+    # the vault stays readable whichever step is interrupted.
+    wrap_for([old_key, new_key])
+    key_name = str(uuid.uuid5(uuid.NAMESPACE_DNS, getlogin())).split("-")[-1]
+    with keystore.transaction():
+        keystore.set_password(key_name, new_key)
+    settings.SECRET_KEY = new_key
+    wrap_for([new_key])
+    audit("keys.secret.rotated")
+
+
+def _rekey_batch(old_key: str, new_key: str, tokens: List[str]) -> list:
+    """
+    Re-encrypt password tokens under `new_key`, with the fingerprint and
+    sketch of each password under it. Tokens already under `new_key` give
+    None, tokens that decrypt under neither key give False.
+    """
+    old, new = Fernet(old_key.encode()), Fernet(new_key.encode())
+    results = []
+    for token in tokens:
+        encrypted = base64.b64decode(token)
+        try:
+            new.decrypt(encrypted)
+            results.append(None)
+            continue
+        except InvalidToken:
+            pass
+        try:
+            password = old.decrypt(encrypted)
+        except InvalidToken:
+            results.append(False)
+            continue
+        results.append(
+            (
+                base64.b64encode(new.encrypt(password)).decode(),
+                password_fingerprint(password.decode(), new_key),
+                password_sketch(password.decode(), new_key),
+            )
+        )
+    return results
+
+
+def _rekeyed(batches, old_key: str, new_key: str, workers: int):
+    """Results of `_rekey_batch`, with a bounded number of batches in flight."""
+    return map_batches(partial(_rekey_batch, old_key, new_key), batches, workers)
+
+
+def _worker_count(workers: Optional[int], jobs: int) -> int:
+    workers = workers or settings.AUDIT_WORKERS or os.cpu_count() or 1
+    return workers if jobs >= AUDIT_PARALLEL_MIN else 1
+
+
+def _rekey_profiles() -> list:
+    """Setup and vault engines of every profile sharing this vault directory."""
+    targets = []
+    for name in sorted(set(list_profiles()) | {settings.DB_NAME}):
+        setup_path = (
+            settings.SETUP_FILEPATH
+            if name == settings.DB_NAME
+            else str(setup_filepath(name))
+        )
+        if not os.path.exists(setup_path):
+            continue
+        setup_engine = DatabaseManager(
+            database_url=setup_path, is_encrypted=True
+        ).get_engine()
+        targets.append((name, setup_engine))
+    return targets
+
+
+def _profile_vault(name: str, setup_data: dict):
+    entry = setup_data.get(name)
+    if not entry:
+        return None
+    filepath = data_cipher().decrypt(base64.b64decode(entry["filepath"])).decode()
+    return DatabaseManager(
+        database_url=filepath, is_encrypted=True, backend=settings.DB_BACKEND
+    ).get_engine()
+
+
+def _reencrypt_passwords(engine, old_key: str, new_key: str, workers) -> tuple:
+    """Move the passwords of one vault under `new_key`, with checkpoints."""
+    from onilock.db.models import Profile
+
     data = engine.read()
     if not data:
+        return 0, 0
+    profile = Profile(**data)
+    accounts = profile.accounts
+    workers = _worker_count(workers, len(accounts))
+    batches = (
+        (batch, [acct.encrypted_password for acct in batch])
+        for batch in batched(accounts, AUDIT_BATCH_SIZE)
+    )
+
+    reencrypted, unreadable, unsaved = 0, 0, 0
+    for batch, results in _rekeyed(batches, old_key, new_key, workers):
+        for acct, result in zip(batch, results):
+            if result is None:
+                continue
+            if result is False:
+                unreadable += 1
+                continue
+            (
+                acct.encrypted_password,
+                acct.password_fingerprint,
+                acct.password_sketch,
+            ) = result
+            reencrypted += 1
+            unsaved += 1
+        if unsaved >= REKEY_CHECKPOINT:
+            engine.write(profile.model_dump())
+            unsaved = 0
+    if unsaved:
+        engine.write(profile.model_dump())
+    return reencrypted, unreadable
+
+
+def _reencrypt_file(manager, location: str) -> bool:
+    """Re-encrypt a stored file to the active GPG key; False if unreadable."""
+    try:
+        data = manager.decrypt_bytes(Path(location).read_bytes())
+    except Exception:
+        return False
+    manager.encrypt_bytes(data, location)
+    return True
+
+
+def _reencrypt_files(files, workers) -> tuple:
+    """Re-encrypt stored files not re-encrypted yet, in a thread pool."""
+    done = {entry["path"] for entry in journal() if entry["stage"] == "file"}
+    locations = [
+        file.location
+        for file in files
+        if file.location not in done and os.path.exists(file.location)
+    ]
+    if not locations:
+        return 0, 0
+
+    # Importing inside the function in order to prevent circular imports: the
+    # file manager reads its profile through this module.
+    from onilock.filemanager import FileEncryptionManager
+
+    manager = FileEncryptionManager()
+    workers = workers or settings.AUDIT_WORKERS or os.cpu_count() or 1
+    reencrypted, unreadable = 0, 0
+    # GPG runs as a subprocess per file, so threads are enough to keep every
+    # worker busy.
+    with ThreadPoolExecutor(max_workers=min(workers, len(locations))) as pool:
+        results = pool.map(
+            lambda location: _reencrypt_file(manager, location), locations
+        )
+        for location, ok in zip(locations, results):
+            if ok:
+                record(stage="file", path=location)
+                reencrypted += 1
+            else:
+                unreadable += 1
+    return reencrypted, unreadable
+
+
+def _read_sealed(engine, old_key: str) -> dict:
+    """Read a file sealed under `old_key`, or already under the current key."""
+    try:
+        with sealed_with(old_key):
+            return engine.read()
+    except Exception:
+        # Already resealed by an earlier, interrupted run.
+        return engine.read()
+
+
+@pre_post_hooks(pre_command, post_command)
+def rekey_vault(workers: Optional[int] = None, files: bool = True) -> dict:
+    """
+    Replace the data key and re-encrypt every profile of the vault directory.
+
+    The new key is stored as pending before anything is sealed under it.
+    Passwords are then re-encrypted in parallel under it and saved every
+    `REKEY_CHECKPOINT` passwords, and stored files are re-encrypted to the
+    active GPG key; the pending key is then made current and each setup and
+    vault file is resealed under it. Every write is synced, and finished
+    steps are recorded in the re-key journal, so running it again after an
+    interruption resumes where it stopped.
+
+    Args:
+        workers (Optional[int]): Processes, `ONI_AUDIT_WORKERS` (or every CPU) if omitted.
+        files (bool): Whether to re-encrypt stored files too.
+
+    Returns:
+        dict: Counts of `profiles`, `reencrypted` and `unreadable` passwords,
+            and of re-encrypted and unreadable stored `files`.
+    """
+    profiles = _rekey_profiles()
+    if not profiles:
         error(
             "This vault is not initialized. Run [bold]onilock initialize-vault[/bold] first."
         )
         exit(1)
 
-    profile = Profile(**data)
-    old_key = settings.SECRET_KEY
-    new_key = Fernet.generate_key().decode()
-    cipher_old = Fernet(old_key.encode())
-    cipher_new = Fernet(new_key.encode())
+    keys = data_keys()
+    if PENDING in keys or PREVIOUS in keys:
+        info("Resuming an interrupted re-key.")
+    with strict_durability():
+        result = _rekey(profiles, keys, workers, files)
+    audit("keys.data.rekeyed", **result)
+    return result
 
-    for account in profile.accounts:
-        encrypted_password = base64.b64decode(account.encrypted_password)
-        decrypted_password = cipher_old.decrypt(encrypted_password)
-        reencrypted = cipher_new.encrypt(decrypted_password)
-        account.encrypted_password = base64.b64encode(reencrypted).decode()
 
-    engine.write(profile.model_dump())
+def _rekey(profiles: list, keys: dict, workers, files: bool) -> dict:
+    from onilock.db.models import Profile
 
-    # Re-encrypt setup file path
-    db_manager = DatabaseManager(
-        database_url=settings.SETUP_FILEPATH, is_encrypted=True
-    )
-    setup_engine = db_manager.get_engine()
-    setup_data = setup_engine.read()
-    entry = setup_data.get(settings.DB_NAME)
-    if entry:
-        encrypted_filepath = base64.b64decode(entry["filepath"])
-        decrypted_path = cipher_old.decrypt(encrypted_filepath)
-        entry["filepath"] = base64.b64encode(
-            cipher_new.encrypt(decrypted_path)
-        ).decode()
-        setup_engine.write(setup_data)
+    result = {
+        "profiles": len(profiles),
+        "reencrypted": 0,
+        "unreadable": 0,
+        "files": 0,
+        "unreadable_files": 0,
+    }
 
-    key_name = str(uuid.uuid5(uuid.NAMESPACE_DNS, getlogin())).split("-")[-1]
-    keystore.set_password(key_name, new_key)
-    settings.SECRET_KEY = new_key
-    audit("keys.secret.rotated")
+    if PREVIOUS not in keys:
+        new_key = begin_rekey()
+        finished = {
+            entry["profile"] for entry in journal() if entry["stage"] == "passwords"
+        }
+        for name, setup_engine in profiles:
+            if name in finished:
+                continue
+            engine = _profile_vault(name, setup_engine.read())
+            if engine is None:
+                continue
+            done, failed = _reencrypt_passwords(
+                engine, keys[CURRENT], new_key, workers
+            )
+            result["reencrypted"] += done
+            result["unreadable"] += failed
+            if files:
+                done, failed = _reencrypt_files(
+                    Profile(**engine.read()).files, workers
+                )
+                result["files"] += done
+                result["unreadable_files"] += failed
+            record(stage="passwords", profile=name)
+        promote_pending()
+
+    old_key = data_keys()[PREVIOUS]
+    cipher = data_cipher()
+    sealed = {entry["profile"] for entry in journal() if entry["stage"] == "sealed"}
+    for name, setup_engine in profiles:
+        if name in sealed:
+            continue
+        setup_data = _read_sealed(setup_engine, old_key)
+        engine = _profile_vault(name, setup_data)
+        for entry in setup_data.values():
+            entry["filepath"] = base64.b64encode(
+                cipher.rotate(base64.b64decode(entry["filepath"]))
+            ).decode()
+        setup_engine.write(setup_data)
+        if engine is not None:
+            data = _read_sealed(engine, old_key)
+            if data:
+                engine.write(data)
+            # Health results are keyed by the fingerprints just replaced.
+            health_path = f"{engine.db_url}.health"
+            if os.path.exists(health_path):
+                os.remove(health_path)
+                remove_lock_file(health_path)
+        record(stage="sealed", profile=name)
+    forget_previous()
+    return result
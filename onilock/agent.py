@@ -0,0 +1,431 @@
+"""
+The OniLock agent: a background process serving the decrypted active profile.
+
+Started by `onilock agent start`, it decrypts the profile once and answers
+`status`, `list`, `get`, `copy` and `stop` requests (see `onilock.core.agent`
+for the protocol) over a UNIX socket in a directory only the user can enter,
+from processes of the same user only. The decrypted profile is dropped as
+soon as one of its files changes, as reported by inotify (or, where inotify
+is not available, by comparing their stat on each request), and the agent
+exits once it has been idle for `ONI_AGENT_TIMEOUT` seconds.
+"""
+
+import argparse
+import base64
+import ctypes
+import ctypes.util
+import os
+import select
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pyperclip
+
+from onilock.account_manager import get_profile_engine
+from onilock.core.agent import (
+    TIMEOUT,
+    is_private,
+    read_message,
+    request,
+    socket_path,
+    write_message,
+)
+from onilock.core.audit import audit
+from onilock.core.keys import data_cipher, key_file_path
+from onilock.core.logging_manager import logger
+from onilock.core.settings import settings
+from onilock.db.models import Profile
+
+
+# Seconds after which a copied password is cleared from the clipboard.
+CLIPBOARD_CLEAR_DELAY = 10
+# Seconds `spawn` waits for a new agent to answer.
+SPAWN_TIMEOUT = 5.0
+
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+)
+# wd, mask, cookie, len; followed by `len` bytes of NUL-padded name.
+_EVENT = struct.Struct("iIII")
+# Sidecars that change without the profile changing.
+_IGNORED_SUFFIXES = (".lock", ".health", ".tmp")
+
+
+def _libc_inotify():
+    """libc, if it provides inotify."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class FileWatcher:
+    """
+    Tells whether any of a set of files changed since the last check.
+
+    A file counts as changed when it, or a sidecar named after it (a SQLite
+    `-wal`, say), is written, replaced or removed. On Linux, the directories
+    holding the files are watched with inotify, and `changed()` only drains
+    the pending events; elsewhere it compares the files' stat.
+    """
+
+    def __init__(self, paths: List[Path]) -> None:
+        self.paths = [Path(path) for path in paths]
+        self._names: Dict[int, List[str]] = {}
+        self._fd: Optional[int] = None
+        self._signature = self._stat()
+
+        libc = _libc_inotify()
+        if libc is None:
+            return
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return
+        directories: Dict[Path, List[str]] = {}
+        for path in self.paths:
+            directories.setdefault(path.parent, []).append(path.name)
+        for directory, names in directories.items():
+            wd = libc.inotify_add_watch(fd, str(directory).encode(), _WATCH_MASK)
+            if wd < 0:
+                os.close(fd)
+                return
+            self._names[wd] = names
+        self._fd = fd
+
+    def _stat(self) -> tuple:
+        signature = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                signature.append(None)
+                continue
+            signature.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    def _relevant(self, wd: int, name: str) -> bool:
+        if name.endswith(_IGNORED_SUFFIXES):
+            return False
+        return any(
+            name == watched or name.startswith((f"{watched}.", f"{watched}-"))
+            for watched in self._names.get(wd, ())
+        )
+
+    def changed(self) -> bool:
+        """Whether a file changed since the last call. Never blocks."""
+        if self._fd is None:
+            signature = self._stat()
+            changed, self._signature = signature != self._signature, signature
+            return changed
+
+        changed = False
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, _, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = (
+                    data[offset : offset + length]
+                    .rstrip(b"\0")
+                    .decode(errors="replace")
+                )
+                offset += length
+                changed = changed or self._relevant(wd, name)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class Agent:
+    """Serves the active profile from memory on the agent socket."""
+
+    def __init__(
+        self, path: Optional[Path] = None, timeout: Optional[float] = None
+    ) -> None:
+        self.path = Path(path or socket_path())
+        self.timeout = settings.AGENT_TIMEOUT if timeout is None else timeout
+        self._profile: Optional[Profile] = None
+        self._cipher = None
+        self._watcher: Optional[FileWatcher] = None
+        self._clear_timers: List[threading.Timer] = []
+        self._running = False
+        self._last_request = time.monotonic()
+
+    def _drop(self) -> None:
+        self._profile = None
+        self._cipher = None
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+
+    def profile(self) -> Profile:
+        """The decrypted profile, loaded again if its files changed."""
+        if self._watcher is not None and self._watcher.changed():
+            logger.debug("Vault files changed, dropping the decrypted profile.")
+            self._drop()
+        if self._profile is None:
+            engine = get_profile_engine()
+            if not engine:
+                raise RuntimeError("This vault is not initialized.")
+            # Watch before decrypting, so that a write in between is not missed.
+            self._watcher = FileWatcher(
+                [
+                    Path(settings.SETUP_FILEPATH),
+                    Path(engine.db_url),
+                    key_file_path(),
+                ]
+            )
+            data = engine.read()
+            if not data:
+                raise RuntimeError("This vault is not initialized.")
+            self._profile = Profile(**data)
+            self._cipher = data_cipher()
+        return self._profile
+
+    def _active_profile(self) -> str:
+        if os.environ.get("ONI_DB_NAME"):
+            return settings.DB_NAME
+        try:
+            return settings.PROFILE_PATH.read_text().strip() or settings.DB_NAME
+        except OSError:
+            return settings.DB_NAME
+
+    def _password(self, account) -> str:
+        return self._cipher.decrypt(
+            base64.b64decode(account.encrypted_password)
+        ).decode()
+
+    def _copy(self, account_id: str, password: str) -> dict:
+        if not settings.CLIPBOARD_ENABLED:
+            return _error("Clipboard is disabled.")
+        try:
+            pyperclip.copy(password)
+        except Exception:
+            return _error("Clipboard is not available.")
+        # A timer instead of the process the CLI forks for this.
+        timer = threading.Timer(CLIPBOARD_CLEAR_DELAY, _clear_clipboard)
+        timer.daemon = True
+        timer.start()
+        self._clear_timers = [t for t in self._clear_timers if t.is_alive()] + [timer]
+        audit("account.copied", account=account_id, agent=True)
+        return {"ok": True, "id": account_id, "clear_after": CLIPBOARD_CLEAR_DELAY}
+
+    def handle(self, message: dict) -> dict:
+        """Answer one request."""
+        op = message.get("op")
+        if op == "stop":
+            self._running = False
+            return {"ok": True}
+        if op == "status":
+            return {
+                "ok": True,
+                "pid": os.getpid(),
+                "profile": settings.DB_NAME,
+                "vault_dir": str(settings.VAULT_DIR),
+                "timeout": self.timeout,
+                "loaded": self._profile is not None,
+            }
+        if op not in ("list", "get", "copy"):
+            return _error(f"Unknown request: {op}")
+
+        if (message.get("profile") or self._active_profile()) != settings.DB_NAME:
+            return _error(f"This agent serves the profile {settings.DB_NAME}.")
+        try:
+            profile = self.profile()
+        except Exception as exc:
+            self._drop()
+            return _error(f"The vault could not be opened: {exc}")
+
+        if op == "list":
+            return {
+                "ok": True,
+                "profile": profile.name,
+                "accounts": [
+                    {
+                        "id": account.id,
+                        "username": account.username,
+                        "url": account.url,
+                        "created_at": account.created_at,
+                    }
+                    for account in profile.accounts
+                ],
+            }
+
+        account_id = message.get("id")
+        if not isinstance(account_id, (str, int)) or isinstance(account_id, bool):
+            return _error("Invalid account id.")
+        account = profile.get_account(account_id)
+        if account is None:
+            return _error(f"Account {account_id} not found.")
+        password = self._password(account)
+        if op == "get":
+            return {"ok": True, "id": account.id, "password": password}
+        return self._copy(account.id, password)
+
+    def _bind(self) -> socket.socket:
+        directory = self.path.parent
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not is_private(directory):
+            raise PermissionError(
+                f"{directory} must belong to you and be private (mode 0700)."
+            )
+        if self.path.exists():
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(str(self.path))
+                except OSError:
+                    # Left behind by an agent that did not exit cleanly.
+                    self.path.unlink()
+                else:
+                    raise RuntimeError("An agent is already running.")
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            sock.bind(str(self.path))
+        finally:
+            os.umask(umask)
+        sock.listen(16)
+        return sock
+
+    def _accept(self, sock: socket.socket) -> None:
+        conn, _ = sock.accept()
+        with conn:
+            conn.settimeout(TIMEOUT)
+            if not _same_user(conn):
+                logger.warning("Refused an agent connection from another user.")
+                return
+            try:
+                message = read_message(conn)
+            except OSError:
+                return
+            if message is None:
+                return
+            self._last_request = time.monotonic()
+            response = self.handle(message)
+            try:
+                write_message(conn, response)
+            except OSError:
+                pass
+
+    def serve(self, ready: Optional[Callable[[], None]] = None) -> None:
+        """
+        Serve requests until stopped or idle for `timeout` seconds.
+
+        Args:
+            ready (Optional[Callable]): Called once the socket accepts connections.
+        """
+        sock = self._bind()
+        self._running = True
+        self._last_request = time.monotonic()
+        if ready is not None:
+            ready()
+        try:
+            while self._running:
+                remaining = self._last_request + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    logger.info("The agent was idle for too long, exiting.")
+                    break
+                readable, _, _ = select.select([sock], [], [], remaining)
+                if readable:
+                    self._accept(sock)
+        finally:
+            sock.close()
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+            self._drop()
+            if any(timer.is_alive() for timer in self._clear_timers):
+                for timer in self._clear_timers:
+                    timer.cancel()
+                _clear_clipboard()
+
+
+def _error(message: str) -> dict:
+    return {"ok": False, "error": message}
+
+
+def _clear_clipboard() -> None:
+    try:
+        pyperclip.copy("")
+    except Exception:
+        pass
+
+
+def _same_user(conn: socket.socket) -> bool:
+    if not hasattr(socket, "SO_PEERCRED"):
+        # The socket directory is private to the user already.
+        return True
+    creds = conn.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    _, uid, _ = struct.unpack("3i", creds)
+    return uid == os.getuid()
+
+
+def spawn(timeout: Optional[float] = None) -> Optional[int]:
+    """
+    Start an agent in the background.
+
+    Returns:
+        Optional[int]: Its process id once it answers, None if it did not start.
+    """
+    command = [sys.executable, "-m", "onilock.agent"]
+    if timeout is not None:
+        command += ["--timeout", str(timeout)]
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + SPAWN_TIMEOUT
+    while time.monotonic() < deadline and process.poll() is None:
+        status = request("status")
+        if status and status.get("ok"):
+            return status["pid"]
+        time.sleep(0.05)
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the OniLock agent.")
+    parser.add_argument("--timeout", type=float, default=None)
+    args = parser.parse_args()
+    Agent(timeout=args.timeout).serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""Console entry point of OniLock."""
+
+import sys
+
+from onilock.core.agent import run_command
+
+
+def main() -> None:
+    # Ask a running agent first: it answers without importing the CLI.
+    status = run_command(sys.argv[1:])
+    if status is not None:
+        sys.exit(status)
+
+    from onilock.run import app
+
+    app()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Client side of the OniLock agent.
+
+`onilock agent start` keeps the active profile decrypted in a background
+process and serves it over a UNIX socket (see `onilock.agent`), much like
+ssh-agent. This module only imports the few standard modules a request
+needs, so a command can be answered by the agent before the rest of OniLock
+is imported.
+
+Requests and responses are single JSON lines. A request is
+`{"op": ..., **arguments}`; a response is `{"ok": true, ...}` or
+`{"ok": false, "error": ...}`.
+"""
+
+import json
+import os
+import socket
+import sys
+from typing import List, Optional
+
+
+# Seconds a client waits for the agent before doing the work itself.
+TIMEOUT = 2.0
+# Longest accepted request or response line.
+MAX_MESSAGE = 1 << 20
+
+
+def runtime_dir() -> str:
+    """
+    Per-user directory for the agent socket and session tickets: under
+    `XDG_RUNTIME_DIR`, else in `/dev/shm`, so that it lives in memory
+    wherever possible.
+    """
+    base = os.environ.get("XDG_RUNTIME_DIR")
+    if base:
+        return os.path.join(base, "onilock")
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    base = base or os.environ.get("TMPDIR") or "/tmp"
+    return os.path.join(base, f"onilock-{os.getuid()}")
+
+
+def socket_path() -> str:
+    """Path of the agent socket, `ONI_AGENT_SOCKET` if set."""
+    return os.environ.get("ONI_AGENT_SOCKET") or os.path.join(
+        runtime_dir(), "agent.sock"
+    )
+
+
+def is_private(directory: str) -> bool:
+    """Whether only the current user can reach sockets in `directory`."""
+    try:
+        st = os.stat(directory)
+    except OSError:
+        return False
+    return st.st_uid == os.getuid() and not st.st_mode & 0o077
+
+
+def read_message(conn: socket.socket) -> Optional[dict]:
+    """Read one JSON line from `conn`, or None if it closed or sent garbage."""
+    buffer = bytearray()
+    while not buffer.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk:
+            return None
+        buffer += chunk
+        if len(buffer) > MAX_MESSAGE:
+            return None
+    try:
+        message = json.loads(buffer)
+    except ValueError:
+        return None
+    return message if isinstance(message, dict) else None
+
+
+def write_message(conn: socket.socket, message: dict) -> None:
+    conn.sendall(json.dumps(message).encode() + b"\n")
+
+
+def request(op: str, **arguments) -> Optional[dict]:
+    """
+    Send a request to the agent.
+
+    The profile named by `ONI_DB_NAME`, if set, is sent along so that an
+    agent serving another profile refuses it.
+
+    Returns:
+        Optional[dict]: The response, or None if no agent is reachable or its
+            socket is not private to the current user.
+    """
+    path = socket_path()
+    if not is_private(os.path.dirname(path)):
+        return None
+    profile = os.environ.get("ONI_DB_NAME")
+    if profile:
+        arguments["profile"] = profile
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(TIMEOUT)
+            conn.connect(path)
+            write_message(conn, {"op": op, **arguments})
+            return read_message(conn)
+    except OSError:
+        return None
+
+
+def account_id(name: str):
+    """`NAME` of `onilock copy NAME`: an account id or a 1-based index."""
+    try:
+        return int(name) - 1
+    except ValueError:
+        return name
+
+
+def run_command(argv: List[str]) -> Optional[int]:
+    """
+    Answer a command line through the agent, if it can be.
+
+    Only `copy NAME` is handled here; everything else, and anything the agent
+    cannot answer, goes through the full CLI.
+
+    Returns:
+        Optional[int]: The exit status, or None to fall back to the full CLI.
+    """
+    if len(argv) != 2 or argv[0] != "copy" or argv[1].startswith("-"):
+        return None
+    response = request("copy", id=account_id(argv[1]))
+    if not response or not response.get("ok"):
+        return None
+    sys.stdout.write(
+        f"✓ Password for {response['id']} copied to clipboard. "
+        f"Clears automatically in {response['clear_after']}s.\n"
+    )
+    return 0
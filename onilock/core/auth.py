@@ -2,6 +2,7 @@ import json
 import time
 from typing import Dict, Tuple
 
+from onilock.core.fileio import atomic_write
 from onilock.core.settings import settings
 from onilock.core.audit import audit
 
@@ -23,7 +24,7 @@ def _load_lockouts() -> Dict[str, Dict]:
 def _save_lockouts(data: Dict[str, Dict]) -> None:
     path = _lockout_path()
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(data, indent=2))
+    atomic_write(path, [json.dumps(data, indent=2).encode()])
 
 
 def is_locked(profile: str) -> Tuple[bool, int]:
@@ -0,0 +1,203 @@
+"""
+Optional compression stage applied before encryption.
+
+Compressed payloads are framed as the original size (8 bytes, big endian)
+followed by the compressed bytes, so decompression can be bounded and the
+achieved ratio reported without inflating the payload. Data that does not
+compress well is stored as is.
+"""
+
+import struct
+import zlib
+from typing import Dict, Optional
+
+from onilock.core.settings import settings
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+
+# Payloads smaller than this are never worth compressing.
+MIN_SIZE = 256
+# Compression is skipped unless it saves at least this fraction of the size.
+MIN_SAVING = 0.05
+# Large inputs are probed on a sample first to cheaply detect incompressible data.
+SAMPLE_SIZE = 64 * 1024
+
+_SIZE = struct.Struct(">Q")
+
+# Marks stored files whose content went through the compression stage. It is
+# followed by the compressor tag and the framed payload.
+FILE_MAGIC = b"\x00ONILOCK-Z\x00"
+
+
+class Compressor:
+    """Base compressor."""
+
+    name: str = ""
+    tag: int = 0
+    default_level: int = 0
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def compress(self, data: bytes, level: int) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes, size: int) -> bytes:
+        raise NotImplementedError
+
+
+class NoCompression(Compressor):
+    name = "none"
+    tag = 0
+
+
+class ZlibCompressor(Compressor):
+    name = "zlib"
+    tag = 1
+    default_level = 6
+
+    def compress(self, data: bytes, level: int) -> bytes:
+        return zlib.compress(data, level)
+
+    def decompress(self, data: bytes, size: int) -> bytes:
+        decompressor = zlib.decompressobj()
+        result = decompressor.decompress(data, size)
+        if decompressor.unconsumed_tail or not decompressor.eof:
+            raise ValueError("Compressed payload is larger than its recorded size")
+        return result
+
+
+class ZstdCompressor(Compressor):
+    """Zstandard. Requires `zstandard`."""
+
+    name = "zstd"
+    tag = 2
+    default_level = 3
+
+    @property
+    def available(self) -> bool:
+        return zstandard is not None
+
+    def _require(self) -> None:
+        if zstandard is None:
+            raise RuntimeError(
+                "This data is zstd-compressed. Install it with `pip install zstandard`."
+            )
+
+    def compress(self, data: bytes, level: int) -> bytes:
+        self._require()
+        return zstandard.ZstdCompressor(level=level).compress(data)
+
+    def decompress(self, data: bytes, size: int) -> bytes:
+        self._require()
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=size)
+
+
+COMPRESSORS: Dict[str, Compressor] = {
+    c.name: c for c in (NoCompression(), ZlibCompressor(), ZstdCompressor())
+}
+COMPRESSORS_BY_TAG: Dict[int, Compressor] = {c.tag: c for c in COMPRESSORS.values()}
+
+
+def get_compressor(name: Optional[str] = None) -> Compressor:
+    """Return a compressor by name. Without a name, use `ONI_COMPRESSION`."""
+    if name is None:
+        name = settings.COMPRESSION
+    try:
+        compressor = COMPRESSORS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown compression algorithm: {name}")
+    if not compressor.available:
+        raise RuntimeError(
+            f"Compression {name} is not available. Install it with `pip install zstandard`."
+        )
+    return compressor
+
+
+def compressor_for_name(name: str) -> Compressor:
+    try:
+        return COMPRESSORS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported compression algorithm: {name}")
+
+
+def compressor_for_tag(tag: int) -> Compressor:
+    try:
+        return COMPRESSORS_BY_TAG[tag]
+    except KeyError:
+        raise ValueError(f"Unsupported compression tag: {tag}")
+
+
+def compress(
+    data: bytes,
+    compressor: Optional[Compressor] = None,
+    level: Optional[int] = None,
+) -> tuple[Compressor, bytes]:
+    """
+    Compress data with the configured algorithm and level.
+
+    Returns the compressor actually used: `none` when compression is disabled,
+    the data is small, or it does not compress well enough.
+    """
+    compressor = compressor or get_compressor()
+    none = COMPRESSORS["none"]
+    if compressor is none or len(data) < MIN_SIZE:
+        return none, data
+
+    if level is None:
+        level = settings.COMPRESSION_LEVEL or compressor.default_level
+
+    if len(data) > SAMPLE_SIZE:
+        sample = compressor.compress(data[:SAMPLE_SIZE], 1)
+        if len(sample) > SAMPLE_SIZE * (1 - MIN_SAVING):
+            return none, data
+
+    compressed = compressor.compress(data, level)
+    if len(compressed) + _SIZE.size > len(data) * (1 - MIN_SAVING):
+        return none, data
+    return compressor, _SIZE.pack(len(data)) + compressed
+
+
+def decompress(compressor: Compressor, data: bytes) -> bytes:
+    """Reverse `compress`."""
+    if compressor.tag == 0:
+        return data
+    (size,) = _SIZE.unpack_from(data)
+    result = compressor.decompress(data[_SIZE.size :], size)
+    if len(result) != size:
+        raise ValueError("Compressed payload does not match its recorded size")
+    return result
+
+
+def original_size(compressor: Compressor, data: bytes) -> int:
+    """Size of the data before compression, read from the frame."""
+    if compressor.tag == 0:
+        return len(data)
+    return _SIZE.unpack_from(data)[0]
+
+
+def pack_file(data: bytes) -> Optional[bytes]:
+    """
+    Run file content through the configured compression stage.
+
+    Returns None when compression is disabled, so the content is stored
+    unchanged and stays readable by older versions.
+    """
+    compressor = get_compressor()
+    if compressor.tag == 0:
+        return None
+    used, payload = compress(data, compressor)
+    return FILE_MAGIC + bytes([used.tag]) + payload
+
+
+def unpack_file(data: bytes) -> bytes:
+    """Reverse `pack_file`. Content stored without the stage is returned as is."""
+    if not data.startswith(FILE_MAGIC):
+        return data
+    offset = len(FILE_MAGIC)
+    return decompress(compressor_for_tag(data[offset]), data[offset + 1 :])
@@ -0,0 +1,263 @@
+"""
+Compiled password corpora: breach lists and common-password lists, looked up
+through a memory map with no load step.
+
+A corpus is compiled once from a wordlist (one password per line) or a SHA-1
+hash list (`HASH` or `HASH:count` per line, as published by breach services)
+into one of two layouts behind a fixed 32-byte header:
+
+- sorted: the deduplicated SHA-1 digests, 20 bytes each, in ascending order.
+  A lookup is a binary search over the mapped file, about 29 probes for 500M
+  entries, and only the pages it touches are ever read in.
+- bloom: a Bloom filter over the digests, about 1.2 bytes per entry at a 1%
+  false-positive rate. Lookups read `hashes` bits and never miss a member.
+
+Compiling a sorted corpus is an external merge sort, so inputs larger than
+memory work too.
+"""
+
+import hashlib
+import heapq
+import math
+import mmap
+import os
+import struct
+import tempfile
+from functools import partial
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+from onilock.core.fileio import atomic_write
+
+
+MAGIC = b"ONICRP"
+VERSION = 1
+KIND_SORTED = 0
+KIND_BLOOM = 1
+_KINDS = (KIND_SORTED, KIND_BLOOM)
+
+# magic, version, kind, width (sorted) or hashes (bloom), entries, bits (bloom)
+_HEADER = struct.Struct(">6sBBIQQ4x")
+HEADER_SIZE = _HEADER.size
+DIGEST_SIZE = hashlib.sha1().digest_size
+
+# Digests sorted in memory before being spilled to a run file.
+RUN_ENTRIES = 1 << 21
+_WRITE_BUFFER = 1 << 20
+
+
+def digest(password: str) -> bytes:
+    return hashlib.sha1(password.encode()).digest()
+
+
+def _input_digests(lines: Iterable[bytes], hashed: bool) -> Iterator[bytes]:
+    for number, line in enumerate(lines, start=1):
+        line = line.rstrip(b"\r\n")
+        if not line:
+            continue
+        if not hashed:
+            yield hashlib.sha1(line).digest()
+            continue
+        value = line.split(b":", 1)[0].strip()
+        try:
+            raw = bytes.fromhex(value.decode("ascii"))
+        except ValueError:
+            raw = b""
+        if len(raw) != DIGEST_SIZE:
+            raise ValueError(f"Line {number}: expected a SHA-1 hex digest.")
+        yield raw
+
+
+def _write_run(directory: str, run: List[bytes]) -> str:
+    run.sort()
+    fd, path = tempfile.mkstemp(prefix=".corpus-run-", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        f.write(b"".join(run))
+    return path
+
+
+def _read_run(f: BinaryIO) -> Iterator[bytes]:
+    return iter(partial(f.read, DIGEST_SIZE), b"")
+
+
+def _unique(digests: Iterable[bytes]) -> Iterator[bytes]:
+    previous = None
+    for value in digests:
+        if value != previous:
+            yield value
+            previous = value
+
+
+def _buffered(records: Iterable[bytes]) -> Iterator[bytes]:
+    buffer = []
+    size = 0
+    for record in records:
+        buffer.append(record)
+        size += len(record)
+        if size >= _WRITE_BUFFER:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _compile_sorted(source: str, output: str, hashed: bool) -> int:
+    directory = os.path.dirname(os.path.abspath(output))
+    runs: List[str] = []
+    run: List[bytes] = []
+    try:
+        with open(source, "rb") as f:
+            for value in _input_digests(f, hashed):
+                run.append(value)
+                if len(run) >= RUN_ENTRIES:
+                    runs.append(_write_run(directory, run))
+                    run = []
+        run.sort()
+
+        files = [open(path, "rb") for path in runs]
+        try:
+            merged = heapq.merge(run, *(_read_run(f) for f in files))
+            count = 0
+
+            def records() -> Iterator[bytes]:
+                nonlocal count
+                yield _HEADER.pack(MAGIC, VERSION, KIND_SORTED, DIGEST_SIZE, 0, 0)
+                for value in _buffered(_unique(merged)):
+                    count += len(value) // DIGEST_SIZE
+                    yield value
+
+            atomic_write(output, records())
+        finally:
+            for f in files:
+                f.close()
+    finally:
+        for path in runs:
+            os.remove(path)
+    return count
+
+
+def bloom_parameters(entries: int, error_rate: float) -> tuple:
+    """Bits and hash count of a Bloom filter for `entries` at `error_rate`."""
+    if not 0 < error_rate < 1:
+        raise ValueError("The false-positive rate must be between 0 and 1.")
+    entries = max(entries, 1)
+    bits = math.ceil(-entries * math.log(error_rate) / math.log(2) ** 2)
+    hashes = max(1, round(bits / entries * math.log(2)))
+    return bits, hashes
+
+
+def _bloom_positions(value: bytes, bits: int, hashes: int) -> Iterator[int]:
+    # Double hashing over two independent halves of the digest.
+    h1 = int.from_bytes(value[:8], "big")
+    h2 = int.from_bytes(value[8:16], "big") | 1
+    return ((h1 + i * h2) % bits for i in range(hashes))
+
+
+def _compile_bloom(source: str, output: str, hashed: bool, error_rate: float) -> int:
+    with open(source, "rb") as f:
+        entries = sum(1 for line in f if line.strip())
+    bits, hashes = bloom_parameters(entries, error_rate)
+
+    table = bytearray((bits + 7) // 8)
+    with open(source, "rb") as f:
+        for value in _input_digests(f, hashed):
+            for position in _bloom_positions(value, bits, hashes):
+                table[position >> 3] |= 1 << (position & 7)
+
+    header = _HEADER.pack(MAGIC, VERSION, KIND_BLOOM, hashes, entries, bits)
+    atomic_write(output, [header, table])
+    return entries
+
+
+def compile_corpus(
+    source: str,
+    output: str,
+    hashed: bool = False,
+    bloom_error_rate: Optional[float] = None,
+) -> int:
+    """
+    Compile a wordlist or SHA-1 hash list into a corpus file.
+
+    Args:
+        source (str): Input file, one password (or SHA-1 hex digest) per line.
+        output (str): Path of the compiled corpus, replaced atomically.
+        hashed (bool): The input holds SHA-1 digests rather than passwords.
+        bloom_error_rate (Optional[float]): Build a Bloom filter with this false-positive rate instead of a sorted list.
+
+    Returns:
+        int: Number of entries in the corpus.
+    """
+    if bloom_error_rate is None:
+        return _compile_sorted(source, output, hashed)
+    return _compile_bloom(source, output, hashed, bloom_error_rate)
+
+
+class Corpus:
+    """Read-only view of a compiled corpus, mapped into memory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER_SIZE:
+                raise ValueError(f"{path} is not a compiled password corpus.")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mmap, "MADV_RANDOM"):
+            # Lookups jump around; reading ahead would only waste memory.
+            self._map.madvise(mmap.MADV_RANDOM)
+
+        magic, version, kind, param, entries, bits = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION or kind not in _KINDS:
+            self.close()
+            raise ValueError(f"{path} is not a compiled password corpus.")
+
+        self.kind = kind
+        if kind == KIND_SORTED:
+            body = size - HEADER_SIZE
+            if param != DIGEST_SIZE or body % DIGEST_SIZE:
+                self.close()
+                raise ValueError(f"{path} is truncated or corrupted.")
+            self.entries = body // DIGEST_SIZE
+        else:
+            if bits == 0 or size < HEADER_SIZE + (bits + 7) // 8:
+                self.close()
+                raise ValueError(f"{path} is truncated or corrupted.")
+            self.entries = entries
+            self._bits = bits
+            self._hashes = param
+
+    def __enter__(self) -> "Corpus":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __len__(self) -> int:
+        return self.entries
+
+    def __contains__(self, password: str) -> bool:
+        return self.contains_digest(digest(password))
+
+    def contains_digest(self, value: bytes) -> bool:
+        if self.kind == KIND_BLOOM:
+            data = self._map
+            return all(
+                data[HEADER_SIZE + (position >> 3)] & (1 << (position & 7))
+                for position in _bloom_positions(value, self._bits, self._hashes)
+            )
+
+        data = self._map
+        lo, hi = 0, self.entries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = HEADER_SIZE + mid * DIGEST_SIZE
+            record = data[offset : offset + DIGEST_SIZE]
+            if record < value:
+                lo = mid + 1
+            elif record > value:
+                hi = mid
+            else:
+                return True
+        return False
@@ -1,13 +1,16 @@
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Dict, Optional
 import os
 from pathlib import Path
-import gnupg
 
 from onilock.core.settings import settings
 from onilock.core.logging_manager import logger
 from onilock.core.enums import GPGKeyIDType
+from onilock.core.gpg import forget_keys, gpg_handle, list_keys
 from onilock.core.exceptions.exceptions import EncryptionKeyNotFoundError
 
+if TYPE_CHECKING:
+    import gnupg
+
 
 class BaseEncryptionBackend:
     """Base Encryption Backend Interface."""
@@ -82,6 +85,9 @@ class EncryptionBackendManager:
 class GPGEncryptionBackend(BaseEncryptionBackend):
     """GPG Encryption Backend."""
 
+    gpg: "gnupg.GPG"
+    gpg_home: Optional[str]
+
     def __init__(self, **kwargs):
         """Initialize GPG client."""
 
@@ -112,10 +118,8 @@ class GPGEncryptionBackend(BaseEncryptionBackend):
                 os.makedirs(gpg_home, exist_ok=True)
                 os.chmod(gpg_home, 0o700)
 
-        self.gpg = gnupg.GPG(
-            gnupghome=gpg_home,
-            options=["--pinentry-mode", "loopback"],
-        )
+        self.gpg_home = gpg_home
+        self.gpg = gpg_handle(gpg_home)
 
         key_info = self.get_key_info(
             settings.PGP_REAL_NAME,
@@ -153,6 +157,7 @@ class GPGEncryptionBackend(BaseEncryptionBackend):
             passphrase=data.get("passphrase", settings.PASSPHRASE),
         )
         key = self.gpg.gen_key(input_data)
+        forget_keys(self.gpg_home)
         fingerprint = getattr(key, "fingerprint", None)
         key_str = str(key).strip() if key is not None else ""
         if not key_str or (fingerprint is not None and not fingerprint):
@@ -179,7 +184,7 @@ class GPGEncryptionBackend(BaseEncryptionBackend):
 
     def list_keys(self, secret=False):
         logger.info("Listing all PGP keys")
-        return self.gpg.list_keys(secret=secret)
+        return list_keys(self.gpg_home, secret=secret)
 
     def get_key_info(
         self,
@@ -188,7 +193,7 @@ class GPGEncryptionBackend(BaseEncryptionBackend):
         secret: bool = False,
     ) -> Optional[Dict]:
         logger.info(f"Retreiving key '{key_id}' info.")
-        keys = self.gpg.list_keys(secret=secret)
+        keys = list_keys(self.gpg_home, secret=secret)
 
         for key in keys:
             uids = key.get("uids", [])
@@ -216,15 +221,18 @@ class GPGEncryptionBackend(BaseEncryptionBackend):
 
         fingerprint = key_info["fingerprint"]
 
-        # Delete the secret key first
-        self.gpg.delete_keys(
-            fingerprint,
-            secret=True,
-            passphrase=passphrase,
-        )
+        try:
+            # Delete the secret key first
+            self.gpg.delete_keys(
+                fingerprint,
+                secret=True,
+                passphrase=passphrase,
+            )
 
-        # Then delete the public key
-        self.gpg.delete_keys(fingerprint)
+            # Then delete the public key
+            self.gpg.delete_keys(fingerprint)
+        finally:
+            forget_keys(self.gpg_home)
 
     def encrypt(self, data: str, **kwargs):
         logger.info("Encrypting data...")
@@ -3,7 +3,7 @@ from enum import Enum
 
 class DBBackEndEnum(Enum):
     JSON = "Json"
-    SQLITE = "SQLite"  # Not implemented yet
+    SQLITE = "SQLite"
     POSTGRES = "PostgreSQL"  # Not implemented yet
 
 
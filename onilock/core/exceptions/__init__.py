@@ -2,4 +2,6 @@ from .exceptions import (
     BaseException,
     EncryptionKeyNotFoundError,
     DatabaseEngineAlreadyExistsException,
+    VaultConflictError,
+    KeyStoreIntegrityError,
 )
@@ -15,3 +15,19 @@ class DatabaseEngineAlreadyExistsException(BaseException):
         if id:
             return super().__init__(f"Engine with id `{id}` already exists.")
         return super().__init__("Engine already exists.")
+
+
+class VaultConflictError(BaseException):
+    def __init__(self, path: str = "") -> None:
+        message = "The vault was modified by another process"
+        if path:
+            message += f" ({path})"
+        return super().__init__(message + ". Please retry.")
+
+
+class KeyStoreIntegrityError(BaseException):
+    def __init__(self, path: str = "") -> None:
+        message = "The keystore failed authentication: it was modified or corrupted"
+        if path:
+            message += f" ({path})"
+        return super().__init__(message + ".")
@@ -0,0 +1,289 @@
+"""
+Cross-process file locking and atomic, durable file writes.
+
+Locks are advisory `flock` locks on a sidecar `<path>.lock` file, so the data
+file itself can be replaced atomically with `os.replace` while locked.
+
+How hard writes push data to disk is selected with `ONI_DURABILITY`:
+
+- `strict`: fsync every file and its directory before returning.
+- `batched`: group commit; written paths are fsynced together once
+  `ONI_DURABILITY_BATCH_SIZE` writes or `ONI_DURABILITY_BATCH_INTERVAL`
+  seconds have accumulated, on `flush()`, and at exit.
+- `fast`: never fsync and leave it to the OS.
+
+In every mode, other processes and a crash of this one see either the old or
+the new content of a file. Only `strict` is crash-atomic across a power loss
+or kernel crash: in the other modes the rename can reach the disk before the
+data it points to, leaving an empty or partial file.
+"""
+
+import atexit
+import contextvars
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Set, Union
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+LOCK_SH = fcntl.LOCK_SH if fcntl else 0
+LOCK_EX = fcntl.LOCK_EX if fcntl else 0
+LOCK_UN = fcntl.LOCK_UN if fcntl else 0
+
+
+class FileLock:
+    """
+    Re-entrant shared/exclusive lock on a sidecar lock file.
+
+    There is one instance per path and process (see `for_path`), so nested
+    acquisitions from the same process never deadlock on each other: a nested
+    shared request is satisfied by an exclusive hold, and a nested exclusive
+    request upgrades a shared hold for its duration. Threads of one process are
+    serialized by an internal lock, since `flock` does not separate them.
+    """
+
+    _instances: Dict[str, "FileLock"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, path: str):
+        self.lock_path = f"{path}.lock"
+        self._thread_lock = threading.RLock()
+        self._fd = None
+        self._depth = 0
+        self._exclusive = False
+
+    @classmethod
+    def for_path(cls, path: str) -> "FileLock":
+        key = os.path.realpath(str(path))
+        with cls._instances_lock:
+            lock = cls._instances.get(key)
+            if lock is None:
+                lock = cls._instances[key] = cls(key)
+            return lock
+
+    def _flock(self, operation: int) -> None:
+        if fcntl is not None and self._fd is not None:
+            fcntl.flock(self._fd, operation)
+
+    @contextmanager
+    def acquire(self, exclusive: bool = False) -> Iterator[None]:
+        with self._thread_lock:
+            was_exclusive = self._exclusive
+            if self._depth == 0:
+                if not exclusive and not os.path.isdir(
+                    os.path.dirname(self.lock_path) or "."
+                ):
+                    # Nothing can be stored there yet, so there is nothing to guard.
+                    yield
+                    return
+                self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+                self._flock(LOCK_EX if exclusive else LOCK_SH)
+                self._exclusive = exclusive
+            elif exclusive and not self._exclusive:
+                self._flock(LOCK_EX)
+                self._exclusive = True
+
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._flock(LOCK_UN)
+                    os.close(self._fd)
+                    self._fd = None
+                    self._exclusive = False
+                elif self._exclusive and not was_exclusive:
+                    self._flock(LOCK_SH)
+                    self._exclusive = False
+
+    def shared(self):
+        return self.acquire(exclusive=False)
+
+    def exclusive(self):
+        return self.acquire(exclusive=True)
+
+
+def remove_lock_file(path: str) -> None:
+    """Delete the sidecar lock file of `path`, if there is one."""
+    try:
+        os.unlink(FileLock.for_path(path).lock_path)
+    except FileNotFoundError:
+        pass
+
+
+DURABILITY_MODES = ("strict", "batched", "fast")
+# Mode that `durability()` returns instead of the configured one, see
+# `strict_durability`. Context-local, so one thread forcing it does not change
+# the mode of the others.
+_forced: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar(
+    "onilock_forced_durability", default=None
+)
+
+
+def _settings():
+    """The settings, or None while they are still being built."""
+    # Importing inside the function in order to prevent circular imports: the
+    # keystore writes its files while the settings load.
+    try:
+        from onilock.core.settings import settings
+    except ImportError:
+        return None
+    return settings
+
+
+def durability() -> str:
+    """The configured durability mode."""
+    forced = _forced.get()
+    if forced is not None:
+        return forced
+    settings = _settings()
+    if settings is None:
+        mode = os.environ.get("ONI_DURABILITY", "strict").lower()
+    else:
+        mode = settings.DURABILITY
+    if mode not in DURABILITY_MODES:
+        raise ValueError(f"Unknown durability mode: {mode}")
+    return mode
+
+
+def fsync_path(path: str) -> None:
+    """fsync a file or directory by path, ignoring ones that are gone."""
+    try:
+        fd = os.open(path or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:  # pragma: no cover - e.g. platforms without directory fds
+        pass
+    finally:
+        os.close(fd)
+
+
+def fsync_directory(path: str) -> None:
+    """Persist a directory entry change (create, rename) on POSIX systems."""
+    fsync_path(path)
+
+
+class GroupCommit:
+    """
+    Paths written in `batched` mode, waiting for a shared fsync.
+
+    Every pending file and its directory are synced once per flush however
+    many times they were written in between.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._files: Set[str] = set()
+        self._directories: Set[str] = set()
+        self._writes = 0
+        self._since: Optional[float] = None
+
+    def __len__(self) -> int:
+        return self._writes
+
+    def add(self, path: str, directory: Optional[str]) -> None:
+        settings = _settings()
+        with self._lock:
+            self._files.add(path)
+            if directory is not None:
+                self._directories.add(directory)
+            self._writes += 1
+            if self._since is None:
+                self._since = time.monotonic()
+            due = settings is None or (
+                self._writes >= settings.DURABILITY_BATCH_SIZE
+                or time.monotonic() - self._since >= settings.DURABILITY_BATCH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """fsync every pending file, then every pending directory."""
+        with self._lock:
+            files, self._files = self._files, set()
+            directories, self._directories = self._directories, set()
+            self._writes = 0
+            self._since = None
+        for path in files:
+            fsync_path(path)
+        for directory in directories:
+            fsync_path(directory)
+
+
+group_commit = GroupCommit()
+atexit.register(group_commit.flush)
+
+
+def flush() -> None:
+    """Sync everything still pending from `batched` writes."""
+    group_commit.flush()
+
+
+@contextmanager
+def strict_durability() -> Iterator[None]:
+    """
+    Sync every write in the block before it returns, whatever `ONI_DURABILITY`
+    says, for writes that later steps rely on having reached the disk.
+    """
+    group_commit.flush()
+    token = _forced.set("strict")
+    try:
+        yield
+    finally:
+        _forced.reset(token)
+
+
+def atomic_write(path: Union[str, Path], chunks: Iterable[bytes]) -> None:
+    """
+    Replace `path` with `chunks` atomically.
+
+    Data goes to a temporary file in the same directory which is renamed over
+    the target, so readers see either the old or the new content, never a
+    partial write. The file and directory are synced per `ONI_DURABILITY`,
+    and only `strict` keeps that guarantee across a power loss.
+    """
+    path = str(path)
+    mode = durability()
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory or None, prefix=f".{Path(path).name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            if mode == "strict":
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    if mode == "strict":
+        fsync_directory(directory)
+    elif mode == "batched":
+        group_commit.add(path, directory)
+
+
+def append_bytes(path: Union[str, Path], data: bytes) -> None:
+    """Append `data` to `path`, synced per `ONI_DURABILITY`."""
+    path = str(path)
+    mode = durability()
+    with open(path, "ab") as f:
+        f.write(data)
+        f.flush()
+        if mode == "strict":
+            os.fsync(f.fileno())
+    if mode == "batched":
+        group_commit.add(path, None)
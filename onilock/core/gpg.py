@@ -1,10 +1,83 @@
-from typing import Optional
-import gnupg
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    # Imported by `gpg_handle`: commands that never use gpg do not load it.
+    import gnupg
+
+# Files gpg rewrites when a key is added or removed.
+KEYRING_FILES = (
+    "pubring.kbx",
+    "pubring.gpg",
+    "secring.gpg",
+    "trustdb.gpg",
+    "private-keys-v1.d",
+)
+
+# `gnupg.GPG()` runs `gpg --list-config` to probe the version, so a command
+# builds a single handle per GPG home, and lists keys once per keyring state.
+_handles: Dict[Optional[str], "gnupg.GPG"] = {}
+_listings: Dict[Tuple[Optional[str], bool], Tuple[tuple, list]] = {}
+
+
+def gpg_handle(gpg_home: Optional[str]) -> "gnupg.GPG":
+    """The shared GPG client of `gpg_home`."""
+    gpg = _handles.get(gpg_home)
+    if gpg is None:
+        import gnupg
+
+        gpg = gnupg.GPG(
+            gnupghome=gpg_home,
+            options=["--pinentry-mode", "loopback"],
+        )
+        _handles[gpg_home] = gpg
+    return gpg
+
+
+def _keyring_state(gpg_home: Optional[str]) -> tuple:
+    home = gpg_home or os.environ.get("GNUPGHOME") or os.path.expanduser("~/.gnupg")
+    state = []
+    for name in KEYRING_FILES:
+        try:
+            stat = os.stat(os.path.join(home, name))
+        except OSError:
+            continue
+        state.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(state)
+
+
+def list_keys(gpg_home: Optional[str], secret: bool = False) -> List[dict]:
+    """
+    Keys of the keyring in `gpg_home`.
+
+    The listing is reused until one of the keyring files changes. A home
+    without keyring files is listed every time.
+    """
+    state = _keyring_state(gpg_home)
+    cached = _listings.get((gpg_home, secret))
+    if state and cached and cached[0] == state:
+        return cached[1]
+    keys = gpg_handle(gpg_home).list_keys(secret=secret)
+    if state:
+        _listings[(gpg_home, secret)] = (state, keys)
+    return keys
+
+
+def forget_keys(gpg_home: Optional[str]) -> None:
+    """Drop the cached listings of `gpg_home` after changing its keyring."""
+    for secret in (False, True):
+        _listings.pop((gpg_home, secret), None)
+
+
+def clear_cache() -> None:
+    """Drop every shared GPG handle and key listing."""
+    _handles.clear()
+    _listings.clear()
 
 
 def generate_pgp_key(gpg_home: Optional[str], name: str, email: str, passphrase: str):
     """Generate a new PGP key pair."""
-    gpg = gnupg.GPG(gnupghome=gpg_home)
+    gpg = gpg_handle(gpg_home)
     input_data = gpg.gen_key_input(
         key_type="RSA",
         key_length=4096,  # ALT: 3072
@@ -12,7 +85,10 @@ def generate_pgp_key(gpg_home: Optional[str], name: str, email: str, passphrase:
         name_email=email,
         passphrase=passphrase,
     )
-    return gpg.gen_key(input_data)
+    try:
+        return gpg.gen_key(input_data)
+    finally:
+        forget_keys(gpg_home)
 
 
 def pgp_key_exists(
@@ -22,8 +98,7 @@ def pgp_key_exists(
     real_name: Optional[str] = None,
 ) -> bool:
     """Check if a key exists in the keyring."""
-    gpg = gnupg.GPG(gnupghome=gpg_home)
-    keys = gpg.list_keys()
+    keys = list_keys(gpg_home)
 
     if key_fingerprint:
         return any(key["fingerprint"] == key_fingerprint for key in keys)
@@ -48,8 +123,7 @@ def get_pgp_key_info(
     key_id: Optional[str] = None,
 ) -> dict:
     """Get key details if exists in keyring."""
-    gpg = gnupg.GPG(gnupghome=gpg_home)
-    keys = gpg.list_keys()
+    keys = list_keys(gpg_home)
 
     for key in keys:
         uids = key.get("uids", [])
@@ -74,18 +148,21 @@ def delete_pgp_key(
     """Delete PGP public and private key."""
     from onilock.core.exceptions.exceptions import EncryptionKeyNotFoundError
 
-    gpg = gnupg.GPG(gnupghome=gpg_home)
+    gpg = gpg_handle(gpg_home)
     key_info = get_pgp_key_info(gpg_home, real_name, key_id)
     if key_info is None:
         raise EncryptionKeyNotFoundError()
     fingerprint = key_info["fingerprint"]
 
-    # Delete the secret key first
-    gpg.delete_keys(
-        fingerprint,
-        secret=True,
-        passphrase=passphrase,
-    )
+    try:
+        # Delete the secret key first
+        gpg.delete_keys(
+            fingerprint,
+            secret=True,
+            passphrase=passphrase,
+        )
 
-    # Then delete the public key
-    gpg.delete_keys(fingerprint)
+        # Then delete the public key
+        gpg.delete_keys(fingerprint)
+    finally:
+        forget_keys(gpg_home)
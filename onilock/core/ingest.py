@@ -0,0 +1,101 @@
+"""
+Streaming readers for bulk account ingestion (`onilock new --from`).
+
+Rows are read one at a time from CSV (with a header row) or JSON Lines, so
+inputs of any size are never loaded whole. Every row comes back with its
+number and either its normalized fields or the reason it was rejected.
+"""
+
+import csv
+import json
+import sys
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, TypeVar
+
+T = TypeVar("T")
+
+FIELDS = ("name", "password", "username", "url", "description")
+ALIASES = {"id": "name", "account": "name", "login": "username"}
+FORMATS = ("csv", "jsonl")
+
+
+class Row(NamedTuple):
+    number: int
+    fields: Dict[str, str]
+    error: Optional[str] = None
+
+
+def guess_format(source: str) -> str:
+    """Format of a source from its extension. Standard input defaults to JSONL."""
+    suffix = Path(source).suffix.lower()
+    if suffix == ".csv":
+        return "csv"
+    return "jsonl"
+
+
+@contextmanager
+def open_source(source: str) -> Iterator[TextIO]:
+    """Open a path for reading, or standard input for `-`."""
+    if source == "-":
+        yield sys.stdin
+        return
+    with open(source, newline="", encoding="utf-8-sig") as f:
+        yield f
+
+
+def _normalize(number: int, record: object) -> Row:
+    if not isinstance(record, dict):
+        return Row(number, {}, "expected an object")
+
+    fields: Dict[str, str] = {}
+    for key, value in record.items():
+        key = ALIASES.get(str(key).strip().lower(), str(key).strip().lower())
+        if key not in FIELDS or value is None:
+            continue
+        if not isinstance(value, str):
+            return Row(number, {}, f"field '{key}' must be a string")
+        fields[key] = value.strip() if key != "password" else value
+
+    if not fields.get("name"):
+        return Row(number, {}, "missing account name")
+    return Row(number, fields)
+
+
+def _csv_rows(stream: TextIO) -> Iterator[Row]:
+    reader = csv.DictReader(stream)
+    for record in reader:
+        # The header is line 1, so data rows are numbered from 2.
+        number = reader.line_num
+        if None in record:
+            yield Row(number, {}, "more values than header columns")
+            continue
+        yield _normalize(number, record)
+
+
+def _jsonl_rows(stream: TextIO) -> Iterator[Row]:
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield Row(number, {}, f"invalid JSON: {exc.msg}")
+            continue
+        yield _normalize(number, record)
+
+
+def iter_rows(stream: TextIO, fmt: str) -> Iterator[Row]:
+    """Stream rows from CSV or JSONL text."""
+    if fmt == "csv":
+        return _csv_rows(stream)
+    if fmt == "jsonl":
+        return _jsonl_rows(stream)
+    raise ValueError(f"Unsupported input format: {fmt}. Use one of {FORMATS}.")
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -0,0 +1,375 @@
+"""
+Master password hashing and passphrase key derivation.
+
+Master password hashes are self-describing strings stored (base64 encoded)
+in the profile header:
+
+- bcrypt: the usual `$2b$<rounds>$...` string;
+- scrypt: `$scrypt$ln=<log2 N>,r=<r>,p=<p>$<salt>$<hash>`;
+- Argon2id: the PHC string `$argon2id$v=19$m=<KiB>,t=<passes>,p=<lanes>$<salt>$<hash>`.
+
+The algorithm and cost used for new hashes come from `ONI_KDF` and from the
+parameters `onilock kdf-calibrate` measured on this machine; a successful
+login re-hashes the master password when it is below them.
+
+Encrypted exports derive their key with scrypt or Argon2id and record the
+algorithm and parameters in the export header. PBKDF2 is only kept to read
+older exports.
+"""
+
+import base64
+import functools
+import hmac
+import json
+import math
+import os
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import bcrypt
+from cryptography.exceptions import UnsupportedAlgorithm
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+from onilock.core.fileio import atomic_write
+from onilock.core.logging_manager import logger
+from onilock.core.settings import settings
+
+try:
+    from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
+except ImportError:  # pragma: no cover - depends on the cryptography version
+    Argon2id = None
+
+
+SALT_SIZE = 16
+HASH_SIZE = 32
+# Unlock latency and memory `kdf-calibrate` aims for by default.
+DEFAULT_TARGET_MS = 300
+DEFAULT_MEMORY_KIB = 64 * 1024
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+class Kdf:
+    """Base key derivation function."""
+
+    name: str = ""
+    # Parameters of new hashes when nothing was calibrated.
+    defaults: Dict[str, int] = {}
+    # Parameters that only make a hash stronger when raised.
+    costs: Tuple[str, ...] = ()
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def derive(self, password: bytes, salt: bytes, params: Dict[str, int]) -> bytes:
+        raise NotImplementedError
+
+    def hash(self, password: bytes, params: Dict[str, int]) -> bytes:
+        salt = os.urandom(SALT_SIZE)
+        digest = self.derive(password, salt, params)
+        return f"{self.prefix(params)}${_b64encode(salt)}${_b64encode(digest)}".encode()
+
+    def verify(self, password: bytes, encoded: bytes) -> bool:
+        *_, salt, digest = encoded.decode().split("$")
+        expected = _b64decode(digest)
+        derived = self.derive(password, _b64decode(salt), self.parse(encoded))
+        return hmac.compare_digest(derived, expected)
+
+    def prefix(self, params: Dict[str, int]) -> str:
+        raise NotImplementedError
+
+    def parse(self, encoded: bytes) -> Dict[str, int]:
+        """The parameters an `encoded` hash was made with."""
+        raise NotImplementedError
+
+    def calibrate(
+        self, target_ms: float, memory_kib: int, timer: Callable[[dict], float]
+    ) -> Dict[str, int]:
+        """Parameters taking about `target_ms` within `memory_kib`."""
+        raise NotImplementedError
+
+
+def _fields(section: str) -> Dict[str, int]:
+    return {
+        key: int(value)
+        for key, value in (field.split("=") for field in section.split(","))
+    }
+
+
+class BcryptKdf(Kdf):
+    name = "bcrypt"
+    defaults = {"rounds": 12}
+    costs = ("rounds",)
+
+    def hash(self, password: bytes, params: Dict[str, int]) -> bytes:
+        return bcrypt.hashpw(password, bcrypt.gensalt(rounds=params["rounds"]))
+
+    def verify(self, password: bytes, encoded: bytes) -> bool:
+        return bcrypt.checkpw(password, encoded)
+
+    def parse(self, encoded: bytes) -> Dict[str, int]:
+        return {"rounds": int(encoded.decode().split("$")[2])}
+
+    def calibrate(self, target_ms, memory_kib, timer):
+        # Each round doubles the cost.
+        elapsed = timer({"rounds": 10})
+        rounds = 10 + math.floor(math.log2(max(target_ms / elapsed, 1)))
+        return {"rounds": min(rounds, 31)}
+
+
+class ScryptKdf(Kdf):
+    name = "scrypt"
+    defaults = {"ln": 17, "r": 8, "p": 1}
+    costs = ("ln", "r", "p")
+
+    def derive(self, password, salt, params):
+        return Scrypt(
+            salt=salt,
+            length=HASH_SIZE,
+            n=2 ** params["ln"],
+            r=params["r"],
+            p=params["p"],
+        ).derive(password)
+
+    def prefix(self, params):
+        return f"$scrypt$ln={params['ln']},r={params['r']},p={params['p']}"
+
+    def parse(self, encoded):
+        return _fields(encoded.decode().split("$")[2])
+
+    def calibrate(self, target_ms, memory_kib, timer):
+        # Time and memory (128 * r * N bytes) both double with each step of ln.
+        params = {"ln": 14, "r": 8, "p": 1}
+        elapsed = timer(params)
+        by_time = 14 + math.floor(math.log2(max(target_ms / elapsed, 1)))
+        by_memory = math.floor(math.log2(memory_kib * 1024 / (128 * params["r"])))
+        return {**params, "ln": max(10, min(by_time, by_memory))}
+
+
+class Argon2idKdf(Kdf):
+    name = "argon2id"
+    # RFC 9106, second recommended option.
+    defaults = {"m": 64 * 1024, "t": 3, "p": 4}
+    costs = ("m", "t")
+
+    @property
+    def available(self) -> bool:
+        return _argon2_supported()
+
+    def derive(self, password, salt, params):
+        return Argon2id(
+            salt=salt,
+            length=HASH_SIZE,
+            iterations=params["t"],
+            lanes=params["p"],
+            memory_cost=params["m"],
+        ).derive(password)
+
+    def prefix(self, params):
+        return f"$argon2id$v=19$m={params['m']},t={params['t']},p={params['p']}"
+
+    def parse(self, encoded):
+        return _fields(encoded.decode().split("$")[3])
+
+    def calibrate(self, target_ms, memory_kib, timer):
+        # Use the whole memory budget, then as many passes as the time allows
+        # (RFC 9106, section 4); memory only shrinks if one pass is too slow.
+        params = {"m": memory_kib, "t": 1, "p": min(4, os.cpu_count() or 1)}
+        elapsed = timer(params)
+        if elapsed > target_ms:
+            memory = int(params["m"] * target_ms / elapsed) // 1024 * 1024
+            return {**params, "m": max(8 * 1024, memory)}
+        return {**params, "t": max(1, math.floor(target_ms / elapsed))}
+
+
+@functools.lru_cache(maxsize=None)
+def _argon2_supported() -> bool:
+    # Argon2id needs OpenSSL 3.2 or later, whatever the cryptography version.
+    if Argon2id is None:
+        return False
+    try:
+        Argon2id(
+            salt=bytes(SALT_SIZE),
+            length=HASH_SIZE,
+            iterations=1,
+            lanes=1,
+            memory_cost=8,
+        ).derive(b"")
+    except UnsupportedAlgorithm:
+        return False
+    return True
+
+
+class Pbkdf2Kdf(Kdf):
+    """PBKDF2-HMAC-SHA256, only kept to read older exports."""
+
+    name = "pbkdf2-sha256"
+    defaults = {"iterations": 200_000}
+
+    def derive(self, password, salt, params):
+        return PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=HASH_SIZE,
+            salt=salt,
+            iterations=params["iterations"],
+        ).derive(password)
+
+
+ALGORITHMS: Dict[str, Kdf] = {
+    kdf.name: kdf for kdf in (BcryptKdf(), ScryptKdf(), Argon2idKdf(), Pbkdf2Kdf())
+}
+# Algorithms the master password can be hashed with.
+PASSWORD_HASHES = ("bcrypt", "scrypt", "argon2id")
+
+
+def get_kdf(name: str) -> Kdf:
+    try:
+        return ALGORITHMS[name]
+    except KeyError:
+        raise ValueError(f"Unknown key derivation function: {name}") from None
+
+
+def identify(encoded: bytes) -> Kdf:
+    """The algorithm of an encoded master password hash."""
+    if encoded.startswith(b"$2"):
+        return ALGORITHMS["bcrypt"]
+    name = encoded.split(b"$")[1].decode() if encoded.startswith(b"$") else ""
+    if name not in PASSWORD_HASHES:
+        raise ValueError("Unrecognized master password hash")
+    return get_kdf(name)
+
+
+def calibration_path():
+    return settings.BASE_DIR / "kdf.json"
+
+
+def load_calibration() -> Optional[dict]:
+    path = calibration_path()
+    if not path.exists():
+        return None
+    try:
+        calibration = json.loads(path.read_text())
+        get_kdf(calibration["algorithm"])
+        return calibration
+    except Exception:
+        logger.warning(f"Ignoring unreadable KDF calibration {path}.")
+        return None
+
+
+def save_calibration(calibration: dict) -> None:
+    path = calibration_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write(path, [json.dumps(calibration, indent=2).encode()])
+
+
+def _bcrypt_rounds() -> int:
+    rounds = getattr(settings, "BCRYPT_ROUNDS", 12)
+    try:
+        rounds = int(rounds)
+    except (TypeError, ValueError):
+        rounds = 12
+    return rounds if rounds >= 4 else 12
+
+
+def target() -> Tuple[Kdf, Dict[str, int]]:
+    """
+    Algorithm and parameters for new master password hashes: `ONI_KDF`, or the
+    calibrated algorithm, or bcrypt; with the calibrated parameters if they
+    are for that algorithm.
+    """
+    calibration = load_calibration() or {}
+    name = settings.KDF or calibration.get("algorithm") or "bcrypt"
+    kdf = get_kdf(name)
+    if name not in PASSWORD_HASHES:
+        raise ValueError(f"{name} cannot hash the master password")
+    if calibration.get("algorithm") == name:
+        return kdf, {**kdf.defaults, **calibration["params"]}
+    if name == "bcrypt":
+        return kdf, {"rounds": _bcrypt_rounds()}
+    return kdf, dict(kdf.defaults)
+
+
+def hash_password(password: bytes) -> bytes:
+    """Hash the master password with the target algorithm and cost."""
+    kdf, params = target()
+    return kdf.hash(password, params)
+
+
+def verify_password(password: bytes, encoded: bytes) -> bool:
+    return identify(encoded).verify(password, encoded)
+
+
+def needs_rehash(encoded: bytes) -> bool:
+    """
+    Whether `encoded` should be re-hashed: it uses another algorithm than the
+    target one, or a lower cost. Hashes above the target cost are kept.
+    """
+    kdf, params = target()
+    current = identify(encoded)
+    if current is not kdf:
+        return True
+    current_params = kdf.parse(encoded)
+    return any(current_params.get(name, 0) < params[name] for name in kdf.costs)
+
+
+def describe(encoded: bytes) -> str:
+    """`argon2id m=65536,t=3,p=4` for an encoded hash."""
+    kdf = identify(encoded)
+    params = kdf.parse(encoded)
+    return f"{kdf.name} " + ",".join(f"{k}={v}" for k, v in params.items())
+
+
+def calibrate(
+    name: str,
+    target_ms: float = DEFAULT_TARGET_MS,
+    memory_kib: int = DEFAULT_MEMORY_KIB,
+) -> dict:
+    """
+    Benchmark `name` on this machine and pick parameters that take about
+    `target_ms` per hash within `memory_kib` of memory.
+
+    Returns:
+        dict: The algorithm, its parameters and the measured milliseconds.
+    """
+    kdf = get_kdf(name)
+    if name not in PASSWORD_HASHES:
+        raise ValueError(f"{name} cannot hash the master password")
+    if not kdf.available:
+        raise ValueError(f"{name} is not supported by this OpenSSL build")
+
+    def timer(params: dict) -> float:
+        start = time.perf_counter()
+        kdf.hash(b"onilock-calibration", params)
+        return max((time.perf_counter() - start) * 1000, 0.01)
+
+    params = kdf.calibrate(target_ms, memory_kib, timer)
+    return {
+        "algorithm": name,
+        "params": params,
+        "ms": round(timer(params), 1),
+        "target_ms": target_ms,
+        "memory_kib": memory_kib,
+    }
+
+
+def default_export_kdf() -> Tuple[Kdf, Dict[str, int]]:
+    """
+    Algorithm and parameters for export keys: the master password target if
+    it is memory-hard, else Argon2id (or scrypt, without Argon2id support).
+    """
+    kdf, params = target()
+    if kdf.name != "bcrypt" and kdf.available:
+        return kdf, params
+    kdf = ALGORITHMS["argon2id"]
+    if not kdf.available:
+        kdf = ALGORITHMS["scrypt"]
+    return kdf, dict(kdf.defaults)
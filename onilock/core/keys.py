@@ -0,0 +1,208 @@
+"""
+Data key hierarchy.
+
+Vault files, setup files, account passwords, fingerprints and similarity
+sketches are all sealed under a data key. The keystore secret
+(`settings.SECRET_KEY`) only wraps it: the data key is kept in a small
+`data.key` file in the vault directory, wrapped under every keystore secret
+allowed to open it. Rotating the secret re-wraps that one file.
+
+Installations from before the hierarchy have no `data.key` file. Their data
+was sealed under the keystore secret itself, so that secret stays the data
+key until a rotation first wraps it.
+
+The file has up to three slots:
+
+- current: the data key new data is sealed with.
+- pending: the next data key while a full re-key re-encrypts passwords.
+- previous: the replaced data key while a re-key re-seals vault files.
+
+Passwords decrypt under any slot, so a re-key that was interrupted leaves
+everything readable until it is resumed. Its progress is appended to
+`rekey.journal` next to `data.key`, tagged with the pending key, so a resumed
+re-key skips what is already done.
+"""
+
+import base64
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from cryptography.fernet import Fernet, MultiFernet
+
+from onilock.core.exceptions.exceptions import EncryptionKeyNotFoundError
+from onilock.core.fileio import append_bytes, atomic_write, strict_durability
+from onilock.core.settings import settings
+
+
+VERSION = 1
+CURRENT = "current"
+PENDING = "pending"
+PREVIOUS = "previous"
+
+_cache: Optional[tuple] = None
+# Data key that `data_key()` returns instead of the current one, see `sealed_with`.
+_override: Optional[str] = None
+
+
+def key_file_path() -> Path:
+    return Path(settings.VAULT_DIR) / "data.key"
+
+
+def journal_path() -> Path:
+    return Path(settings.VAULT_DIR) / "rekey.journal"
+
+
+def secret_id(secret_key: str) -> str:
+    """Identifier of a keystore secret, under which its wrapping is stored."""
+    return hashlib.sha256(b"onilock-secret:" + secret_key.encode()).hexdigest()[:16]
+
+
+def _unwrap(secret_key: str) -> Dict[str, str]:
+    path = key_file_path()
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return {CURRENT: secret_key}
+
+    global _cache
+    identity = (str(path), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    wanted = secret_id(secret_key)
+    if _cache is not None and _cache[:2] == (identity, wanted):
+        return dict(_cache[2])
+
+    data = json.loads(path.read_text())
+    cipher = Fernet(secret_key.encode())
+    keys = {}
+    for slot, wrappings in data["keys"].items():
+        token = wrappings.get(wanted)
+        if token is None:
+            raise EncryptionKeyNotFoundError(
+                f"The data key in {path} is not wrapped for the keystore secret in use."
+            )
+        keys[slot] = cipher.decrypt(token.encode()).decode()
+    _cache = (identity, wanted, dict(keys))
+    return keys
+
+
+def _wrap(secret_key: str, key: str) -> str:
+    return Fernet(secret_key.encode()).encrypt(key.encode()).decode()
+
+
+def _store(keys: Dict[str, str], secret_keys: Iterable[str]) -> None:
+    secret_keys = list(dict.fromkeys(secret_keys))
+    data = {
+        "version": VERSION,
+        "keys": {
+            slot: {secret_id(secret): _wrap(secret, key) for secret in secret_keys}
+            for slot, key in keys.items()
+        },
+    }
+    path = key_file_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Nothing may be sealed under a key that could still be lost.
+    with strict_durability():
+        atomic_write(path, [json.dumps(data, indent=2).encode()])
+
+
+def data_keys() -> Dict[str, str]:
+    """The data key of each slot in use, unwrapped with the keystore secret."""
+    return _unwrap(settings.SECRET_KEY)
+
+
+def data_key() -> str:
+    """The data key to seal new data with."""
+    return _override or data_keys()[CURRENT]
+
+
+def vault_key() -> bytes:
+    """Raw AES key of vault and setup files."""
+    return base64.urlsafe_b64decode(data_key().encode())
+
+
+def data_cipher() -> MultiFernet:
+    """
+    Cipher of passwords and other values sealed under the data key. Encrypts
+    under the current key and decrypts under any slot.
+    """
+    keys = data_keys()
+    order = [keys[CURRENT]] + [keys[s] for s in (PENDING, PREVIOUS) if s in keys]
+    return MultiFernet([Fernet(key.encode()) for key in order])
+
+
+def wrap_for(secret_keys: Iterable[str]) -> None:
+    """Re-wrap the data keys so that exactly these keystore secrets open them."""
+    _store(data_keys(), secret_keys)
+
+
+def begin_rekey() -> str:
+    """The pending data key of a re-key, generated and stored on first call."""
+    keys = data_keys()
+    if PENDING not in keys:
+        keys[PENDING] = Fernet.generate_key().decode()
+        _store(keys, [settings.SECRET_KEY])
+    return keys[PENDING]
+
+
+def promote_pending() -> None:
+    """Make the pending data key current, keeping the replaced one as previous."""
+    keys = data_keys()
+    _store({CURRENT: keys[PENDING], PREVIOUS: keys[CURRENT]}, [settings.SECRET_KEY])
+
+
+def forget_previous() -> None:
+    """Drop the replaced data key once nothing is sealed under it anymore."""
+    _store({CURRENT: data_keys()[CURRENT]}, [settings.SECRET_KEY])
+    try:
+        os.remove(journal_path())
+    except FileNotFoundError:
+        pass
+
+
+def _rekey_id() -> Optional[str]:
+    keys = data_keys()
+    if PENDING in keys:
+        return secret_id(keys[PENDING])
+    if PREVIOUS in keys:
+        return secret_id(keys[CURRENT])
+    return None
+
+
+def journal() -> List[dict]:
+    """Steps recorded by the re-key in progress, oldest first."""
+    wanted = _rekey_id()
+    try:
+        lines = journal_path().read_bytes().splitlines()
+    except FileNotFoundError:
+        return []
+    entries = []
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # Torn by a crash in the middle of an append.
+            continue
+        if entry.pop("key", None) == wanted:
+            entries.append(entry)
+    return entries
+
+
+def record(**entry) -> None:
+    """Append a step of the re-key in progress to the journal, synced."""
+    line = json.dumps({"key": _rekey_id(), **entry}, sort_keys=True)
+    with strict_durability():
+        append_bytes(journal_path(), b"\n" + line.encode() + b"\n")
+
+
+@contextmanager
+def sealed_with(key: str) -> Iterator[None]:
+    """Read and write vault files under `key` instead of the current data key."""
+    global _override
+    previous, _override = _override, key
+    try:
+        yield
+    finally:
+        _override = previous
@@ -1,19 +1,32 @@
 import os
 import json
 import logging
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Optional, Set
+from typing import Dict, Iterator, Optional, Set
 import uuid
 import getpass
 from abc import ABC, abstractmethod
 
-import keyring
-from Crypto.Cipher import AES
-from Crypto.Random import get_random_bytes
-from Crypto.Util.Padding import pad, unpad
-
 from onilock.core.enums import KeyStoreBackendEnum
-from onilock.core.exceptions.exceptions import KeyRingBackendNotAvailable
+from onilock.core.fileio import atomic_write
+from onilock.core.exceptions.exceptions import (
+    KeyRingBackendNotAvailable,
+    KeyStoreIntegrityError,
+)
+
+# `keyring` and pycryptodome are only imported by the backend that needs them,
+# when it is first used.
+keyring = None
+
+
+def _keyring():
+    global keyring
+    if keyring is None:
+        import keyring as module
+
+        keyring = module
+    return keyring
 
 
 class KeyStore(ABC):
@@ -43,6 +56,11 @@ class KeyStore(ABC):
         if id in KeyStore._passwords:
             KeyStore._passwords.remove(id)
 
+    @contextmanager
+    def transaction(self) -> Iterator["KeyStore"]:
+        """Group changes to the store. They are applied one by one by default."""
+        yield self
+
 
 class KeyRing(KeyStore):
     """
@@ -57,33 +75,52 @@ class KeyRing(KeyStore):
 
     def __init__(self, keystore_id: str) -> None:
         # This line raises an error if the backend is not available.
-        keyring.get_password("onilock", "x")
+        _keyring().get_password("onilock", "x")
         super().__init__(keystore_id)
 
     def clear(self):
         for pwd in KeyRing._passwords:
-            keyring.delete_password(self.keystore_id, pwd)
+            _keyring().delete_password(self.keystore_id, pwd)
         super().clear()
 
     def set_password(self, id: str, password: str):
-        keyring.set_password(self.keystore_id, id, password)
+        _keyring().set_password(self.keystore_id, id, password)
         super().set_password(id, password)
 
     def get_password(self, id: str) -> Optional[str]:
         super().get_password(id)
-        return keyring.get_password(self.keystore_id, id)
+        return _keyring().get_password(self.keystore_id, id)
 
     def delete_password(self, id: str):
         super().delete_password(id)
-        keyring.delete_password(self.keystore_id, id)
+        _keyring().delete_password(self.keystore_id, id)
+
+
+def _unpad(data: bytes, block_size: int) -> bytes:
+    from Crypto.Util.Padding import unpad
+
+    return unpad(data, block_size)
 
 
 class VaultKeyStore(KeyStore):
     """
     Less secure key store using the filesystem to store passwords.
+
+    Passwords are kept in one file sealed with AES-GCM under a random key
+    stored next to it. The decrypted content is cached until the file
+    changes, and `transaction` batches changes into a single write.
     """
 
     BLOCK_SIZE = 16
+    MAGIC = b"ONKS"
+    VERSION = 2
+    NONCE_SIZE = 12
+
+    # Decrypted content, and the identity of the file it was read from.
+    _cache: Optional[Dict] = None
+    _cache_identity: Optional[tuple] = None
+    # Content changed by the open transaction, if any.
+    _pending: Optional[Dict] = None
 
     def __init__(self, keystore_id: str) -> None:
         super().__init__(keystore_id)
@@ -103,30 +140,74 @@ class VaultKeyStore(KeyStore):
         key_file = os.path.join(keystore_basedir, ".key")
         if os.path.exists(key_file):
             return Path(key_file).read_bytes()
-        key = get_random_bytes(32)
-        Path(key_file).write_bytes(key)
+        key = os.urandom(32)
+        atomic_write(key_file, [key])
         os.chmod(key_file, 0o600)
         return key
 
-    def _cipher(self, iv: bytes):
-        return AES.new(self.key, AES.MODE_CBC, iv)
+    def _cipher(self, iv: bytes, key: Optional[bytes] = None):
+        from Crypto.Cipher import AES
+
+        return AES.new(key or self.key, AES.MODE_CBC, iv)
+
+    @staticmethod
+    def _file_identity(stat: os.stat_result) -> tuple[int, int, int]:
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _header(self) -> bytes:
+        return self.MAGIC + bytes([self.VERSION])
+
+    def _aad(self) -> bytes:
+        return self._header() + self.keystore_id.encode()
 
     def _read_keystore(self) -> Dict:
+        if self._pending is not None:
+            return self._pending
+        try:
+            with open(self.filename, "rb") as f:
+                identity = self._file_identity(os.fstat(f.fileno()))
+                if self._cache is not None and identity == self._cache_identity:
+                    return dict(self._cache)
+                encrypted_data = f.read()
+        except FileNotFoundError:
+            self._cache = self._cache_identity = None
+            return dict()
+
+        if not encrypted_data.startswith(self._header()):
+            return self._migrate_cbc_keystore(encrypted_data)
+
+        from cryptography.exceptions import InvalidTag
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        offset = len(self._header())
+        nonce = encrypted_data[offset : offset + self.NONCE_SIZE]
+        try:
+            json_str = AESGCM(self.key).decrypt(
+                nonce, encrypted_data[offset + self.NONCE_SIZE :], self._aad()
+            )
+        except InvalidTag:
+            raise KeyStoreIntegrityError(self.filename) from None
+        data = json.loads(json_str)
+        self._cache, self._cache_identity = data, identity
+        return dict(data)
+
+    def _migrate_cbc_keystore(self, encrypted_data: bytes) -> Dict:
+        """Re-seal a keystore written in AES-CBC by earlier versions."""
         try:
-            encrypted_data = Path(self.filename).read_bytes()
             iv = encrypted_data[self.BLOCK_SIZE : self.BLOCK_SIZE * 2]
             ciphertext = (
                 encrypted_data[: self.BLOCK_SIZE]
                 + encrypted_data[self.BLOCK_SIZE * 2 :]
             )
-            json_str = unpad(self._cipher(iv).decrypt(ciphertext), self.BLOCK_SIZE)
-            return json.loads(json_str)
-        except FileNotFoundError:
-            return dict()
+            json_str = _unpad(self._cipher(iv).decrypt(ciphertext), self.BLOCK_SIZE)
+            data = json.loads(json_str)
         except Exception:
             # Decryption failed — attempt one-time migration from pre-v1.7.3
             # key derivation (hashlib.sha256(__file__)).
             return self._migrate_legacy_keystore()
+        self._write_keystore(data)
+        logging.getLogger(__name__).info("Keystore migrated to AES-GCM.")
+        return data
 
     def _migrate_legacy_keystore(self) -> Dict:
         """Transparently migrate a keystore encrypted with the pre-v1.7.3 key."""
@@ -140,8 +221,8 @@ class VaultKeyStore(KeyStore):
                 encrypted_data[: self.BLOCK_SIZE]
                 + encrypted_data[self.BLOCK_SIZE * 2 :]
             )
-            cipher = AES.new(legacy_key, AES.MODE_CBC, iv)
-            json_str = unpad(cipher.decrypt(ciphertext), self.BLOCK_SIZE)
+            cipher = self._cipher(iv, legacy_key)
+            json_str = _unpad(cipher.decrypt(ciphertext), self.BLOCK_SIZE)
             data = json.loads(json_str)
             # Re-write with the new random key so migration only happens once.
             self._write_keystore(data)
@@ -150,32 +231,45 @@ class VaultKeyStore(KeyStore):
             )
             return data
         except Exception:
-            logging.getLogger(__name__).warning(
-                "Keystore decryption failed and legacy migration was unsuccessful. "
-                "The keystore may be corrupted or was created by an incompatible version."
-            )
-            return dict()
-
-    def _write_keystore(self, data):
-        iv = get_random_bytes(self.BLOCK_SIZE)
-        json_str = json.dumps(data)
-        padded_data = pad(json_str.encode(), self.BLOCK_SIZE)
-        encrypted_data = self._cipher(iv).encrypt(padded_data)
-        iv_data = (
-            encrypted_data[: self.BLOCK_SIZE]
-            + iv
-            + encrypted_data[self.BLOCK_SIZE :]
-        )
-        Path(self.filename).write_bytes(iv_data)
+            # Neither legacy format: refuse it rather than let the next write
+            # replace the secrets it holds.
+            raise KeyStoreIntegrityError(self.filename) from None
+
+    def _write_keystore(self, data: Dict) -> None:
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        nonce = os.urandom(self.NONCE_SIZE)
+        sealed = AESGCM(self.key).encrypt(nonce, json.dumps(data).encode(), self._aad())
+        atomic_write(self.filename, [self._header(), nonce, sealed])
+        self._cache = dict(data)
+        self._cache_identity = self._file_identity(os.stat(self.filename))
+
+    @contextmanager
+    def transaction(self) -> Iterator["VaultKeyStore"]:
+        """
+        Batch changes into one write of the keystore, made when the block
+        exits without an error. Nested transactions join the outer one.
+        """
+        if self._pending is not None:
+            yield self
+            return
+        original = self._read_keystore()
+        self._pending = dict(original)
+        try:
+            yield self
+            if self._pending != original:
+                self._write_keystore(self._pending)
+        finally:
+            self._pending = None
 
     def clear(self):
         os.remove(self.filename)
+        self._cache = self._cache_identity = None
         super().clear()
 
     def set_password(self, id: str, password: str):
-        data = self._read_keystore()
-        data[id] = password
-        self._write_keystore(data)
+        with self.transaction():
+            self._pending[id] = password
         super().set_password(id, password)
 
     def get_password(self, id: str) -> Optional[str]:
@@ -184,9 +278,8 @@ class VaultKeyStore(KeyStore):
         return data.get(id)
 
     def delete_password(self, id: str):
-        data = self._read_keystore()
-        data.pop(id)
-        self._write_keystore(data)
+        with self.transaction():
+            self._pending.pop(id)
         super().delete_password(id)
 
 
@@ -196,9 +289,27 @@ class KeyStoreManager:
     BACKEND_FILE = Path.home() / ".onilock" / "keystore_backends.json"
     keystore: KeyStore
 
-    def __init__(self, keystore_id: str):
-        """Initialize the KeyStore manger class."""
+    def __init__(self, keystore_id: str, lazy: bool = False):
+        """
+        Initialize the KeyStore manger class.
 
+        Args:
+            keystore_id (str): Id of the key store.
+            lazy (bool): Select the backend when it is first used instead.
+        """
+        self.keystore_id = keystore_id
+        if not lazy:
+            self.keystore = self._select_backend()
+
+    def __getattr__(self, name: str):
+        # Only reached for `keystore` while a lazy manager has no backend yet.
+        if name != "keystore":
+            raise AttributeError(name)
+        self.keystore = self._select_backend()
+        return self.keystore
+
+    def _select_backend(self) -> KeyStore:
+        keystore_id = self.keystore_id
         account_key = self._get_account_key()
         default_backend = self._get_persisted_backend(account_key) or os.environ.get(
             "ONI_DEFAULT_KEYSTORE_BACKEND", KeyStoreBackendEnum.KEYRING.value
@@ -206,24 +317,26 @@ class KeyStoreManager:
 
         if default_backend == KeyStoreBackendEnum.KEYRING.value:
             try:
-                self.keystore = KeyRing(keystore_id)
+                keystore = KeyRing(keystore_id)
                 self._persist_backend(account_key, KeyStoreBackendEnum.KEYRING.value)
+                return keystore
             except Exception as e:
                 logging.getLogger(__name__).warning(
                     "System keyring unavailable (%s), falling back to VaultKeyStore.", e
                 )
-                self.keystore = VaultKeyStore(keystore_id)
+                keystore = VaultKeyStore(keystore_id)
                 self._persist_backend(account_key, KeyStoreBackendEnum.VAULT.value)
         elif default_backend == KeyStoreBackendEnum.VAULT.value:
-            self.keystore = VaultKeyStore(keystore_id)
+            keystore = VaultKeyStore(keystore_id)
             self._persist_backend(account_key, KeyStoreBackendEnum.VAULT.value)
         else:
             logging.getLogger(__name__).warning(
                 "Unknown keystore backend '%s', falling back to VaultKeyStore.",
                 default_backend,
             )
-            self.keystore = VaultKeyStore(keystore_id)
+            keystore = VaultKeyStore(keystore_id)
             self._persist_backend(account_key, KeyStoreBackendEnum.VAULT.value)
+        return keystore
 
     def _get_account_key(self) -> str:
         profile = os.environ.get("ONI_DB_NAME")
@@ -254,7 +367,7 @@ class KeyStoreManager:
         data[account_key] = backend
         try:
             self.BACKEND_FILE.parent.mkdir(parents=True, exist_ok=True)
-            self.BACKEND_FILE.write_text(json.dumps(data, indent=2))
+            atomic_write(self.BACKEND_FILE, [json.dumps(data, indent=2).encode()])
         except OSError:
             logging.getLogger(__name__).warning(
                 "Unable to persist keystore backend for account '%s'.",
@@ -282,7 +395,7 @@ class KeyStoreManager:
                 return False
             data.pop(account_key, None)
             if data:
-                cls.BACKEND_FILE.write_text(json.dumps(data, indent=2))
+                atomic_write(cls.BACKEND_FILE, [json.dumps(data, indent=2).encode()])
             else:
                 cls.BACKEND_FILE.unlink()
             return True
@@ -305,5 +418,8 @@ class KeyStoreManager:
     def delete_password(self, id: str) -> None:
         return self.keystore.delete_password(id)
 
+    def transaction(self):
+        return self.keystore.transaction()
+
 
-keystore = KeyStoreManager("onilock")
+keystore = KeyStoreManager("onilock", lazy=True)
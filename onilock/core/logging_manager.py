@@ -16,6 +16,12 @@ LOGS_DIR = Path("/tmp/logs/onilock")
 DEBUG = os.environ.get(DEBUG_ENV_NAME, "false").lower() in TRUTHFUL_STR
 
 
+class _DelayedRotatingFileHandler(RotatingFileHandler):
+    def _open(self):
+        Path(self.baseFilename).parent.mkdir(parents=True, exist_ok=True)
+        return super()._open()
+
+
 class LoggingManager:
     def __init__(
         self,
@@ -33,9 +39,6 @@ class LoggingManager:
         self.logger.setLevel(default_level)
         self.handlers: Dict[str, logging.Handler] = {}
 
-        # Create log directory if it does not exist.
-        LOGS_DIR.mkdir(parents=True, exist_ok=True)
-
     def add_console_handler(self, level: int = logging.INFO):
         """Add a console (stdout) logging handler."""
         log_format = "%(log_color)s%(asctime)s %(levelname)s%(reset)s %(message_log_color)s%(name)s%(reset)s %(message)s"
@@ -72,9 +75,12 @@ class LoggingManager:
         max_bytes: int = 10485760,
         backup_count: int = 5,
     ):
-        """Add a rotating file logging handler."""
-        handler = RotatingFileHandler(
-            filepath, maxBytes=max_bytes, backupCount=backup_count
+        """
+        Add a rotating file logging handler. The file, and its directory, are
+        only created when the first record is logged.
+        """
+        handler = _DelayedRotatingFileHandler(
+            filepath, maxBytes=max_bytes, backupCount=backup_count, delay=True
         )
         handler.setLevel(level)
         formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s")
@@ -1,7 +1,45 @@
-import math
+import base64
+import hashlib
+import hmac
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from functools import lru_cache
 from pathlib import Path
-from typing import Iterable, Dict, Any
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from onilock.core.corpus import Corpus
+from onilock.core.keys import data_key
+from onilock.core.logging_manager import logger
+from onilock.core.settings import settings
+from onilock.core.strength import estimate
+
+T = TypeVar("T")
+
+# Bump whenever the rules in `password_health` change, so that cached health
+# results computed under the old rules are discarded.
+HEALTH_POLICY = 5
+
+# Thresholds of the health policy, on the length and the pattern-aware
+# estimate of `onilock.core.strength`.
+MIN_LENGTH = 12
+MIN_CATEGORIES = 3
+MIN_ENTROPY_BITS = 60
+WEAK_ENTROPY_BITS = 50
+WEAK_LENGTH = 10
+
+SIMILAR_REASON = "similar to another account's password"
 
 
 @lru_cache(maxsize=1)
@@ -13,34 +51,70 @@ def _common_passwords() -> set[str]:
         return set()
 
 
-def estimate_entropy_bits(password: str) -> float:
-    if not password:
-        return 0.0
+@lru_cache(maxsize=4)
+def _open_corpus(path: str) -> Optional[Corpus]:
+    try:
+        return Corpus(path)
+    except (OSError, ValueError) as exc:
+        logger.warning(f"Password corpus {path} is unusable: {exc}")
+        return None
+
 
-    has_lower = any(c.islower() for c in password)
-    has_upper = any(c.isupper() for c in password)
-    has_digit = any(c.isdigit() for c in password)
-    has_symbol = any(not c.isalnum() for c in password)
+def _corpus() -> Optional[Corpus]:
+    """The compiled breach corpus from `ONI_PASSWORD_CORPUS`, if any."""
+    path = settings.PASSWORD_CORPUS
+    return _open_corpus(path) if path else None
 
-    pool = 0
-    if has_lower:
-        pool += 26
-    if has_upper:
-        pool += 26
-    if has_digit:
-        pool += 10
-    if has_symbol:
-        pool += 32
 
-    if pool == 0:
-        return 0.0
+def is_breached(password: str) -> bool:
+    """Whether the password, or its lowercase form, is in the breach corpus."""
+    corpus = _corpus()
+    if corpus is None:
+        return False
+    lowered = password.lower()
+    return password in corpus or (lowered != password and lowered in corpus)
+
 
-    return len(password) * math.log2(pool)
+@lru_cache(maxsize=4)
+def _fingerprint_key(key: str) -> bytes:
+    return hmac.new(
+        base64.urlsafe_b64decode(key.encode()),
+        b"onilock-password-fingerprint",
+        "sha256",
+    ).digest()
 
 
-def password_health(password: str, existing_passwords: Iterable[str]) -> Dict[str, Any]:
+def password_fingerprint(password: str, key: Optional[str] = None) -> str:
+    """
+    Keyed fingerprint of a password, for reuse detection without decryption.
+
+    An HMAC under a subkey of the data key (or `key`), so fingerprints cannot
+    be brute forced without it and change when the vault is re-keyed.
+    """
+    subkey = _fingerprint_key(key or data_key())
+    return hmac.new(subkey, password.encode(), "sha256").hexdigest()
+
+
+def estimate_entropy_bits(password: str) -> float:
+    """
+    log2 of the guesses an informed attacker needs, trying dictionary words,
+    dates, keyboard walks and other common patterns before brute force.
+    """
+    return estimate(password).entropy_bits
+
+
+def password_health(
+    password: str,
+    existing_passwords: Iterable[str] = (),
+    is_reused: bool = False,
+    is_similar: bool = False,
+) -> Dict[str, Any]:
     length = len(password)
-    entropy = estimate_entropy_bits(password)
+    strength_estimate = estimate(password)
+    entropy = strength_estimate.entropy_bits
+    patterns = sorted(
+        {m.pattern for m in strength_estimate.sequence if m.pattern != "bruteforce"}
+    )
     categories = sum(
         [
             any(c.islower() for c in password),
@@ -52,30 +126,143 @@ def password_health(password: str, existing_passwords: Iterable[str]) -> Dict[st
 
     lowered = password.lower()
     is_common = lowered in _common_passwords()
-    is_reused = password in set(existing_passwords)
+    breached = is_breached(password)
+    is_reused = is_reused or password in set(existing_passwords)
 
     reasons = []
-    if length < 12:
-        reasons.append("too short (min 12)")
-    if categories < 3:
+    if length < MIN_LENGTH:
+        reasons.append(f"too short (min {MIN_LENGTH})")
+    if password.strip() != password:
+        reasons.append("leading or trailing whitespace")
+    if categories < MIN_CATEGORIES:
         reasons.append("not enough character variety")
-    if entropy < 60:
+    if entropy < MIN_ENTROPY_BITS:
         reasons.append("low entropy")
+        if patterns:
+            reasons.append("predictable patterns: " + ", ".join(patterns))
     if is_common:
         reasons.append("common password")
+    if breached:
+        reasons.append("found in breach corpus")
     if is_reused:
         reasons.append("password reuse detected")
+    if is_similar:
+        reasons.append(SIMILAR_REASON)
 
     strength = "strong"
     if reasons:
-        strength = "weak" if entropy < 50 or length < 10 or is_common or is_reused else "medium"
+        strength = (
+            "weak"
+            if entropy < WEAK_ENTROPY_BITS
+            or length < WEAK_LENGTH
+            or is_common
+            or breached
+            or is_reused
+            else "medium"
+        )
 
     return {
         "length": length,
         "entropy_bits": round(entropy, 2),
+        "guesses_log10": round(strength_estimate.guesses_log10, 2),
+        "score": strength_estimate.score,
+        "patterns": patterns,
         "categories": categories,
         "is_common": is_common,
+        "is_breached": breached,
         "is_reused": is_reused,
+        "is_similar": is_similar,
         "strength": strength,
         "reasons": reasons,
     }
+
+
+@lru_cache(maxsize=1)
+def _rules_digest():
+    digest = hashlib.sha256(f"{HEALTH_POLICY}\n".encode())
+    for password in sorted(_common_passwords()):
+        digest.update(password.encode() + b"\n")
+    return digest
+
+
+def policy_version() -> str:
+    """
+    Identifier of the health policy: its rules, the common-password list and
+    the breach corpus in use.
+    """
+    digest = _rules_digest().copy()
+    corpus = _corpus()
+    if corpus is not None:
+        stat = os.stat(corpus.path)
+        digest.update(f"{corpus.path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:16]
+
+
+def with_reuse(health: Dict[str, Any]) -> Dict[str, Any]:
+    """`health` of a password found to be shared with another account."""
+    if health["is_reused"]:
+        return health
+    return {
+        **health,
+        "is_reused": True,
+        "strength": "weak",
+        "reasons": [*health["reasons"], "password reuse detected"],
+    }
+
+
+def with_similar(health: Dict[str, Any]) -> Dict[str, Any]:
+    """`health` of a password that is a near-duplicate of another account's."""
+    if health["is_similar"]:
+        return health
+    return {
+        **health,
+        "is_similar": True,
+        "strength": "medium" if health["strength"] == "strong" else health["strength"],
+        "reasons": [*health["reasons"], SIMILAR_REASON],
+    }
+
+
+def _health_batch(passwords: List[str]) -> List[Dict[str, Any]]:
+    return [password_health(password) for password in passwords]
+
+
+def map_batches(
+    function: Callable[[List[Any]], Any],
+    batches: Iterable[Tuple[T, List[Any]]],
+    workers: int = 1,
+) -> Iterator[Tuple[T, Any]]:
+    """
+    Apply `function` to each batch of `(key, items)`, yielding `(key, result)`
+    in order.
+
+    With more than one worker, batches run in a process pool while the caller
+    keeps producing the next ones. At most two batches per worker are in
+    flight: the next batch is only taken once the oldest result is handed
+    back, so a bounded number of batches and results exist at once.
+    """
+    if workers <= 1:
+        for key, items in batches:
+            yield key, function(items)
+        return
+
+    window = 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Deque[Tuple[T, Future]] = deque()
+        for key, items in batches:
+            pending.append((key, pool.submit(function, items)))
+            if len(pending) >= window:
+                key, future = pending.popleft()
+                yield key, future.result()
+        while pending:
+            key, future = pending.popleft()
+            yield key, future.result()
+
+
+def analyse_passwords(
+    batches: Iterable[Tuple[T, List[str]]], workers: int = 1
+) -> Iterator[Tuple[T, List[Dict[str, Any]]]]:
+    """
+    Run `password_health` over batches of `(key, passwords)`, with the key of
+    each batch, in order (see `map_batches`).
+    """
+    return map_batches(_health_batch, batches, workers)
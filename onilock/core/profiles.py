@@ -1,6 +1,9 @@
 import json
+import uuid
+from pathlib import Path
 from typing import List
 
+from onilock.core.fileio import atomic_write
 from onilock.core.settings import settings
 
 
@@ -8,6 +11,12 @@ def _profiles_path():
     return settings.BASE_DIR / "profiles.json"
 
 
+def setup_filepath(name: str) -> Path:
+    """Setup file of a profile, which holds the encrypted path of its vault."""
+    filename = str(uuid.uuid5(uuid.NAMESPACE_DNS, name + "_oni")).split("-")[-1]
+    return Path(settings.VAULT_DIR) / f"{filename}.oni"
+
+
 def list_profiles() -> List[str]:
     path = _profiles_path()
     if not path.exists():
@@ -25,14 +34,14 @@ def register_profile(name: str) -> None:
     if name not in profiles:
         profiles.append(name)
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps({"profiles": profiles}, indent=2))
+    atomic_write(path, [json.dumps({"profiles": profiles}, indent=2).encode()])
 
 
 def remove_profile(name: str) -> None:
     profiles = [p for p in list_profiles() if p != name]
     path = _profiles_path()
     if profiles:
-        path.write_text(json.dumps({"profiles": profiles}, indent=2))
+        atomic_write(path, [json.dumps({"profiles": profiles}, indent=2).encode()])
     elif path.exists():
         path.unlink()
 
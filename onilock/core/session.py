@@ -0,0 +1,104 @@
+"""
+Session tickets.
+
+Once the master password has been verified, a ticket is written to the
+user's private runtime directory (see `onilock.core.agent.runtime_dir`), and
+later verifications accept it instead of hashing the password again, until it
+expires after `ONI_SESSION_TTL` seconds or `onilock lock` revokes it.
+
+A ticket is sealed under the vault data key and names the profile, its vault
+directory and a digest of the stored master password hash, so it opens no
+other profile and dies with a master password change. The ticket itself is
+the credential: it holds nothing derived from the master password, so a
+password given within a session is still checked against the password hash.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from onilock.core.agent import is_private, runtime_dir
+from onilock.core.fileio import atomic_write
+from onilock.core.keys import data_cipher
+from onilock.core.logging_manager import logger
+from onilock.core.settings import settings
+
+
+def ticket_path(profile: str) -> Path:
+    name = hashlib.sha256(f"{settings.VAULT_DIR}\0{profile}".encode()).hexdigest()
+    return Path(runtime_dir()) / f"{name[:16]}.ticket"
+
+
+def _claims(profile: str, credential: str) -> dict:
+    return {
+        "profile": profile,
+        "vault": str(settings.VAULT_DIR),
+        "credential": hashlib.sha256(credential.encode()).hexdigest(),
+    }
+
+
+def mint(profile: str, credential: str, ttl: Optional[float] = None) -> Optional[float]:
+    """
+    Write a ticket for `profile`, whose master password was just verified
+    against its stored hash `credential`.
+
+    Args:
+        ttl (Optional[float]): Seconds it stays valid, `ONI_SESSION_TTL` if omitted.
+
+    Returns:
+        Optional[float]: When it expires, or None if sessions are disabled or
+            the runtime directory is not private.
+    """
+    ttl = settings.SESSION_TTL if ttl is None else ttl
+    if ttl <= 0:
+        return None
+    path = ticket_path(profile)
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if not is_private(str(path.parent)):
+        logger.warning(f"Not writing a session ticket: {path.parent} is not private.")
+        return None
+    expires = time.time() + ttl
+    claims = {**_claims(profile, credential), "expires": expires}
+    # Temporary files are created 0600, so the ticket is never readable by others.
+    atomic_write(path, [data_cipher().encrypt(json.dumps(claims).encode())])
+    return expires
+
+
+def _read(profile: str) -> Optional[dict]:
+    path = ticket_path(profile)
+    if not is_private(str(path.parent)):
+        return None
+    try:
+        claims = json.loads(data_cipher().decrypt(path.read_bytes()))
+        claims["expires"] = float(claims["expires"])
+    except Exception:
+        # Missing, sealed under another data key, or tampered with.
+        return None
+    return claims if time.time() < claims["expires"] else None
+
+
+def is_valid(profile: str, credential: str) -> bool:
+    """Whether a live ticket for `profile` and `credential` exists."""
+    claims = _read(profile)
+    if not claims:
+        return False
+    claims.pop("expires")
+    return claims == _claims(profile, credential)
+
+
+def expires_at(profile: str) -> Optional[float]:
+    """When the live ticket of `profile` expires, None if there is none."""
+    claims = _read(profile)
+    return claims["expires"] if claims else None
+
+
+def revoke(profile: str) -> bool:
+    """Remove the ticket of `profile`. Returns whether there was one."""
+    try:
+        os.remove(ticket_path(profile))
+    except FileNotFoundError:
+        return False
+    return True
@@ -14,12 +14,7 @@ class Settings:
 
     def __init__(self) -> None:
         # Importing inside the function in order to prevent circular imports.
-        from onilock.core.utils import (
-            get_passphrase,
-            get_secret_key,
-            getlogin,
-            str_to_bool,
-        )
+        from onilock.core.utils import getlogin, str_to_bool
 
         def find_project_root() -> Optional[Path]:
             path = Path(__file__).resolve()
@@ -55,6 +50,7 @@ class Settings:
         self.PROFILE_PATH = self.BASE_DIR / ".profile"
         self.AUDIT_LOG = self.BASE_DIR / "audit.log"
         self.BACKUP_DIR = self.BASE_DIR / "backups"
+        self.CACHE_DIR = self.BASE_DIR / "cache"
 
         self.DEBUG = False
         try:
@@ -63,7 +59,10 @@ class Settings:
         except ValueError:
             pass
 
-        self.SECRET_KEY = os.environ.get("ONI_SECRET_KEY", get_secret_key())
+        # SECRET_KEY and PASSPHRASE fall back to the keystore, which is only
+        # opened when one of them is first read (see __getattr__).
+        if "ONI_SECRET_KEY" in os.environ:
+            self.SECRET_KEY = os.environ["ONI_SECRET_KEY"]
         self.DB_BACKEND = DBBackEndEnum(os.environ.get("ONI_DB_BACKEND", "Json"))
         self.DB_URL = os.environ.get("ONI_DB_URL")
         default_db_name = f"{getlogin()}_dev" if is_dev_source else getlogin()
@@ -78,7 +77,8 @@ class Settings:
         self.DB_USER = os.environ.get("ONI_DB_USER")
         self.DB_PWD = os.environ.get("ONI_DB_PWD")
 
-        self.PASSPHRASE: str = os.environ.get("ONI_GPG_PASSPHRASE", get_passphrase())
+        if "ONI_GPG_PASSPHRASE" in os.environ:
+            self.PASSPHRASE: str = os.environ["ONI_GPG_PASSPHRASE"]
         default_gpg_home = (
             str(project_root / ".onilock_dev" / ".gnupg")
             if is_dev_source
@@ -104,6 +104,9 @@ class Settings:
         self.PGP_EMAIL: str = "pgp@onilock.com"
         self.CHECKSUM_SEPARATOR = "(:|?"
         self.BCRYPT_ROUNDS = int(os.environ.get("ONI_BCRYPT_ROUNDS", "12"))
+        # Master password hash for new hashes: "bcrypt", "scrypt" or "argon2id".
+        # Empty uses the algorithm picked by `onilock kdf-calibrate`, or bcrypt.
+        self.KDF = os.environ.get("ONI_KDF", "").lower()
         self.LOCKOUT_ATTEMPTS = int(os.environ.get("ONI_LOCKOUT_ATTEMPTS", "5"))
         self.LOCKOUT_WINDOW_SEC = int(
             os.environ.get("ONI_LOCKOUT_WINDOW_SEC", "300")
@@ -124,6 +127,47 @@ class Settings:
             "on",
         )
 
+        self.VAULT_JOURNAL = os.environ.get("ONI_VAULT_JOURNAL", "false").lower() in (
+            "1",
+            "true",
+            "yes",
+            "on",
+        )
+        self.JOURNAL_MAX_BYTES = int(os.environ.get("ONI_JOURNAL_MAX_BYTES", "262144"))
+        # Layout used when writing JSON vaults: "v2" (single envelope), "v3"
+        # (independently sealed segments) or "v4" (binary envelope). Reads
+        # accept all of them.
+        self.VAULT_FORMAT = os.environ.get("ONI_VAULT_FORMAT", "v2").lower()
+        # Payload codec for vault writes: "auto", "json", "orjson" or "msgpack".
+        self.VAULT_CODEC = os.environ.get("ONI_VAULT_CODEC", "auto").lower()
+        # Compression applied before encryption to vaults and stored files:
+        # "none", "zlib" or "zstd". A level of 0 uses the algorithm's default.
+        self.COMPRESSION = os.environ.get("ONI_COMPRESSION", "none").lower()
+        self.COMPRESSION_LEVEL = int(os.environ.get("ONI_COMPRESSION_LEVEL", "0"))
+        # Maximum number of open database engines kept per process.
+        self.ENGINE_CACHE_SIZE = int(os.environ.get("ONI_ENGINE_CACHE_SIZE", "16"))
+        # How many times a read-modify-write is retried after another process
+        # wrote the vault in between.
+        self.WRITE_RETRIES = int(os.environ.get("ONI_WRITE_RETRIES", "5"))
+        # How writes reach the disk: "strict" (fsync file and directory),
+        # "batched" (group commit of up to DURABILITY_BATCH_SIZE writes or
+        # DURABILITY_BATCH_INTERVAL seconds) or "fast" (no fsync).
+        self.DURABILITY = os.environ.get("ONI_DURABILITY", "strict").lower()
+        self.DURABILITY_BATCH_SIZE = int(
+            os.environ.get("ONI_DURABILITY_BATCH_SIZE", "64")
+        )
+        self.DURABILITY_BATCH_INTERVAL = float(
+            os.environ.get("ONI_DURABILITY_BATCH_INTERVAL", "1.0")
+        )
+        # Processes used by `audit-passwords`; 0 uses every CPU.
+        self.AUDIT_WORKERS = int(os.environ.get("ONI_AUDIT_WORKERS", "0"))
+        # Compiled breach corpus checked by password health (`onilock corpus compile`).
+        self.PASSWORD_CORPUS = os.environ.get("ONI_PASSWORD_CORPUS", "")
+        # Seconds of inactivity after which `onilock agent` exits.
+        self.AGENT_TIMEOUT = float(os.environ.get("ONI_AGENT_TIMEOUT", "900"))
+        # Seconds a verified master password is trusted for; 0 disables it.
+        self.SESSION_TTL = float(os.environ.get("ONI_SESSION_TTL", "300"))
+
         try:
             db_port = int(os.environ.get("ONI_DB_PORT", "0"))
             self.DB_PORT = db_port
@@ -140,5 +184,16 @@ class Settings:
             f"{filename}.oni",
         )
 
+    def __getattr__(self, name: str):
+        # Only called for attributes that were not set in __init__.
+        from onilock.core.utils import get_passphrase, get_secret_key
+
+        lookups = {"SECRET_KEY": get_secret_key, "PASSPHRASE": get_passphrase}
+        if name not in lookups:
+            raise AttributeError(name)
+        value = lookups[name]()
+        setattr(self, name, value)
+        return value
+
 
 settings = Settings()
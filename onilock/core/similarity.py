@@ -0,0 +1,125 @@
+"""
+Near-duplicate password detection with MinHash and locality-sensitive hashing.
+
+A password's sketch is a MinHash signature of its lowercase character
+trigrams, under 96 hash functions keyed by the vault data key. The fraction
+of positions on which two sketches agree estimates the Jaccard similarity of
+the trigram sets, so `Summer2023!` and `Summer2024!` come out close, while a
+sketch reveals nothing useful without the key. Only sketches are stored.
+
+Sketches are cut into bands, and only passwords sharing at least one band are
+compared, so clustering a vault takes roughly linear time instead of
+comparing every pair.
+"""
+
+import base64
+import hashlib
+import hmac
+import struct
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Hashable, List, Optional
+
+from onilock.core.keys import data_key
+
+
+NGRAM = 3
+HASHES = 96
+BANDS = 32
+ROWS = HASHES // BANDS
+# Estimated Jaccard similarity from which two passwords are near-duplicates
+# (`Summer2023!` and `Summer2024!` share 8 of their 14 trigrams). With 32
+# bands of 3 rows, pairs at this similarity become candidates with
+# probability ~0.95, and pairs at 0.6 with ~0.999. Candidates are confirmed
+# on their full sketches.
+THRESHOLD = 0.45
+
+# Each MinHash value keeps its low 16 bits, written as 4 hex digits.
+_VALUE_WIDTH = 4
+BAND_WIDTH = ROWS * _VALUE_WIDTH
+_ROW = struct.Struct(f">{HASHES}I")
+_SKETCH = struct.Struct(f">{HASHES}H")
+# Past this size, a bucket is only compared against its first member.
+_MAX_BUCKET_PAIRS = 64
+
+
+@lru_cache(maxsize=4)
+def _sketch_key(key: str) -> bytes:
+    return hmac.new(
+        base64.urlsafe_b64decode(key.encode()),
+        b"onilock-password-sketch",
+        "sha256",
+    ).digest()
+
+
+def _shingles(password: str) -> set:
+    text = f"\x02{password.lower()}\x03"
+    return {text[i : i + NGRAM] for i in range(max(1, len(text) - NGRAM + 1))}
+
+
+def password_sketch(password: str, key: Optional[str] = None) -> str:
+    """Keyed MinHash sketch of a password under the data key (or `key`), as hex."""
+    subkey = _sketch_key(key or data_key())
+    # One keyed SHAKE-256 output per trigram supplies all 96 hash functions.
+    rows = [
+        _ROW.unpack(hashlib.shake_256(subkey + shingle.encode()).digest(_ROW.size))
+        for shingle in _shingles(password)
+    ]
+    return _SKETCH.pack(*[min(column) & 0xFFFF for column in zip(*rows)]).hex()
+
+
+def band(sketch: str, number: int) -> str:
+    """Band `number` of a sketch; "" for a missing sketch."""
+    return sketch[number * BAND_WIDTH : (number + 1) * BAND_WIDTH]
+
+
+def similarity(a: str, b: str) -> float:
+    """Estimated Jaccard similarity of the passwords behind two sketches."""
+    if not a or not b:
+        return 0.0
+    equal = sum(
+        a[i : i + _VALUE_WIDTH] == b[i : i + _VALUE_WIDTH]
+        for i in range(0, len(a), _VALUE_WIDTH)
+    )
+    return equal / HASHES
+
+
+def cluster(sketches: Dict[Hashable, str]) -> List[List[Hashable]]:
+    """
+    Group keys whose sketches are near-duplicates, transitively.
+
+    Returns the clusters with more than one member, each in input order.
+    """
+    parent = {key: key for key in sketches}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    # One band at a time, so only one band's buckets are ever held in memory.
+    for number in range(BANDS):
+        buckets = defaultdict(list)
+        for key, sketch in sketches.items():
+            buckets[band(sketch, number)].append(key)
+
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            pairs = (
+                ((a, b) for i, a in enumerate(members) for b in members[i + 1 :])
+                if len(members) <= _MAX_BUCKET_PAIRS
+                else ((members[0], b) for b in members[1:])
+            )
+            for a, b in pairs:
+                root_a, root_b = find(a), find(b)
+                if root_a == root_b:
+                    continue
+                if similarity(sketches[a], sketches[b]) >= THRESHOLD:
+                    parent[root_b] = root_a
+
+    groups = defaultdict(list)
+    for key in sketches:
+        groups[find(key)].append(key)
+    return [members for members in groups.values() if len(members) > 1]
@@ -0,0 +1,68 @@
+"""
+Subprocess accounting.
+
+With `ONI_DEBUG` on, the CLI counts every process it starts (`subprocess`,
+`os.system` and forks, seen through Python audit hooks) and logs the totals
+per program when the command ends, so that a command spawning `gpg` it does
+not need shows up in the debug log.
+"""
+
+import os
+import sys
+from collections import Counter
+from typing import Dict
+
+from onilock.core.logging_manager import logger
+
+_counts: Counter = Counter()
+_watching = False
+_hooked = False
+
+
+def _program(executable, args) -> str:
+    if executable is None:
+        if isinstance(args, (str, bytes)):
+            executable = os.fsdecode(args).split()[0]
+        else:
+            executable = args[0]
+    return os.path.basename(os.fsdecode(executable))
+
+
+def _audit(event: str, args: tuple) -> None:
+    if not _watching:
+        return
+    if event == "subprocess.Popen":
+        _counts[_program(args[0], args[1])] += 1
+    elif event == "os.system":
+        _counts["sh"] += 1
+    elif event == "os.fork":
+        _counts["fork"] += 1
+
+
+def watch() -> None:
+    """Start counting the processes spawned from now on."""
+    global _watching, _hooked
+    if not _hooked:
+        # Audit hooks cannot be removed, `_watching` turns this one off.
+        sys.addaudithook(_audit)
+        _hooked = True
+    _counts.clear()
+    _watching = True
+
+
+def counts() -> Dict[str, int]:
+    """Processes spawned since `watch`, per program."""
+    return dict(_counts)
+
+
+def report() -> Dict[str, int]:
+    """Stop counting and log the processes spawned since `watch`."""
+    global _watching
+    if not _watching:
+        return {}
+    _watching = False
+    spawned = counts()
+    total = sum(spawned.values())
+    details = ", ".join(f"{name} x{count}" for name, count in sorted(spawned.items()))
+    logger.debug(f"Spawned {total} subprocess(es){': ' + details if details else ''}.")
+    return spawned
@@ -0,0 +1,657 @@
+"""
+Pattern-aware password strength estimation, in the spirit of zxcvbn.
+
+A password is matched against the patterns people actually use (dictionary
+words, l33t spellings and reversals of them, keyboard walks, dates, repeats
+and sequences), and the estimate is the number of guesses needed by an
+attacker trying the cheapest combination of those patterns, with brute force
+for whatever is left over.
+
+The dictionary tries and keyboard graphs are built once from the bundled
+wordlists and layouts, then saved as JSON in the cache directory; later
+processes only load them, as long as the wordlists keep their size and mtime.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from onilock.core.fileio import atomic_write
+from onilock.core.logging_manager import logger
+from onilock.core.settings import settings
+
+
+# Bump when the table layout below changes, to rebuild serialized tables.
+TABLES_VERSION = 2
+TABLES_FORMAT = "onilock-strength-tables"
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+DICTIONARIES = ("common_passwords.txt", "words.txt")
+
+# Shortest dictionary word worth matching.
+MIN_WORD_LENGTH = 3
+
+L33T = {
+    "4": "a",
+    "@": "a",
+    "8": "b",
+    "(": "c",
+    "{": "c",
+    "3": "e",
+    "6": "g",
+    "9": "g",
+    "1": "il",
+    "!": "i",
+    "|": "il",
+    "0": "o",
+    "$": "s",
+    "5": "s",
+    "7": "lt",
+    "+": "t",
+    "2": "z",
+    "%": "x",
+}
+
+# Keys as "unshifted+shifted" tokens. On the slanted layout each row is offset
+# by half a key, so the neighbours above are (c, c+1) and below (c-1, c).
+_QWERTY = (
+    "`~ 1! 2@ 3# 4$ 5% 6^ 7& 8* 9( 0) -_ =+",
+    "   qQ wW eE rR tT yY uU iI oO pP [{ ]} \\|",
+    "   aA sS dD fF gG hH jJ kK lL ;: '\"",
+    "   zZ xX cC vV bB nN mM ,< .> /?",
+)
+_KEYPAD = (
+    "   /  *  -",
+    "7  8  9  +",
+    "4  5  6",
+    "1  2  3",
+    "0     .",
+)
+
+REFERENCE_YEAR = date.today().year
+MIN_YEAR_SPACE = 20
+MIN_GUESSES_SINGLE_CHAR = 10
+MIN_GUESSES_MULTI_CHAR = 50
+
+# Score thresholds on log10(guesses), as in zxcvbn.
+SCORE_THRESHOLDS = (3, 6, 8, 10)
+
+
+class Match(NamedTuple):
+    pattern: str
+    i: int
+    j: int
+    token: str
+    guesses_log10: float
+
+
+class Estimate(NamedTuple):
+    guesses_log10: float
+    score: int
+    sequence: List[Match]
+
+    @property
+    def entropy_bits(self) -> float:
+        return self.guesses_log10 * math.log2(10)
+
+
+# ---- Tables -----------------------------------------------------------------
+
+
+def _build_trie(words: List[str]) -> dict:
+    """Trie of lowercase words; the "" key of a node holds the word's rank."""
+    root: dict = {}
+    for rank, word in enumerate(words, start=1):
+        node = root
+        for char in word:
+            node = node.setdefault(char, {})
+        node.setdefault("", rank)
+    return root
+
+
+def _build_graph(rows: Tuple[str, ...], slanted: bool) -> dict:
+    """
+    Adjacency of every key, as one neighbour token (or "") per direction,
+    plus the starting-position count and average degree used for guesses.
+    """
+    width = 3
+    positions = {}
+    for y, row in enumerate(rows):
+        for x in range(0, len(row), width):
+            token = row[x : x + width].strip()
+            if token:
+                positions[(x // width, y)] = token
+
+    if slanted:
+        offsets = [(-1, 0), (0, -1), (1, -1), (1, 0), (0, 1), (-1, 1)]
+    else:
+        offsets = [(-1, -1), (0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0)]
+
+    adjacency = {}
+    degrees = []
+    for (x, y), token in positions.items():
+        neighbours = [positions.get((x + dx, y + dy), "") for dx, dy in offsets]
+        degrees.append(sum(1 for n in neighbours if n))
+        for char in token:
+            adjacency[char] = neighbours
+    return {
+        "adjacency": adjacency,
+        "shifted": "".join(t[1] for t in positions.values() if len(t) > 1),
+        "starts": len(positions),
+        "degree": sum(degrees) / len(degrees),
+    }
+
+
+def _sources() -> List[Tuple[str, List[str]]]:
+    sources = []
+    for name in DICTIONARIES:
+        try:
+            text = (DATA_DIR / name).read_text()
+        except OSError:
+            continue
+        words = [w.strip().lower() for w in text.splitlines() if w.strip()]
+        sources.append((name, words))
+    return sources
+
+
+def build_tables() -> dict:
+    """Build the dictionary tries and keyboard graphs from their sources."""
+    return {
+        "dictionaries": {name: _build_trie(words) for name, words in _sources()},
+        "graphs": {
+            "qwerty": _build_graph(_QWERTY, slanted=True),
+            "keypad": _build_graph(_KEYPAD, slanted=False),
+        },
+    }
+
+
+def _tables_path() -> Optional[Path]:
+    cache_dir = getattr(settings, "CACHE_DIR", None)
+    if cache_dir is None:
+        return None
+    return Path(cache_dir) / "strength-tables.json"
+
+
+def _sources_stamp() -> str:
+    """
+    What the tables were built from: their version, the keyboard layouts and
+    each wordlist's size and mtime, which are checked without reading it.
+    """
+    digest = hashlib.sha256(f"{TABLES_VERSION}".encode())
+    for layout in (_QWERTY, _KEYPAD):
+        digest.update("\n".join(layout).encode())
+    for name in DICTIONARIES:
+        try:
+            stat = os.stat(DATA_DIR / name)
+        except OSError:
+            continue
+        digest.update(f"{name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _load_tables(path: Path, stamp: str) -> Optional[dict]:
+    """Tables saved at `path` for `stamp`, None if missing, stale or invalid."""
+    try:
+        saved = json.loads(path.read_bytes())
+        if saved["format"] != TABLES_FORMAT or saved["version"] != TABLES_VERSION:
+            return None
+        if saved["sources"] != stamp:
+            return None
+        data = saved["tables"]
+        if not isinstance(data["dictionaries"], dict):
+            return None
+        for name in ("qwerty", "keypad"):
+            graph = data["graphs"][name]
+            if not isinstance(graph["adjacency"], dict) or not graph["starts"]:
+                return None
+            if not isinstance(graph["shifted"], str):
+                return None
+            float(graph["degree"])
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+    return data
+
+
+@lru_cache(maxsize=1)
+def tables() -> dict:
+    """Matcher tables, loaded from the cache or built and cached once."""
+    path = _tables_path()
+    stamp = _sources_stamp()
+    if path is not None:
+        data = _load_tables(path, stamp)
+        if data is not None:
+            return data
+
+    data = build_tables()
+    if path is not None:
+        saved = {
+            "format": TABLES_FORMAT,
+            "version": TABLES_VERSION,
+            "sources": stamp,
+            "tables": data,
+        }
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write(str(path), [json.dumps(saved, separators=(",", ":")).encode()])
+        except OSError as exc:
+            logger.debug(f"Unable to cache strength tables: {exc}")
+    return data
+
+
+# ---- Guess counts ------------------------------------------------------------
+
+
+def _n_ck(n: int, k: int) -> int:
+    return math.comb(n, k) if 0 <= k <= n else 0
+
+
+def _uppercase_variations(token: str) -> int:
+    if token.islower() or not any(c.isalpha() for c in token):
+        return 1
+    if token.isupper() or token[0].isupper() and token[1:].islower():
+        return 2
+    if token[-1].isupper() and token[:-1].islower():
+        return 2
+    upper = sum(1 for c in token if c.isupper())
+    lower = sum(1 for c in token if c.islower())
+    return sum(_n_ck(upper + lower, i) for i in range(1, min(upper, lower) + 1))
+
+
+def _log10_comb(n: int, k: int) -> float:
+    return (
+        math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)
+    ) / math.log(10)
+
+
+def _log10_sum(terms: List[float]) -> float:
+    """log10 of the sum of the numbers whose log10 are `terms`."""
+    top = max(terms)
+    return top + math.log10(sum(10 ** (term - top) for term in terms))
+
+
+def _spatial_log10(graph: dict, length: int, turns: int, shifted: int) -> float:
+    """
+    log10 of the guesses of a keyboard walk, as in zxcvbn, worked out in log
+    space so that walks thousands of keys long do not overflow a float.
+
+    zxcvbn sums C(i - 1, j - 1) * starts * degree**j over every prefix length
+    i and turn count j; summing over i first gives C(length, j) - 1, so the
+    cost is linear in the number of turns.
+    """
+    starts, degree = graph["starts"], graph["degree"]
+    terms = []
+    for j in range(1, min(turns, length - 1) + 1):
+        # C(length, j) >= length >= 2 here, so C(length, j) - 1 is positive.
+        combinations = _log10_comb(length, j)
+        combinations += math.log10(1 - 10**-combinations)
+        terms.append(combinations + j * math.log10(degree))
+    guesses_log10 = math.log10(starts) + _log10_sum(terms)
+    if shifted:
+        unshifted = length - shifted
+        if unshifted == 0:
+            guesses_log10 += math.log10(2)
+        else:
+            guesses_log10 += _log10_sum(
+                [
+                    _log10_comb(shifted + unshifted, i)
+                    for i in range(1, min(shifted, unshifted) + 1)
+                ]
+            )
+    return guesses_log10
+
+
+def _year_space(year: int) -> int:
+    return max(abs(REFERENCE_YEAR - year), MIN_YEAR_SPACE)
+
+
+def _min_log10(length: int) -> float:
+    minimum = MIN_GUESSES_SINGLE_CHAR if length == 1 else MIN_GUESSES_MULTI_CHAR
+    return math.log10(minimum)
+
+
+def _log10(guesses: float, length: int) -> float:
+    return math.log10(max(guesses, 10 ** _min_log10(length)))
+
+
+# ---- Matchers ----------------------------------------------------------------
+
+
+def _dictionary_matches(password: str, trie: dict) -> List[Match]:
+    matches = []
+    n = len(password)
+    lowered = password.lower()
+    for reverse in (False, True):
+        text = lowered[::-1] if reverse else lowered
+        original = password[::-1] if reverse else password
+        for start in range(n):
+            # Depth-first walk, following l33t substitutions as alternatives.
+            stack = [(trie, start, 0)]
+            while stack:
+                node, end, subs = stack.pop()
+                if end - start >= MIN_WORD_LENGTH and "" in node:
+                    i, j = (n - end, n - start - 1) if reverse else (start, end - 1)
+                    token = password[i : j + 1]
+                    guesses = (
+                        node[""]
+                        * _uppercase_variations(original[start:end])
+                        * 2**subs
+                        * (2 if reverse else 1)
+                    )
+                    pattern = (
+                        "reversed" if reverse else "l33t" if subs else "dictionary"
+                    )
+                    matches.append(
+                        Match(pattern, i, j, token, _log10(guesses, j - i + 1))
+                    )
+                if end == n:
+                    continue
+                char = text[end]
+                child = node.get(char)
+                if child is not None:
+                    stack.append((child, end + 1, subs))
+                for sub in L33T.get(original[end], ""):
+                    child = node.get(sub)
+                    if sub != char and child is not None:
+                        stack.append((child, end + 1, subs + 1))
+    return matches
+
+
+def _spatial_matches(password: str, graphs: dict) -> List[Match]:
+    matches = []
+    n = len(password)
+    for graph in graphs.values():
+        adjacency = graph["adjacency"]
+        shifted_keys = graph["shifted"]
+        i = 0
+        while i < n - 1:
+            j = i
+            direction = None
+            turns = 0
+            shifted = 1 if password[i] in shifted_keys else 0
+            while j + 1 < n:
+                neighbours = adjacency.get(password[j])
+                following = password[j + 1]
+                found = None
+                if neighbours:
+                    for index, token in enumerate(neighbours):
+                        if following in token:
+                            found = index
+                            break
+                if found is None:
+                    break
+                if found != direction:
+                    turns += 1
+                    direction = found
+                if following in shifted_keys:
+                    shifted += 1
+                j += 1
+            length = j - i + 1
+            if length >= 3:
+                guesses_log10 = max(
+                    _spatial_log10(graph, length, turns, shifted), _min_log10(length)
+                )
+                matches.append(
+                    Match("spatial", i, j, password[i : j + 1], guesses_log10)
+                )
+            i = j + 1 if j > i else i + 1
+    return matches
+
+
+def _sequence_matches(password: str) -> List[Match]:
+    matches = []
+    n = len(password)
+    i = 0
+    while i < n - 2:
+        delta = ord(password[i + 1]) - ord(password[i])
+        j = i + 1
+        if 0 < abs(delta) <= 5:
+            while j + 1 < n and ord(password[j + 1]) - ord(password[j]) == delta:
+                j += 1
+        token = password[i : j + 1]
+        if len(token) >= 3 and (token.isalpha() or token.isdigit()):
+            first = token[0]
+            if first in "aAzZ019":
+                base = 4
+            elif first.isdigit():
+                base = 10
+            else:
+                base = 26
+            guesses = base * len(token) * (2 if delta < 0 else 1)
+            matches.append(Match("sequence", i, j, token, _log10(guesses, len(token))))
+            i = j
+        else:
+            i += 1
+    return matches
+
+
+_REPEAT_GREEDY = re.compile(r"(.+)\1+")
+_REPEAT_LAZY = re.compile(r"(.+?)\1+")
+
+
+def _repeat_matches(password: str) -> List[Match]:
+    matches = []
+    position = 0
+    while position < len(password):
+        greedy = _REPEAT_GREEDY.search(password, position)
+        if not greedy:
+            break
+        lazy = _REPEAT_LAZY.search(password, position)
+        if len(greedy.group(0)) > len(lazy.group(0)):
+            match, base = greedy, greedy.group(1)
+            # "abcabcabc" matches greedily as "abcabc"+...; use the shortest unit.
+            unit = _REPEAT_LAZY.fullmatch(match.group(0))
+            base = unit.group(1) if unit else base
+        else:
+            match, base = lazy, lazy.group(1)
+        token = match.group(0)
+        count = len(token) // len(base)
+        base_log10 = estimate(base).guesses_log10
+        matches.append(
+            Match(
+                "repeat",
+                match.start(),
+                match.end() - 1,
+                token,
+                base_log10 + math.log10(count),
+            )
+        )
+        position = match.end()
+    return matches
+
+
+_YEAR = re.compile(r"19\d\d|20\d\d")
+_SEPARATED_DATE = re.compile(r"(\d{1,4})([\s/\\_.-])(\d{1,2})\2(\d{1,4})")
+_DIGITS = re.compile(r"\d{4,8}")
+
+
+def _two_digit_year(value: int) -> int:
+    return value + (1900 if value > 50 else 2000)
+
+
+def _valid_date(parts: Tuple[int, ...], lengths: Tuple[int, ...]) -> Optional[int]:
+    """Year of the first valid year/month/day reading of `parts`, if any."""
+    for y_index in (0, 2):
+        year = parts[y_index]
+        if lengths[y_index] == 4:
+            if not 1000 <= year <= 2050:
+                continue
+        elif lengths[y_index] <= 2:
+            year = _two_digit_year(year)
+        else:
+            continue
+        rest = [parts[k] for k in range(3) if k != y_index]
+        for month, day in (rest, rest[::-1]):
+            if 1 <= month <= 12 and 1 <= day <= 31:
+                return year
+    return None
+
+
+def _date_matches(password: str) -> List[Match]:
+    matches = []
+    for match in _YEAR.finditer(password):
+        guesses = _year_space(int(match.group(0)))
+        matches.append(
+            Match(
+                "year",
+                match.start(),
+                match.end() - 1,
+                match.group(0),
+                _log10(guesses, 4),
+            )
+        )
+
+    for match in _SEPARATED_DATE.finditer(password):
+        a, _, b, c = match.groups()
+        year = _valid_date((int(a), int(b), int(c)), (len(a), len(b), len(c)))
+        if year is not None:
+            guesses = 365 * _year_space(year) * 4
+            token = match.group(0)
+            matches.append(
+                Match(
+                    "date",
+                    match.start(),
+                    match.end() - 1,
+                    token,
+                    _log10(guesses, len(token)),
+                )
+            )
+
+    for run in _DIGITS.finditer(password):
+        digits = run.group(0)
+        for start in range(len(digits) - 3):
+            for end in range(start + 4, min(len(digits), start + 8) + 1):
+                token = digits[start:end]
+                year = None
+                for k in range(1, len(token) - 1):
+                    for m in range(k + 1, len(token)):
+                        parts = (token[:k], token[k:m], token[m:])
+                        if any(len(p) > 4 for p in parts):
+                            continue
+                        year = _valid_date(
+                            tuple(int(p) for p in parts), tuple(len(p) for p in parts)
+                        )
+                        if year is not None:
+                            break
+                    if year is not None:
+                        break
+                if year is not None:
+                    guesses = 365 * _year_space(year)
+                    i = run.start() + start
+                    matches.append(
+                        Match(
+                            "date",
+                            i,
+                            i + len(token) - 1,
+                            token,
+                            _log10(guesses, len(token)),
+                        )
+                    )
+    return matches
+
+
+# ---- Search ------------------------------------------------------------------
+
+
+def _bruteforce_cardinality(password: str) -> int:
+    pool = 0
+    if any(c.islower() for c in password):
+        pool += 26
+    if any(c.isupper() for c in password):
+        pool += 26
+    if any(c.isdigit() for c in password):
+        pool += 10
+    if any(not c.isalnum() for c in password):
+        pool += 32
+    return max(pool, 10)
+
+
+def _matches(password: str) -> List[Match]:
+    data = tables()
+    found = []
+    for trie in data["dictionaries"].values():
+        found.extend(_dictionary_matches(password, trie))
+    found.extend(_spatial_matches(password, data["graphs"]))
+    found.extend(_sequence_matches(password))
+    found.extend(_repeat_matches(password))
+    found.extend(_date_matches(password))
+    return found
+
+
+def _log10_factorial(n: int) -> float:
+    return math.lgamma(n + 1) / math.log(10)
+
+
+def _run_cost(run: tuple) -> float:
+    return run[0] + _log10_factorial(run[1])
+
+
+def _minimum_sequence(password: str, matches: List[Match]) -> Tuple[float, List[Match]]:
+    """
+    Cheapest cover of the password by matches and brute-force runs.
+
+    The cost of a sequence of `l` matches is log10(l! * product of guesses),
+    as in zxcvbn. Each position keeps its best sequence overall and its best
+    sequence ending in a brute-force run, which keeps the search linear in
+    the number of matches.
+    """
+    n = len(password)
+    char_log10 = math.log10(_bruteforce_cardinality(password))
+    ending_at: Dict[int, List[Match]] = {}
+    for match in matches:
+        ending_at.setdefault(match.j, []).append(match)
+
+    # best[k] = (cost, log10 product, count, back), where `back` is the last
+    # match, or the start of a trailing brute-force run.
+    best: List[tuple] = []
+    run = None  # (log10 product, count, start) of the best run ending at k - 1
+    for k in range(n):
+        _, product, count, _ = best[k - 1] if k else (0.0, 0.0, 0, None)
+        fresh = (product + char_log10, count + 1, k)
+        if run is not None:
+            extended = (run[0] + char_log10, run[1], run[2])
+            if _run_cost(extended) <= _run_cost(fresh):
+                fresh = extended
+        run = fresh
+        current = (_run_cost(run), run[0], run[1], run[2])
+
+        for match in ending_at.get(k, ()):
+            _, product, count, _ = best[match.i - 1] if match.i else (0.0, 0.0, 0, None)
+            product += match.guesses_log10
+            cost = product + _log10_factorial(count + 1)
+            if cost < current[0]:
+                current = (cost, product, count + 1, match)
+        best.append(current)
+
+    sequence = []
+    k = n - 1
+    while k >= 0:
+        back = best[k][3]
+        if isinstance(back, Match):
+            sequence.append(back)
+            k = back.i - 1
+        else:
+            token = password[back : k + 1]
+            sequence.append(
+                Match("bruteforce", back, k, token, len(token) * char_log10)
+            )
+            k = back - 1
+    sequence.reverse()
+    return best[-1][0], sequence
+
+
+def _score(guesses_log10: float) -> int:
+    return sum(1 for threshold in SCORE_THRESHOLDS if guesses_log10 >= threshold)
+
+
+def estimate(password: str) -> Estimate:
+    """Estimate how many guesses an informed attacker needs for `password`."""
+    if not password:
+        return Estimate(0.0, 0, [])
+    guesses_log10, sequence = _minimum_sequence(password, _matches(password))
+    return Estimate(guesses_log10, _score(guesses_log10), sequence)
@@ -8,6 +8,7 @@ import string
 import secrets
 import random
 import uuid
+from typing import Callable
 
 from cryptography.fernet import Fernet
 import pyperclip
@@ -104,34 +105,12 @@ def is_password_strong(password: str) -> bool:
     """
     Basic strength check for passwords.
 
-    Strong if it has enough length and character variety.
+    Strong if `password_health` finds nothing wrong with it on its own, so
+    both apply the same policy to the same strength estimate.
     """
-    if not password:
-        return False
-
-    length = len(password)
-    if length < 12:
-        return False
-    if password.strip() != password:
-        return False
+    from onilock.core.passwords import password_health
 
-    has_lower = any(c.islower() for c in password)
-    has_upper = any(c.isupper() for c in password)
-    has_digit = any(c.isdigit() for c in password)
-    has_symbol = any(not c.isalnum() for c in password)
-    categories = sum([has_lower, has_upper, has_digit, has_symbol])
-
-    score = 0
-    if length >= 12:
-        score += 1
-    if length >= 16:
-        score += 1
-    if categories >= 3:
-        score += 1
-    if categories == 4:
-        score += 1
-
-    return score >= 3
+    return password_health(password)["strength"] == "strong"
 
 
 def generate_key() -> str:
@@ -142,22 +121,28 @@ def generate_key() -> str:
     return secret_key.decode()
 
 
+def _stored_or_new(key_name: str, generate: Callable[[], str]) -> str:
+    """
+    Return the secret stored under `key_name`, generating and storing one if
+    there is none. The lookup and the store run in one keystore transaction,
+    so the file keystore is read and written once.
+    """
+    with keystore.transaction():
+        stored = keystore.get_password(key_name)
+        if stored:
+            return stored
+        secret = generate()
+        keystore.set_password(key_name, secret)
+    return secret
+
+
 def get_secret_key() -> str:
     """
     Retrieve or generate a random secret key to use for the project.
     """
 
-    # Retrieve key securely
     key_name = str(uuid.uuid5(uuid.NAMESPACE_DNS, getlogin())).split("-")[-1]
-    stored_key = keystore.get_password(key_name)
-    if stored_key:
-        return stored_key
-
-    # Generate and store the key securely
-    secret_key = generate_key()
-    keystore.set_password(key_name, secret_key)
-
-    return secret_key
+    return _stored_or_new(key_name, generate_key)
 
 
 def get_passphrase() -> str:
@@ -165,17 +150,11 @@ def get_passphrase() -> str:
     Retrieve or generate a random passphrase for the PGP key
     """
 
-    # Retrieve key securely
     key_name = str(uuid.uuid5(uuid.NAMESPACE_DNS, getlogin() + "_oni")).split("-")[-1]
-    stored_key = keystore.get_password(key_name)
-    if stored_key:
-        return stored_key
-
-    # Generate and store the key securely
-    password = generate_random_password(25, include_special_characters=False)
-    keystore.set_password(key_name, password)
-
-    return password
+    return _stored_or_new(
+        key_name,
+        lambda: generate_random_password(25, include_special_characters=False),
+    )
 
 
 def str_to_bool(s: str) -> bool:
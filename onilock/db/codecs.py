@@ -0,0 +1,147 @@
+"""
+Serializers for vault payloads.
+
+Every envelope records the codec it was written with, so vaults written with one
+codec keep loading after `ONI_VAULT_CODEC` changes. `orjson` and `msgpack` are
+optional; `auto` picks the fastest JSON codec available.
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+from onilock.core.settings import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+
+class Codec:
+    """Base payload codec."""
+
+    name: str = ""
+    tag: int = 0
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def dumps(self, data: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, payload: bytes) -> Dict:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """Standard library JSON, compact with sorted keys."""
+
+    name = "json"
+    tag = 0
+
+    def dumps(self, data: Any) -> bytes:
+        return json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+
+    def loads(self, payload: bytes) -> Dict:
+        return json.loads(payload)
+
+
+class OrjsonCodec(Codec):
+    """
+    orjson, producing the same compact sorted JSON as `JsonCodec`.
+
+    Its output is plain JSON, so it stays readable without orjson installed.
+    """
+
+    name = "orjson"
+    tag = 1
+
+    @property
+    def available(self) -> bool:
+        return orjson is not None
+
+    def dumps(self, data: Any) -> bytes:
+        if orjson is None:
+            return JsonCodec().dumps(data)
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+
+    def loads(self, payload: bytes) -> Dict:
+        if orjson is None:
+            return json.loads(payload)
+        return orjson.loads(payload)
+
+
+class MsgpackCodec(Codec):
+    """MessagePack, a compact binary encoding. Requires `msgpack`."""
+
+    name = "msgpack"
+    tag = 2
+
+    @property
+    def available(self) -> bool:
+        return msgpack is not None
+
+    def _require(self) -> None:
+        if msgpack is None:
+            raise RuntimeError(
+                "This vault is encoded with msgpack. Install it with `pip install msgpack`."
+            )
+
+    def dumps(self, data: Any) -> bytes:
+        self._require()
+        return msgpack.packb(data, use_bin_type=True)
+
+    def loads(self, payload: bytes) -> Dict:
+        self._require()
+        return msgpack.unpackb(payload, raw=False)
+
+
+CODECS: Dict[str, Codec] = {
+    codec.name: codec for codec in (JsonCodec(), OrjsonCodec(), MsgpackCodec())
+}
+CODECS_BY_TAG: Dict[int, Codec] = {codec.tag: codec for codec in CODECS.values()}
+
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """
+    Return a codec by name. Without a name, use `ONI_VAULT_CODEC`.
+
+    `auto` resolves to orjson when it is installed and stdlib json otherwise.
+    """
+    if name is None:
+        name = settings.VAULT_CODEC
+    name = name.lower()
+    if name == "auto":
+        return CODECS["orjson"] if CODECS["orjson"].available else CODECS["json"]
+
+    try:
+        codec = CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown vault codec: {name}")
+    if not codec.available:
+        raise RuntimeError(
+            f"Vault codec {name} is not installed. Install it with `pip install {name}`."
+        )
+    return codec
+
+
+def codec_for_name(name: str) -> Codec:
+    """Look up the codec recorded in an envelope."""
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported vault codec: {name}")
+
+
+def codec_for_tag(tag: int) -> Codec:
+    """Look up the codec recorded in a binary envelope."""
+    try:
+        return CODECS_BY_TAG[tag]
+    except KeyError:
+        raise ValueError(f"Unsupported vault codec tag: {tag}")
@@ -1,10 +1,20 @@
+import os
+from collections import OrderedDict
 from threading import Lock
-from typing import Optional
+from typing import Optional, Union
 
 from onilock.core.encryption.encryption import BaseEncryptionBackend
+from onilock.core.enums import DBBackEndEnum
 from onilock.core.exceptions import DatabaseEngineAlreadyExistsException
 from onilock.core.logging_manager import logger
-from onilock.db.engines import EncryptedJsonEngine, JsonEngine
+from onilock.core.settings import settings
+from onilock.db.engines import (
+    EncryptedEngine,
+    EncryptedJsonEngine,
+    Engine,
+    JsonEngine,
+    SqliteEngine,
+)
 
 
 def create_engine(database_url: str):
@@ -12,27 +22,88 @@ def create_engine(database_url: str):
 
 
 def create_encrypted_engine(
-    database_url: str, encryption_backend: Optional[BaseEncryptionBackend] = None
+    database_url: str,
+    encryption_backend: Optional[BaseEncryptionBackend] = None,
+    backend: DBBackEndEnum = DBBackEndEnum.JSON,
 ):
+    if backend == DBBackEndEnum.SQLITE:
+        return SqliteEngine(db_url=database_url, encryption_backend=encryption_backend)
+
     return EncryptedJsonEngine(
         db_url=database_url, encryption_backend=encryption_backend
     )
 
 
-class DatabaseManager:
-    _instance = None
-    _lock = Lock()
+class EngineRegistry:
+    """
+    Process-wide registry of open engines.
+
+    Engines are keyed by normalized path and encryption mode, so every caller
+    working on the same file shares one engine (and its decrypted cache), while
+    different files never share one. At most `maxsize` engines are kept; the
+    least recently used one is dropped first.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._engines: OrderedDict[tuple, Union[Engine, EncryptedEngine]] = (
+            OrderedDict()
+        )
+        self._lock = Lock()
+
+    @staticmethod
+    def normalize(database_url: str) -> str:
+        return os.path.realpath(os.path.expanduser(str(database_url)))
+
+    def get(
+        self,
+        database_url: str,
+        is_encrypted: bool = False,
+        encryption_backend: Optional[BaseEncryptionBackend] = None,
+        backend: DBBackEndEnum = DBBackEndEnum.JSON,
+    ) -> Union[Engine, EncryptedEngine]:
+        """Return the engine for a file, creating it on first use."""
+        mode = backend.value if is_encrypted else "plain"
+        key = (self.normalize(database_url), mode, encryption_backend)
+
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is not None:
+                self._engines.move_to_end(key)
+                return engine
+
+            if is_encrypted:
+                engine = create_encrypted_engine(
+                    database_url, encryption_backend, backend
+                )
+            else:
+                engine = create_engine(database_url)
+            self._engines[key] = engine
+            logger.debug(f"Opened {mode} engine for {key[0]}.")
+
+            while len(self._engines) > self.maxsize:
+                (evicted, _, _), _ = self._engines.popitem(last=False)
+                logger.debug(f"Evicted engine for {evicted}.")
+            return engine
+
+    def clear(self) -> None:
+        with self._lock:
+            self._engines.clear()
 
-    def __new__(cls, **kwargs):
-        """Implement thread-safe singleton behavior."""
+    def __len__(self) -> int:
+        return len(self._engines)
 
-        if not cls._instance:
-            with cls._lock:
-                if not cls._instance:
-                    logger.debug("Creating the database manager singleton object.")
-                    cls._instance = super().__new__(cls)
 
-        return cls._instance
+engine_registry = EngineRegistry(settings.ENGINE_CACHE_SIZE)
+
+
+class DatabaseManager:
+    """
+    Named engines for one database, resolved through `engine_registry`.
+
+    Managers built for the same path share their engines; managers built for
+    different paths never do.
+    """
 
     def __init__(
         self,
@@ -40,23 +111,13 @@ class DatabaseManager:
         database_url: str,
         is_encrypted: bool = False,
         encryption_backend: Optional[BaseEncryptionBackend] = None,
+        backend: DBBackEndEnum = DBBackEndEnum.JSON,
     ):
-        if getattr(self, "_initialized", False):
-            return
-
-        # Initialize the database engine and session maker only once
-        if not is_encrypted:
-            self._engines = {
-                "default": create_engine(database_url),
-            }
-            logger.debug("Database initialized successfully.")
-        else:
-            self._engines = {
-                "default": create_encrypted_engine(database_url, encryption_backend),
-            }
-            logger.debug("Encrypted database initialized successfully.")
-
-        self._initialized = True
+        self._engines = {
+            "default": engine_registry.get(
+                database_url, is_encrypted, encryption_backend, backend
+            ),
+        }
 
     def get_engine(self, id: Optional[str] = None):
         if id:
@@ -71,12 +132,12 @@ class DatabaseManager:
         db_url: str,
         is_encrypted: bool = False,
         encryption_backend: Optional[BaseEncryptionBackend] = None,
+        backend: DBBackEndEnum = DBBackEndEnum.JSON,
     ):
         if id in self._engines:
             return self._engines[id]
 
-        if is_encrypted:
-            self._engines[id] = create_encrypted_engine(db_url, encryption_backend)
-        else:
-            self._engines[id] = create_engine(db_url)
+        self._engines[id] = engine_registry.get(
+            db_url, is_encrypted, encryption_backend, backend
+        )
         return self._engines[id]
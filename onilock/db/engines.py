@@ -1,9 +1,14 @@
 import os
 import json
 import base64
+import random
+import sqlite3
+import time
+from contextlib import closing, contextmanager
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
 import hashlib
+import hmac
 
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
@@ -11,8 +16,55 @@ from onilock.core.encryption.encryption import (
     BaseEncryptionBackend,
     EncryptionBackendManager,
 )
+from onilock.core.compression import (
+    Compressor,
+    compress,
+    compressor_for_name,
+    compressor_for_tag,
+    decompress,
+    original_size,
+)
+from onilock.core.exceptions import VaultConflictError
+from onilock.core.fileio import FileLock, append_bytes, atomic_write
+from onilock.core.keys import vault_key
 from onilock.core.settings import settings
 from onilock.core.logging_manager import logger
+from onilock.db.records import (
+    RECORD_COLLECTIONS,
+    _copy_profile,
+    apply_delete,
+    apply_put,
+    find_record,
+    record_key,
+)
+from onilock.db.codecs import Codec, codec_for_name, codec_for_tag, get_codec
+from onilock.db.envelope import (
+    BINARY_MAGIC,
+    CODEC_MASK,
+    COMPRESSION_SHIFT,
+    HEADER_SIZE,
+    EnvelopeReader,
+    peek_generation as peek_v4_generation,
+    seal,
+)
+from onilock.db.segments import (
+    HEADER_SEGMENT,
+    PREFIX_SIZE,
+    V3_HEADER,
+    Segment,
+    SegmentedVault,
+    pack,
+    peek_generation as peek_v3_generation,
+    seal_profile,
+    seal_segment,
+    segment_key,
+)
+
+T = TypeVar("T")
+
+
+def _vault_key() -> bytes:
+    return vault_key()
 
 
 class Engine:
@@ -50,6 +102,96 @@ class EncryptedEngine:
     def read(self) -> Dict:
         raise NotImplementedError
 
+    # Record-level API. The defaults fall back to a full read-modify-write;
+    # engines that can address single records override them.
+
+    def read_header(self) -> Dict:
+        """Read the profile fields, without the record collections."""
+        data = self.read()
+        return {k: v for k, v in data.items() if k not in RECORD_COLLECTIONS}
+
+    def _retry_on_conflict(self, operation: Callable[[], T]) -> T:
+        """
+        Run a read-modify-write, starting over with a fresh read whenever
+        another process wrote the vault in between. Gives up after
+        `ONI_WRITE_RETRIES` retries.
+        """
+        attempt = 0
+        while True:
+            try:
+                return operation()
+            except VaultConflictError:
+                if attempt >= settings.WRITE_RETRIES:
+                    raise
+                attempt += 1
+                logger.debug(f"Vault write conflict, retry {attempt}.")
+                time.sleep(random.uniform(0, 0.005 * 2**attempt))
+
+    def update_header(self, **fields: Any) -> None:
+        """Update top-level profile fields."""
+
+        def update() -> None:
+            data = self.read()
+            data.update(fields)
+            self.write(data)
+
+        self._retry_on_conflict(update)
+
+    def get_record(self, collection: str, id: str | int) -> Optional[Dict]:
+        """Return a single record by id or list index, or None."""
+        return find_record(self.read(), collection, id)
+
+    def read_collection(self, collection: str) -> List[Dict]:
+        """Return every record of a collection."""
+        return self.read().get(collection) or []
+
+    def format_info(self) -> Dict[str, Any]:
+        """
+        Describe the stored format, or {} if nothing is stored.
+
+        Keys: `format`, `codec`, `compression` and `ratio` (payload size before
+        compression divided by its stored size).
+        """
+        return {}
+
+    def put_record(self, collection: str, record: Dict) -> None:
+        """Insert or replace a single record."""
+
+        def put() -> None:
+            data = self.read()
+            apply_put(data, collection, record)
+            self.write(data)
+
+        self._retry_on_conflict(put)
+
+    def insert_record(self, collection: str, record: Dict) -> bool:
+        """
+        Insert a single record, unless one with the same id exists. Returns
+        False in that case, leaving the stored record as it is.
+        """
+
+        def insert() -> bool:
+            data = self.read()
+            if find_record(data, collection, record["id"]) is not None:
+                return False
+            apply_put(data, collection, record)
+            self.write(data)
+            return True
+
+        return self._retry_on_conflict(insert)
+
+    def delete_record(self, collection: str, id: str) -> bool:
+        """Delete a single record. Returns False if it does not exist."""
+
+        def delete() -> bool:
+            data = self.read()
+            if not apply_delete(data, collection, id):
+                return False
+            self.write(data)
+            return True
+
+        return self._retry_on_conflict(delete)
+
 
 class JsonEngine(Engine):
     """Json Database Engine."""
@@ -64,8 +206,7 @@ class JsonEngine(Engine):
             logger.debug(f"Parent dir {parent_dir} does not exist. It will be created.")
             os.makedirs(parent_dir)
 
-        with open(self.filepath, "w") as f:
-            json.dump(data, f, indent=4)
+        atomic_write(self.filepath, [json.dumps(data, indent=4).encode()])
 
     def read(self) -> Dict:
         if not os.path.exists(self.filepath):
@@ -79,10 +220,30 @@ class JsonEngine(Engine):
 
 
 class EncryptedJsonEngine(EncryptedEngine):
-    """Versioned encrypted JSON database engine with AEAD v2 format."""
+    """
+    Versioned encrypted JSON database engine with AEAD v2 format.
+
+    With `ONI_VAULT_FORMAT=v3` the vault is written as independently sealed
+    segments instead (see `onilock.db.segments`), and record-level calls only
+    decrypt and re-seal the segments they touch. `ONI_VAULT_FORMAT=v4` writes
+    the compact binary envelope of `onilock.db.envelope`.
+
+    With `ONI_VAULT_JOURNAL` enabled, record-level mutations are appended after
+    the v2 snapshot as individually sealed delta records, one per line. Reads
+    replay them on top of the snapshot, and the journal is folded back into a
+    fresh snapshot once it grows past `ONI_JOURNAL_MAX_BYTES`.
+
+    Reads hold a shared and writes an exclusive lock on a `<vault>.lock`
+    sidecar, and snapshots are committed through a temporary file and a rename.
+    Every write also bumps a generation number stored in the envelope: `write()`
+    refuses to overwrite a vault whose generation moved since this engine last
+    read it and raises `VaultConflictError`, which record-level calls handle by
+    retrying their read-modify-write.
+    """
 
     V2_HEADER = b"ONILOCK_V2\n"
     V2_AAD = b"onilock-v2"
+    JOURNAL_AAD = b"onilock-v2-journal"
 
     def __init__(
         self, db_url: str, encryption_backend: Optional[BaseEncryptionBackend] = None
@@ -90,42 +251,486 @@ class EncryptedJsonEngine(EncryptedEngine):
         super().__init__(db_url, encryption_backend)
         self.filepath = db_url
 
+        # Decrypted content and generation of the file, keyed on its
+        # (inode, mtime_ns, size).
+        self._cache: Optional[tuple[tuple[int, int, int], Dict, int]] = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # Generation of the vault this engine last read or wrote, None if it
+        # has not seen the file yet.
+        self._generation: Optional[int] = None
+        self._lock = FileLock.for_path(db_url)
+
+        self._envelope_reader = EnvelopeReader()
+
+    @staticmethod
+    def _file_identity(stat: os.stat_result) -> tuple[int, int, int]:
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _cache_read(
+        self, identity: tuple[int, int, int], data: Dict, generation: int
+    ) -> None:
+        self._cache = (identity, _copy_profile(data), generation)
+        self._generation = generation
+
+    def _store_cache(self, data: Dict, generation: int) -> None:
+        """Remember data just written by this engine, keyed on the new file identity."""
+        self._generation = generation
+        try:
+            identity = self._file_identity(os.stat(self.filepath))
+        except OSError:
+            self._cache = None
+            return
+        self._cache_read(identity, data, generation)
+
+    def invalidate_cache(self) -> None:
+        self._cache = None
+
+    def cache_stats(self) -> Dict[str, int]:
+        return {"hits": self.cache_hits, "misses": self.cache_misses}
+
     def _serialize(self, data: Dict) -> bytes:
+        """Serialize a journal delta. Deltas are small and always plain JSON."""
         return json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
 
-    def _write_v2(self, data: Dict) -> None:
-        payload = self._serialize(data)
-        key = base64.urlsafe_b64decode(settings.SECRET_KEY.encode())
+    def _v2_aad(self, codec: Codec, compressor: Compressor, generation: int = 0) -> bytes:
+        # Bind a non-default codec, compression or the generation to the
+        # ciphertext; plain, uncompressed json keeps the original AAD.
+        parts = [self.V2_AAD]
+        if codec.name != "json" or compressor.tag or generation:
+            parts.append(codec.name.encode())
+        if compressor.tag or generation:
+            parts.append(compressor.name.encode())
+        if generation:
+            parts.append(str(generation).encode())
+        return b":".join(parts)
+
+    def _write_v2(self, data: Dict, generation: int) -> None:
+        codec = get_codec()
+        compressor, payload = compress(codec.dumps(data))
+        key = _vault_key()
         nonce = os.urandom(12)
-        ciphertext = AESGCM(key).encrypt(nonce, payload, self.V2_AAD)
+        aad = self._v2_aad(codec, compressor, generation)
+        ciphertext = AESGCM(key).encrypt(nonce, payload, aad)
         envelope = {
             "version": 2,
             "alg": "aesgcm",
+            "codec": codec.name,
+            "compression": compressor.name,
+            "generation": generation,
             "nonce": base64.b64encode(nonce).decode(),
-            "aad": base64.b64encode(self.V2_AAD).decode(),
+            "aad": base64.b64encode(aad).decode(),
             "data": base64.b64encode(ciphertext).decode(),
         }
         data_bytes = self.V2_HEADER + json.dumps(envelope, sort_keys=True).encode()
-        Path(self.filepath).write_bytes(data_bytes)
+        atomic_write(self.filepath, [data_bytes])
+        self._store_cache(data, generation)
+
+    def _write_v3(self, data: Dict, generation: int) -> None:
+        key = _vault_key()
+        try:
+            loaded = self._load_v3()
+        except Exception:
+            # Unreadable with the current key (e.g. after a rotation): reseal all.
+            loaded = None
+        codec = get_codec()
+        segments = seal_profile(key, data, codec, loaded[1] if loaded else None)
+        atomic_write(self.filepath, [pack(key, segments, codec, generation)])
+        self._store_cache(data, generation)
+
+    def _write_v4(self, data: Dict, generation: int) -> None:
+        codec = get_codec()
+        compressor, payload = compress(codec.dumps(data))
+        flags = codec.tag | compressor.tag << COMPRESSION_SHIFT
+        header, ciphertext = seal(
+            _vault_key(), payload, flags=flags, generation=generation
+        )
+        atomic_write(self.filepath, [header, ciphertext])
+        self._store_cache(data, generation)
+
+    def _write(self, data: Dict, generation: int) -> None:
+        if settings.VAULT_FORMAT == "v4":
+            self._write_v4(data, generation)
+        elif settings.VAULT_FORMAT == "v3":
+            self._write_v3(data, generation)
+        else:
+            self._write_v2(data, generation)
+
+    def _disk_generation(self) -> int:
+        """Generation of the vault on disk, read without the key. 0 if there is none."""
+        try:
+            f = Path(self.filepath).open("rb")
+        except FileNotFoundError:
+            return 0
+        with f:
+            head = f.read(max(HEADER_SIZE, PREFIX_SIZE))
+            if head.startswith(BINARY_MAGIC):
+                return peek_v4_generation(head)
+            if head.startswith(V3_HEADER):
+                return peek_v3_generation(head)
+            if head.startswith(self.V2_HEADER):
+                raw = head[len(self.V2_HEADER) :] + f.read()
+                snapshot, lines = self._split_v2(raw)
+                return json.loads(snapshot.decode()).get("generation", 0) + len(lines)
+        return 0
 
     def write(self, data: Dict) -> None:
-        """Encrypt data and write to file."""
+        """
+        Encrypt data and write to file.
+
+        Raises `VaultConflictError` if another process wrote the vault after
+        this engine last read it.
+        """
         parent_dir = os.path.dirname(self.filepath)
         if parent_dir and not os.path.exists(parent_dir):
             os.makedirs(parent_dir)
 
-        self._write_v2(data)
+        with self._lock.exclusive():
+            generation = self._disk_generation()
+            if self._generation is not None and generation != self._generation:
+                raise VaultConflictError(str(self.filepath))
+            self._write(data, generation + 1)
+
+    def _load_v3(self) -> Optional[tuple[tuple[int, int, int], SegmentedVault]]:
+        """Parse the segment table of the file if it is a v3 vault."""
+        with self._lock.shared():
+            try:
+                f = Path(self.filepath).open("rb")
+            except FileNotFoundError:
+                return None
+            with f:
+                if f.read(len(V3_HEADER)) != V3_HEADER:
+                    return None
+                identity = self._file_identity(os.fstat(f.fileno()))
+                raw = V3_HEADER + f.read()
+        return identity, SegmentedVault(_vault_key(), raw)
+
+    @contextmanager
+    def _locked_v3(
+        self,
+    ) -> Iterator[Optional[tuple[tuple[int, int, int], SegmentedVault]]]:
+        """
+        Yield the v3 vault on disk if record-level updates can patch it in
+        place (v3 is the configured format and the vault uses the configured
+        codec), or None. The write lock is held until the block exits.
+        """
+        if settings.VAULT_FORMAT != "v3" or not os.path.exists(self.filepath):
+            yield None
+            return
+        with self._lock.exclusive():
+            loaded = self._load_v3()
+            if loaded is not None and loaded[1].codec.name != get_codec().name:
+                loaded = None
+            yield loaded
+
+    def _segments(self) -> Optional[SegmentedVault]:
+        """The v3 vault on disk, unless the read cache can answer instead."""
+        if self._cache is not None:
+            try:
+                identity = self._file_identity(os.stat(self.filepath))
+            except OSError:
+                identity = None
+            if identity == self._cache[0]:
+                return None
+        loaded = self._load_v3()
+        return loaded[1] if loaded else None
+
+    def _advance_cache(
+        self,
+        identity_before: tuple[int, int, int],
+        generation_before: int,
+        delta: Dict,
+    ) -> None:
+        """Keep the read cache in step with our own writes instead of dropping it."""
+        generation = generation_before + 1
+        if self._cache is not None and self._cache[0] == identity_before:
+            self._apply_delta(self._cache[1], delta)
+            self._store_cache(self._cache[1], generation)
+            return
+        self._cache = None
+        # Only move forward if nothing else was written since our last read, so
+        # a stale full write() is still detected as a conflict.
+        if self._generation == generation_before:
+            self._generation = generation
+
+    def _commit_v3(
+        self,
+        identity_before: tuple[int, int, int],
+        vault: SegmentedVault,
+        segments: List[Segment],
+        delta: Dict,
+    ) -> None:
+        generation = vault.generation + 1
+        atomic_write(
+            self.filepath, [pack(_vault_key(), segments, get_codec(), generation)]
+        )
+        self._advance_cache(identity_before, vault.generation, delta)
+
+    def _split_v2(self, data: bytes) -> tuple[bytes, list[bytes]]:
+        """Split the bytes following the v2 header into snapshot and journal lines."""
+        snapshot, _, journal = data.partition(b"\n")
+        return snapshot, [line for line in journal.split(b"\n") if line]
+
+    def _journal_aad(self, snapshot_nonce: bytes, seq: int) -> bytes:
+        # Bind each delta to its snapshot and position so records cannot be
+        # replayed onto another snapshot or reordered.
+        return b":".join([self.JOURNAL_AAD, snapshot_nonce, str(seq).encode()])
+
+    def _apply_delta(self, data: Dict, delta: Dict) -> None:
+        op = delta.get("op")
+        if op == "put":
+            apply_put(data, delta["collection"], delta["record"])
+        elif op == "insert":
+            record = delta["record"]
+            if find_record(data, delta["collection"], record["id"]) is None:
+                apply_put(data, delta["collection"], record)
+        elif op == "delete":
+            apply_delete(data, delta["collection"], delta["id"])
+        elif op == "header":
+            data.update(delta["fields"])
+        else:
+            raise ValueError(f"Unsupported journal operation: {op}")
+
+    def _replay(self, data: Dict, snapshot_nonce: bytes, lines: list[bytes]) -> None:
+        key = _vault_key()
+        for seq, line in enumerate(lines):
+            try:
+                record = json.loads(line.decode())
+            except ValueError:
+                if seq == len(lines) - 1:
+                    logger.warning("Ignoring a torn journal record at the end of the vault.")
+                    return
+                raise ValueError("Corrupted vault journal")
+            plaintext = AESGCM(key).decrypt(
+                base64.b64decode(record["nonce"]),
+                base64.b64decode(record["data"]),
+                self._journal_aad(snapshot_nonce, seq),
+            )
+            self._apply_delta(data, json.loads(plaintext.decode()))
+
+    def _append(self, delta: Dict) -> bool:
+        """
+        Append a sealed delta record to the journal.
+
+        Returns False when journaling does not apply (disabled, or no v2
+        snapshot on disk yet) so the caller can fall back to a full write.
+        """
+        filepath = Path(self.filepath)
+        if (
+            not settings.VAULT_JOURNAL
+            or settings.VAULT_FORMAT != "v2"
+            or not filepath.exists()
+        ):
+            return False
+
+        # Deltas apply to whatever the vault holds when they are replayed, so
+        # appending under the write lock cannot lose a concurrent change.
+        with self._lock.exclusive():
+            with filepath.open("rb") as f:
+                identity_before = self._file_identity(os.fstat(f.fileno()))
+                raw = f.read()
+            if not raw.startswith(self.V2_HEADER):
+                return False
+
+            snapshot, lines = self._split_v2(raw[len(self.V2_HEADER) :])
+            if lines:
+                try:
+                    json.loads(lines[-1].decode())
+                except ValueError:
+                    # A torn record must stay last; fold the journal before appending.
+                    self.compact()
+                    return self._append(delta)
+
+            envelope = json.loads(snapshot.decode())
+            snapshot_nonce = base64.b64decode(envelope["nonce"])
+            nonce = os.urandom(12)
+            ciphertext = AESGCM(_vault_key()).encrypt(
+                nonce,
+                self._serialize(delta),
+                self._journal_aad(snapshot_nonce, len(lines)),
+            )
+            record = {
+                "nonce": base64.b64encode(nonce).decode(),
+                "data": base64.b64encode(ciphertext).decode(),
+            }
+            line = b"\n" + json.dumps(record, sort_keys=True).encode()
+            append_bytes(filepath, line)
+
+            generation_before = envelope.get("generation", 0) + len(lines)
+            self._advance_cache(identity_before, generation_before, delta)
+
+            journal_size = len(raw) - len(self.V2_HEADER) - len(snapshot) + len(line)
+            if journal_size > settings.JOURNAL_MAX_BYTES:
+                logger.debug(f"Vault journal reached {journal_size} bytes, compacting.")
+                self.compact()
+        return True
+
+    def compact(self) -> None:
+        """Fold journaled deltas back into a single snapshot."""
+        if not os.path.exists(self.filepath):
+            return
+        with self._lock.exclusive():
+            data = self.read()
+            if data:
+                self.write(data)
+
+    def read_header(self) -> Dict:
+        vault = self._segments()
+        if vault is None:
+            return super().read_header()
+        return {k: v for k, v in vault.header().items() if k not in RECORD_COLLECTIONS}
+
+    def get_record(self, collection: str, id: str | int) -> Optional[Dict]:
+        vault = self._segments()
+        if vault is None:
+            return super().get_record(collection, id)
+        segment = vault.find(collection, id)
+        return vault.open(segment) if segment is not None else None
+
+    def read_collection(self, collection: str) -> List[Dict]:
+        vault = self._segments()
+        if vault is None:
+            return super().read_collection(collection)
+        return vault.records(collection)
+
+    def put_record(self, collection: str, record: Dict) -> None:
+        delta = {"op": "put", "collection": collection, "record": record}
+        with self._locked_v3() as loaded:
+            if loaded is not None:
+                identity, vault = loaded
+                key = _vault_key()
+                rkey = segment_key(key, collection, record["id"])
+                previous = vault.by_key().get((collection, rkey))
+                segment = seal_segment(
+                    key, collection, rkey, record, vault.codec, previous
+                )
+                self._commit_v3(identity, vault, vault.replace(segment), delta)
+                return
+        if not self._append(delta):
+            super().put_record(collection, record)
+
+    def insert_record(self, collection: str, record: Dict) -> bool:
+        delta = {"op": "insert", "collection": collection, "record": record}
+        with self._locked_v3() as loaded:
+            if loaded is not None:
+                identity, vault = loaded
+                if vault.find(collection, record["id"]) is not None:
+                    return False
+                key = _vault_key()
+                rkey = segment_key(key, collection, record["id"])
+                segment = seal_segment(key, collection, rkey, record, vault.codec)
+                self._commit_v3(identity, vault, vault.replace(segment), delta)
+                return True
+
+        if not settings.VAULT_JOURNAL:
+            return super().insert_record(collection, record)
+
+        if find_record(self.read(), collection, record["id"]) is not None:
+            return False
+        # Replayed as an insert, so a record added concurrently is kept.
+        if not self._append(delta):
+            return super().insert_record(collection, record)
+        return True
+
+    def delete_record(self, collection: str, id: str) -> bool:
+        with self._locked_v3() as loaded:
+            if loaded is not None:
+                identity, vault = loaded
+                segment = vault.find(collection, id)
+                if segment is None:
+                    return False
+                segments = [s for s in vault.segments if s is not segment]
+                delta = {"op": "delete", "collection": collection, "id": id}
+                self._commit_v3(identity, vault, segments, delta)
+                return True
+
+        if not settings.VAULT_JOURNAL:
+            return super().delete_record(collection, id)
 
-    def _read_v2(self, data: bytes) -> Dict:
-        envelope = json.loads(data.decode())
+        if find_record(self.read(), collection, id) is None:
+            return False
+        delta = {"op": "delete", "collection": collection, "id": id}
+        if not self._append(delta):
+            return super().delete_record(collection, id)
+        return True
+
+    def update_header(self, **fields: Any) -> None:
+        delta = {"op": "header", "fields": fields}
+        with self._locked_v3() as loaded:
+            if loaded is not None:
+                identity, vault = loaded
+                header = vault.header()
+                header.update(fields)
+                previous = vault.by_key().get((HEADER_SEGMENT, ""))
+                segment = seal_segment(
+                    _vault_key(), HEADER_SEGMENT, "", header, vault.codec, previous
+                )
+                self._commit_v3(identity, vault, vault.replace(segment), delta)
+                return
+        if not self._append(delta):
+            super().update_header(**fields)
+
+    def _open_v2(self, snapshot: bytes) -> tuple[bytes, int, Codec, Compressor, bytes]:
+        """
+        Decrypt a v2 snapshot. Returns its nonce, generation, codec,
+        compression and payload.
+        """
+        envelope = json.loads(snapshot.decode())
         if envelope.get("version") != 2 or envelope.get("alg") != "aesgcm":
             raise ValueError("Unsupported vault format")
+        codec = codec_for_name(envelope.get("codec", "json"))
+        compressor = compressor_for_name(envelope.get("compression", "none"))
+        generation = envelope.get("generation", 0)
         nonce = base64.b64decode(envelope["nonce"])
         aad = base64.b64decode(envelope["aad"])
+        if aad != self._v2_aad(codec, compressor, generation):
+            raise ValueError("Vault codec does not match its envelope")
         ciphertext = base64.b64decode(envelope["data"])
-        key = base64.urlsafe_b64decode(settings.SECRET_KEY.encode())
-        plaintext = AESGCM(key).decrypt(nonce, ciphertext, aad)
-        return json.loads(plaintext.decode())
+        payload = AESGCM(_vault_key()).decrypt(nonce, ciphertext, aad)
+        return nonce, generation, codec, compressor, payload
+
+    def _read_v2(self, data: bytes) -> tuple[Dict, int]:
+        """Decrypt a v2 snapshot and replay its journal. Returns data and generation."""
+        snapshot, journal = self._split_v2(data)
+        nonce, generation, codec, compressor, payload = self._open_v2(snapshot)
+        result = codec.loads(decompress(compressor, payload))
+        if journal:
+            self._replay(result, nonce, journal)
+        return result, generation + len(journal)
+
+    def format_info(self) -> Dict[str, Any]:
+        try:
+            f = Path(self.filepath).open("rb")
+        except FileNotFoundError:
+            return {}
+        with f:
+            head = f.read(len(self.V2_HEADER))
+            if head.startswith(BINARY_MAGIC):
+                f.seek(0)
+                flags, _, payload = self._envelope_reader.open(f, _vault_key())
+                fmt = "v4"
+                codec = codec_for_tag(flags & CODEC_MASK)
+                compressor = compressor_for_tag(flags >> COMPRESSION_SHIFT)
+            elif head == self.V2_HEADER:
+                _, _, codec, compressor, payload = self._open_v2(f.readline())
+                fmt = "v2"
+            else:
+                payload = None
+
+        if payload is not None:
+            return {
+                "format": fmt,
+                "codec": codec.name,
+                "compression": compressor.name,
+                "ratio": original_size(compressor, payload) / max(len(payload), 1),
+            }
+        if head == V3_HEADER:
+            _, vault = self._load_v3()
+            info = {"format": "v3", "codec": vault.codec.name}
+        else:
+            info = {"format": "v1", "codec": "json"}
+        return {**info, "compression": "none", "ratio": 1.0}
 
     def _read_v1(self, encrypted_data: bytes) -> Dict:
         # Decrypt data using legacy GPG backend
@@ -151,22 +756,334 @@ class EncryptedJsonEngine(EncryptedEngine):
 
         return json.loads(data)
 
-    def read(self) -> Dict:
-        """Read and decrypt data from file."""
+    def _read(self) -> tuple[Dict, bool]:
+        """Read the vault under the read lock. Returns data and whether it is legacy v1."""
         filepath = Path(self.filepath)
 
-        if not filepath.exists():
+        try:
+            f = filepath.open("rb")
+        except FileNotFoundError:
             logger.debug(f"File {filepath} does not exist. Returning an empty dict.")
-            return dict()
+            self._cache = None
+            self._generation = 0
+            return dict(), False
+
+        with f:
+            identity = self._file_identity(os.fstat(f.fileno()))
+            if self._cache is not None and self._cache[0] == identity:
+                self.cache_hits += 1
+                self._generation = self._cache[2]
+                return _copy_profile(self._cache[1]), False
+
+            self.cache_misses += 1
+            magic = f.read(len(BINARY_MAGIC))
+            if magic == BINARY_MAGIC:
+                f.seek(0)
+                flags, generation, payload = self._envelope_reader.open(
+                    f, _vault_key()
+                )
+                compressor = compressor_for_tag(flags >> COMPRESSION_SHIFT)
+                codec = codec_for_tag(flags & CODEC_MASK)
+                data = codec.loads(decompress(compressor, payload))
+                self._cache_read(identity, data, generation)
+                return data, False
+            raw = magic + f.read()
+
+        if raw.startswith(V3_HEADER):
+            vault = SegmentedVault(_vault_key(), raw)
+            data = vault.to_dict()
+            self._cache_read(identity, data, vault.generation)
+            return data, False
 
-        raw = filepath.read_bytes()
         if raw.startswith(self.V2_HEADER):
-            return self._read_v2(raw[len(self.V2_HEADER) :])
+            data, generation = self._read_v2(raw[len(self.V2_HEADER) :])
+            self._cache_read(identity, data, generation)
+            return data, False
 
-        # Legacy v1: migrate on successful read.
-        data = self._read_v1(raw)
-        try:
-            self._write_v2(data)
-        except Exception:
-            pass
+        self._cache = None
+        self._generation = 0
+        return self._read_v1(raw), True
+
+    def read(self) -> Dict:
+        """
+        Read and decrypt data from file.
+
+        Decrypted content is cached in-process and reused as long as the file's
+        inode, mtime and size are unchanged. Binary (v4) envelopes are read
+        straight from the file into a reusable buffer.
+        """
+        with self._lock.shared():
+            data, legacy = self._read()
+
+        if legacy:
+            # Legacy v1: migrate on successful read.
+            try:
+                self.write(data)
+            except Exception:
+                pass
         return data
+
+
+class SqliteEngine(EncryptedEngine):
+    """
+    SQLite database engine storing each record as its own AEAD-sealed row.
+
+    The profile fields live in a single sealed `header` row, and every account
+    and file is sealed separately in `records`, so single-record operations
+    only decrypt and re-encrypt the row they touch. Record ids are never stored
+    in clear: rows are addressed by an HMAC of the normalized id.
+
+    Every write transaction bumps the counter in the `generation` table, and
+    `write()` raises `VaultConflictError` when it moved since this engine last
+    read the vault, instead of replacing rows another process just wrote.
+    """
+
+    SQLITE_MAGIC = b"SQLite format 3\x00"
+    AAD_PREFIX = b"onilock-sqlite"
+    SCHEMA_VERSION = 2
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS header (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            nonce BLOB NOT NULL,
+            data BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS records (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            collection TEXT NOT NULL,
+            key TEXT NOT NULL,
+            nonce BLOB NOT NULL,
+            data BLOB NOT NULL,
+            UNIQUE (collection, key)
+        );
+        CREATE TABLE IF NOT EXISTS generation (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO generation (id, value) VALUES (1, 0);
+    """
+
+    def __init__(
+        self, db_url: str, encryption_backend: Optional[BaseEncryptionBackend] = None
+    ):
+        super().__init__(db_url, encryption_backend)
+        self.filepath = db_url
+
+        # Generation of the vault this engine last read or wrote, None if it
+        # has not seen the database yet.
+        self._generation: Optional[int] = None
+
+    def _row_key(self, collection: str, id: str) -> str:
+        index_key = hmac.new(_vault_key(), b"onilock-sqlite-index", "sha256").digest()
+        message = f"{collection}\x00{record_key(collection, id)}".encode()
+        return hmac.new(index_key, message, "sha256").hexdigest()
+
+    def _aad(self, collection: str, key: str) -> bytes:
+        return b":".join([self.AAD_PREFIX, collection.encode(), key.encode()])
+
+    def _seal(self, data: Dict, aad: bytes) -> tuple[bytes, bytes]:
+        nonce = os.urandom(12)
+        payload = json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+        return nonce, AESGCM(_vault_key()).encrypt(nonce, payload, aad)
+
+    def _open(self, nonce: bytes, ciphertext: bytes, aad: bytes) -> Dict:
+        plaintext = AESGCM(_vault_key()).decrypt(nonce, ciphertext, aad)
+        return json.loads(plaintext.decode())
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        (version,) = conn.execute("PRAGMA user_version").fetchone()
+        if version == self.SCHEMA_VERSION:
+            return
+        conn.executescript(self.SCHEMA)
+        conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def _read_generation(self, conn: sqlite3.Connection) -> int:
+        (generation,) = conn.execute(
+            "SELECT value FROM generation WHERE id = 1"
+        ).fetchone()
+        return generation
+
+    def _migrate_legacy(self) -> None:
+        """Convert an existing JSON vault at this path into a SQLite vault."""
+        logger.info(f"Migrating {self.filepath} to the SQLite storage engine.")
+        data = EncryptedJsonEngine(self.filepath, self._encryption_backend).read()
+        tmp_path = f"{self.filepath}.migrating"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        with closing(sqlite3.connect(tmp_path, isolation_level=None)) as conn:
+            self._create_schema(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            self._write_all(conn, data)
+            conn.execute("COMMIT")
+        os.replace(tmp_path, self.filepath)
+
+    @contextmanager
+    def _transaction(self, write: bool = False) -> Iterator[sqlite3.Connection]:
+        parent_dir = os.path.dirname(self.filepath)
+        if write and parent_dir and not os.path.exists(parent_dir):
+            os.makedirs(parent_dir)
+
+        filepath = Path(self.filepath)
+        if filepath.exists() and filepath.stat().st_size:
+            with filepath.open("rb") as f:
+                magic = f.read(len(self.SQLITE_MAGIC))
+            if magic != self.SQLITE_MAGIC:
+                self._migrate_legacy()
+
+        with closing(
+            sqlite3.connect(self.filepath, timeout=30, isolation_level=None)
+        ) as conn:
+            self._create_schema(conn)
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield conn
+                if write:
+                    generation = self._read_generation(conn)
+                    conn.execute(
+                        "UPDATE generation SET value = ? WHERE id = 1",
+                        (generation + 1,),
+                    )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+        # Follow our own writes, unless another process wrote in between.
+        if write and self._generation == generation:
+            self._generation = generation + 1
+
+    def _read_header_row(self, conn: sqlite3.Connection) -> Optional[Dict]:
+        row = conn.execute("SELECT nonce, data FROM header WHERE id = 1").fetchone()
+        if row is None:
+            return None
+        return self._open(row[0], row[1], self._aad("header", ""))
+
+    def _write_header_row(self, conn: sqlite3.Connection, header: Dict) -> None:
+        nonce, ciphertext = self._seal(header, self._aad("header", ""))
+        conn.execute(
+            "INSERT INTO header (id, nonce, data) VALUES (1, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET nonce = excluded.nonce, data = excluded.data",
+            (nonce, ciphertext),
+        )
+
+    def _put_row(self, conn: sqlite3.Connection, collection: str, record: Dict) -> None:
+        key = self._row_key(collection, record["id"])
+        nonce, ciphertext = self._seal(record, self._aad(collection, key))
+        conn.execute(
+            "INSERT INTO records (collection, key, nonce, data) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (collection, key) DO UPDATE "
+            "SET nonce = excluded.nonce, data = excluded.data",
+            (collection, key, nonce, ciphertext),
+        )
+
+    def _write_all(self, conn: sqlite3.Connection, data: Dict) -> None:
+        conn.execute("DELETE FROM header")
+        conn.execute("DELETE FROM records")
+        if not data:
+            return
+        header = {k: ([] if k in RECORD_COLLECTIONS else v) for k, v in data.items()}
+        self._write_header_row(conn, header)
+        for collection in RECORD_COLLECTIONS:
+            for record in data.get(collection) or []:
+                self._put_row(conn, collection, record)
+
+    def write(self, data: Dict) -> None:
+        """
+        Replace the whole vault content.
+
+        Raises `VaultConflictError` if another process wrote the vault after
+        this engine last read it.
+        """
+        with self._transaction(write=True) as conn:
+            generation = self._read_generation(conn)
+            if self._generation is not None and generation != self._generation:
+                raise VaultConflictError(str(self.filepath))
+            self._generation = generation
+            self._write_all(conn, data)
+
+    def read(self) -> Dict:
+        """Read and decrypt the whole vault."""
+        if not os.path.exists(self.filepath):
+            return dict()
+
+        with self._transaction() as conn:
+            self._generation = self._read_generation(conn)
+            header = self._read_header_row(conn)
+            if header is None:
+                return dict()
+            rows = conn.execute(
+                "SELECT collection, key, nonce, data FROM records ORDER BY seq"
+            ).fetchall()
+
+        data = dict(header)
+        for collection, key, nonce, ciphertext in rows:
+            record = self._open(nonce, ciphertext, self._aad(collection, key))
+            data.setdefault(collection, []).append(record)
+        return data
+
+    def format_info(self) -> Dict[str, Any]:
+        if not os.path.exists(self.filepath):
+            return {}
+        return {"format": "sqlite", "codec": "json", "compression": "none", "ratio": 1.0}
+
+    def read_header(self) -> Dict:
+        if not os.path.exists(self.filepath):
+            return dict()
+
+        with self._transaction() as conn:
+            header = self._read_header_row(conn)
+        if header is None:
+            return dict()
+        return {k: v for k, v in header.items() if k not in RECORD_COLLECTIONS}
+
+    def update_header(self, **fields: Any) -> None:
+        with self._transaction(write=True) as conn:
+            header = self._read_header_row(conn) or {}
+            header.update(fields)
+            self._write_header_row(conn, header)
+
+    def get_record(self, collection: str, id: str | int) -> Optional[Dict]:
+        if not os.path.exists(self.filepath):
+            return None
+
+        with self._transaction() as conn:
+            if isinstance(id, int):
+                order, offset = ("ASC", id) if id >= 0 else ("DESC", -id - 1)
+                row = conn.execute(
+                    "SELECT key, nonce, data FROM records WHERE collection = ? "
+                    f"ORDER BY seq {order} LIMIT 1 OFFSET ?",
+                    (collection, offset),
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    "SELECT key, nonce, data FROM records "
+                    "WHERE collection = ? AND key = ?",
+                    (collection, self._row_key(collection, id)),
+                ).fetchone()
+
+        if row is None:
+            return None
+        key, nonce, ciphertext = row
+        return self._open(nonce, ciphertext, self._aad(collection, key))
+
+    def put_record(self, collection: str, record: Dict) -> None:
+        with self._transaction(write=True) as conn:
+            self._put_row(conn, collection, record)
+
+    def insert_record(self, collection: str, record: Dict) -> bool:
+        key = self._row_key(collection, record["id"])
+        nonce, ciphertext = self._seal(record, self._aad(collection, key))
+        with self._transaction(write=True) as conn:
+            cursor = conn.execute(
+                "INSERT INTO records (collection, key, nonce, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (collection, key) DO NOTHING",
+                (collection, key, nonce, ciphertext),
+            )
+        return cursor.rowcount > 0
+
+    def delete_record(self, collection: str, id: str) -> bool:
+        with self._transaction(write=True) as conn:
+            cursor = conn.execute(
+                "DELETE FROM records WHERE collection = ? AND key = ?",
+                (collection, self._row_key(collection, id)),
+            )
+        return cursor.rowcount > 0
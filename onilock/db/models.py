@@ -1,8 +1,13 @@
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from pydantic import BaseModel, Field, PrivateAttr
 
 from onilock.core.logging_manager import logger
+from onilock.core.similarity import BANDS, THRESHOLD, band, similarity
 from onilock.core.utils import naive_utcnow
+from onilock.db.records import record_key
 
 
 # @TODO : Rename to Account
@@ -11,6 +16,12 @@ class Account(BaseModel):
     username: str = Field(default="", description="Username")
     encrypted_password: str = Field(description="Encrypted Password")
     is_weak_password: bool = Field(default=True, description="Password is weak")
+    password_fingerprint: Optional[str] = Field(
+        default=None, description="Keyed password fingerprint"
+    )
+    password_sketch: Optional[str] = Field(
+        default=None, description="Keyed password similarity sketch"
+    )
     url: Optional[str] = Field(default=None, description="URL or Service name")
     description: Optional[str] = Field(default=None, description="Description")
     created_at: int = Field(description="Creation date")
@@ -25,6 +36,100 @@ class File(BaseModel):
     host: str = Field(description="Owner Host")
 
 
+def url_host(url: Optional[str]) -> str:
+    """Lowercase host of a URL. Bare service names are treated as hosts."""
+    if not url:
+        return ""
+    try:
+        host = urlsplit(url if "://" in url else f"//{url}").hostname
+    except ValueError:
+        return ""
+    return host or ""
+
+
+class RecordIndex:
+    """
+    Hash indexes over one record list of a profile.
+
+    Records are indexed by normalized id, and optionally by secondary keys
+    which are only built when first queried. The index remembers the list it
+    was built from and its length, so a list that is replaced or resized
+    without going through the index is detected and the index rebuilt.
+    Records changed in place are not: change them through the profile (see
+    `Profile.update_account`), which drops the index.
+    """
+
+    def __init__(
+        self,
+        collection: str,
+        records: list,
+        secondary: Optional[Dict[str, Callable]] = None,
+    ):
+        self.collection = collection
+        self.records = records
+        self.size = len(records)
+        self.by_id: Dict[str, BaseModel] = {}
+        for record in records:
+            self.by_id.setdefault(record_key(collection, record.id), record)
+        self._key_funcs = secondary or {}
+        self._secondary: Dict[str, Dict[str, list]] = {}
+
+    def is_current(self, records: list) -> bool:
+        return records is self.records and len(records) == self.size
+
+    def lookup(self, name: str, value: str) -> list:
+        """Records whose secondary key `name` equals `value`, in list order."""
+        index = self._secondary.get(name)
+        if index is None:
+            key_func = self._key_funcs[name]
+            index = defaultdict(list)
+            for record in self.records:
+                index[key_func(record)].append(record)
+            self._secondary[name] = index
+        return list(index.get(value, ()))
+
+    def add(self, record: BaseModel) -> None:
+        self.records.append(record)
+        self.size += 1
+        self.by_id.setdefault(record_key(self.collection, record.id), record)
+        for name, index in self._secondary.items():
+            index[self._key_funcs[name](record)].append(record)
+
+    def remove(self, id: str) -> Optional[BaseModel]:
+        """Remove the first record with this id. Returns it, or None."""
+        key = record_key(self.collection, id)
+        record = self.by_id.pop(key, None)
+        if record is None:
+            return None
+
+        position = next(i for i, r in enumerate(self.records) if r is record)
+        del self.records[position]
+        self.size -= 1
+        # Duplicate ids are possible in old vaults: the next one takes over.
+        for other in self.records[position:]:
+            if record_key(self.collection, other.id) == key:
+                self.by_id[key] = other
+                break
+
+        for name, index in self._secondary.items():
+            bucket = index[self._key_funcs[name](record)]
+            bucket[:] = [r for r in bucket if r is not record]
+        return record
+
+
+ACCOUNT_KEYS: Dict[str, Callable] = {
+    "host": lambda account: url_host(account.url),
+    "username": lambda account: account.username.lower(),
+    "fingerprint": lambda account: account.password_fingerprint or "",
+    **{
+        f"band{number}": (
+            lambda account, number=number: band(account.password_sketch or "", number)
+        )
+        for number in range(BANDS)
+    },
+}
+
+
 class Profile(BaseModel):
     name: str
     master_password: str = Field(description="Hashed Master Password")
@@ -35,6 +140,19 @@ class Profile(BaseModel):
     accounts: List[Account]
     files: List[File] = Field(default_factory=list)
 
+    _indexes: Dict[str, RecordIndex] = PrivateAttr(default_factory=dict)
+
+    def _index(self, collection: str) -> RecordIndex:
+        """The index of a collection, (re)built on first use after a change."""
+        records = getattr(self, collection)
+        index = self._indexes.get(collection)
+        if index is None or not index.is_current(records):
+            secondary = ACCOUNT_KEYS if collection == "accounts" else None
+            index = self._indexes[collection] = RecordIndex(
+                collection, records, secondary
+            )
+        return index
+
     def get_account(self, id: str | int) -> Account | None:
         if isinstance(id, int):
             try:
@@ -43,16 +161,55 @@ class Profile(BaseModel):
                 logger.error("Invalid account index")
                 return None
 
-        for account in self.accounts:
-            if account.id.lower() == id.lower():
-                return account
-        return None
+        return self._index("accounts").by_id.get(id.lower())
+
+    def add_account(self, account: Account) -> None:
+        self._index("accounts").add(account)
+
+    def update_account(self, account: Account, **fields) -> None:
+        """Set fields of one of the profile's accounts, rebuilding its indexes."""
+        for name, value in fields.items():
+            setattr(account, name, value)
+        self._indexes.pop("accounts", None)
 
     def remove_account(self, id: str):
-        for index, password in enumerate(self.accounts):
-            if password.id.lower() == id.lower():
-                del self.accounts[index]
-                break
+        self._index("accounts").remove(id)
+
+    def find_accounts(
+        self, host: Optional[str] = None, username: Optional[str] = None
+    ) -> List[Account]:
+        """Accounts matching a URL host and/or a username, both case-insensitive."""
+        index = self._index("accounts")
+        matches = None
+        if host is not None:
+            matches = index.lookup("host", url_host(host))
+        if username is not None:
+            by_username = index.lookup("username", username.lower())
+            if matches is None:
+                matches = by_username
+            else:
+                ids = {id(account) for account in by_username}
+                matches = [account for account in matches if id(account) in ids]
+        return matches if matches is not None else list(self.accounts)
+
+    def accounts_with_password(self, fingerprint: str) -> List[Account]:
+        """Accounts whose password has this fingerprint (see `password_fingerprint`)."""
+        return self._index("accounts").lookup("fingerprint", fingerprint)
+
+    def similar_accounts(self, sketch: str) -> List[Account]:
+        """Accounts whose password is a near-duplicate (see `password_sketch`)."""
+        if not sketch:
+            return []
+        index = self._index("accounts")
+        candidates = {}
+        for number in range(BANDS):
+            for account in index.lookup(f"band{number}", band(sketch, number)):
+                candidates[id(account)] = account
+        return [
+            account
+            for account in candidates.values()
+            if similarity(sketch, account.password_sketch or "") >= THRESHOLD
+        ]
 
     def get_file(self, id: str | int):
         if isinstance(id, int):
@@ -62,13 +219,10 @@ class Profile(BaseModel):
                 logger.error("Invalid file index")
                 return None
 
-        for file in self.files:
-            if file.id == id:
-                return file
-        return None
+        return self._index("files").by_id.get(id)
+
+    def add_file(self, file: File) -> None:
+        self._index("files").add(file)
 
     def remove_file(self, id: str):
-        for index, file in enumerate(self.files):
-            if file.id == id:
-                del self.files[index]
-                break
+        self._index("files").remove(id)
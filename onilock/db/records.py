@@ -0,0 +1,68 @@
+from typing import Dict, Optional
+
+
+# Record collections stored inside a profile. Each record is a dict with an `id`.
+RECORD_COLLECTIONS = ("accounts", "files")
+
+
+def record_key(collection: str, id: str) -> str:
+    """Normalize a record id the same way `Profile` lookups do."""
+    if collection == "accounts":
+        return id.lower()
+    return id
+
+
+def find_record(data: Dict, collection: str, id: str | int) -> Optional[Dict]:
+    """Find a record by id (or list index) inside a profile dict."""
+    records = data.get(collection, [])
+    if isinstance(id, int):
+        try:
+            return records[id]
+        except IndexError:
+            return None
+
+    key = record_key(collection, id)
+    for record in records:
+        if record_key(collection, record["id"]) == key:
+            return record
+    return None
+
+
+def apply_put(data: Dict, collection: str, record: Dict) -> None:
+    """Insert a record into a profile dict, replacing any record with the same id."""
+    records = data.setdefault(collection, [])
+    key = record_key(collection, record["id"])
+    for index, existing in enumerate(records):
+        if record_key(collection, existing["id"]) == key:
+            records[index] = record
+            return
+    records.append(record)
+
+
+def apply_delete(data: Dict, collection: str, id: str) -> bool:
+    """Remove a record from a profile dict. Returns False if it was not found."""
+    records = data.get(collection, [])
+    key = record_key(collection, id)
+    for index, existing in enumerate(records):
+        if record_key(collection, existing["id"]) == key:
+            del records[index]
+            return True
+    return False
+
+
+def _copy_profile(data: Dict) -> Dict:
+    """
+    Copy a profile dict down to its records.
+
+    Profile and setup documents are at most two levels deep (records only hold
+    scalars), so copying the top-level dict, its lists and their dicts is enough
+    to keep callers from mutating a cached value, at a fraction of a deep copy.
+    """
+    copied = {}
+    for key, value in data.items():
+        if isinstance(value, list):
+            value = [item.copy() if isinstance(item, dict) else item for item in value]
+        elif isinstance(value, dict):
+            value = value.copy()
+        copied[key] = value
+    return copied
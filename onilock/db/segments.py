@@ -0,0 +1,264 @@
+"""
+Segmented (v3) vault layout.
+
+A v3 vault is a single file made of independently sealed segments: one for the
+profile header and one per account and file record. An AES-GCM sealed segment
+table maps each segment to its offset, nonce and a keyed digest of its
+plaintext, so readers only decrypt the segments they need and writers keep the
+ciphertext of unchanged segments byte for byte.
+
+Layout::
+
+    ONILOCK_V3\\n
+    table length (4 bytes, big endian) | generation (8 bytes) |
+    table nonce (12 bytes) | sealed table
+    segment ciphertexts, back to back
+
+The generation increases with every write. It is stored in clear, so writers
+can detect conflicts without the key, and bound to the table as associated
+data.
+"""
+
+import hmac
+import os
+import struct
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from onilock.db.codecs import Codec, JsonCodec, codec_for_name
+from onilock.db.records import RECORD_COLLECTIONS, record_key
+
+
+V3_HEADER = b"ONILOCK_V3\n"
+TABLE_AAD = b"onilock-v3-table"
+SEGMENT_AAD = b"onilock-v3"
+HEADER_SEGMENT = "header"
+
+_TABLE_PREFIX = struct.Struct(">IQ12s")
+PREFIX_SIZE = len(V3_HEADER) + _TABLE_PREFIX.size
+_TABLE_CODEC = JsonCodec()
+
+
+class Segment(NamedTuple):
+    kind: str
+    key: str
+    nonce: bytes
+    digest: str
+    ciphertext: bytes
+
+
+def _subkey(vault_key: bytes, label: bytes) -> bytes:
+    return hmac.new(vault_key, label, "sha256").digest()
+
+
+def segment_key(vault_key: bytes, collection: str, id: str) -> str:
+    """Address a record by a keyed HMAC of its normalized id."""
+    message = f"{collection}\x00{record_key(collection, id)}".encode()
+    return hmac.new(
+        _subkey(vault_key, b"onilock-v3-index"), message, "sha256"
+    ).hexdigest()
+
+
+def _table_aad(generation: int) -> bytes:
+    return b":".join([TABLE_AAD, str(generation).encode()])
+
+
+def peek_generation(raw: bytes) -> int:
+    """Read the generation of v3 file content, without decrypting."""
+    if len(raw) < PREFIX_SIZE:
+        raise ValueError("Truncated vault table")
+    return _TABLE_PREFIX.unpack_from(raw, len(V3_HEADER))[1]
+
+
+def _segment_aad(kind: str, key: str, digest: str) -> bytes:
+    return b":".join([SEGMENT_AAD, kind.encode(), key.encode(), digest.encode()])
+
+
+def seal_segment(
+    vault_key: bytes,
+    kind: str,
+    key: str,
+    data: Dict,
+    codec: Codec,
+    previous: Optional[Segment] = None,
+) -> Segment:
+    """
+    Seal one segment, reusing `previous` when its plaintext did not change.
+
+    The digest is keyed, so the table does not leak equality of plaintexts to
+    anyone without the vault key.
+    """
+    payload = codec.dumps(data)
+    message = b"\x00".join([kind.encode(), key.encode(), payload])
+    digest = hmac.new(
+        _subkey(vault_key, b"onilock-v3-digest"), message, "sha256"
+    ).hexdigest()
+    if previous is not None and previous.digest == digest:
+        return previous
+
+    nonce = os.urandom(12)
+    ciphertext = AESGCM(vault_key).encrypt(
+        nonce, payload, _segment_aad(kind, key, digest)
+    )
+    return Segment(kind, key, nonce, digest, ciphertext)
+
+
+def seal_profile(
+    vault_key: bytes,
+    data: Dict,
+    codec: Codec,
+    previous: Optional["SegmentedVault"] = None,
+) -> List[Segment]:
+    """Split a profile dict into sealed segments."""
+    reusable = {}
+    if previous is not None and previous.codec.name == codec.name:
+        reusable = previous.by_key()
+
+    # Keep empty collections in the header so they survive a round trip.
+    header = {k: ([] if k in RECORD_COLLECTIONS else v) for k, v in data.items()}
+    segments = [
+        seal_segment(
+            vault_key,
+            HEADER_SEGMENT,
+            "",
+            header,
+            codec,
+            reusable.get((HEADER_SEGMENT, "")),
+        )
+    ]
+    for collection in RECORD_COLLECTIONS:
+        for record in data.get(collection) or []:
+            key = segment_key(vault_key, collection, record["id"])
+            segments.append(
+                seal_segment(
+                    vault_key,
+                    collection,
+                    key,
+                    record,
+                    codec,
+                    reusable.get((collection, key)),
+                )
+            )
+    return segments
+
+
+def pack(
+    vault_key: bytes,
+    segments: Iterable[Segment],
+    codec: Codec,
+    generation: int = 0,
+) -> bytes:
+    """Serialize segments and their sealed table into v3 file content."""
+    entries = []
+    body = bytearray()
+    for segment in segments:
+        entries.append(
+            [
+                segment.kind,
+                segment.key,
+                len(body),
+                len(segment.ciphertext),
+                segment.nonce.hex(),
+                segment.digest,
+            ]
+        )
+        body += segment.ciphertext
+
+    nonce = os.urandom(12)
+    table = {"version": 3, "codec": codec.name, "segments": entries}
+    sealed_table = AESGCM(vault_key).encrypt(
+        nonce, _TABLE_CODEC.dumps(table), _table_aad(generation)
+    )
+    prefix = _TABLE_PREFIX.pack(len(sealed_table), generation, nonce)
+    return b"".join([V3_HEADER, prefix, sealed_table, body])
+
+
+class SegmentedVault:
+    """
+    Parsed v3 vault.
+
+    Only the segment table is decrypted up front; segments are decrypted on
+    access.
+    """
+
+    def __init__(self, vault_key: bytes, raw: bytes):
+        if not raw.startswith(V3_HEADER):
+            raise ValueError("Not a v3 vault")
+        self.vault_key = vault_key
+
+        offset = len(V3_HEADER)
+        table_len, self.generation, nonce = _TABLE_PREFIX.unpack_from(raw, offset)
+        offset += _TABLE_PREFIX.size
+        table = _TABLE_CODEC.loads(
+            AESGCM(vault_key).decrypt(
+                nonce, raw[offset : offset + table_len], _table_aad(self.generation)
+            )
+        )
+        if table.get("version") != 3:
+            raise ValueError("Unsupported vault format")
+        self.codec = codec_for_name(table.get("codec", "json"))
+
+        body = offset + table_len
+        self.segments: List[Segment] = []
+        for kind, key, start, length, seg_nonce, digest in table["segments"]:
+            ciphertext = raw[body + start : body + start + length]
+            if len(ciphertext) != length:
+                raise ValueError("Truncated vault segment")
+            self.segments.append(
+                Segment(kind, key, bytes.fromhex(seg_nonce), digest, ciphertext)
+            )
+
+    def by_key(self) -> Dict[tuple[str, str], Segment]:
+        return {(s.kind, s.key): s for s in self.segments}
+
+    def open(self, segment: Segment) -> Dict:
+        plaintext = AESGCM(self.vault_key).decrypt(
+            segment.nonce,
+            segment.ciphertext,
+            _segment_aad(segment.kind, segment.key, segment.digest),
+        )
+        return self.codec.loads(plaintext)
+
+    def header(self) -> Dict:
+        """Decrypt the profile header, collections left empty."""
+        for segment in self.segments:
+            if segment.kind == HEADER_SEGMENT:
+                return self.open(segment)
+        return dict()
+
+    def records(self, collection: str) -> List[Dict]:
+        """Decrypt every record of one collection, in storage order."""
+        return [self.open(s) for s in self.segments if s.kind == collection]
+
+    def find(self, collection: str, id: str | int) -> Optional[Segment]:
+        if isinstance(id, int):
+            matches = [s for s in self.segments if s.kind == collection]
+            try:
+                return matches[id]
+            except IndexError:
+                return None
+
+        key = segment_key(self.vault_key, collection, id)
+        for segment in self.segments:
+            if segment.kind == collection and segment.key == key:
+                return segment
+        return None
+
+    def to_dict(self) -> Dict:
+        """Decrypt the whole vault into a profile dict."""
+        data = self.header()
+        for segment in self.segments:
+            if segment.kind != HEADER_SEGMENT:
+                data.setdefault(segment.kind, []).append(self.open(segment))
+        return data
+
+    def replace(self, segment: Segment) -> List[Segment]:
+        """Return the segment list with `segment` inserted or replacing its slot."""
+        segments = list(self.segments)
+        for index, existing in enumerate(segments):
+            if (existing.kind, existing.key) == (segment.kind, segment.key):
+                segments[index] = segment
+                return segments
+        segments.append(segment)
+        return segments
@@ -1,23 +1,29 @@
 import os
 import socket
 import zipfile
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 from pathlib import Path
 import uuid
 import subprocess
 import tempfile
 
-import gnupg
-
 from onilock.account_manager import get_profile_engine
 from onilock.core.constants import SECRET_FILENAME_PREFIX
 from onilock.core.settings import settings
 from onilock.core.logging_manager import logger
 from onilock.core.audit import audit
+from onilock.core.compression import pack_file, unpack_file
+from onilock.core.fileio import atomic_write
+from onilock.core.gpg import gpg_handle
 from onilock.core.ui import success, error
 from onilock.core.utils import getlogin, naive_utcnow
 from onilock.db.engines import Engine
-from onilock.db.models import File, Profile
+
+if TYPE_CHECKING:
+    # Imported where used: pydantic is slow to load.
+    import gnupg
+
+    from onilock.db.models import Profile
 
 
 def get_output_filename(file_id: str):
@@ -30,8 +36,8 @@ def get_output_filename(file_id: str):
 class FileEncryptionManager:
     """This class is responsible for all file operations."""
 
-    gpg: gnupg.GPG
-    _profile: Optional[Profile]
+    gpg: "gnupg.GPG"
+    _profile: Optional["Profile"]
     _engine: Optional[Engine]
 
     def __init__(self, gpg_home: Optional[str] = None) -> None:
@@ -58,12 +64,14 @@ class FileEncryptionManager:
                 home = str(Path(settings.VAULT_DIR).parent / ".gnupg")
                 os.makedirs(home, exist_ok=True)
                 os.chmod(home, 0o700)
-        self.gpg = gnupg.GPG(gnupghome=home)
+        self.gpg = gpg_handle(home)
         self._engine = None
         self._profile = None
 
     @property
-    def profile(self) -> Profile:
+    def profile(self) -> "Profile":
+        from onilock.db.models import Profile
+
         if self._profile:
             return self._profile
 
@@ -102,15 +110,23 @@ class FileEncryptionManager:
         )
         output_filepath.parent.mkdir(parents=True, exist_ok=True)
 
+        extra_args = None
+        packed = pack_file(data)
+        if packed is not None:
+            # Already compressed (or known incompressible); skip GPG's own pass.
+            data = packed
+            extra_args = ["--compress-algo", "none"]
+
         encrypted_data = self.gpg.encrypt(
             data,
             recipients=[settings.PGP_REAL_NAME],
             always_trust=True,
             armor=False,
+            extra_args=extra_args,
         )
         if not encrypted_data.ok:
             raise RuntimeError(f"Encryption failed: {encrypted_data.status}")
-        output_filepath.write_bytes(encrypted_data.data)
+        atomic_write(output_filepath, [encrypted_data.data])
         logger.info("File encrypted successfully.")
 
     def encrypt(
@@ -121,6 +137,7 @@ class FileEncryptionManager:
         update_db: bool = True,
     ):
         """Encrypts a file and stores it in the vault."""
+        from onilock.db.models import File
 
         target_filepath = Path(file_to_encrypt)
 
@@ -154,17 +171,16 @@ class FileEncryptionManager:
                 src_file_abs_path = str(target_filepath.absolute())
                 owner = getlogin()
                 host = socket.gethostname()
-                self.profile.files.append(
-                    File(
-                        id=file_id,
-                        location=output_filepath,
-                        created_at=int(naive_utcnow().timestamp()),
-                        src=src_file_abs_path,
-                        user=owner,
-                        host=host,
-                    )
+                file = File(
+                    id=file_id,
+                    location=output_filepath,
+                    created_at=int(naive_utcnow().timestamp()),
+                    src=src_file_abs_path,
+                    user=owner,
+                    host=host,
                 )
-                self.engine.write(self.profile.model_dump())
+                self.profile.add_file(file)
+                self.engine.put_record("files", file.model_dump())
                 success(f"[bold]{file_id}[/bold] encrypted and stored in vault.")
                 audit("file.encrypted", file_id=file_id, src=src_file_abs_path)
             return encrypted_data
@@ -177,7 +193,7 @@ class FileEncryptionManager:
         )
         if not decrypted_data.ok:
             raise Exception(decrypted_data.status)
-        return decrypted_data.data
+        return unpack_file(decrypted_data.data)
 
     def decrypt(self, file_id: str):
         encrypted_filename = get_output_filename(file_id)
@@ -236,7 +252,7 @@ class FileEncryptionManager:
         if encrypted_filename.exists():
             encrypted_filename.unlink()
             self.profile.remove_file(file_id)
-            self.engine.write(self.profile.model_dump())
+            self.engine.delete_record("files", file_id)
             success(f"[bold]{file_id}[/bold] removed from vault.")
             audit("file.deleted", file_id=file_id)
 
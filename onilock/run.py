@@ -6,22 +6,24 @@ import base64
 import zipfile
 import io
 import hashlib
+import time
 from pathlib import Path
-import uuid
-import gnupg
 
+import click
 import typer
 from rich.panel import Panel
 
 from onilock.core import env
+from onilock.core import kdf
+from onilock.core import agent as agent_client
 from onilock.core.decorators import exception_handler
+from onilock.core.corpus import Corpus, compile_corpus
+from onilock.core.fileio import remove_lock_file
 from onilock.core.ui import console
 from onilock.core.utils import generate_random_password, get_version, naive_utcnow
 from cryptography.fernet import Fernet
 from onilock.core.settings import settings
-from onilock.db.models import Profile, Account, File
 from onilock.db import DatabaseManager
-from onilock.db.engines import EncryptedJsonEngine
 from onilock.filemanager import FileEncryptionManager, get_output_filename
 from onilock.account_manager import (
     copy_account_password,
@@ -32,49 +34,67 @@ from onilock.account_manager import (
     list_files,
     remove_account as am_remove_account,
     new_account,
+    new_accounts_from,
+    audit_passwords as am_audit_passwords,
     rotate_secret_key,
+    rekey_vault,
+    is_unlocked,
+    unlock as am_unlock,
+    lock as am_lock,
 )
 from onilock.core.profiles import (
     list_profiles,
     set_active_profile,
     get_active_profile,
     remove_profile,
+    setup_filepath,
 )
 from onilock.core.audit import audit
-from onilock.core.gpg import get_pgp_key_info, delete_pgp_key
+from onilock.core import spawns
+from onilock.core.gpg import get_pgp_key_info, delete_pgp_key, list_keys
+from onilock.core.keys import data_cipher
 from onilock.core.keystore import KeyStoreManager
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.backends import default_backend
+from onilock.core.passwords import password_fingerprint
+from onilock.core.similarity import password_sketch
 
 
 app = typer.Typer()
 profiles_app = typer.Typer()
 keys_app = typer.Typer()
-filemanager = FileEncryptionManager()
+corpus_app = typer.Typer()
+agent_app = typer.Typer()
 
 
-def _derive_export_key(passphrase: str, salt: bytes, iterations: int) -> bytes:
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=iterations,
-        backend=default_backend(),
-    )
-    return base64.urlsafe_b64encode(kdf.derive(passphrase.encode()))
+class _LazyFileManager:
+    """Creates the `FileEncryptionManager`, which starts gpg, on first use."""
+
+    def __init__(self) -> None:
+        self._manager: Optional[FileEncryptionManager] = None
+
+    def __getattr__(self, name: str):
+        if self._manager is None:
+            self._manager = FileEncryptionManager()
+        return getattr(self._manager, name)
+
+
+filemanager = _LazyFileManager()
+
+
+def _derive_export_key(passphrase: str, salt: bytes, name: str, params: dict) -> bytes:
+    derived = kdf.get_kdf(name).derive(passphrase.encode(), salt, params)
+    return base64.urlsafe_b64encode(derived)
 
 
 def _encrypt_export(archive_bytes: bytes, passphrase: str) -> bytes:
     salt = hashlib.sha256(os.urandom(32)).digest()[:16]
-    iterations = 200_000
-    key = _derive_export_key(passphrase, salt, iterations)
+    export_kdf, params = kdf.default_export_kdf()
+    key = _derive_export_key(passphrase, salt, export_kdf.name, params)
     token = Fernet(key).encrypt(archive_bytes)
     payload = {
         "type": "onilock-export",
-        "version": 1,
-        "kdf": "pbkdf2-sha256",
-        "iterations": iterations,
+        "version": 2,
+        "kdf": export_kdf.name,
+        "kdf_params": params,
         "salt": base64.b64encode(salt).decode(),
         "data": base64.b64encode(token).decode(),
     }
@@ -86,9 +106,13 @@ def _decrypt_export(payload: bytes, passphrase: str) -> bytes:
     if data.get("type") != "onilock-export":
         raise ValueError("Unsupported export format")
     salt = base64.b64decode(data["salt"])
-    iterations = int(data["iterations"])
+    if "kdf_params" in data:
+        params = {key: int(value) for key, value in data["kdf_params"].items()}
+    else:
+        # Version 1: PBKDF2 with the iteration count beside it.
+        params = {"iterations": int(data["iterations"])}
     token = base64.b64decode(data["data"])
-    key = _derive_export_key(passphrase, salt, iterations)
+    key = _derive_export_key(passphrase, salt, data.get("kdf", "pbkdf2-sha256"), params)
     return Fernet(key).decrypt(token)
 
 
@@ -142,20 +166,52 @@ def initialize_vault(
 @app.command(rich_help_panel="Passwords")
 @exception_handler
 def new(
-    name: str = typer.Option(..., prompt="Account name (e.g. Github)"),
+    name: Optional[str] = typer.Option(None, help="Account name (e.g. Github)."),
     password: Optional[str] = typer.Option(
-        "",
-        prompt="Password (leave empty to auto-generate)",
+        None,
         help="If empty, a strong password will be auto-generated.",
-        hide_input=True,
     ),
-    username: Optional[str] = typer.Option("", prompt="Username"),
-    url: Optional[str] = typer.Option("", prompt="URL"),
-    description: Optional[str] = typer.Option("", prompt="Description"),
+    username: Optional[str] = typer.Option(None),
+    url: Optional[str] = typer.Option(None),
+    description: Optional[str] = typer.Option(None),
+    from_file: Optional[str] = typer.Option(
+        None,
+        "--from",
+        help="Add accounts in bulk from a CSV or JSONL file ('-' for stdin).",
+    ),
+    input_format: Optional[str] = typer.Option(
+        None,
+        "--format",
+        help="Format of --from input: csv or jsonl (default: from the extension).",
+    ),
 ):
     """
     Add a new account to OniLock.
+
+    With --from, every row of the file (columns or keys: name, password,
+    username, url, description) is added in a single vault write.
     """
+    if from_file:
+        result = new_accounts_from(from_file, input_format)
+        if result["failed"]:
+            raise SystemExit(1)
+        return result
+
+    if name is None:
+        name = typer.prompt("Account name (e.g. Github)")
+    if password is None:
+        password = typer.prompt(
+            "Password (leave empty to auto-generate)",
+            default="",
+            hide_input=True,
+            show_default=False,
+        )
+    if username is None:
+        username = typer.prompt("Username", default="", show_default=False)
+    if url is None:
+        url = typer.prompt("URL", default="", show_default=False)
+    if description is None:
+        description = typer.prompt("Description", default="", show_default=False)
     return new_account(name, password, username, url, description)
 
 
@@ -301,6 +357,8 @@ def import_vault(
     """
     Import a vault export (zip or encrypted JSON export).
     """
+    from onilock.db.models import Account, File, Profile
+
     engine = get_profile_engine()
     if not engine:
         console.print(
@@ -344,7 +402,7 @@ def import_vault(
         if passwords and "accounts.json" in names:
             accounts_payload = json.loads(zipf.read("accounts.json").decode())
             accounts = accounts_payload.get("accounts", [])
-            cipher = Fernet(settings.SECRET_KEY.encode())
+            cipher = data_cipher()
             for account in accounts:
                 account_id = account["id"]
                 if profile.get_account(account_id):
@@ -353,10 +411,13 @@ def import_vault(
                     )
                     continue
                 encrypted_password = cipher.encrypt(account["password"].encode())
-                profile.accounts.append(
+                fingerprint = password_fingerprint(account["password"])
+                profile.add_account(
                     Account(
                         id=account_id,
                         encrypted_password=base64.b64encode(encrypted_password).decode(),
+                        password_fingerprint=fingerprint,
+                        password_sketch=password_sketch(account["password"]),
                         username=account.get("username", ""),
                         url=account.get("url"),
                         description=account.get("description"),
@@ -390,7 +451,7 @@ def import_vault(
                 output_filename = get_output_filename(file_id)
                 output_path = settings.VAULT_DIR / output_filename
                 filemanager.encrypt_bytes(content, output_path)
-                profile.files.append(
+                profile.add_file(
                     File(
                         id=file_id,
                         location=str(output_path.absolute()),
@@ -443,6 +504,8 @@ def _export_vault_impl(
     passphrase: Optional[str] = None,
 ):
     """Internal implementation for full vault exports."""
+    from onilock.db.models import Profile
+
     engine = get_profile_engine()
     if not engine:
         console.print(
@@ -474,7 +537,7 @@ def _export_vault_impl(
         output_path = output_path / default_name
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    cipher = Fernet(settings.SECRET_KEY.encode())
+    cipher = data_cipher()
     accounts = []
     if passwords:
         for account in profile.accounts:
@@ -624,8 +687,7 @@ def profiles_use(name: str):
 
 
 def _profile_setup_path(name: str) -> Path:
-    filename = str(uuid.uuid5(uuid.NAMESPACE_DNS, name + "_oni")).split("-")[-1]
-    return Path(settings.VAULT_DIR) / f"{filename}.oni"
+    return setup_filepath(name)
 
 
 def _cleanup_profile_artifacts(name: str) -> dict[str, int]:
@@ -650,7 +712,7 @@ def _cleanup_profile_artifacts(name: str) -> dict[str, int]:
                 profile_info = setup_data.get(name, {})
                 encrypted_fp = profile_info.get("filepath")
                 if encrypted_fp:
-                    cipher = Fernet(settings.SECRET_KEY.encode())
+                    cipher = data_cipher()
                     decrypted_fp = cipher.decrypt(
                         base64.b64decode(encrypted_fp)
                     ).decode()
@@ -663,11 +725,14 @@ def _cleanup_profile_artifacts(name: str) -> dict[str, int]:
             removed["setup_file"] = 1
         except OSError:
             pass
+        remove_lock_file(str(setup_path))
 
     if profile_path and profile_path.exists():
         try:
             profile_engine = DatabaseManager(
-                database_url=str(profile_path), is_encrypted=True
+                database_url=str(profile_path),
+                is_encrypted=True,
+                backend=settings.DB_BACKEND,
             ).get_engine()
             profile_data = profile_engine.read() or {}
             if isinstance(profile_data, dict):
@@ -690,6 +755,14 @@ def _cleanup_profile_artifacts(name: str) -> dict[str, int]:
             removed["vault_file"] = 1
         except OSError:
             pass
+        remove_lock_file(str(profile_path))
+        health_cache = Path(f"{profile_path}.health")
+        if health_cache.exists():
+            try:
+                health_cache.unlink()
+            except OSError:
+                pass
+        remove_lock_file(str(health_cache))
 
     backup_dir = Path(settings.BACKUP_DIR)
     if backup_dir.exists():
@@ -785,8 +858,7 @@ def copy(name: str):
 @keys_app.command("list")
 def keys_list():
     """List GPG keys and the active vault secret key id."""
-    gpg = gnupg.GPG(gnupghome=settings.GPG_HOME)
-    secret_keys = gpg.list_keys(secret=True)
+    secret_keys = list_keys(settings.GPG_HOME, secret=True)
     if not secret_keys:
         console.print("[bold yellow]![/bold yellow] No GPG secret keys found.")
     else:
@@ -824,11 +896,150 @@ def keys_delete(name: Optional[str] = None, key_id: Optional[str] = None):
 
 @keys_app.command("rotate-secret")
 def keys_rotate_secret():
-    """Rotate the vault secret key used for password encryption."""
+    """Rotate the keystore secret that wraps the vault data key."""
     rotate_secret_key()
     console.print("[bold green]✓[/bold green] Vault secret key rotated.")
 
 
+@keys_app.command("rekey")
+def keys_rekey(
+    workers: Optional[int] = typer.Option(
+        None, help="Processes (default: ONI_AUDIT_WORKERS or every CPU)."
+    ),
+    files: bool = typer.Option(
+        True, "--files/--no-files", help="Re-encrypt stored files too."
+    ),
+):
+    """Replace the vault data key and re-encrypt every password under it."""
+    typer.confirm(
+        "Re-encrypt every profile of this vault directory under a new data key?",
+        abort=True,
+    )
+    result = rekey_vault(workers, files)
+    console.print(
+        f"[bold green]✓[/bold green] Data key replaced: {result['reencrypted']} "
+        f"passwords and {result['files']} files re-encrypted across "
+        f"{result['profiles']} profiles."
+    )
+    if result["unreadable"]:
+        console.print(
+            f"[bold yellow]![/bold yellow] {result['unreadable']} passwords could "
+            "not be decrypted and were left as they were."
+        )
+    if result["unreadable_files"]:
+        console.print(
+            f"[bold yellow]![/bold yellow] {result['unreadable_files']} files could "
+            "not be decrypted and were left as they were."
+        )
+
+
+@agent_app.command("start")
+def agent_start(
+    timeout: Optional[float] = typer.Option(
+        None, help="Idle seconds before the agent exits (default: ONI_AGENT_TIMEOUT)."
+    ),
+    foreground: bool = typer.Option(
+        False, "--foreground", help="Serve from this process instead of detaching."
+    ),
+):
+    """Keep the active profile unlocked in a background agent."""
+    status = agent_client.request("status")
+    if status and status.get("ok"):
+        console.print(
+            f"[bold yellow]![/bold yellow] An agent is already running "
+            f"(pid {status['pid']}, profile {status['profile']})."
+        )
+        return
+
+    # Importing inside the function: only the agent commands need it.
+    from onilock.agent import Agent, spawn
+
+    if foreground:
+        Agent(timeout=timeout).serve()
+        return
+    pid = spawn(timeout)
+    if pid is None:
+        console.print("[bold red]✗[/bold red] The agent did not start.")
+        raise typer.Exit(code=1)
+    console.print(f"[bold green]✓[/bold green] Agent started (pid {pid}).")
+    audit("agent.started", pid=pid)
+
+
+@agent_app.command("stop")
+def agent_stop():
+    """Stop the agent, dropping the unlocked profile."""
+    response = agent_client.request("stop")
+    if not response or not response.get("ok"):
+        console.print("[bold yellow]![/bold yellow] No agent is running.")
+        return
+    console.print("[bold green]✓[/bold green] Agent stopped.")
+    audit("agent.stopped")
+
+
+@agent_app.command("status")
+def agent_status():
+    """Show whether an agent is running, and for which profile."""
+    status = agent_client.request("status")
+    if not status or not status.get("ok"):
+        console.print("No agent is running.")
+        raise typer.Exit(code=1)
+    console.print(
+        f"Agent running (pid {status['pid']}), profile "
+        f"[bold]{status['profile']}[/bold], vault {status['vault_dir']}, "
+        f"idle timeout {status['timeout']:g}s."
+    )
+
+
+@corpus_app.command("compile")
+def corpus_compile(
+    source: str,
+    output: str,
+    sha1: bool = typer.Option(
+        False, "--sha1", help="Input lines are SHA-1 digests (HASH or HASH:count)."
+    ),
+    bloom: Optional[float] = typer.Option(
+        None,
+        help="Build a Bloom filter with this false-positive rate (e.g. 0.001).",
+    ),
+):
+    """Compile a wordlist or SHA-1 hash list for offline breach checks."""
+    try:
+        count = compile_corpus(source, output, hashed=sha1, bloom_error_rate=bloom)
+    except (OSError, ValueError) as exc:
+        console.print(f"[bold red]✗[/bold red] {exc}")
+        raise SystemExit(1)
+    console.print(
+        f"[bold green]✓[/bold green] Compiled {count} entries into {output}. "
+        f"Set [bold]ONI_PASSWORD_CORPUS={output}[/bold] to use it."
+    )
+
+
+@corpus_app.command("check")
+def corpus_check(
+    corpus: Optional[str] = typer.Option(
+        None, help="Compiled corpus (default: ONI_PASSWORD_CORPUS)."
+    ),
+):
+    """Check whether a password appears in a compiled corpus."""
+    path = corpus or settings.PASSWORD_CORPUS
+    if not path:
+        console.print(
+            "[bold red]✗[/bold red] Provide --corpus or set ONI_PASSWORD_CORPUS."
+        )
+        raise SystemExit(1)
+    password = typer.prompt("Password", hide_input=True)
+    try:
+        with Corpus(path) as compiled:
+            found = password in compiled
+    except (OSError, ValueError) as exc:
+        console.print(f"[bold red]✗[/bold red] {exc}")
+        raise SystemExit(1)
+    if found:
+        console.print("[bold yellow]![/bold yellow] Password found in the corpus.")
+        raise SystemExit(1)
+    console.print("[bold green]✓[/bold green] Password not found in the corpus.")
+
+
 @app.command(rich_help_panel="Passwords")
 @exception_handler
 def remove_account(name: str):
@@ -842,6 +1053,42 @@ def remove_account(name: str):
     return am_remove_account(name)
 
 
+@app.command(rich_help_panel="Passwords")
+@exception_handler
+def audit_passwords(
+    output_format: str = typer.Option(
+        "json",
+        "--format",
+        click_type=click.Choice(["json", "jsonl"]),
+        help="Output format.",
+    ),
+    workers: Optional[int] = typer.Option(
+        None, help="Analysis processes (default: ONI_AUDIT_WORKERS or every CPU)."
+    ),
+):
+    """
+    Re-check the health of every stored password and report it as JSON.
+
+    Accounts with near-duplicate passwords are reported in `similar` clusters.
+    Stale weak-password flags are updated in the vault.
+    """
+    report = am_audit_passwords(workers)
+    if output_format == "json":
+        typer.echo(json.dumps(report, indent=2))
+        return
+    for account in report["accounts"]:
+        typer.echo(json.dumps(account))
+    typer.echo(
+        json.dumps(
+            {
+                "policy_version": report["policy_version"],
+                "summary": report["summary"],
+                "similar": report["similar"],
+            }
+        )
+    )
+
+
 @app.command(rich_help_panel="Passwords")
 @exception_handler
 def generate_pwd(
@@ -938,15 +1185,61 @@ def generate_fernet_key():
 
 @app.command(rich_help_panel="Vault")
 @exception_handler
-def erase_user_data(
+def unlock(
     master_password: str = typer.Option(
         prompt="Master password",
         hide_input=True,
     ),
+    ttl: Optional[float] = typer.Option(
+        None, help="Session length in seconds (default: ONI_SESSION_TTL)."
+    ),
+):
+    """
+    Verify the master password once for the next commands that ask for it.
+    """
+    expires = am_unlock(master_password, ttl)
+    if expires is None:
+        console.print(
+            "[bold yellow]![/bold yellow] Master password verified, but sessions "
+            "are disabled (ONI_SESSION_TTL=0) or the runtime directory is not private."
+        )
+        return
+    console.print(
+        f"[bold green]✓[/bold green] Unlocked for {_session_remaining(expires)}."
+    )
+
+
+@app.command(rich_help_panel="Vault")
+@exception_handler
+def lock():
+    """
+    End the session started by `unlock` and stop the agent.
+    """
+    if am_lock():
+        console.print("[bold green]✓[/bold green] Locked.")
+    else:
+        console.print("[bold yellow]![/bold yellow] Nothing was unlocked.")
+
+
+def _session_remaining(expires: float) -> str:
+    seconds = max(0, round(expires - time.time()))
+    return f"{seconds // 60}m {seconds % 60}s" if seconds >= 60 else f"{seconds}s"
+
+
+@app.command(rich_help_panel="Vault")
+@exception_handler
+def erase_user_data(
+    master_password: Optional[str] = typer.Option(
+        None,
+        hide_input=True,
+        help="Prompted for unless a session is unlocked.",
+    ),
 ):
     """
     Permanently delete all OniLock data for this profile.
     """
+    if master_password is None and not is_unlocked():
+        master_password = typer.prompt("Master password", hide_input=True)
     typer.confirm(
         "This will permanently delete ALL accounts, files, and keys. Continue?",
         abort=True,
@@ -954,6 +1247,54 @@ def erase_user_data(
     return delete_profile(master_password)
 
 
+@app.command(rich_help_panel="Vault")
+@exception_handler
+def kdf_calibrate(
+    algorithm: Optional[str] = typer.Option(
+        None,
+        help="bcrypt, scrypt or argon2id (default: argon2id, or scrypt without it).",
+    ),
+    target_ms: float = typer.Option(
+        kdf.DEFAULT_TARGET_MS, help="Master password check time to aim for, in ms."
+    ),
+    memory: int = typer.Option(
+        kdf.DEFAULT_MEMORY_KIB // 1024, help="Memory budget for one check, in MiB."
+    ),
+    save: bool = typer.Option(
+        True, "--save/--dry-run", help="Use the parameters for new hashes."
+    ),
+):
+    """
+    Pick master password hash parameters for this machine.
+    """
+    if algorithm is None:
+        algorithm = "argon2id" if kdf.ALGORITHMS["argon2id"].available else "scrypt"
+    try:
+        calibration = kdf.calibrate(algorithm.lower(), target_ms, memory * 1024)
+    except ValueError as exc:
+        console.print(f"[bold red]✗[/bold red] {exc}")
+        raise SystemExit(1)
+
+    params = ",".join(f"{k}={v}" for k, v in calibration["params"].items())
+    console.print(
+        f"[bold]{calibration['algorithm']}[/bold] {params}: "
+        f"{calibration['ms']:g} ms per check."
+    )
+    if not save:
+        return
+    kdf.save_calibration(calibration)
+    audit("kdf.calibrated", algorithm=calibration["algorithm"], params=params)
+    console.print(
+        "[bold green]✓[/bold green] Saved. The master password is re-hashed with "
+        "these parameters the next time it is checked."
+    )
+    if settings.KDF and settings.KDF != calibration["algorithm"]:
+        console.print(
+            f"[bold yellow]![/bold yellow] ONI_KDF={settings.KDF} takes precedence "
+            "over the calibrated algorithm."
+        )
+
+
 @app.command(rich_help_panel="Utilities")
 @exception_handler
 def version(
@@ -982,24 +1323,34 @@ def version(
     )
 
 
-@app.command("vault-format", rich_help_panel="Utilities")
-@exception_handler
+VAULT_FORMAT_DESCRIPTIONS = {
+    "v1": "legacy GPG + checksum",
+    "v2": "AEAD AES-GCM",
+    "v3": "segmented AEAD AES-GCM",
+    "v4": "binary AEAD AES-GCM",
+    "sqlite": "per-record AEAD AES-GCM",
+}
+
+
 def _get_vault_format() -> str:
     engine = get_profile_engine()
     if not engine:
         return "v2 (default for new vaults)"
 
-    setup_path = Path(settings.SETUP_FILEPATH)
-    if not setup_path.exists():
+    info = engine.format_info()
+    if not info:
         return "v2 (default for new vaults)"
 
-    raw = setup_path.read_bytes()
-    if raw.startswith(EncryptedJsonEngine.V2_HEADER):
-        return "v2 (AEAD AES-GCM)"
-    return "v1 (legacy GPG + checksum)"
+    description = VAULT_FORMAT_DESCRIPTIONS.get(info["format"], "unknown")
+    report = f"{info['format']} ({description}), codec: {info['codec']}"
+    if info.get("compression", "none") != "none":
+        report += f", compression: {info['compression']} ({info['ratio']:.2f}x)"
+    return report
 
 
 def _get_vault_created_version() -> Optional[str]:
+    from onilock.db.models import Profile
+
     engine = get_profile_engine()
     if not engine:
         return None
@@ -1010,6 +1361,8 @@ def _get_vault_created_version() -> Optional[str]:
     return profile.vault_version or None
 
 
+@app.command("vault-format", rich_help_panel="Utilities")
+@exception_handler
 def vault_format_cmd():
     """Print the vault format version."""
     console.print(_get_vault_format())
@@ -1048,14 +1401,19 @@ def export(
 
 
 @app.callback()
-def main():
+def main(ctx: typer.Context):
     """
     OniLock - Secure Password Manager CLI.
     """
+    if settings.DEBUG:
+        spawns.watch()
+        ctx.call_on_close(spawns.report)
 
 
 app.add_typer(profiles_app, name="profiles", rich_help_panel="Profiles")
 app.add_typer(keys_app, name="keys", rich_help_panel="Keys")
+app.add_typer(corpus_app, name="corpus", rich_help_panel="Passwords")
+app.add_typer(agent_app, name="agent", rich_help_panel="Agent")
 
 if __name__ == "__main__":
     app()
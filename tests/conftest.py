@@ -30,6 +30,9 @@ os.environ["ONI_DEFAULT_KEYSTORE_BACKEND"] = "vault"
 os.environ["ONI_DEBUG"] = "false"
 os.environ["ONI_PGP_REAL_NAME"] = "test_onilock_pgp"
 os.environ["ONI_DB_NAME"] = "test_profile"
+# Never reach an agent or session ticket of the developer.
+os.environ["XDG_RUNTIME_DIR"] = os.path.join(_TEST_HOME_DIR, "run")
+os.environ.pop("ONI_AGENT_SOCKET", None)
 
 # ── 3. Stub gnupg before any onilock module imports it ───────────────────────
 # FileEncryptionManager() and GPGEncryptionBackend.__init__() call gnupg.GPG()
@@ -48,6 +51,7 @@ sys.modules["gnupg"] = _mock_gnupg_module
 
 # ── Now it is safe to import pytest and onilock ──────────────────────────────
 import pytest  # noqa: E402
+from pathlib import Path  # noqa: E402
 from unittest.mock import patch  # noqa: E402
 
 
@@ -57,16 +61,23 @@ from unittest.mock import patch  # noqa: E402
 @pytest.fixture(autouse=True)
 def reset_singletons():
     """Reset module-level singletons before and after every test."""
-    from onilock.db.database_manager import DatabaseManager
+    from onilock.db.database_manager import engine_registry
+    from onilock.core import gpg
+    from onilock.core.agent import runtime_dir
     from onilock.core.keystore import KeyStore
 
-    DatabaseManager._instance = None
+    engine_registry.clear()
     KeyStore._passwords = set()
+    gpg.clear_cache()
 
     yield
 
-    DatabaseManager._instance = None
+    engine_registry.clear()
     KeyStore._passwords = set()
+    gpg.clear_cache()
+    # Session tickets minted by one test must not unlock the next.
+    for ticket in Path(runtime_dir()).glob("*.ticket"):
+        ticket.unlink()
 
 
 @pytest.fixture
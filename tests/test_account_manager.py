@@ -2,12 +2,15 @@
 
 import base64
 import os
+import shutil
+import tempfile
 import unittest
 from unittest.mock import MagicMock, patch, call
 
 import bcrypt
 from cryptography.fernet import Fernet
 
+from onilock.db.engines import EncryptedEngine
 from onilock.db.models import Account, File, Profile
 from onilock.core.utils import naive_utcnow
 
@@ -60,8 +63,10 @@ def _make_profile(with_account=False, with_file=False):
 
 
 def _make_engine(profile: Profile = None, empty=False):
-    """Return a mock engine with canned read() output."""
-    engine = MagicMock()
+    """Return an engine with mocked read()/write() and the default record API."""
+    engine = EncryptedEngine("/tmp/test_profile.oni")
+    engine.read = MagicMock()
+    engine.write = MagicMock()
     if empty or profile is None:
         engine.read.return_value = {}
     else:
@@ -285,6 +290,124 @@ class TestNewAccount(unittest.TestCase):
 
         engine.write.assert_called_once()
 
+    def test_reuse_is_detected_without_decrypting(self):
+        from onilock.core.passwords import password_fingerprint
+        from onilock.core.similarity import password_sketch
+
+        profile = _make_profile(with_account=True)
+        profile.accounts[0].password_fingerprint = password_fingerprint("mypassword")
+        profile.accounts[0].password_sketch = password_sketch("mypassword")
+        engine = _make_engine(profile)
+        engine.insert_record = MagicMock(return_value=True)
+
+        with patch("onilock.account_manager.get_profile_engine", return_value=engine):
+            with patch.object(Fernet, "decrypt") as decrypt:
+                from onilock.account_manager import new_account
+
+                new_account("gitlab", "mypassword", None, None, None)
+
+        decrypt.assert_not_called()
+        engine.write.assert_not_called()
+        record = engine.insert_record.call_args[0][1]
+        self.assertEqual(
+            record["password_fingerprint"], password_fingerprint("mypassword")
+        )
+        self.assertTrue(record["is_weak_password"])
+
+    def test_similar_password_warns_with_account_names(self):
+        profile = _make_profile(with_account=True)
+        engine = _make_engine(profile)
+        engine.insert_record = MagicMock(return_value=True)
+
+        with patch("onilock.account_manager.get_profile_engine", return_value=engine):
+            with patch("onilock.account_manager.warning") as warn:
+                from onilock.account_manager import new_account
+
+                new_account("gitlab", "mypassword2", None, None, None)
+
+        messages = [c[0][0] for c in warn.call_args_list]
+        self.assertIn("Password is similar to the one of: github", messages)
+        record = engine.insert_record.call_args[0][1]
+        self.assertTrue(record["password_sketch"])
+
+    def test_legacy_accounts_are_fingerprinted_once(self):
+        from onilock.core.passwords import password_fingerprint
+
+        profile = _make_profile(with_account=True)
+        engine = _make_engine(profile)
+        engine.insert_record = MagicMock(return_value=True)
+
+        from onilock import account_manager
+
+        with patch("onilock.account_manager.get_profile_engine", return_value=engine):
+            with patch("onilock.account_manager.warning") as warn:
+                with patch.object(
+                    account_manager,
+                    "ProcessPoolExecutor",
+                    wraps=account_manager.ProcessPoolExecutor,
+                ) as pool:
+                    account_manager.new_account(
+                        "gitlab", "mypassword", None, None, None
+                    )
+
+        # Stored passwords are only decrypted in a one-shot worker.
+        pool.assert_called_once_with(max_workers=1)
+        self.assertIn("password reuse detected", warn.call_args[0][0])
+        written = engine.write.call_args[0][0]
+        self.assertEqual(
+            written["accounts"][0]["password_fingerprint"],
+            password_fingerprint("mypassword"),
+        )
+
+    def test_unreadable_legacy_accounts_are_only_tried_once(self):
+        from onilock import account_manager
+
+        profile = _make_profile(with_account=True)
+        profile.accounts[0].encrypted_password = base64.b64encode(b"junk").decode()
+        engine = _make_engine(profile)
+        engine.insert_record = MagicMock(return_value=True)
+
+        with patch("onilock.account_manager.get_profile_engine", return_value=engine):
+            account_manager.new_account("gitlab", "mypassword", None, None, None)
+        written = engine.write.call_args[0][0]
+        self.assertEqual(written["accounts"][0]["password_fingerprint"], "")
+        self.assertEqual(written["accounts"][0]["password_sketch"], "")
+
+        # Once marked, later inserts neither decrypt nor rewrite the vault.
+        engine = _make_engine(Profile(**written))
+        engine.insert_record = MagicMock(return_value=True)
+        with patch("onilock.account_manager.get_profile_engine", return_value=engine):
+            with patch.object(account_manager, "ProcessPoolExecutor") as pool:
+                account_manager.new_account("gitea", "mypassword", None, None, None)
+        pool.assert_not_called()
+        engine.write.assert_not_called()
+        engine.insert_record.assert_called_once()
+
+    def test_existing_name_is_refused(self):
+        profile = _make_profile(with_account=True)
+        engine = _make_engine(profile)
+        engine.insert_record = MagicMock()
+
+        with patch("onilock.account_manager.get_profile_engine", return_value=engine):
+            from onilock.account_manager import new_account
+
+            with self.assertRaises(SystemExit):
+                new_account("GitHub", "other-password", None, None, None)
+        engine.insert_record.assert_not_called()
+        engine.write.assert_not_called()
+
+    def test_name_added_concurrently_is_refused(self):
+        profile = _make_profile()
+        engine = _make_engine(profile)
+        engine.insert_record = MagicMock(return_value=False)
+
+        with patch("onilock.account_manager.get_profile_engine", return_value=engine):
+            from onilock.account_manager import new_account
+
+            with self.assertRaises(SystemExit):
+                new_account("github", "mypassword", None, None, None)
+        engine.write.assert_not_called()
+
     def test_new_account_uninitialized_db_exits(self):
         engine = _make_engine(empty=True)
 
@@ -297,6 +420,206 @@ class TestNewAccount(unittest.TestCase):
                     new_account("github", "pass", None, None, None)
 
 
+class TestNewAccountsFrom(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="onilock_ingest_")
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+
+    def _source(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def _run(self, profile, source, fmt=None):
+        engine = _make_engine(profile)
+        with patch("onilock.account_manager.get_profile_engine", return_value=engine):
+            with patch("onilock.account_manager.audit") as audit:
+                from onilock.account_manager import new_accounts_from
+
+                result = new_accounts_from(source, fmt)
+        return engine, audit, result
+
+    def test_csv_rows_are_committed_in_one_write(self):
+        source = self._source(
+            "accounts.csv",
+            "name,password,username,url\n"
+            "gitlab,pH$zJ?+k51XM,me,https://gitlab.com\n"
+            "mail,,me@example.com,\n",
+        )
+        engine, audit, result = self._run(_make_profile(), source)
+
+        self.assertEqual(result, {"added": 2, "weak": 0, "failed": 0})
+        engine.write.assert_called_once()
+        audit.assert_called_once_with("account.bulk_added", count=2, failed=0)
+        accounts = engine.write.call_args[0][0]["accounts"]
+        self.assertEqual([a["id"] for a in accounts], ["gitlab", "mail"])
+        self.assertEqual(accounts[0]["url"], "https://gitlab.com")
+        self.assertIsNone(accounts[1]["url"])
+
+        cipher = Fernet(TEST_SECRET_KEY.encode())
+        password = cipher.decrypt(base64.b64decode(accounts[0]["encrypted_password"]))
+        self.assertEqual(password, b"pH$zJ?+k51XM")
+
+    def test_similar_passwords_are_flagged_weak(self):
+        source = self._source(
+            "accounts.csv",
+            "name,password\n"
+            "gitlab,pH$zJ?+k51XM\n"
+            "gitea,pH$zJ?+k51XN\n"
+            "mail,w8!Lq#2vRt6@\n",
+        )
+        engine, _, result = self._run(_make_profile(), source)
+
+        self.assertEqual(result["weak"], 2)
+        accounts = {a["id"]: a for a in engine.write.call_args[0][0]["accounts"]}
+        self.assertTrue(accounts["gitlab"]["is_weak_password"])
+        self.assertTrue(accounts["gitea"]["is_weak_password"])
+        self.assertFalse(accounts["mail"]["is_weak_password"])
+
+    def test_invalid_and_duplicate_rows_are_reported_and_skipped(self):
+        source = self._source(
+            "accounts.jsonl",
+            '{"name": "new", "password": "mypassword"}\n'
+            "not json\n"
+            '{"name": "GitHub"}\n'
+            '{"name": "NEW"}\n'
+            '{"password": "x"}\n',
+        )
+        with patch("onilock.account_manager.error") as report:
+            engine, _, result = self._run(_make_profile(with_account=True), source)
+
+        self.assertEqual(result, {"added": 1, "weak": 1, "failed": 4})
+        messages = [c.args[0] for c in report.call_args_list]
+        self.assertTrue(messages[0].startswith("Row 2: invalid JSON"))
+        self.assertEqual(messages[1], "Row 3: account 'GitHub' already exists")
+        self.assertEqual(messages[2], "Row 4: account 'NEW' already exists")
+        self.assertEqual(messages[3], "Row 5: missing account name")
+        accounts = engine.write.call_args[0][0]["accounts"]
+        # Reuse of the existing account's password is detected.
+        self.assertTrue(accounts[1]["is_weak_password"])
+        self.assertEqual(
+            accounts[0]["password_fingerprint"], accounts[1]["password_fingerprint"]
+        )
+
+    def test_nothing_to_add_does_not_write(self):
+        profile = _make_profile()
+        source = self._source("empty.jsonl", "\n")
+        engine, audit, result = self._run(profile, source)
+        self.assertEqual(result["added"], 0)
+        engine.write.assert_not_called()
+        audit.assert_not_called()
+
+
+class TestAuditPasswords(unittest.TestCase):
+    def _profile(self):
+        profile = _make_profile(with_account=True)
+        cipher = Fernet(TEST_SECRET_KEY.encode())
+        for name, password in (("strong", "pH$zJ?+k51XM"), ("copy", "mypassword")):
+            profile.add_account(
+                Account(
+                    id=name,
+                    encrypted_password=base64.b64encode(
+                        cipher.encrypt(password.encode())
+                    ).decode(),
+                    is_weak_password=False,
+                    created_at=0,
+                )
+            )
+        return profile
+
+    def _run(self, engine, cache):
+        cache_engine = MagicMock()
+        cache_engine.read.return_value = cache
+        with (
+            patch("onilock.account_manager.get_profile_engine", return_value=engine),
+            patch(
+                "onilock.account_manager._health_cache_engine",
+                return_value=cache_engine,
+            ),
+            patch("onilock.account_manager.audit") as audit,
+        ):
+            from onilock.account_manager import audit_passwords
+
+            report = audit_passwords(workers=1)
+        return report, cache_engine, audit
+
+    def test_refreshes_stale_flags_in_one_write_and_caches_results(self):
+        engine = _make_engine(self._profile())
+        report, cache_engine, audit = self._run(engine, {})
+
+        summary = report["summary"]
+        self.assertEqual(summary["analysed"], 2)
+        self.assertEqual(summary["cached"], 0)
+        self.assertEqual((summary["strong"], summary["weak"]), (1, 2))
+        # "copy" shares the password of "github" and was wrongly flagged strong.
+        self.assertEqual(summary["updated"], 1)
+        engine.write.assert_called_once()
+        accounts = {a["id"]: a for a in engine.write.call_args[0][0]["accounts"]}
+        self.assertTrue(accounts["copy"]["is_weak_password"])
+        self.assertFalse(accounts["strong"]["is_weak_password"])
+
+        by_id = {a["id"]: a for a in report["accounts"]}
+        self.assertTrue(by_id["copy"]["is_reused"])
+        self.assertIn("password reuse detected", by_id["github"]["reasons"])
+        audit.assert_called_once()
+
+        # Cached results are stored without the vault-dependent reuse flag.
+        cache = cache_engine.write.call_args[0][0]
+        self.assertEqual(len(cache["results"]), 2)
+        self.assertFalse(any(h["is_reused"] for h in cache["results"].values()))
+
+        # A second run finds everything in the cache and writes nothing.
+        engine = _make_engine(Profile(**engine.write.call_args[0][0]))
+        report, cache_engine, _ = self._run(engine, cache)
+        self.assertEqual(report["summary"]["analysed"], 0)
+        self.assertEqual(report["summary"]["cached"], 2)
+        engine.write.assert_not_called()
+        cache_engine.write.assert_not_called()
+
+    def test_similar_passwords_are_clustered(self):
+        profile = self._profile()
+        cipher = Fernet(TEST_SECRET_KEY.encode())
+        for name, password in (("spring", "pH$zJ?+k51XN"), ("other", "w8!Lq#2vRt6@")):
+            profile.add_account(
+                Account(
+                    id=name,
+                    encrypted_password=base64.b64encode(
+                        cipher.encrypt(password.encode())
+                    ).decode(),
+                    created_at=0,
+                )
+            )
+        report, _, _ = self._run(_make_engine(profile), {})
+
+        self.assertEqual(report["similar"], [["strong", "spring"]])
+        self.assertEqual(report["summary"]["similar_clusters"], 1)
+        by_id = {a["id"]: a for a in report["accounts"]}
+        self.assertEqual(by_id["spring"]["strength"], "medium")
+        self.assertTrue(by_id["strong"]["is_similar"])
+        self.assertFalse(by_id["other"]["is_similar"])
+        # Identical passwords are reuse, not similarity.
+        self.assertFalse(by_id["copy"]["is_similar"])
+
+    def test_results_from_another_policy_are_discarded(self):
+        engine = _make_engine(self._profile())
+        _, cache_engine, _ = self._run(engine, {})
+        cache = cache_engine.write.call_args[0][0]
+
+        engine = _make_engine(Profile(**engine.write.call_args[0][0]))
+        report, _, _ = self._run(engine, {**cache, "policy": "outdated"})
+        self.assertEqual(report["summary"]["analysed"], 2)
+
+    def test_unreadable_password_is_reported(self):
+        profile = _make_profile()
+        profile.add_account(
+            Account(id="broken", encrypted_password="bm9wZQ==", created_at=0)
+        )
+        report, _, _ = self._run(_make_engine(profile), {})
+        self.assertEqual(report["summary"]["unreadable"], 1)
+        self.assertEqual(report["accounts"][0]["error"], "unreadable")
+
+
 class TestListAccounts(unittest.TestCase):
     def test_list_accounts_outputs(self):
         from io import StringIO
@@ -0,0 +1,200 @@
+"""Tests for the OniLock agent (onilock.agent) and its client (onilock.core.agent)."""
+
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from cryptography.fernet import Fernet
+
+from onilock import agent as agent_server
+from onilock.agent import Agent, FileWatcher
+from onilock.core import agent as agent_client
+from onilock.core.settings import settings
+from onilock.db.database_manager import engine_registry
+
+
+class AgentTestCase(unittest.TestCase):
+    def setUp(self):
+        base = Path(tempfile.mkdtemp(prefix="onilock_agent_"))
+        self.addCleanup(shutil.rmtree, base, ignore_errors=True)
+        self.base = base
+        vault_dir = base / "vault"
+        vault_dir.mkdir()
+        for name, value in (
+            ("VAULT_DIR", vault_dir),
+            ("BASE_DIR", base),
+            ("PROFILE_PATH", base / ".profile"),
+            ("SETUP_FILEPATH", str(vault_dir / "setup.oni")),
+            ("SECRET_KEY", Fernet.generate_key().decode()),
+            ("BCRYPT_ROUNDS", 4),
+            ("CLIPBOARD_ENABLED", True),
+        ):
+            patcher = patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(engine_registry.clear)
+        for target in ("onilock.account_manager.audit", "onilock.agent.audit"):
+            patcher = patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.socket = base / "agent" / "agent.sock"
+        patcher = patch.dict(os.environ, {"ONI_AGENT_SOCKET": str(self.socket)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        from onilock.account_manager import initialize, new_account
+
+        initialize("master-password")
+        new_account("github", "pH$zJ?+k51XM", username="octocat")
+        new_account("mail", "correcthorse2023!")
+
+    def start_agent(self, timeout=30):
+        agent = Agent(timeout=timeout)
+        ready = threading.Event()
+        thread = threading.Thread(target=agent.serve, args=(ready.set,))
+        thread.start()
+        self.assertTrue(ready.wait(5))
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(agent_client.request, "stop")
+        return thread
+
+
+class TestAgent(AgentTestCase):
+    def test_serves_status_list_and_get(self):
+        self.start_agent()
+        self.assertEqual(os.stat(self.socket).st_mode & 0o777, 0o600)
+
+        status = agent_client.request("status")
+        self.assertEqual(status["profile"], settings.DB_NAME)
+        self.assertFalse(status["loaded"])
+
+        listed = agent_client.request("list")
+        self.assertEqual(
+            [(row["id"], row["username"]) for row in listed["accounts"]],
+            [("github", "octocat"), ("mail", "")],
+        )
+        self.assertEqual(
+            agent_client.request("get", id="github")["password"], "pH$zJ?+k51XM"
+        )
+        self.assertEqual(agent_client.request("get", id=1)["id"], "mail")
+        self.assertFalse(agent_client.request("get", id="nope")["ok"])
+        self.assertFalse(agent_client.request("get", id=[1])["ok"])
+        self.assertFalse(agent_client.request("explode")["ok"])
+
+    def test_copy_is_answered_without_the_cli(self):
+        self.start_agent()
+        with (
+            patch("onilock.agent.pyperclip") as pyperclip,
+            patch("sys.stdout", new_callable=io.StringIO) as stdout,
+        ):
+            self.assertEqual(agent_client.run_command(["copy", "2"]), 0)
+            pyperclip.copy.assert_called_once_with("correcthorse2023!")
+        self.assertIn("Password for mail copied to clipboard", stdout.getvalue())
+
+        # Anything else goes through the full CLI.
+        self.assertIsNone(agent_client.run_command(["list"]))
+        self.assertIsNone(agent_client.run_command(["copy", "--help"]))
+        with patch("onilock.agent.pyperclip") as pyperclip:
+            pyperclip.copy.side_effect = Exception("no display")
+            self.assertIsNone(agent_client.run_command(["copy", "github"]))
+
+    def test_changes_to_the_vault_are_picked_up(self):
+        from onilock.account_manager import new_account, remove_account
+
+        self.start_agent()
+        self.assertEqual(len(agent_client.request("list")["accounts"]), 2)
+        new_account("bank", "Zq8#vLr!t0pW")
+        remove_account("mail")
+        listed = agent_client.request("list")
+        self.assertEqual([row["id"] for row in listed["accounts"]], ["github", "bank"])
+
+    def test_other_profiles_are_refused(self):
+        self.start_agent()
+        with patch.dict(os.environ, {"ONI_DB_NAME": "someone_else"}):
+            response = agent_client.request("list")
+        self.assertFalse(response["ok"])
+        self.assertIn(settings.DB_NAME, response["error"])
+
+    def test_stop_and_idle_timeout(self):
+        thread = self.start_agent()
+        self.assertTrue(agent_client.request("stop")["ok"])
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(self.socket.exists())
+        self.assertIsNone(agent_client.request("status"))
+
+        thread = self.start_agent(timeout=0.1)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def test_socket_directory_must_be_private(self):
+        self.socket.parent.mkdir(mode=0o755)
+        os.chmod(self.socket.parent, 0o755)
+        with self.assertRaises(PermissionError):
+            Agent().serve()
+        self.assertIsNone(agent_client.request("status"))
+
+    def test_a_second_agent_does_not_start(self):
+        self.start_agent()
+        with self.assertRaises(RuntimeError):
+            Agent().serve()
+
+    def test_list_accounts_uses_the_agent(self):
+        from onilock.account_manager import list_accounts
+
+        self.start_agent()
+        with (
+            patch("onilock.account_manager.get_profile_engine") as engine,
+            patch("onilock.account_manager.console") as console,
+        ):
+            list_accounts()
+        engine.assert_not_called()
+        table = console.print.call_args[0][0]
+        self.assertEqual(table.row_count, 2)
+
+
+class TestFileWatcher(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp(prefix="onilock_watch_"))
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.path = self.dir / "vault.oni"
+        self.path.write_bytes(b"v1")
+
+    def check(self, watcher):
+        self.addCleanup(watcher.close)
+        self.assertFalse(watcher.changed())
+        (self.dir / "vault.oni.lock").write_bytes(b"")
+        (self.dir / "unrelated.oni").write_bytes(b"x")
+        self.assertFalse(watcher.changed())
+
+        tmp = self.dir / ".vault.oni.123.tmp"
+        tmp.write_bytes(b"v2-longer")
+        os.replace(tmp, self.path)
+        self.assertTrue(watcher.changed())
+        self.assertFalse(watcher.changed())
+
+    def test_inotify(self):
+        if agent_server._libc_inotify() is None:
+            self.skipTest("inotify is not available")
+        watcher = FileWatcher([self.path])
+        self.assertIsNotNone(watcher._fd)
+        self.check(watcher)
+
+        (self.dir / "vault.oni-wal").write_bytes(b"x")
+        self.assertTrue(watcher.changed())
+
+    def test_stat_fallback(self):
+        with patch("onilock.agent._libc_inotify", return_value=None):
+            watcher = FileWatcher([self.path])
+        self.assertIsNone(watcher._fd)
+        self.check(watcher)
+
+
+if __name__ == "__main__":
+    unittest.main()
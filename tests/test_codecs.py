@@ -0,0 +1,139 @@
+"""Tests for onilock.db.codecs and codec selection in EncryptedJsonEngine."""
+
+import base64
+import json
+import os
+import unittest
+from unittest.mock import patch
+
+from onilock.core.settings import settings
+from onilock.db import codecs
+from onilock.db.codecs import CODECS, codec_for_name, codec_for_tag, get_codec
+from onilock.db.engines import EncryptedJsonEngine
+
+
+PROFILE = {
+    "name": "p",
+    "accounts": [{"id": "github", "url": "https://github.com", "created_at": 1}],
+    "files": [],
+}
+
+
+class TestCodecs(unittest.TestCase):
+    def test_available_codecs_roundtrip(self):
+        for codec in CODECS.values():
+            if not codec.available:
+                continue
+            with self.subTest(codec=codec.name):
+                self.assertEqual(codec.loads(codec.dumps(PROFILE)), PROFILE)
+
+    def test_json_codecs_are_interchangeable(self):
+        payload = CODECS["orjson"].dumps(PROFILE)
+        self.assertEqual(CODECS["json"].loads(payload), PROFILE)
+        self.assertEqual(CODECS["orjson"].loads(CODECS["json"].dumps(PROFILE)), PROFILE)
+
+    def test_orjson_falls_back_to_stdlib(self):
+        with patch.object(codecs, "orjson", None):
+            codec = CODECS["orjson"]
+            self.assertFalse(codec.available)
+            self.assertEqual(codec.loads(codec.dumps(PROFILE)), PROFILE)
+            self.assertEqual(get_codec("auto").name, "json")
+
+    def test_auto_prefers_orjson(self):
+        with patch.object(codecs, "orjson", object()):
+            self.assertEqual(get_codec("auto").name, "orjson")
+
+    def test_default_comes_from_settings(self):
+        with patch.object(settings, "VAULT_CODEC", "json"):
+            self.assertEqual(get_codec().name, "json")
+
+    def test_unknown_codec_raises(self):
+        with self.assertRaises(ValueError):
+            get_codec("pickle")
+        with self.assertRaises(ValueError):
+            codec_for_name("pickle")
+        with self.assertRaises(ValueError):
+            codec_for_tag(15)
+
+    def test_missing_msgpack(self):
+        with patch.object(codecs, "msgpack", None):
+            with self.assertRaises(RuntimeError):
+                get_codec("msgpack")
+            with self.assertRaises(RuntimeError):
+                CODECS["msgpack"].loads(b"\x80")
+
+    def test_lookup_by_tag(self):
+        for codec in CODECS.values():
+            self.assertIs(codec_for_tag(codec.tag), codec)
+
+
+class TestEngineCodecs(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = "/tmp/test_onilock_codec_engine"
+        os.makedirs(self.tmp_path, exist_ok=True)
+        self.filepath = os.path.join(self.tmp_path, "test.oni")
+        with patch("onilock.db.engines.EncryptionBackendManager"):
+            self.engine = EncryptedJsonEngine(self.filepath)
+
+    def tearDown(self):
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    def _write(self, fmt, codec):
+        with patch.multiple(settings, VAULT_FORMAT=fmt, VAULT_CODEC=codec):
+            self.engine.write(PROFILE)
+        self.engine.invalidate_cache()
+
+    def test_codec_is_recorded_per_format(self):
+        names = [name for name in ("json", "orjson") if CODECS[name].available]
+        for fmt in ("v2", "v3", "v4"):
+            for codec in names:
+                with self.subTest(fmt=fmt, codec=codec):
+                    self._write(fmt, codec)
+                    info = self.engine.format_info()
+                    self.assertEqual((info["format"], info["codec"]), (fmt, codec))
+                    # Readable whatever the currently configured codec is.
+                    with patch.object(settings, "VAULT_CODEC", "json"):
+                        self.assertEqual(self.engine.read(), PROFILE)
+
+    def test_legacy_v2_envelope_defaults_to_json(self):
+        self._write("v2", "json")
+        raw = open(self.filepath, "rb").read()
+        header, envelope = raw.split(b"\n", 1)
+        envelope = json.loads(envelope)
+        del envelope["codec"]
+        with open(self.filepath, "wb") as f:
+            f.write(header + b"\n" + json.dumps(envelope).encode())
+
+        self.assertEqual(self.engine.format_info()["codec"], "json")
+        self.assertEqual(self.engine.read(), PROFILE)
+
+    @unittest.skipUnless(CODECS["orjson"].available, "orjson is not installed")
+    def test_v2_codec_field_is_authenticated(self):
+        self._write("v2", "orjson")
+        raw = open(self.filepath, "rb").read()
+        header, envelope = raw.split(b"\n", 1)
+        envelope = json.loads(envelope)
+        envelope["codec"] = "json"
+        with open(self.filepath, "wb") as f:
+            f.write(header + b"\n" + json.dumps(envelope).encode())
+        with self.assertRaises(ValueError):
+            self.engine.read()
+
+        envelope["aad"] = base64.b64encode(b"onilock-v2").decode()
+        with open(self.filepath, "wb") as f:
+            f.write(header + b"\n" + json.dumps(envelope).encode())
+        with self.assertRaises(Exception):
+            self.engine.read()
+
+    @unittest.skipUnless(CODECS["orjson"].available, "orjson is not installed")
+    def test_v3_codec_change_reseals_on_update(self):
+        self._write("v3", "json")
+        with patch.multiple(settings, VAULT_FORMAT="v3", VAULT_CODEC="orjson"):
+            self.engine.put_record("accounts", {"id": "new", "created_at": 2})
+            self.assertEqual(self.engine.format_info()["codec"], "orjson")
+            self.engine.invalidate_cache()
+            self.assertEqual(len(self.engine.read()["accounts"]), 2)
+
+    def test_format_info_missing_file(self):
+        self.assertEqual(self.engine.format_info(), {})
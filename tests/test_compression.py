@@ -0,0 +1,137 @@
+"""Tests for onilock.core.compression and the compression stage in the engines."""
+
+import os
+import unittest
+from unittest.mock import patch
+
+from onilock.core import compression
+from onilock.core.compression import (
+    COMPRESSORS,
+    FILE_MAGIC,
+    compress,
+    decompress,
+    get_compressor,
+    original_size,
+    pack_file,
+    unpack_file,
+)
+from onilock.core.settings import settings
+from onilock.db.engines import EncryptedJsonEngine
+
+
+TEXT = b"".join(b"url=https://example.com/login user=someone\n" for _ in range(200))
+
+
+class TestCompression(unittest.TestCase):
+    def test_zlib_roundtrip(self):
+        compressor, payload = compress(TEXT, COMPRESSORS["zlib"])
+        self.assertEqual(compressor.name, "zlib")
+        self.assertLess(len(payload), len(TEXT) // 10)
+        self.assertEqual(original_size(compressor, payload), len(TEXT))
+        self.assertEqual(decompress(compressor, payload), TEXT)
+
+    def test_levels_are_configurable(self):
+        _, fast = compress(TEXT * 10, COMPRESSORS["zlib"], level=1)
+        _, best = compress(TEXT * 10, COMPRESSORS["zlib"], level=9)
+        self.assertLessEqual(len(best), len(fast))
+        with patch.object(settings, "COMPRESSION_LEVEL", 1):
+            self.assertEqual(compress(TEXT * 10, COMPRESSORS["zlib"])[1], fast)
+
+    def test_incompressible_data_is_stored_as_is(self):
+        data = os.urandom(4096)
+        compressor, payload = compress(data, COMPRESSORS["zlib"])
+        self.assertEqual(compressor.name, "none")
+        self.assertIs(payload, data)
+
+    def test_large_incompressible_data_is_detected_on_a_sample(self):
+        data = os.urandom(compression.SAMPLE_SIZE * 2)
+        with patch.object(
+            COMPRESSORS["zlib"], "compress", wraps=COMPRESSORS["zlib"].compress
+        ) as spy:
+            compressor, _ = compress(data, COMPRESSORS["zlib"])
+        self.assertEqual(compressor.name, "none")
+        spy.assert_called_once()
+
+    def test_small_data_is_not_compressed(self):
+        self.assertEqual(compress(b"a" * 10, COMPRESSORS["zlib"])[0].name, "none")
+
+    def test_disabled_by_default(self):
+        self.assertEqual(compress(TEXT)[0].name, "none")
+
+    def test_oversized_payload_is_rejected(self):
+        compressor, payload = compress(TEXT, COMPRESSORS["zlib"])
+        forged = (len(TEXT) // 2).to_bytes(8, "big") + payload[8:]
+        with self.assertRaises(ValueError):
+            decompress(compressor, forged)
+
+    def test_unknown_or_missing_algorithms(self):
+        with self.assertRaises(ValueError):
+            get_compressor("lz4")
+        with patch.object(compression, "zstandard", None):
+            with self.assertRaises(RuntimeError):
+                get_compressor("zstd")
+
+    def test_file_framing(self):
+        with patch.object(settings, "COMPRESSION", "none"):
+            self.assertIsNone(pack_file(TEXT))
+        with patch.object(settings, "COMPRESSION", "zlib"):
+            packed = pack_file(TEXT)
+            self.assertTrue(packed.startswith(FILE_MAGIC))
+            self.assertEqual(unpack_file(packed), TEXT)
+
+            random = os.urandom(1024)
+            self.assertEqual(unpack_file(pack_file(random)), random)
+        self.assertEqual(unpack_file(b"legacy content"), b"legacy content")
+
+
+class TestEngineCompression(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = "/tmp/test_onilock_compression_engine"
+        os.makedirs(self.tmp_path, exist_ok=True)
+        self.filepath = os.path.join(self.tmp_path, "test.oni")
+        with patch("onilock.db.engines.EncryptionBackendManager"):
+            self.engine = EncryptedJsonEngine(self.filepath)
+        self.data = {
+            "name": "p",
+            "accounts": [
+                {"id": f"a{i}", "url": "https://example.com/login", "username": "me"}
+                for i in range(200)
+            ],
+        }
+
+    def tearDown(self):
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    def test_compressed_vaults_roundtrip_and_report_ratio(self):
+        for fmt in ("v2", "v4"):
+            with self.subTest(fmt=fmt):
+                with patch.multiple(settings, VAULT_FORMAT=fmt, COMPRESSION="none"):
+                    self.engine.write(self.data)
+                plain_size = os.path.getsize(self.filepath)
+
+                with patch.multiple(settings, VAULT_FORMAT=fmt, COMPRESSION="zlib"):
+                    self.engine.write(self.data)
+                self.assertLess(os.path.getsize(self.filepath), plain_size // 3)
+
+                self.engine.invalidate_cache()
+                self.assertEqual(self.engine.read(), self.data)
+                info = self.engine.format_info()
+                self.assertEqual(info["compression"], "zlib")
+                self.assertGreater(info["ratio"], 3)
+
+    def test_uncompressed_vault_reports_unit_ratio(self):
+        self.engine.write(self.data)
+        info = self.engine.format_info()
+        self.assertEqual((info["compression"], info["ratio"]), ("none", 1.0))
+
+    def test_compression_flag_is_authenticated(self):
+        with patch.multiple(settings, VAULT_FORMAT="v4", COMPRESSION="zlib"):
+            self.engine.write(self.data)
+        raw = bytearray(open(self.filepath, "rb").read())
+        raw[5] &= 0x0F
+        with open(self.filepath, "wb") as f:
+            f.write(raw)
+        self.engine.invalidate_cache()
+        with self.assertRaises(Exception):
+            self.engine.read()
@@ -0,0 +1,79 @@
+"""Tests for onilock.core.corpus."""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from onilock.core import corpus
+from onilock.core.corpus import HEADER_SIZE, Corpus, compile_corpus
+
+
+WORDS = ["password", "123456", "dragon", "letmein", "Summer2024!", "dragon"]
+
+
+class TestCompileCorpus(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(prefix="onilock_corpus_")
+        self.source = os.path.join(self.tmp_path, "words.txt")
+        self.output = os.path.join(self.tmp_path, "words.corpus")
+        with open(self.source, "w") as f:
+            f.write("\n".join(WORDS) + "\n\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def test_sorted_corpus_lookups(self):
+        self.assertEqual(compile_corpus(self.source, self.output), 5)
+        with Corpus(self.output) as compiled:
+            self.assertEqual(len(compiled), 5)
+            for word in WORDS:
+                self.assertIn(word, compiled)
+            self.assertNotIn("pH$zJ?+k51XM", compiled)
+            self.assertNotIn("Password", compiled)
+        self.assertEqual(os.path.getsize(self.output), HEADER_SIZE + 5 * 20)
+
+    def test_external_sort_merges_runs(self):
+        with patch.object(corpus, "RUN_ENTRIES", 2):
+            self.assertEqual(compile_corpus(self.source, self.output), 5)
+        self.assertEqual(
+            sorted(os.listdir(self.tmp_path)), ["words.corpus", "words.txt"]
+        )
+        with Corpus(self.output) as compiled:
+            self.assertTrue(all(word in compiled for word in WORDS))
+
+    def test_sha1_hash_list(self):
+        with open(self.source, "w") as f:
+            for word in WORDS[:3]:
+                f.write(hashlib.sha1(word.encode()).hexdigest().upper() + ":42\n")
+        compile_corpus(self.source, self.output, hashed=True)
+        with Corpus(self.output) as compiled:
+            self.assertIn("dragon", compiled)
+            self.assertNotIn("letmein", compiled)
+
+    def test_invalid_hash_line(self):
+        with open(self.source, "w") as f:
+            f.write("not-a-hash\n")
+        with self.assertRaises(ValueError):
+            compile_corpus(self.source, self.output, hashed=True)
+        self.assertFalse(os.path.exists(self.output))
+
+    def test_bloom_filter(self):
+        self.assertEqual(
+            compile_corpus(self.source, self.output, bloom_error_rate=0.01), 6
+        )
+        with Corpus(self.output) as compiled:
+            self.assertTrue(all(word in compiled for word in WORDS))
+            misses = sum(f"random-{i}" in compiled for i in range(1000))
+            self.assertLess(misses, 100)
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            Corpus(self.source)
+        compile_corpus(self.source, self.output)
+        with open(self.output, "ab") as f:
+            f.write(b"x")
+        with self.assertRaises(ValueError):
+            Corpus(self.output)
@@ -1,12 +1,14 @@
-"""Tests for onilock.db.database_manager (DatabaseManager singleton)."""
+"""Tests for onilock.db.database_manager (DatabaseManager and engine registry)."""
 
 import unittest
 from unittest.mock import MagicMock, patch
 
 from onilock.db.database_manager import (
     DatabaseManager,
+    EngineRegistry,
     create_engine,
     create_encrypted_engine,
+    engine_registry,
 )
 
 
@@ -24,6 +26,13 @@ class TestFactoryFunctions(unittest.TestCase):
             engine = create_encrypted_engine("/tmp/test.oni")
         self.assertIsInstance(engine, EncryptedJsonEngine)
 
+    def test_create_encrypted_engine_sqlite_backend(self):
+        from onilock.core.enums import DBBackEndEnum
+        from onilock.db.engines import SqliteEngine
+
+        engine = create_encrypted_engine("/tmp/test.oni", backend=DBBackEndEnum.SQLITE)
+        self.assertIsInstance(engine, SqliteEngine)
+
     def test_create_encrypted_engine_with_custom_backend(self):
         from onilock.db.engines import EncryptedJsonEngine
 
@@ -33,18 +42,21 @@ class TestFactoryFunctions(unittest.TestCase):
         self.assertIsInstance(engine, EncryptedJsonEngine)
 
 
-class TestDatabaseManagerSingleton(unittest.TestCase):
-    def setUp(self):
-        DatabaseManager._instance = None
-
-    def tearDown(self):
-        DatabaseManager._instance = None
-
-    def test_singleton_same_instance(self):
+class TestDatabaseManager(unittest.TestCase):
+    def test_managers_for_different_paths_do_not_share_engines(self):
         with patch("onilock.db.engines.EncryptionBackendManager"):
             m1 = DatabaseManager(database_url="/tmp/db1.oni", is_encrypted=True)
             m2 = DatabaseManager(database_url="/tmp/db2.oni", is_encrypted=True)
-        self.assertIs(m1, m2)
+        self.assertEqual(m1.get_engine().filepath, "/tmp/db1.oni")
+        self.assertEqual(m2.get_engine().filepath, "/tmp/db2.oni")
+
+    def test_managers_for_same_path_share_engines(self):
+        with patch("onilock.db.engines.EncryptionBackendManager"):
+            m1 = DatabaseManager(database_url="/tmp/db1.oni", is_encrypted=True)
+            m2 = DatabaseManager(database_url="/tmp/../tmp/db1.oni", is_encrypted=True)
+            extra = m2.add_engine("setup", "/tmp/db1.oni", is_encrypted=True)
+        self.assertIs(m1.get_engine(), m2.get_engine())
+        self.assertIs(extra, m1.get_engine())
 
     def test_plain_db_initialization(self):
         manager = DatabaseManager(database_url="/tmp/plain.json", is_encrypted=False)
@@ -88,13 +100,62 @@ class TestDatabaseManagerSingleton(unittest.TestCase):
         result = manager.add_engine("existing", "/tmp/other.json", is_encrypted=False)
         self.assertIs(result, mock_engine)
 
-    def test_initialized_flag_prevents_reinitialization(self):
-        """Second __init__ call on same singleton should be a no-op."""
+    def test_reinitialization_switches_database(self):
         manager = DatabaseManager(database_url="/tmp/plain.json", is_encrypted=False)
-        initial_engines = dict(manager._engines)
-        # Call __init__ again with different URL
         manager.__init__(database_url="/tmp/other.json", is_encrypted=False)
-        self.assertEqual(list(manager._engines.keys()), list(initial_engines.keys()))
+        self.assertEqual(manager.get_engine().filepath, "/tmp/other.json")
+
+
+class TestEngineRegistry(unittest.TestCase):
+    def test_mode_is_part_of_the_key(self):
+        from onilock.core.enums import DBBackEndEnum
+        from onilock.db.engines import EncryptedJsonEngine, JsonEngine, SqliteEngine
+
+        registry = EngineRegistry(maxsize=8)
+        with patch("onilock.db.engines.EncryptionBackendManager"):
+            plain = registry.get("/tmp/x.oni")
+            encrypted = registry.get("/tmp/x.oni", is_encrypted=True)
+        sqlite = registry.get(
+            "/tmp/x.oni", is_encrypted=True, backend=DBBackEndEnum.SQLITE
+        )
+        self.assertIsInstance(plain, JsonEngine)
+        self.assertIsInstance(encrypted, EncryptedJsonEngine)
+        self.assertIsInstance(sqlite, SqliteEngine)
+        self.assertEqual(len(registry), 3)
+
+    def test_least_recently_used_engine_is_evicted(self):
+        registry = EngineRegistry(maxsize=2)
+        a = registry.get("/tmp/a.json")
+        registry.get("/tmp/b.json")
+        self.assertIs(registry.get("/tmp/a.json"), a)
+        registry.get("/tmp/c.json")
+
+        self.assertEqual(len(registry), 2)
+        self.assertIs(registry.get("/tmp/a.json"), a)
+        self.assertEqual(
+            {key[0] for key in registry._engines}, {"/tmp/a.json", "/tmp/c.json"}
+        )
+
+    def test_engine_cache_survives_across_managers(self):
+        import os
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "vault.oni")
+            with patch("onilock.db.engines.EncryptionBackendManager"):
+                DatabaseManager(
+                    database_url=path, is_encrypted=True
+                ).get_engine().write({"name": "p"})
+                engine = DatabaseManager(
+                    database_url=path, is_encrypted=True
+                ).get_engine()
+            self.assertEqual(engine.read(), {"name": "p"})
+            self.assertEqual(engine.cache_stats()["hits"], 1)
+
+    def test_clear(self):
+        engine_registry.get("/tmp/a.json")
+        engine_registry.clear()
+        self.assertEqual(len(engine_registry), 0)
 
 
 if __name__ == "__main__":
@@ -144,7 +144,7 @@ class TestGPGEncryptionBackend(unittest.TestCase):
             mock_gpg_instance.list_keys.return_value = []
 
         with patch(
-            "onilock.core.encryption.encryption.gnupg.GPG",
+            "gnupg.GPG",
             return_value=mock_gpg_instance,
         ):
             with patch("onilock.core.encryption.encryption.settings") as ms:
@@ -166,9 +166,7 @@ class TestGPGEncryptionBackend(unittest.TestCase):
         mock_gpg.gen_key_input.return_value = "input_data"
         mock_gpg.gen_key.return_value = MagicMock()
 
-        with patch(
-            "onilock.core.encryption.encryption.gnupg.GPG", return_value=mock_gpg
-        ):
+        with patch("gnupg.GPG", return_value=mock_gpg):
             with patch("onilock.core.encryption.encryption.settings") as ms:
                 ms.PASSPHRASE = "test-pass"
                 ms.GPG_HOME = "/tmp/test_gpg"
@@ -6,7 +6,7 @@ import os
 import unittest
 from unittest.mock import MagicMock, patch
 
-from onilock.db.engines import JsonEngine, EncryptedJsonEngine
+from onilock.db.engines import JsonEngine, EncryptedJsonEngine, SqliteEngine
 from onilock.core.settings import settings
 
 
@@ -169,6 +169,688 @@ class TestEncryptedJsonEngine(unittest.TestCase):
         with self.assertRaises(ValueError):
             engine.read()
 
+    def test_record_api_falls_back_to_full_rewrite(self):
+        engine = self._make_engine(self.filepath)
+        engine.write({"name": "p", "accounts": [{"id": "GitHub"}], "files": []})
+
+        self.assertEqual(engine.read_header(), {"name": "p"})
+        self.assertEqual(engine.get_record("accounts", "github"), {"id": "GitHub"})
+        self.assertEqual(engine.get_record("accounts", 0), {"id": "GitHub"})
+
+        engine.put_record("accounts", {"id": "github", "username": "me"})
+        engine.put_record("files", {"id": "doc"})
+        self.assertEqual(
+            engine.read()["accounts"], [{"id": "github", "username": "me"}]
+        )
+
+        self.assertTrue(engine.delete_record("files", "doc"))
+        self.assertFalse(engine.delete_record("files", "doc"))
+        engine.update_header(name="q")
+        self.assertEqual(engine.read()["name"], "q")
+
+
+class TestEncryptedJsonEngineCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = "/tmp/test_onilock_cache_engine"
+        os.makedirs(self.tmp_path, exist_ok=True)
+        self.filepath = os.path.join(self.tmp_path, "test.oni")
+        with patch("onilock.db.engines.EncryptionBackendManager"):
+            self.engine = EncryptedJsonEngine(self.filepath)
+        self.engine.write({"name": "p", "accounts": [{"id": "a"}]})
+
+    def tearDown(self):
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    def test_repeated_reads_hit_cache(self):
+        with patch("onilock.db.engines.AESGCM") as mock_aesgcm:
+            self.engine.read()
+            self.engine.read()
+        mock_aesgcm.assert_not_called()
+        self.assertEqual(self.engine.cache_stats(), {"hits": 2, "misses": 0})
+
+    def test_cached_reads_return_independent_copies(self):
+        first = self.engine.read()
+        first["name"] = "changed"
+        first["accounts"][0]["id"] = "changed"
+        first["accounts"].append({"id": "b"})
+        self.assertEqual(self.engine.read(), {"name": "p", "accounts": [{"id": "a"}]})
+
+    def test_external_change_invalidates_cache(self):
+        with patch("onilock.db.engines.EncryptionBackendManager"):
+            other = EncryptedJsonEngine(self.filepath)
+        other.write({"name": "other", "accounts": []})
+
+        self.assertEqual(self.engine.read()["name"], "other")
+        self.assertEqual(self.engine.cache_stats()["misses"], 1)
+
+    def test_own_writes_refresh_cache(self):
+        self.engine.put_record("accounts", {"id": "b"})
+        self.assertEqual(len(self.engine.read()["accounts"]), 2)
+        self.assertEqual(self.engine.cache_stats()["misses"], 0)
+
+    def test_journal_appends_refresh_cache(self):
+        with patch.object(settings, "VAULT_JOURNAL", True):
+            self.engine.read()
+            self.engine.put_record("accounts", {"id": "b"})
+            self.assertEqual(len(self.engine.read()["accounts"]), 2)
+        self.assertEqual(self.engine.cache_stats(), {"hits": 2, "misses": 0})
+
+    def test_invalidate_cache_forces_decrypt(self):
+        self.engine.invalidate_cache()
+        self.engine.read()
+        self.assertEqual(self.engine.cache_stats()["misses"], 1)
+
+
+class TestEncryptedJsonEngineJournal(unittest.TestCase):
+    """Journaled mode: record mutations append sealed deltas after the snapshot."""
+
+    def setUp(self):
+        self.tmp_path = "/tmp/test_onilock_journal_engine"
+        os.makedirs(self.tmp_path, exist_ok=True)
+        self.filepath = os.path.join(self.tmp_path, "test.oni")
+        patcher = patch.multiple(
+            settings, VAULT_JOURNAL=True, JOURNAL_MAX_BYTES=1 << 20
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with patch("onilock.db.engines.EncryptionBackendManager"):
+            self.engine = EncryptedJsonEngine(self.filepath)
+        self.engine.write({"name": "p", "accounts": [{"id": "a"}], "files": []})
+
+    def tearDown(self):
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    def _journal_lines(self):
+        raw = open(self.filepath, "rb").read()
+        _, lines = self.engine._split_v2(raw[len(EncryptedJsonEngine.V2_HEADER) :])
+        return lines
+
+    def test_mutations_append_and_replay(self):
+        snapshot = open(self.filepath, "rb").read()
+
+        self.engine.put_record("accounts", {"id": "b"})
+        self.engine.put_record("files", {"id": "doc"})
+        self.assertTrue(self.engine.delete_record("accounts", "A"))
+        self.assertFalse(self.engine.delete_record("accounts", "missing"))
+        self.engine.update_header(name="q")
+
+        raw = open(self.filepath, "rb").read()
+        self.assertTrue(raw.startswith(snapshot))
+        self.assertEqual(len(self._journal_lines()), 4)
+        self.assertEqual(
+            self.engine.read(),
+            {"name": "q", "accounts": [{"id": "b"}], "files": [{"id": "doc"}]},
+        )
+
+    def test_insert_keeps_existing_records(self):
+        self.assertFalse(self.engine.insert_record("accounts", {"id": "A", "n": 1}))
+        self.assertTrue(self.engine.insert_record("accounts", {"id": "b", "n": 1}))
+        self.assertEqual(len(self._journal_lines()), 1)
+
+        # A record added after the check is kept when the insert is replayed.
+        self.engine.put_record("accounts", {"id": "c", "n": 1})
+        data = self.engine.read()
+        self.engine._apply_delta(
+            data,
+            {"op": "insert", "collection": "accounts", "record": {"id": "C", "n": 2}},
+        )
+        self.assertEqual(data["accounts"][-1], {"id": "c", "n": 1})
+        self.assertEqual(len(data["accounts"]), 3)
+
+    def test_append_cost_is_independent_of_vault_size(self):
+        self.engine.write(
+            {"name": "p", "accounts": [{"id": str(i)} for i in range(2000)]}
+        )
+        before = os.path.getsize(self.filepath)
+        self.engine.put_record("accounts", {"id": "new"})
+        self.assertLess(os.path.getsize(self.filepath) - before, 200)
+
+    def test_compaction_after_threshold(self):
+        settings.JOURNAL_MAX_BYTES = 300
+        for i in range(5):
+            self.engine.put_record("accounts", {"id": f"x{i}"})
+        self.assertLess(len(self._journal_lines()), 5)
+        self.assertEqual(len(self.engine.read()["accounts"]), 6)
+
+    def test_compact_folds_journal(self):
+        self.engine.put_record("accounts", {"id": "b"})
+        self.engine.compact()
+        self.assertEqual(self._journal_lines(), [])
+        self.assertEqual([a["id"] for a in self.engine.read()["accounts"]], ["a", "b"])
+
+    def test_reordered_deltas_fail_authentication(self):
+        self.engine.put_record("accounts", {"id": "b"})
+        self.engine.put_record("accounts", {"id": "c"})
+        raw = open(self.filepath, "rb").read()
+        head, first, second = raw.rsplit(b"\n", 2)
+        with open(self.filepath, "wb") as f:
+            f.write(b"\n".join([head, second, first]))
+        with self.assertRaises(Exception):
+            self.engine.read()
+
+    def test_torn_last_record_is_ignored_and_folded(self):
+        self.engine.put_record("accounts", {"id": "b"})
+        with open(self.filepath, "ab") as f:
+            f.write(b'\n{"nonce": "tor')
+        self.assertEqual(len(self.engine.read()["accounts"]), 2)
+
+        self.engine.put_record("accounts", {"id": "c"})
+        self.assertEqual(
+            [a["id"] for a in self.engine.read()["accounts"]], ["a", "b", "c"]
+        )
+
+    def test_disabled_journal_rewrites_snapshot(self):
+        settings.VAULT_JOURNAL = False
+        self.engine.put_record("accounts", {"id": "b"})
+        self.assertEqual(self._journal_lines(), [])
+        self.assertEqual(len(self.engine.read()["accounts"]), 2)
+
+
+class TestEncryptedJsonEngineBinaryEnvelope(unittest.TestCase):
+    """v4 layout: fixed binary header followed by the raw ciphertext."""
+
+    def setUp(self):
+        self.tmp_path = "/tmp/test_onilock_binary_engine"
+        os.makedirs(self.tmp_path, exist_ok=True)
+        self.filepath = os.path.join(self.tmp_path, "test.oni")
+        patcher = patch.multiple(settings, VAULT_FORMAT="v4", VAULT_JOURNAL=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with patch("onilock.db.engines.EncryptionBackendManager"):
+            self.engine = EncryptedJsonEngine(self.filepath)
+        self.data = {"name": "p", "accounts": [{"id": str(i)} for i in range(50)]}
+
+    def tearDown(self):
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    def test_roundtrip_without_base64(self):
+        from onilock.db.envelope import BINARY_MAGIC
+
+        self.engine.write(self.data)
+        raw = open(self.filepath, "rb").read()
+        self.assertTrue(raw.startswith(BINARY_MAGIC))
+        payload = json.dumps(self.data, sort_keys=True, separators=(",", ":"))
+        # Header (50 bytes) plus ciphertext of the exact payload size.
+        self.assertEqual(len(raw), 50 + len(payload))
+
+        self.engine.invalidate_cache()
+        self.assertEqual(self.engine.read(), self.data)
+
+    def test_reader_buffer_is_reused(self):
+        self.engine.write(self.data)
+        self.engine.invalidate_cache()
+        self.engine.read()
+        buffer = self.engine._envelope_reader._buffer
+
+        self.engine.write({"name": "p", "accounts": []})
+        self.engine.invalidate_cache()
+        self.assertEqual(self.engine.read(), {"name": "p", "accounts": []})
+        self.assertIs(self.engine._envelope_reader._buffer, buffer)
+
+    def test_tampered_header_fails_authentication(self):
+        self.engine.write(self.data)
+        raw = bytearray(open(self.filepath, "rb").read())
+        raw[5] ^= 1  # flags byte
+        with open(self.filepath, "wb") as f:
+            f.write(raw)
+        self.engine.invalidate_cache()
+        with self.assertRaises(Exception):
+            self.engine.read()
+
+    def test_truncated_file_raises(self):
+        self.engine.write(self.data)
+        raw = open(self.filepath, "rb").read()
+        with open(self.filepath, "wb") as f:
+            f.write(raw[:-10])
+        self.engine.invalidate_cache()
+        with self.assertRaises(ValueError):
+            self.engine.read()
+
+    def test_oversized_length_is_refused_before_allocating(self):
+        from onilock.db.envelope import EnvelopeReader
+
+        self.engine.write(self.data)
+        raw = bytearray(open(self.filepath, "rb").read())
+        raw[34:42] = (2**62).to_bytes(8, "big")  # length field
+        with open(self.filepath, "wb") as f:
+            f.write(raw)
+        self.engine.invalidate_cache()
+        self.engine._envelope_reader = EnvelopeReader()
+        with self.assertRaises(ValueError):
+            self.engine.read()
+        self.assertEqual(len(self.engine._envelope_reader._buffer), 0)
+
+    def test_reads_older_formats_and_converts_on_write(self):
+        settings.VAULT_FORMAT = "v2"
+        self.engine.write(self.data)
+        settings.VAULT_FORMAT = "v4"
+        self.engine.invalidate_cache()
+        self.assertEqual(self.engine.read(), self.data)
+
+        from onilock.db.envelope import BINARY_MAGIC
+
+        self.engine.put_record("accounts", {"id": "new"})
+        self.assertTrue(open(self.filepath, "rb").read().startswith(BINARY_MAGIC))
+        self.engine.invalidate_cache()
+        self.assertEqual(len(self.engine.read()["accounts"]), 51)
+
+
+class TestEncryptedJsonEngineSegmented(unittest.TestCase):
+    """v3 layout: header and records are sealed as separate segments."""
+
+    def setUp(self):
+        self.tmp_path = "/tmp/test_onilock_segmented_engine"
+        os.makedirs(self.tmp_path, exist_ok=True)
+        self.filepath = os.path.join(self.tmp_path, "test.oni")
+        patcher = patch.multiple(settings, VAULT_FORMAT="v3", VAULT_JOURNAL=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with patch("onilock.db.engines.EncryptionBackendManager"):
+            self.engine = EncryptedJsonEngine(self.filepath)
+        self.data = {
+            "name": "p",
+            "accounts": [{"id": "GitHub", "password": "x"}, {"id": "mail"}],
+            "files": [{"id": "doc", "src": "/a"}],
+        }
+        self.engine.write(self.data)
+
+    def tearDown(self):
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    def _segments(self):
+        from onilock.db.segments import SegmentedVault
+        from onilock.db.engines import _vault_key
+
+        return SegmentedVault(_vault_key(), open(self.filepath, "rb").read()).segments
+
+    def test_roundtrip(self):
+        from onilock.db.segments import V3_HEADER
+
+        raw = open(self.filepath, "rb").read()
+        self.assertTrue(raw.startswith(V3_HEADER))
+        self.assertNotIn(b"GitHub", raw)
+        self.engine.invalidate_cache()
+        self.assertEqual(self.engine.read(), self.data)
+
+    def test_insert_record(self):
+        self.assertFalse(self.engine.insert_record("accounts", {"id": "github"}))
+        self.assertTrue(self.engine.insert_record("accounts", {"id": "gitlab"}))
+        self.engine.invalidate_cache()
+        ids = [a["id"] for a in self.engine.read()["accounts"]]
+        self.assertEqual(ids, ["GitHub", "mail", "gitlab"])
+        self.assertEqual(self.engine.get_record("accounts", "github")["password"], "x")
+
+    def test_empty_collections_survive(self):
+        self.engine.write({"name": "p", "accounts": [], "files": []})
+        self.engine.invalidate_cache()
+        self.assertEqual(self.engine.read(), {"name": "p", "accounts": [], "files": []})
+
+    def test_partial_reads_only_open_needed_segments(self):
+        from onilock.db.segments import SegmentedVault
+
+        self.engine.invalidate_cache()
+        with patch.object(
+            SegmentedVault, "open", autospec=True, side_effect=SegmentedVault.open
+        ) as opened:
+            self.assertEqual(self.engine.read_header(), {"name": "p"})
+            self.assertEqual(opened.call_count, 1)
+            account = self.engine.get_record("accounts", "github")
+            self.assertEqual(account["password"], "x")
+            self.assertEqual(opened.call_count, 2)
+            self.assertEqual(self.engine.get_record("accounts", -1), {"id": "mail"})
+            self.assertIsNone(self.engine.get_record("accounts", "missing"))
+            self.assertEqual(self.engine.read_collection("files"), self.data["files"])
+            self.assertEqual(opened.call_count, 4)
+
+    def test_unchanged_segments_keep_ciphertext(self):
+        before = self._segments()
+        data = self.engine.read()
+        data["accounts"][1]["username"] = "me"
+        self.engine.write(data)
+        after = self._segments()
+
+        self.assertEqual(before[0], after[0])
+        self.assertEqual(before[1], after[1])
+        self.assertNotEqual(before[2].ciphertext, after[2].ciphertext)
+        self.assertEqual(before[3], after[3])
+
+    def test_record_api_reseals_one_segment(self):
+        before = self._segments()
+        self.engine.put_record("accounts", {"id": "new"})
+        self.assertTrue(self.engine.delete_record("accounts", "MAIL"))
+        self.assertFalse(self.engine.delete_record("accounts", "missing"))
+        self.engine.update_header(name="q")
+        after = self._segments()
+
+        self.assertEqual(before[1], after[1])
+        self.assertEqual(before[3], after[2])
+        self.assertEqual(
+            self.engine.read(),
+            {
+                "name": "q",
+                "accounts": [{"id": "GitHub", "password": "x"}, {"id": "new"}],
+                "files": [{"id": "doc", "src": "/a"}],
+            },
+        )
+        self.engine.invalidate_cache()
+        self.assertEqual(self.engine.read()["name"], "q")
+
+    def test_swapped_segments_fail_authentication(self):
+        from onilock.db.codecs import get_codec
+        from onilock.db.segments import pack
+        from onilock.db.engines import _vault_key
+
+        segments = self._segments()
+        github, mail = segments[1], segments[2]
+        forged = mail._replace(ciphertext=github.ciphertext, nonce=github.nonce)
+        with open(self.filepath, "wb") as f:
+            f.write(pack(_vault_key(), [segments[0], forged, segments[3]], get_codec()))
+        self.engine.invalidate_cache()
+        with self.assertRaises(Exception):
+            self.engine.read()
+
+    def test_v2_vault_is_converted_on_write(self):
+        settings.VAULT_FORMAT = "v2"
+        self.engine.write(self.data)
+        self.assertTrue(
+            open(self.filepath, "rb").read().startswith(EncryptedJsonEngine.V2_HEADER)
+        )
+        settings.VAULT_FORMAT = "v3"
+        self.engine.put_record("accounts", {"id": "new"})
+        self.assertEqual(len(self._segments()), 5)
+
+
+def _put_records(filepath, fmt, prefix, count):
+    with patch.multiple(settings, VAULT_FORMAT=fmt, VAULT_JOURNAL=False):
+        engine = EncryptedJsonEngine(filepath)
+        for i in range(count):
+            engine.put_record("accounts", {"id": f"{prefix}-{i}"})
+
+
+class TestEncryptedJsonEngineConcurrency(unittest.TestCase):
+    """Locking, atomic writes and generation-based conflict detection."""
+
+    FORMATS = ("v2", "v3", "v4")
+
+    def setUp(self):
+        self.tmp_path = "/tmp/test_onilock_concurrency_engine"
+        os.makedirs(self.tmp_path, exist_ok=True)
+        self.filepath = os.path.join(self.tmp_path, "test.oni")
+        patcher = patch.object(settings, "VAULT_JOURNAL", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.data = {"name": "p", "accounts": [{"id": "a"}], "files": []}
+
+    def tearDown(self):
+        for name in os.listdir(self.tmp_path):
+            os.remove(os.path.join(self.tmp_path, name))
+
+    def _engine(self):
+        with patch("onilock.db.engines.EncryptionBackendManager"):
+            return EncryptedJsonEngine(self.filepath)
+
+    def test_generation_increases_with_every_write(self):
+        for fmt in self.FORMATS:
+            with self.subTest(fmt=fmt), patch.object(settings, "VAULT_FORMAT", fmt):
+                if os.path.exists(self.filepath):
+                    os.remove(self.filepath)
+                engine = self._engine()
+                engine.write(self.data)
+                self.assertEqual(engine._disk_generation(), 1)
+                engine.put_record("accounts", {"id": "b"})
+                engine.update_header(name="q")
+                self.assertEqual(engine._disk_generation(), 3)
+                engine.invalidate_cache()
+                self.assertEqual(engine.read()["name"], "q")
+                self.assertEqual(engine._generation, 3)
+
+    def test_journal_appends_count_as_generations(self):
+        with patch.multiple(settings, VAULT_FORMAT="v2", VAULT_JOURNAL=True):
+            engine = self._engine()
+            engine.write(self.data)
+            engine.put_record("accounts", {"id": "b"})
+            engine.delete_record("accounts", "a")
+            self.assertEqual(engine._disk_generation(), 3)
+            engine.write(engine.read())
+            self.assertEqual(engine._disk_generation(), 4)
+
+    def test_stale_write_raises_conflict(self):
+        from onilock.core.exceptions import VaultConflictError
+
+        for fmt in self.FORMATS:
+            with self.subTest(fmt=fmt), patch.object(settings, "VAULT_FORMAT", fmt):
+                first, second = self._engine(), self._engine()
+                first.write(self.data)
+                stale = second.read()
+                first.put_record("accounts", {"id": "b"})
+                with self.assertRaises(VaultConflictError):
+                    second.write(stale)
+                self.assertEqual(len(first.read()["accounts"]), 2)
+
+    def test_record_updates_retry_after_a_conflict(self):
+        first, second = self._engine(), self._engine()
+        first.write(self.data)
+        second.read()
+        original_read = second.read
+
+        def racing_read():
+            data = original_read()
+            if not racing_read.raced:
+                racing_read.raced = True
+                first.put_record("accounts", {"id": "b"})
+            return data
+
+        racing_read.raced = False
+        with (
+            patch.multiple(settings, VAULT_FORMAT="v4"),
+            patch.object(second, "read", side_effect=racing_read),
+        ):
+            second.put_record("accounts", {"id": "c"})
+        first.invalidate_cache()
+        ids = [a["id"] for a in first.read()["accounts"]]
+        self.assertEqual(ids, ["a", "b", "c"])
+
+    def test_conflicts_give_up_after_configured_retries(self):
+        from onilock.core.exceptions import VaultConflictError
+
+        engine = self._engine()
+        engine.write(self.data)
+        with (
+            patch.object(settings, "WRITE_RETRIES", 2),
+            patch.object(engine, "write", side_effect=VaultConflictError()) as write,
+            patch("onilock.db.engines.time.sleep"),
+        ):
+            with self.assertRaises(VaultConflictError):
+                engine.put_record("accounts", {"id": "b"})
+        self.assertEqual(write.call_count, 3)
+
+    def test_generation_is_authenticated(self):
+        for fmt in ("v3", "v4"):
+            with self.subTest(fmt=fmt), patch.object(settings, "VAULT_FORMAT", fmt):
+                engine = self._engine()
+                engine.write(self.data)
+                raw = bytearray(open(self.filepath, "rb").read())
+                # The generation's low byte sits at the end of the v4 header
+                # and of the v3 table length + generation prefix.
+                raw[49 if fmt == "v4" else 22] ^= 1
+                with open(self.filepath, "wb") as f:
+                    f.write(raw)
+                engine.invalidate_cache()
+                with self.assertRaises(Exception):
+                    engine.read()
+
+    def test_writes_replace_the_file_atomically(self):
+        engine = self._engine()
+        engine.write(self.data)
+        inode = os.stat(self.filepath).st_ino
+        with patch(
+            "onilock.db.engines.AESGCM.encrypt", side_effect=RuntimeError("boom")
+        ):
+            with self.assertRaises(RuntimeError):
+                engine.write({"name": "other"})
+        self.assertEqual(os.stat(self.filepath).st_ino, inode)
+        engine.invalidate_cache()
+        self.assertEqual(engine.read(), self.data)
+        self.assertEqual(
+            sorted(os.listdir(self.tmp_path)), ["test.oni", "test.oni.lock"]
+        )
+
+    def test_parallel_processes_do_not_lose_updates(self):
+        import multiprocessing
+
+        context = multiprocessing.get_context("fork")
+        for fmt in self.FORMATS:
+            with self.subTest(fmt=fmt), patch.object(settings, "VAULT_FORMAT", fmt):
+                self._engine().write({"name": "p", "accounts": [], "files": []})
+                workers = [
+                    context.Process(
+                        target=_put_records, args=(self.filepath, fmt, f"w{n}", 5)
+                    )
+                    for n in range(4)
+                ]
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join(60)
+                    self.assertEqual(worker.exitcode, 0)
+
+                accounts = self._engine().read()["accounts"]
+                self.assertEqual(len(accounts), 20)
+
+
+class TestSqliteEngine(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = "/tmp/test_onilock_sqlite_engine"
+        os.makedirs(self.tmp_path, exist_ok=True)
+        self.filepath = os.path.join(self.tmp_path, "test.oni")
+        self.data = {
+            "name": "p",
+            "master_password": "hash",
+            "accounts": [{"id": "GitHub", "n": 1}, {"id": "gitlab", "n": 2}],
+            "files": [{"id": "Doc"}],
+        }
+
+    def tearDown(self):
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    def test_read_missing_file_returns_empty_dict(self):
+        engine = SqliteEngine(self.filepath)
+        self.assertEqual(engine.read(), {})
+        self.assertEqual(engine.read_header(), {})
+        self.assertIsNone(engine.get_record("accounts", "github"))
+        self.assertFalse(os.path.exists(self.filepath))
+
+    def test_write_and_read_roundtrip(self):
+        engine = SqliteEngine(self.filepath)
+        engine.write(self.data)
+        self.assertEqual(engine.read(), self.data)
+        self.assertEqual(engine.read_header(), {"name": "p", "master_password": "hash"})
+
+    def test_empty_collections_roundtrip(self):
+        engine = SqliteEngine(self.filepath)
+        engine.write({"name": "p", "accounts": [], "files": []})
+        self.assertEqual(engine.read(), {"name": "p", "accounts": [], "files": []})
+
+    def test_record_operations(self):
+        engine = SqliteEngine(self.filepath)
+        engine.write(self.data)
+
+        self.assertEqual(engine.get_record("accounts", "github")["n"], 1)
+        self.assertEqual(engine.get_record("accounts", 1)["id"], "gitlab")
+        self.assertEqual(engine.get_record("accounts", -1)["id"], "gitlab")
+        self.assertIsNone(engine.get_record("accounts", 5))
+        self.assertIsNone(engine.get_record("files", "doc"))
+
+        engine.put_record("accounts", {"id": "github", "n": 3})
+        engine.put_record("accounts", {"id": "bitbucket", "n": 4})
+        ids = [(a["id"], a["n"]) for a in engine.read()["accounts"]]
+        self.assertEqual(ids, [("github", 3), ("gitlab", 2), ("bitbucket", 4)])
+
+        self.assertFalse(engine.insert_record("accounts", {"id": "GITHUB", "n": 5}))
+        self.assertEqual(engine.get_record("accounts", "github")["n"], 3)
+        self.assertTrue(engine.insert_record("accounts", {"id": "gitea", "n": 6}))
+        self.assertTrue(engine.delete_record("accounts", "gitea"))
+
+        self.assertTrue(engine.delete_record("accounts", "GITLAB"))
+        self.assertFalse(engine.delete_record("accounts", "gitlab"))
+        engine.update_header(master_password="new")
+        self.assertEqual(engine.read_header()["master_password"], "new")
+        self.assertEqual(len(engine.read()["accounts"]), 2)
+
+    def test_rows_are_encrypted_and_ids_not_stored_in_clear(self):
+        engine = SqliteEngine(self.filepath)
+        engine.write(self.data)
+        raw = open(self.filepath, "rb").read()
+        self.assertTrue(raw.startswith(SqliteEngine.SQLITE_MAGIC))
+        self.assertNotIn(b"GitHub", raw)
+        self.assertNotIn(b"hash", raw)
+
+    def test_swapped_rows_fail_authentication(self):
+        import sqlite3
+
+        engine = SqliteEngine(self.filepath)
+        engine.write(self.data)
+        conn = sqlite3.connect(self.filepath)
+        rows = conn.execute(
+            "SELECT seq, nonce, data FROM records "
+            "WHERE collection = 'accounts' ORDER BY seq"
+        ).fetchall()
+        conn.execute(
+            "UPDATE records SET nonce = ?, data = ? WHERE seq = ?",
+            (rows[1][1], rows[1][2], rows[0][0]),
+        )
+        conn.commit()
+        conn.close()
+        with self.assertRaises(Exception):
+            engine.get_record("accounts", "github")
+
+    def test_stale_write_raises_conflict(self):
+        from onilock.core.exceptions import VaultConflictError
+
+        first, second = SqliteEngine(self.filepath), SqliteEngine(self.filepath)
+        first.write(self.data)
+        stale = second.read()
+        first.put_record("accounts", {"id": "bitbucket"})
+        with self.assertRaises(VaultConflictError):
+            second.write(stale)
+        self.assertEqual(len(first.read()["accounts"]), 3)
+
+        # A fresh read makes the write go through, and the engine follows
+        # its own record-level writes.
+        second.write(second.read())
+        second.put_record("accounts", {"id": "gitea"})
+        second.write(second.read())
+        self.assertEqual(len(first.read()["accounts"]), 4)
+
+    def test_upgrades_schema_version_1(self):
+        import sqlite3
+
+        engine = SqliteEngine(self.filepath)
+        engine.write(self.data)
+        conn = sqlite3.connect(self.filepath)
+        conn.execute("DROP TABLE generation")
+        conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+        conn.close()
+
+        engine = SqliteEngine(self.filepath)
+        self.assertEqual(engine.read(), self.data)
+        engine.write(self.data)
+        self.assertEqual(engine._generation, 1)
+
+    def test_migrates_existing_json_vault(self):
+        with patch("onilock.db.engines.EncryptionBackendManager"):
+            EncryptedJsonEngine(self.filepath).write(self.data)
+        engine = SqliteEngine(self.filepath)
+        self.assertEqual(engine.read(), self.data)
+        raw = open(self.filepath, "rb").read()
+        self.assertTrue(raw.startswith(SqliteEngine.SQLITE_MAGIC))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,197 @@
+"""Tests for onilock.core.fileio."""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from onilock.core import fileio
+from onilock.core.fileio import (
+    FileLock,
+    append_bytes,
+    atomic_write,
+    group_commit,
+    remove_lock_file,
+)
+from onilock.core.settings import settings
+
+
+def _hold_exclusive(path, ready, release):
+    with FileLock(os.path.realpath(path)).exclusive():
+        ready.set()
+        release.wait(10)
+
+
+class TestFileLock(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(prefix="onilock_fileio_")
+        self.path = os.path.join(self.tmp_path, "vault.oni")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def test_one_lock_per_path(self):
+        alias = os.path.join(self.tmp_path, ".", "vault.oni")
+        self.assertIs(FileLock.for_path(self.path), FileLock.for_path(alias))
+
+    def test_nested_acquisitions_upgrade_and_downgrade(self):
+        lock = FileLock.for_path(self.path)
+        with lock.shared():
+            self.assertFalse(lock._exclusive)
+            with lock.exclusive():
+                self.assertTrue(lock._exclusive)
+                with lock.shared():
+                    self.assertTrue(lock._exclusive)
+            self.assertFalse(lock._exclusive)
+        self.assertIsNone(lock._fd)
+        self.assertTrue(os.path.exists(self.path + ".lock"))
+
+    def test_shared_lock_on_missing_directory_is_a_no_op(self):
+        lock = FileLock.for_path(os.path.join(self.tmp_path, "missing", "vault.oni"))
+        with lock.shared():
+            self.assertIsNone(lock._fd)
+
+    def test_exclusive_lock_blocks_other_processes(self):
+        context = multiprocessing.get_context("fork")
+        ready, release = context.Event(), context.Event()
+        holder = context.Process(
+            target=_hold_exclusive, args=(self.path, ready, release)
+        )
+        holder.start()
+        self.assertTrue(ready.wait(10))
+
+        def release_later():
+            time.sleep(0.2)
+            release.set()
+
+        context.Process(target=release_later).start()
+        start = time.monotonic()
+        with FileLock.for_path(self.path).shared():
+            waited = time.monotonic() - start
+        holder.join(10)
+        self.assertGreaterEqual(waited, 0.15)
+
+    def test_remove_lock_file(self):
+        with FileLock.for_path(self.path).exclusive():
+            pass
+        remove_lock_file(self.path)
+        self.assertFalse(os.path.exists(self.path + ".lock"))
+        remove_lock_file(self.path)
+
+
+class TestAtomicWrite(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(prefix="onilock_fileio_")
+        self.path = os.path.join(self.tmp_path, "data.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def test_writes_all_chunks(self):
+        atomic_write(self.path, [b"abc", memoryview(b"def")])
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"abcdef")
+
+    def test_failure_keeps_the_previous_content(self):
+        atomic_write(self.path, [b"old"])
+
+        def chunks():
+            yield b"new"
+            raise RuntimeError("interrupted")
+
+        with self.assertRaises(RuntimeError):
+            atomic_write(self.path, chunks())
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"old")
+        self.assertEqual(os.listdir(self.tmp_path), ["data.bin"])
+
+    def test_content_is_synced_before_rename(self):
+        with patch("onilock.core.fileio.os.fsync") as fsync:
+            atomic_write(self.path, [b"x"])
+        # Once for the file, once for the directory.
+        self.assertEqual(fsync.call_count, 2)
+
+
+class TestDurability(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(prefix="onilock_fileio_")
+        self.path = os.path.join(self.tmp_path, "data.bin")
+        group_commit.flush()
+
+    def tearDown(self):
+        group_commit.flush()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def _write(self, mode, write=atomic_write, **overrides):
+        with (
+            patch.multiple(settings, DURABILITY=mode, **overrides),
+            patch("onilock.core.fileio.os.fsync") as fsync,
+        ):
+            write(self.path, [b"x"] if write is atomic_write else b"x")
+        return fsync.call_count
+
+    def test_fast_never_syncs(self):
+        self.assertEqual(self._write("fast"), 0)
+        self.assertEqual(self._write("fast", append_bytes), 0)
+        self.assertEqual(len(group_commit), 0)
+
+    def test_strict_syncs_appends(self):
+        self.assertEqual(self._write("strict", append_bytes), 1)
+
+    def test_batched_writes_are_synced_together(self):
+        for _ in range(3):
+            self.assertEqual(self._write("batched"), 0)
+        self.assertEqual(len(group_commit), 3)
+
+        with patch("onilock.core.fileio.os.fsync") as fsync:
+            fileio.flush()
+        # The file and its directory, once each.
+        self.assertEqual(fsync.call_count, 2)
+        self.assertEqual(len(group_commit), 0)
+
+    def test_batch_is_flushed_when_full(self):
+        self.assertEqual(self._write("batched", DURABILITY_BATCH_SIZE=2), 0)
+        self.assertEqual(self._write("batched", DURABILITY_BATCH_SIZE=2), 2)
+        self.assertEqual(len(group_commit), 0)
+
+    def test_batch_is_flushed_after_its_interval(self):
+        self.assertEqual(self._write("batched", DURABILITY_BATCH_INTERVAL=0), 2)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            self._write("eventually")
+
+    def test_strict_durability_overrides_the_mode(self):
+        self.assertEqual(self._write("batched"), 0)
+        with patch("onilock.core.fileio.os.fsync") as fsync:
+            with fileio.strict_durability():
+                # The pending batch is flushed first.
+                self.assertEqual(fsync.call_count, 2)
+                self.assertEqual(self._write("fast"), 2)
+        self.assertEqual(self._write("fast"), 0)
+
+    def test_strict_durability_is_local_to_the_thread(self):
+        entered, leave = threading.Event(), threading.Event()
+        modes = []
+
+        def force():
+            with fileio.strict_durability():
+                entered.set()
+                leave.wait(5)
+
+        with patch.object(settings, "DURABILITY", "fast"):
+            thread = threading.Thread(target=force)
+            thread.start()
+            entered.wait(5)
+            modes.append(fileio.durability())
+            with fileio.strict_durability():
+                leave.set()
+                thread.join(5)
+                # The other thread leaving its block does not end this one.
+                modes.append(fileio.durability())
+            modes.append(fileio.durability())
+        self.assertEqual(modes, ["fast", "strict", "fast"])
@@ -51,7 +51,7 @@ class TestGetOutputFilename(unittest.TestCase):
 
 class TestFileEncryptionManagerInit(unittest.TestCase):
     def test_init_creates_gpg_instance(self):
-        with patch("onilock.filemanager.gnupg.GPG") as MockGPG:
+        with patch("gnupg.GPG") as MockGPG:
             MockGPG.return_value = MagicMock()
             with patch("onilock.filemanager.settings") as ms:
                 ms.GPG_HOME = "/tmp/gpg"
@@ -62,16 +62,18 @@ class TestFileEncryptionManagerInit(unittest.TestCase):
         self.assertIsNone(manager._profile)
 
     def test_init_with_gpg_home(self):
-        with patch("onilock.filemanager.gnupg.GPG") as MockGPG:
+        with patch("gnupg.GPG") as MockGPG:
             MockGPG.return_value = MagicMock()
             manager = FileEncryptionManager(gpg_home="/tmp/custom/gpg")
 
-        MockGPG.assert_called_once_with(gnupghome="/tmp/custom/gpg")
+        MockGPG.assert_called_once_with(
+            gnupghome="/tmp/custom/gpg", options=["--pinentry-mode", "loopback"]
+        )
 
 
 class TestFileEncryptionManagerProperties(unittest.TestCase):
     def _make_manager(self, profile=None, empty_engine=False):
-        with patch("onilock.filemanager.gnupg.GPG") as MockGPG:
+        with patch("gnupg.GPG") as MockGPG:
             MockGPG.return_value = MagicMock()
             with patch("onilock.filemanager.settings") as ms:
                 ms.GPG_HOME = "/tmp/gpg"
@@ -121,7 +123,7 @@ class TestFileEncryptionManagerProperties(unittest.TestCase):
 
 class TestEncryptBytes(unittest.TestCase):
     def _make_manager(self):
-        with patch("onilock.filemanager.gnupg.GPG") as MockGPG:
+        with patch("gnupg.GPG") as MockGPG:
             mock_gpg = MagicMock()
             mock_encrypted = MagicMock()
             mock_encrypted.ok = True
@@ -156,10 +158,27 @@ class TestEncryptBytes(unittest.TestCase):
                 manager.encrypt_bytes(b"plaintext content", out_file)
         mock_gpg.encrypt.assert_called_once()
 
+    def test_encrypt_bytes_compresses_before_gpg(self):
+        import tempfile
+        from onilock.core.compression import FILE_MAGIC, unpack_file
+        from onilock.core.settings import settings
+
+        content = b"key = value\n" * 500
+        manager, mock_gpg = self._make_manager()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            out_file = Path(tmpdir) / "encrypted.oni"
+            with patch.object(settings, "COMPRESSION", "zlib"):
+                manager.encrypt_bytes(content, out_file)
+        args, kwargs = mock_gpg.encrypt.call_args
+        self.assertTrue(args[0].startswith(FILE_MAGIC))
+        self.assertLess(len(args[0]), len(content) // 10)
+        self.assertEqual(kwargs["extra_args"], ["--compress-algo", "none"])
+        self.assertEqual(unpack_file(args[0]), content)
+
 
 class TestEncrypt(unittest.TestCase):
     def _make_manager_with_mock_gpg(self):
-        with patch("onilock.filemanager.gnupg.GPG") as MockGPG:
+        with patch("gnupg.GPG") as MockGPG:
             mock_gpg = MagicMock()
             mock_result = MagicMock()
             mock_result.ok = True
@@ -257,12 +276,16 @@ class TestEncrypt(unittest.TestCase):
                     ):
                         manager.encrypt("doc1", str(src_file))
 
-        engine.write.assert_called_once()
+        engine.put_record.assert_called_once()
+        collection, record = engine.put_record.call_args[0]
+        self.assertEqual(collection, "files")
+        self.assertEqual(record["id"], "doc1")
+        engine.write.assert_not_called()
 
 
 class TestDecryptBytes(unittest.TestCase):
     def _make_manager(self, decrypt_ok=True):
-        with patch("onilock.filemanager.gnupg.GPG") as MockGPG:
+        with patch("gnupg.GPG") as MockGPG:
             mock_gpg = MagicMock()
             mock_result = MagicMock()
             mock_result.ok = decrypt_ok
@@ -282,6 +305,19 @@ class TestDecryptBytes(unittest.TestCase):
             result = manager.decrypt_bytes(b"encrypted_data")
         self.assertEqual(result, b"plaintext")
 
+    def test_decrypt_bytes_decompresses(self):
+        from onilock.core.compression import pack_file
+        from onilock.core.settings import settings
+
+        content = b"key = value\n" * 500
+        with patch.object(settings, "COMPRESSION", "zlib"):
+            packed = pack_file(content)
+        manager = self._make_manager(decrypt_ok=True)
+        manager.gpg.decrypt.return_value.data = packed
+        with patch("onilock.filemanager.settings") as ms:
+            ms.PASSPHRASE = "test"
+            self.assertEqual(manager.decrypt_bytes(b"encrypted_data"), content)
+
     def test_decrypt_bytes_failure_raises(self):
         manager = self._make_manager(decrypt_ok=False)
         with patch("onilock.filemanager.settings") as ms:
@@ -294,7 +330,7 @@ class TestDelete(unittest.TestCase):
     def test_delete_existing_file(self):
         import tempfile
 
-        with patch("onilock.filemanager.gnupg.GPG") as MockGPG:
+        with patch("gnupg.GPG") as MockGPG:
             MockGPG.return_value = MagicMock()
             with patch("onilock.filemanager.settings") as ms:
                 ms.GPG_HOME = "/tmp/gpg"
@@ -316,10 +352,11 @@ class TestDelete(unittest.TestCase):
                 ms.VAULT_DIR = vault_dir
                 manager.delete("doc1")
 
-        engine.write.assert_called_once()
+        engine.delete_record.assert_called_once_with("files", "doc1")
+        self.assertIsNone(profile.get_file("doc1"))
 
     def test_delete_nonexistent_file_no_error(self):
-        with patch("onilock.filemanager.gnupg.GPG") as MockGPG:
+        with patch("gnupg.GPG") as MockGPG:
             MockGPG.return_value = MagicMock()
             with patch("onilock.filemanager.settings") as ms:
                 ms.GPG_HOME = "/tmp/gpg"
@@ -335,11 +372,12 @@ class TestDelete(unittest.TestCase):
             manager.delete("doc1")  # File doesn't exist, should not raise
 
         engine.write.assert_not_called()
+        engine.delete_record.assert_not_called()
 
 
 class TestExport(unittest.TestCase):
     def _make_manager_with_decrypt(self):
-        with patch("onilock.filemanager.gnupg.GPG") as MockGPG:
+        with patch("gnupg.GPG") as MockGPG:
             mock_gpg = MagicMock()
             mock_result = MagicMock()
             mock_result.ok = True
@@ -520,7 +558,7 @@ class TestExport(unittest.TestCase):
 
 class TestOpen(unittest.TestCase):
     def _make_manager(self):
-        with patch("onilock.filemanager.gnupg.GPG") as MockGPG:
+        with patch("gnupg.GPG") as MockGPG:
             mock_gpg = MagicMock()
             mock_result = MagicMock()
             mock_result.ok = True
@@ -682,7 +720,7 @@ class TestOpen(unittest.TestCase):
 
 class TestClear(unittest.TestCase):
     def test_clear_is_callable(self):
-        with patch("onilock.filemanager.gnupg.GPG") as MockGPG:
+        with patch("gnupg.GPG") as MockGPG:
             MockGPG.return_value = MagicMock()
             with patch("onilock.filemanager.settings") as ms:
                 ms.GPG_HOME = "/tmp/gpg"
@@ -1,10 +1,16 @@
 """Tests for onilock.core.gpg utility functions."""
 
+import os
+import shutil
+import tempfile
 import unittest
+from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 from onilock.core.gpg import (
     generate_pgp_key,
+    gpg_handle,
+    list_keys,
     pgp_key_exists,
     get_pgp_key_info,
     delete_pgp_key,
@@ -34,7 +40,7 @@ class TestGeneratePgpKey(unittest.TestCase):
         mock_key = MagicMock()
         mock_gpg.gen_key.return_value = mock_key
 
-        with patch("onilock.core.gpg.gnupg.GPG", return_value=mock_gpg):
+        with patch("gnupg.GPG", return_value=mock_gpg):
             result = generate_pgp_key(
                 gpg_home="/tmp/gpg",
                 name="testkey",
@@ -55,92 +61,70 @@ class TestGeneratePgpKey(unittest.TestCase):
 
 class TestPgpKeyExists(unittest.TestCase):
     def test_by_fingerprint_found(self):
-        with patch(
-            "onilock.core.gpg.gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)
-        ):
+        with patch("gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)):
             result = pgp_key_exists(None, key_fingerprint="ABCDEF1234567890")
         self.assertTrue(result)
 
     def test_by_fingerprint_not_found(self):
-        with patch(
-            "onilock.core.gpg.gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)
-        ):
+        with patch("gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)):
             result = pgp_key_exists(None, key_fingerprint="FFFFFFFFFFFFFFFF")
         self.assertFalse(result)
 
     def test_by_key_id_found(self):
-        with patch(
-            "onilock.core.gpg.gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)
-        ):
+        with patch("gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)):
             result = pgp_key_exists(None, key_id="ABCDEF12")
         self.assertTrue(result)
 
     def test_by_key_id_not_found(self):
-        with patch(
-            "onilock.core.gpg.gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)
-        ):
+        with patch("gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)):
             result = pgp_key_exists(None, key_id="NOTFOUND")
         self.assertFalse(result)
 
     def test_by_real_name_found(self):
-        with patch(
-            "onilock.core.gpg.gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)
-        ):
+        with patch("gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)):
             result = pgp_key_exists(None, real_name="testkey")
         self.assertTrue(result)
 
     def test_by_real_name_not_found(self):
-        with patch(
-            "onilock.core.gpg.gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)
-        ):
+        with patch("gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)):
             result = pgp_key_exists(None, real_name="otherkey")
         self.assertFalse(result)
 
     def test_no_criteria_returns_false(self):
-        with patch(
-            "onilock.core.gpg.gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)
-        ):
+        with patch("gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)):
             result = pgp_key_exists(None)
         self.assertFalse(result)
 
     def test_empty_keyring_returns_false(self):
-        with patch("onilock.core.gpg.gnupg.GPG", return_value=_make_mock_gpg([])):
+        with patch("gnupg.GPG", return_value=_make_mock_gpg([])):
             result = pgp_key_exists(None, real_name="testkey")
         self.assertFalse(result)
 
 
 class TestGetPgpKeyInfo(unittest.TestCase):
     def test_by_real_name_found(self):
-        with patch(
-            "onilock.core.gpg.gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)
-        ):
+        with patch("gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)):
             result = get_pgp_key_info(None, real_name="testkey")
         self.assertIsNotNone(result)
         self.assertEqual(result["fingerprint"], "ABCDEF1234567890")
 
     def test_by_real_name_not_found_returns_none(self):
-        with patch(
-            "onilock.core.gpg.gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)
-        ):
+        with patch("gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)):
             result = get_pgp_key_info(None, real_name="nonexistent")
         self.assertIsNone(result)
 
     def test_by_key_id_found(self):
-        with patch(
-            "onilock.core.gpg.gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)
-        ):
+        with patch("gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)):
             result = get_pgp_key_info(None, key_id="ABCDEF12")
         self.assertIsNotNone(result)
 
     def test_by_key_id_not_found_returns_none(self):
-        with patch(
-            "onilock.core.gpg.gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)
-        ):
+        with patch("gnupg.GPG", return_value=_make_mock_gpg(_SAMPLE_KEYS)):
             result = get_pgp_key_info(None, key_id="NOTFOUND")
         self.assertIsNone(result)
 
     def test_empty_keyring_returns_none(self):
-        with patch("onilock.core.gpg.gnupg.GPG", return_value=_make_mock_gpg([])):
+        with patch("gnupg.GPG", return_value=_make_mock_gpg([])):
             result = get_pgp_key_info(None, real_name="testkey")
         self.assertIsNone(result)
 
@@ -149,7 +133,7 @@ class TestDeletePgpKey(unittest.TestCase):
     def test_deletes_secret_then_public(self):
         mock_gpg = _make_mock_gpg(_SAMPLE_KEYS)
 
-        with patch("onilock.core.gpg.gnupg.GPG", return_value=mock_gpg):
+        with patch("gnupg.GPG", return_value=mock_gpg):
             delete_pgp_key(
                 passphrase="mypass",
                 gpg_home="/tmp/gpg",
@@ -169,5 +153,54 @@ class TestDeletePgpKey(unittest.TestCase):
         self.assertEqual(calls[1][0][0], "ABCDEF1234567890")
 
 
+class TestSharedHandles(unittest.TestCase):
+    def setUp(self):
+        self.home = Path(tempfile.mkdtemp(prefix="onilock_gpg_"))
+        self.addCleanup(shutil.rmtree, self.home, ignore_errors=True)
+        (self.home / "pubring.kbx").write_bytes(b"keys")
+        self.gpg = _make_mock_gpg(_SAMPLE_KEYS)
+        patcher = patch("gnupg.GPG", return_value=self.gpg)
+        self.GPG = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def touch_keyring(self):
+        stat = (self.home / "pubring.kbx").stat()
+        os.utime(
+            self.home / "pubring.kbx",
+            ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000),
+        )
+
+    def test_one_client_and_listing_per_keyring_state(self):
+        home = str(self.home)
+        self.assertIs(gpg_handle(home), gpg_handle(home))
+        self.assertTrue(pgp_key_exists(home, real_name="testkey"))
+        self.assertIsNotNone(get_pgp_key_info(home, key_id="ABCDEF12"))
+        self.GPG.assert_called_once()
+        self.gpg.list_keys.assert_called_once_with(secret=False)
+
+        list_keys(home, secret=True)
+        self.assertEqual(self.gpg.list_keys.call_count, 2)
+
+        self.touch_keyring()
+        list_keys(home)
+        self.assertEqual(self.gpg.list_keys.call_count, 3)
+
+    def test_key_changes_drop_the_listing(self):
+        home = str(self.home)
+        delete_pgp_key(passphrase="mypass", gpg_home=home, real_name="testkey")
+        self.gpg.list_keys.return_value = []
+        self.assertFalse(pgp_key_exists(home, real_name="testkey"))
+
+        generate_pgp_key(home, "testkey", "test@onilock.com", "mypass")
+        self.gpg.list_keys.return_value = _SAMPLE_KEYS
+        self.assertTrue(pgp_key_exists(home, real_name="testkey"))
+
+    def test_home_without_keyring_is_listed_every_time(self):
+        (self.home / "pubring.kbx").unlink()
+        list_keys(str(self.home))
+        list_keys(str(self.home))
+        self.assertEqual(self.gpg.list_keys.call_count, 2)
+
+
 if __name__ == "__main__":
     unittest.main()
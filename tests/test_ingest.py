@@ -0,0 +1,64 @@
+"""Tests for onilock.core.ingest."""
+
+import io
+import unittest
+
+from onilock.core.ingest import batched, guess_format, iter_rows
+
+
+class TestIterRows(unittest.TestCase):
+    def test_csv_rows_are_normalized(self):
+        stream = io.StringIO(
+            "Account,Password,Login,URL,Notes\n"
+            "github, s3cret ,me , https://github.com,\n"
+        )
+        (row,) = iter_rows(stream, "csv")
+        self.assertEqual(row.number, 2)
+        self.assertIsNone(row.error)
+        self.assertEqual(
+            row.fields,
+            {
+                "name": "github",
+                "password": " s3cret ",
+                "username": "me",
+                "url": "https://github.com",
+            },
+        )
+
+    def test_csv_row_errors(self):
+        stream = io.StringIO("name,password\n,x\na,b,c\nok,\n")
+        rows = list(iter_rows(stream, "csv"))
+        self.assertEqual(
+            [(r.number, r.error) for r in rows],
+            [
+                (2, "missing account name"),
+                (3, "more values than header columns"),
+                (4, None),
+            ],
+        )
+
+    def test_jsonl_row_errors(self):
+        stream = io.StringIO(
+            '{"name": "a"}\n\n[1]\n{"name": 5}\n{bad\n{"id": "b", "extra": 1}\n'
+        )
+        rows = list(iter_rows(stream, "jsonl"))
+        self.assertEqual([r.number for r in rows], [1, 3, 4, 5, 6])
+        self.assertIsNone(rows[0].error)
+        self.assertEqual(rows[1].error, "expected an object")
+        self.assertEqual(rows[2].error, "field 'name' must be a string")
+        self.assertTrue(rows[3].error.startswith("invalid JSON"))
+        self.assertEqual(rows[4].fields, {"name": "b"})
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            iter_rows(io.StringIO(""), "xml")
+
+
+class TestHelpers(unittest.TestCase):
+    def test_guess_format(self):
+        self.assertEqual(guess_format("export.CSV"), "csv")
+        self.assertEqual(guess_format("export.jsonl"), "jsonl")
+        self.assertEqual(guess_format("-"), "jsonl")
+
+    def test_batched(self):
+        self.assertEqual(list(batched(range(5), 2)), [[0, 1], [2, 3], [4]])
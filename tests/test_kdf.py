@@ -0,0 +1,169 @@
+"""Tests for onilock.core.kdf and master password re-hashing."""
+
+import base64
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from cryptography.fernet import Fernet
+
+from onilock.core import kdf
+from onilock.core.settings import settings
+from onilock.db.database_manager import engine_registry
+
+# Parameters cheap enough for tests.
+FAST = {
+    "bcrypt": {"rounds": 4},
+    "scrypt": {"ln": 10, "r": 8, "p": 1},
+    "argon2id": {"m": 1024, "t": 1, "p": 1},
+}
+
+
+class KdfTestCase(unittest.TestCase):
+    def setUp(self):
+        base = Path(tempfile.mkdtemp(prefix="onilock_kdf_"))
+        self.addCleanup(shutil.rmtree, base, ignore_errors=True)
+        vault_dir = base / "vault"
+        vault_dir.mkdir()
+        for name, value in (
+            ("VAULT_DIR", vault_dir),
+            ("BASE_DIR", base),
+            ("PROFILE_PATH", base / ".profile"),
+            ("SETUP_FILEPATH", str(vault_dir / "setup.oni")),
+            ("SECRET_KEY", Fernet.generate_key().decode()),
+            ("BCRYPT_ROUNDS", 4),
+            ("KDF", ""),
+            ("SESSION_TTL", 0),
+        ):
+            patcher = patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(engine_registry.clear)
+
+    def calibrate_to(self, algorithm: str) -> None:
+        kdf.save_calibration({"algorithm": algorithm, "params": FAST[algorithm]})
+
+
+class TestPasswordHashes(KdfTestCase):
+    def test_hashes_verify_and_describe_themselves(self):
+        for name in kdf.PASSWORD_HASHES:
+            algorithm = kdf.get_kdf(name)
+            if not algorithm.available:
+                continue
+            with self.subTest(name):
+                encoded = algorithm.hash(b"pass-phrase", FAST[name])
+                self.assertIs(kdf.identify(encoded), algorithm)
+                self.assertEqual(algorithm.parse(encoded), FAST[name])
+                self.assertTrue(kdf.verify_password(b"pass-phrase", encoded))
+                self.assertFalse(kdf.verify_password(b"pass-phrasE", encoded))
+                self.assertTrue(kdf.describe(encoded).startswith(f"{name} "))
+
+        with self.assertRaises(ValueError):
+            kdf.identify(b"$pbkdf2-sha256$i=1$c2FsdA$aGFzaA")
+
+    def test_target_follows_calibration_then_environment(self):
+        self.assertEqual(kdf.target(), (kdf.get_kdf("bcrypt"), {"rounds": 4}))
+
+        self.calibrate_to("scrypt")
+        self.assertEqual(kdf.target(), (kdf.get_kdf("scrypt"), FAST["scrypt"]))
+
+        with patch.object(settings, "KDF", "argon2id"):
+            self.assertEqual(
+                kdf.target(), (kdf.get_kdf("argon2id"), kdf.Argon2idKdf.defaults)
+            )
+        with patch.object(settings, "KDF", "pbkdf2-sha256"):
+            with self.assertRaises(ValueError):
+                kdf.target()
+
+        kdf.calibration_path().write_text("{not json")
+        self.assertEqual(kdf.target()[0].name, "bcrypt")
+
+    def test_rehash_only_upgrades(self):
+        self.calibrate_to("scrypt")
+        scrypt = kdf.get_kdf("scrypt")
+        self.assertTrue(
+            kdf.needs_rehash(kdf.get_kdf("bcrypt").hash(b"pw", {"rounds": 4}))
+        )
+        self.assertFalse(kdf.needs_rehash(scrypt.hash(b"pw", FAST["scrypt"])))
+        self.assertTrue(
+            kdf.needs_rehash(scrypt.hash(b"pw", {**FAST["scrypt"], "ln": 9}))
+        )
+        self.assertFalse(
+            kdf.needs_rehash(scrypt.hash(b"pw", {**FAST["scrypt"], "ln": 11}))
+        )
+
+
+class TestCalibration(unittest.TestCase):
+    def test_parameters_scale_with_the_measured_time(self):
+        bcrypt_kdf = kdf.get_kdf("bcrypt")
+        self.assertEqual(bcrypt_kdf.calibrate(300, 65536, lambda p: 70), {"rounds": 12})
+        self.assertEqual(
+            bcrypt_kdf.calibrate(300, 65536, lambda p: 900), {"rounds": 10}
+        )
+
+        scrypt = kdf.get_kdf("scrypt")
+        self.assertEqual(scrypt.calibrate(300, 1 << 20, lambda p: 35)["ln"], 17)
+        # 64 MiB caps N at 2**16 whatever the time allows.
+        self.assertEqual(scrypt.calibrate(300, 65536, lambda p: 1)["ln"], 16)
+
+        argon2 = kdf.get_kdf("argon2id")
+        params = argon2.calibrate(300, 65536, lambda p: 90)
+        self.assertEqual((params["m"], params["t"]), (65536, 3))
+        params = argon2.calibrate(300, 65536, lambda p: 600)
+        self.assertEqual((params["m"], params["t"]), (32768, 1))
+
+    def test_calibrate_measures_the_chosen_parameters(self):
+        with patch.object(kdf.BcryptKdf, "calibrate", return_value={"rounds": 4}):
+            calibration = kdf.calibrate("bcrypt", target_ms=50, memory_kib=1024)
+        self.assertEqual(calibration["algorithm"], "bcrypt")
+        self.assertEqual(calibration["params"], {"rounds": 4})
+        self.assertGreater(calibration["ms"], 0)
+        with self.assertRaises(ValueError):
+            kdf.calibrate("pbkdf2-sha256")
+
+
+class TestMasterPasswordUpgrade(KdfTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = patch("onilock.account_manager.audit")
+        self.audit = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stored_hash(self) -> bytes:
+        from onilock.account_manager import get_profile_engine
+
+        header = get_profile_engine().read_header()
+        return base64.b64decode(header["master_password"])
+
+    def test_login_rehashes_with_the_calibrated_algorithm(self):
+        from onilock.account_manager import initialize, verify_master_password
+
+        initialize("master-password")
+        self.assertEqual(kdf.identify(self.stored_hash()).name, "bcrypt")
+
+        self.calibrate_to("scrypt")
+        with patch("onilock.account_manager.rate_limit_delay"):
+            self.assertFalse(verify_master_password("wrong"))
+        self.assertEqual(kdf.identify(self.stored_hash()).name, "bcrypt")
+
+        self.assertTrue(verify_master_password("master-password"))
+        self.assertEqual(kdf.describe(self.stored_hash()), "scrypt ln=10,r=8,p=1")
+        self.audit.assert_any_call(
+            "auth.kdf.upgrade",
+            from_kdf="bcrypt rounds=4",
+            to_kdf="scrypt ln=10,r=8,p=1",
+        )
+        self.assertTrue(verify_master_password("master-password"))
+
+    def test_new_vaults_use_the_target(self):
+        from onilock.account_manager import initialize
+
+        self.calibrate_to("scrypt")
+        initialize("master-password")
+        self.assertEqual(kdf.identify(self.stored_hash()).name, "scrypt")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,268 @@
+import base64
+import os
+import tempfile
+import shutil
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from cryptography.fernet import Fernet
+
+from onilock.core import keys
+from onilock.core.exceptions.exceptions import EncryptionKeyNotFoundError
+from onilock.core.passwords import password_fingerprint
+from onilock.core.settings import settings
+from onilock.db.database_manager import engine_registry
+from onilock.db.models import File
+
+
+class KeysTestCase(unittest.TestCase):
+    def setUp(self):
+        base = Path(tempfile.mkdtemp(prefix="onilock_keys_"))
+        self.addCleanup(shutil.rmtree, base, ignore_errors=True)
+        self.secret = Fernet.generate_key().decode()
+        vault_dir = base / "vault"
+        vault_dir.mkdir()
+        for name, value in (
+            ("VAULT_DIR", vault_dir),
+            ("BASE_DIR", base),
+            ("SETUP_FILEPATH", str(vault_dir / "setup.oni")),
+            ("SECRET_KEY", self.secret),
+            ("BCRYPT_ROUNDS", 4),
+        ):
+            patcher = patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(engine_registry.clear)
+
+
+class TestDataKeys(KeysTestCase):
+    def test_legacy_installs_use_the_secret_as_data_key(self):
+        self.assertEqual(keys.data_key(), self.secret)
+        self.assertFalse(keys.key_file_path().exists())
+
+    def test_wrapped_data_key_only_opens_with_its_secrets(self):
+        keys.wrap_for([self.secret])
+        self.assertTrue(keys.key_file_path().exists())
+        self.assertEqual(keys.data_key(), self.secret)
+        self.assertNotIn(self.secret, keys.key_file_path().read_text())
+
+        with patch.object(settings, "SECRET_KEY", Fernet.generate_key().decode()):
+            with self.assertRaises(EncryptionKeyNotFoundError):
+                keys.data_key()
+
+    def test_pending_keys_decrypt_until_promoted(self):
+        token = keys.data_cipher().encrypt(b"secret")
+        pending = keys.begin_rekey()
+        self.assertEqual(keys.begin_rekey(), pending)
+        self.assertEqual(keys.data_key(), self.secret)
+        migrated = Fernet(pending.encode()).encrypt(b"migrated")
+        self.assertEqual(keys.data_cipher().decrypt(migrated), b"migrated")
+
+        keys.promote_pending()
+        self.assertEqual(keys.data_key(), pending)
+        self.assertEqual(keys.data_cipher().decrypt(token), b"secret")
+        keys.forget_previous()
+        self.assertEqual(set(keys.data_keys()), {keys.CURRENT})
+
+    def test_journal_only_holds_steps_of_the_rekey_in_progress(self):
+        keys.begin_rekey()
+        keys.record(stage="passwords", profile="a")
+        with open(keys.journal_path(), "ab") as f:
+            f.write(b'{"key": "other", "stage": "sealed", "profile": "a"}\n{"ke')
+        keys.record(stage="sealed", profile="b")
+        self.assertEqual(
+            keys.journal(),
+            [
+                {"stage": "passwords", "profile": "a"},
+                {"stage": "sealed", "profile": "b"},
+            ],
+        )
+
+        keys.promote_pending()
+        self.assertEqual(len(keys.journal()), 2)
+        keys.forget_previous()
+        self.assertEqual(keys.journal(), [])
+        self.assertFalse(keys.journal_path().exists())
+
+
+class TestKeyRotation(KeysTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = patch("onilock.account_manager.audit")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        from onilock.account_manager import initialize, new_account
+
+        initialize("master-password")
+        self.passwords = {"github": "pH$zJ?+k51XM", "mail": "correcthorse2023!"}
+        for name, password in self.passwords.items():
+            new_account(name, password)
+
+    def _stored_passwords(self):
+        from onilock.account_manager import get_profile_engine
+
+        engine_registry.clear()
+        engine = get_profile_engine()
+        cipher = keys.data_cipher()
+        return engine, {
+            account["id"]: cipher.decrypt(
+                base64.b64decode(account["encrypted_password"])
+            ).decode()
+            for account in engine.read()["accounts"]
+        }
+
+    def test_rotating_the_secret_only_rewraps_the_data_key(self):
+        from onilock.account_manager import rotate_secret_key
+
+        engine, _ = self._stored_passwords()
+        vault_stat = os.stat(engine.db_url)
+        with patch("onilock.account_manager.keystore") as keystore:
+            rotate_secret_key()
+
+        new_secret = keystore.set_password.call_args[0][1]
+        self.assertEqual(settings.SECRET_KEY, new_secret)
+        self.assertEqual(keys.data_key(), self.secret)
+        self.assertEqual(os.stat(engine.db_url).st_mtime_ns, vault_stat.st_mtime_ns)
+        self.assertEqual(self._stored_passwords()[1], self.passwords)
+
+        with patch.object(settings, "SECRET_KEY", self.secret):
+            with self.assertRaises(EncryptionKeyNotFoundError):
+                keys.data_key()
+
+    def test_rekey_reencrypts_everything_under_a_new_data_key(self):
+        from onilock.account_manager import rekey_vault
+
+        result = rekey_vault(workers=1)
+
+        self.assertEqual(
+            result,
+            {
+                "profiles": 1,
+                "reencrypted": 2,
+                "unreadable": 0,
+                "files": 0,
+                "unreadable_files": 0,
+            },
+        )
+        self.assertNotEqual(keys.data_key(), self.secret)
+        self.assertEqual(set(keys.data_keys()), {keys.CURRENT})
+        engine, passwords = self._stored_passwords()
+        self.assertEqual(passwords, self.passwords)
+        for account in engine.read()["accounts"]:
+            self.assertEqual(
+                account["password_fingerprint"],
+                password_fingerprint(self.passwords[account["id"]]),
+            )
+        # Nothing opens with the replaced key anymore.
+        with keys.sealed_with(self.secret):
+            engine_registry.clear()
+            from onilock.account_manager import get_profile_engine
+
+            with self.assertRaises(Exception):
+                get_profile_engine()
+
+    def test_rekey_bounds_the_batches_in_flight(self):
+        from onilock.account_manager import _rekeyed
+
+        old_key = Fernet.generate_key().decode()
+        new_key = Fernet.generate_key().decode()
+        token = base64.b64encode(Fernet(old_key.encode()).encrypt(b"secret")).decode()
+        produced = []
+
+        def batches():
+            for n in range(12):
+                produced.append(n)
+                yield n, [token]
+
+        workers = 2
+        for consumed, (key, results) in enumerate(
+            _rekeyed(batches(), old_key, new_key, workers)
+        ):
+            self.assertEqual(key, consumed)
+            self.assertEqual(len(results), 1)
+            # Batches taken but not handed back yet, this one included.
+            self.assertLessEqual(len(produced) - consumed, 2 * workers)
+        self.assertEqual(len(produced), 12)
+
+    def test_interrupted_rekey_stays_readable_and_resumes(self):
+        from onilock.account_manager import rekey_vault
+
+        with patch(
+            "onilock.account_manager.promote_pending", side_effect=KeyboardInterrupt
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                rekey_vault(workers=1)
+        self.assertIn(keys.PENDING, keys.data_keys())
+        self.assertEqual(self._stored_passwords()[1], self.passwords)
+
+        with patch(
+            "onilock.account_manager.forget_previous", side_effect=KeyboardInterrupt
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                rekey_vault(workers=1)
+        self.assertIn(keys.PREVIOUS, keys.data_keys())
+
+        result = rekey_vault(workers=1)
+        self.assertEqual(result["reencrypted"], 0)
+        self.assertEqual(set(keys.data_keys()), {keys.CURRENT})
+        self.assertEqual(self._stored_passwords()[1], self.passwords)
+
+    def test_stored_files_are_reencrypted_once(self):
+        from onilock.account_manager import get_profile_engine, rekey_vault
+
+        location = Path(settings.VAULT_DIR) / "stored.oni"
+        location.write_bytes(b"sealed under the old gpg key")
+        engine = get_profile_engine()
+        data = engine.read()
+        data["files"] = [
+            File(
+                id="doc",
+                location=str(location),
+                created_at=0,
+                src="/tmp/doc.txt",
+                user="user",
+                host="host",
+            ).model_dump()
+        ]
+        engine.write(data)
+
+        with (
+            patch(
+                "onilock.account_manager._reencrypt_file", return_value=True
+            ) as reencrypt,
+            patch(
+                "onilock.account_manager.promote_pending",
+                side_effect=KeyboardInterrupt,
+            ),
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                rekey_vault(workers=2)
+        self.assertEqual(reencrypt.call_args[0][1], str(location))
+
+        # The journal says both the passwords and the file are done.
+        with patch("onilock.account_manager._reencrypt_file") as reencrypt:
+            result = rekey_vault(workers=2)
+        reencrypt.assert_not_called()
+        self.assertEqual(result["files"], 0)
+        self.assertEqual(self._stored_passwords()[1], self.passwords)
+
+    def test_unreadable_files_are_counted_and_left_alone(self):
+        from onilock.account_manager import _reencrypt_file
+
+        manager = MagicMock()
+        manager.decrypt_bytes.side_effect = Exception("decryption failed")
+        location = Path(settings.VAULT_DIR) / "stored.oni"
+        location.write_bytes(b"data")
+        self.assertFalse(_reencrypt_file(manager, str(location)))
+        manager.encrypt_bytes.assert_not_called()
+
+        manager.decrypt_bytes.side_effect = None
+        manager.decrypt_bytes.return_value = b"plain"
+        self.assertTrue(_reencrypt_file(manager, str(location)))
+        manager.encrypt_bytes.assert_called_once_with(b"plain", str(location))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,11 +6,12 @@ import tempfile
 from unittest.mock import MagicMock, patch
 from pathlib import Path
 
+from onilock.core.exceptions import KeyStoreIntegrityError
 from onilock.core.keystore import VaultKeyStore, KeyRing, KeyStoreManager, KeyStore
 
 
 class TestVaultKeyStore(unittest.TestCase):
-    """Test the file-based AES-CBC key store."""
+    """Test the file-based AES-GCM key store."""
 
     def setUp(self):
         self.vault_dir = "/tmp/test_onilock_vault_ks"
@@ -100,6 +101,105 @@ class TestVaultKeyStore(unittest.TestCase):
         self.assertEqual(store.get_password("k1"), "v1")
         self.assertEqual(store.get_password("k2"), "v2")
 
+    def test_reads_are_cached_until_the_file_changes(self):
+        store = self._make_store()
+        store.set_password("k", "v")
+        stat = os.stat(store.filename)
+        data = Path(store.filename).read_bytes()
+
+        # Same inode, size and mtime: served from the cache, never decrypted.
+        with open(store.filename, "r+b") as f:
+            f.seek(5)
+            f.write(b"\0" * (len(data) - 5))
+        os.utime(store.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(store.get_password("k"), "v")
+
+        os.utime(store.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        with self.assertRaises(KeyStoreIntegrityError):
+            store.get_password("k")
+
+    def test_changes_by_another_instance_are_seen(self):
+        store, other = self._make_store(), self._make_store()
+        store.set_password("k", "v1")
+        self.assertEqual(other.get_password("k"), "v1")
+        other.set_password("k", "v2")
+        self.assertEqual(store.get_password("k"), "v2")
+
+    def test_tampering_is_detected(self):
+        store = self._make_store()
+        store.set_password("k", "v")
+        data = bytearray(Path(store.filename).read_bytes())
+        data[-1] ^= 1
+        Path(store.filename).write_bytes(bytes(data))
+        with patch.object(store, "_migrate_legacy_keystore") as migrate:
+            with self.assertRaises(KeyStoreIntegrityError):
+                store.get_password("k")
+        migrate.assert_not_called()
+
+        # Nor is it overwritten.
+        with self.assertRaises(KeyStoreIntegrityError):
+            store.set_password("k", "v")
+
+        # The file is bound to its keystore id.
+        store.clear()
+        store.set_password("k", "v")
+        other = self._make_store("other_id")
+        other.filename = store.filename
+        with self.assertRaises(KeyStoreIntegrityError):
+            other.get_password("k")
+
+    def test_transaction_batches_changes_into_one_write(self):
+        store = self._make_store()
+        store.set_password("old", "x")
+        with patch(
+            "onilock.core.keystore.atomic_write",
+            wraps=__import__("onilock.core.fileio").core.fileio.atomic_write,
+        ) as write:
+            with store.transaction():
+                store.set_password("k1", "v1")
+                with store.transaction():
+                    store.set_password("k2", "v2")
+                store.delete_password("old")
+                write.assert_not_called()
+            write.assert_called_once()
+
+            # Nothing changed, nothing written.
+            with store.transaction():
+                store.set_password("k1", "v1")
+            write.assert_called_once()
+
+            with self.assertRaises(KeyError):
+                with store.transaction():
+                    store.set_password("k3", "v3")
+                    store.delete_password("missing")
+            write.assert_called_once()
+
+        self.assertEqual(store._read_keystore(), {"k1": "v1", "k2": "v2"})
+
+    def test_cbc_keystore_is_migrated_to_gcm(self):
+        from Crypto.Util.Padding import pad
+
+        store = self._make_store()
+        iv = os.urandom(16)
+        encrypted = store._cipher(iv).encrypt(pad(b'{"k": "v"}', 16))
+        Path(store.filename).write_bytes(encrypted[:16] + iv + encrypted[16:])
+
+        self.assertEqual(store.get_password("k"), "v")
+        self.assertTrue(Path(store.filename).read_bytes().startswith(b"ONKS\x02"))
+        self.assertEqual(self._make_store().get_password("k"), "v")
+
+    def test_stripped_header_is_not_taken_for_a_legacy_keystore(self):
+        store = self._make_store()
+        store.set_password("k", "v")
+        stripped = Path(store.filename).read_bytes()[len(store._header()) :]
+        Path(store.filename).write_bytes(stripped)
+
+        with self.assertRaises(KeyStoreIntegrityError):
+            store.get_password("k")
+        with self.assertRaises(KeyStoreIntegrityError):
+            store.set_password("other", "x")
+        self.assertEqual(Path(store.filename).read_bytes(), stripped)
+
 
 class TestKeyRing(unittest.TestCase):
     """Test the system keyring-backed key store."""
@@ -166,6 +266,23 @@ class TestKeyStoreManager(unittest.TestCase):
             manager = KeyStoreManager("onilock_vault_test")
         self.assertIsInstance(manager.keystore, VaultKeyStore)
 
+    def test_lazy_manager_selects_backend_on_first_use(self):
+        with patch.dict(os.environ, {"ONI_DEFAULT_KEYSTORE_BACKEND": "vault"}):
+            with patch("onilock.core.keystore.VaultKeyStore") as MockVault:
+                manager = KeyStoreManager("onilock_lazy", lazy=True)
+                MockVault.assert_not_called()
+                self.assertFalse(self.backend_file.exists())
+
+                manager.get_password("k")
+                manager.get_password("k")
+        MockVault.assert_called_once_with("onilock_lazy")
+        self.assertTrue(self.backend_file.exists())
+
+    def test_manager_delegates_transactions(self):
+        mgr = KeyStoreManager.__new__(KeyStoreManager)
+        mgr.keystore = MagicMock()
+        self.assertIs(mgr.transaction(), mgr.keystore.transaction.return_value)
+
     def test_manager_delegates_set_get_delete(self):
         mock_store = MagicMock()
         with patch.dict(os.environ, {"ONI_DEFAULT_KEYSTORE_BACKEND": "vault"}):
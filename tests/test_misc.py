@@ -99,6 +99,33 @@ class TestLoggingManagerRemoveHandler(unittest.TestCase):
         mgr.remove_handler("nonexistent")  # should not raise
 
 
+class TestSettingsSecrets(unittest.TestCase):
+    def test_keystore_is_only_read_when_a_secret_is_needed(self):
+        from onilock.core.settings import Settings
+
+        env = {
+            k: v
+            for k, v in os.environ.items()
+            if k not in ("ONI_SECRET_KEY", "ONI_GPG_PASSPHRASE")
+        }
+        with (
+            patch.dict(os.environ, env, clear=True),
+            patch("onilock.core.utils.get_secret_key", return_value="secret") as secret,
+            patch("onilock.core.utils.get_passphrase", return_value="phrase") as phrase,
+        ):
+            settings = Settings()
+            secret.assert_not_called()
+            phrase.assert_not_called()
+
+            self.assertEqual(settings.SECRET_KEY, "secret")
+            self.assertEqual(settings.SECRET_KEY, "secret")
+            self.assertEqual(settings.PASSPHRASE, "phrase")
+        secret.assert_called_once_with()
+        phrase.assert_called_once_with()
+        with self.assertRaises(AttributeError):
+            settings.NOT_A_SETTING
+
+
 class TestSettingsValueErrorBranches(unittest.TestCase):
     """Cover the ValueError-catching branches in Settings.__init__."""
 
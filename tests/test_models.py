@@ -176,5 +176,96 @@ class TestProfile(unittest.TestCase):
         self.assertEqual(len(p.files), 1)
 
 
+class TestProfileIndexes(unittest.TestCase):
+    def _account(self, id, url=None, username="user"):
+        account = _make_account(id, username=username)
+        account.url = url
+        return account
+
+    def test_add_and_remove_keep_the_index_in_step(self):
+        p = _make_profile()
+        p.add_account(_make_account("GitHub"))
+        p.add_account(_make_account("mail"))
+        index = p._index("accounts")
+        self.assertEqual(p.get_account("github").id, "GitHub")
+
+        p.remove_account("GITHUB")
+        self.assertIs(p._index("accounts"), index)
+        self.assertIsNone(p.get_account("github"))
+        self.assertEqual([a.id for a in p.accounts], ["mail"])
+
+    def test_index_is_rebuilt_after_direct_list_changes(self):
+        p = _make_profile(accounts=[_make_account("a")])
+        self.assertIsNotNone(p.get_account("a"))
+        p.accounts.append(_make_account("b"))
+        self.assertIsNotNone(p.get_account("b"))
+        p.accounts = []
+        self.assertIsNone(p.get_account("a"))
+
+    def test_updates_in_place_rebuild_the_index(self):
+        p = _make_profile(accounts=[_make_account("a"), _make_account("b")])
+        self.assertEqual(p.accounts_with_password("fp"), [])
+        p.update_account(p.accounts[1], password_fingerprint="fp")
+        self.assertEqual([a.id for a in p.accounts_with_password("fp")], ["b"])
+        self.assertEqual(p.accounts[1].password_fingerprint, "fp")
+
+    def test_duplicate_ids_resolve_to_the_first_one(self):
+        first, second = _make_account("dup", "p1"), _make_account("DUP", "p2")
+        p = _make_profile(accounts=[first, second])
+        self.assertIs(p.get_account("dup"), first)
+        p.remove_account("dup")
+        self.assertIs(p.get_account("dup"), second)
+
+    def test_files_are_case_sensitive(self):
+        p = _make_profile()
+        p.add_file(_make_file("Doc"))
+        self.assertIsNone(p.get_file("doc"))
+        self.assertEqual(p.get_file("Doc").id, "Doc")
+        p.remove_file("Doc")
+        self.assertEqual(p.files, [])
+
+    def test_find_accounts_by_host_and_username(self):
+        p = _make_profile(
+            accounts=[
+                self._account("a", "https://GitHub.com/login", "me"),
+                self._account("b", "github.com", "Work"),
+                self._account("c", "https://mail.example.com", "me"),
+            ]
+        )
+        ids = lambda accounts: [a.id for a in accounts]  # noqa: E731
+        self.assertEqual(ids(p.find_accounts(host="github.com")), ["a", "b"])
+        self.assertEqual(ids(p.find_accounts(username="ME")), ["a", "c"])
+        self.assertEqual(
+            ids(p.find_accounts(host="github.com", username="work")), ["b"]
+        )
+
+        p.add_account(self._account("d", "https://github.com", "me"))
+        p.remove_account("a")
+        self.assertEqual(ids(p.find_accounts(host="github.com")), ["b", "d"])
+
+    def test_similar_accounts(self):
+        from onilock.core.similarity import password_sketch
+
+        accounts = []
+        for id, password in (
+            ("a", "correcthorse2023!"),
+            ("b", "kX9#mP2$vL7@"),
+            ("c", ""),
+        ):
+            account = _make_account(id)
+            account.password_sketch = password_sketch(password) if password else None
+            accounts.append(account)
+        p = _make_profile(accounts=accounts)
+
+        similar = p.similar_accounts(password_sketch("correcthorse2024!"))
+        self.assertEqual([a.id for a in similar], ["a"])
+        self.assertEqual(p.similar_accounts(""), [])
+
+    def test_indexes_are_not_serialized(self):
+        p = _make_profile(accounts=[_make_account("a")])
+        p.get_account("a")
+        self.assertEqual(set(p.model_dump()), set(_make_profile().model_dump()))
+
+
 if __name__ == "__main__":
     unittest.main()
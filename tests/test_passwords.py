@@ -1,6 +1,23 @@
+import os
+import shutil
+import tempfile
 import unittest
+from unittest.mock import patch
 
-from onilock.core.passwords import password_health, estimate_entropy_bits
+from cryptography.fernet import Fernet
+
+from onilock.core.corpus import compile_corpus
+from onilock.core.settings import settings
+
+from onilock.core.passwords import (
+    analyse_passwords,
+    password_fingerprint,
+    password_health,
+    policy_version,
+    with_reuse,
+    with_similar,
+    estimate_entropy_bits,
+)
 
 
 class TestPasswordHealth(unittest.TestCase):
@@ -19,3 +36,94 @@ class TestPasswordHealth(unittest.TestCase):
     def test_strong_password(self):
         health = password_health("pH$zJ?+k51XM", [])
         self.assertEqual(health["strength"], "strong")
+
+    def test_reuse_flag_from_fingerprint_lookup(self):
+        health = password_health("Unique123!", is_reused=True)
+        self.assertTrue(health["is_reused"])
+        self.assertIn("password reuse detected", health["reasons"])
+
+
+class TestBreachCorpus(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(prefix="onilock_corpus_")
+        self.addCleanup(shutil.rmtree, self.tmp_path, ignore_errors=True)
+        source = os.path.join(self.tmp_path, "breached.txt")
+        with open(source, "w") as f:
+            f.write("correct horse battery staple\n")
+        self.corpus = os.path.join(self.tmp_path, "breached.corpus")
+        compile_corpus(source, self.corpus)
+
+    def test_breached_password_is_weak(self):
+        with patch.object(settings, "PASSWORD_CORPUS", self.corpus):
+            health = password_health("Correct Horse Battery Staple")
+            version = policy_version()
+        self.assertTrue(health["is_breached"])
+        self.assertEqual(health["strength"], "weak")
+        self.assertIn("found in breach corpus", health["reasons"])
+        self.assertNotEqual(version, policy_version())
+
+    def test_no_corpus(self):
+        self.assertFalse(password_health("correct horse battery staple")["is_breached"])
+
+    def test_unusable_corpus_is_ignored(self):
+        missing = os.path.join(self.tmp_path, "missing.corpus")
+        with patch.object(settings, "PASSWORD_CORPUS", missing):
+            self.assertFalse(password_health("anything")["is_breached"])
+
+
+class TestPasswordFingerprint(unittest.TestCase):
+    def test_stable_and_keyed(self):
+        key = Fernet.generate_key().decode()
+        self.assertEqual(password_fingerprint("a", key), password_fingerprint("a", key))
+        self.assertNotEqual(password_fingerprint("a", key), password_fingerprint("b", key))
+        self.assertNotEqual(password_fingerprint("a", key), password_fingerprint("a"))
+        self.assertEqual(len(password_fingerprint("a")), 64)
+
+
+class TestHealthAudit(unittest.TestCase):
+    def test_with_reuse_marks_the_password_weak(self):
+        health = with_reuse(password_health("pH$zJ?+k51XM"))
+        self.assertTrue(health["is_reused"])
+        self.assertEqual(health["strength"], "weak")
+        self.assertEqual(health["reasons"], ["password reuse detected"])
+        self.assertEqual(with_reuse(health), health)
+
+    def test_with_similar_downgrades_strong_passwords(self):
+        health = with_similar(password_health("pH$zJ?+k51XM"))
+        self.assertTrue(health["is_similar"])
+        self.assertEqual(health["strength"], "medium")
+        self.assertEqual(health["reasons"], ["similar to another account's password"])
+        self.assertEqual(with_similar(health), health)
+        self.assertEqual(with_similar(password_health("password"))["strength"], "weak")
+
+    def test_policy_version_is_stable(self):
+        self.assertEqual(policy_version(), policy_version())
+        self.assertEqual(len(policy_version()), 16)
+
+    def test_analyse_passwords_bounds_the_batches_in_flight(self):
+        produced = []
+
+        def batches():
+            for n in range(12):
+                produced.append(n)
+                yield n, ["pH$zJ?+k51XM"]
+
+        workers = 2
+        for consumed, (key, healths) in enumerate(
+            analyse_passwords(batches(), workers)
+        ):
+            self.assertEqual(key, consumed)
+            self.assertEqual(len(healths), 1)
+            # Batches taken but not handed back yet, this one included.
+            self.assertLessEqual(len(produced) - consumed, 2 * workers)
+        self.assertEqual(len(produced), 12)
+
+    def test_analyse_passwords_keeps_batches_in_order(self):
+        batches = [("a", ["password", "pH$zJ?+k51XM"]), ("b", ["Unique123!"])]
+        for workers in (1, 2):
+            results = list(analyse_passwords(batches, workers))
+            self.assertEqual([key for key, _ in results], ["a", "b"])
+            self.assertEqual(
+                [h["strength"] for _, healths in results for h in healths],
+                ["weak", "strong", "medium"],
+            )
@@ -1,5 +1,6 @@
 """Tests for onilock.run (CLI commands via typer.testing.CliRunner)."""
 
+import json
 import os
 import unittest
 from unittest.mock import MagicMock, patch
@@ -13,7 +14,7 @@ from cryptography.fernet import Fernet
 
 def _get_app():
     """Import and return the typer app with mocked module-level side effects."""
-    with patch("onilock.filemanager.gnupg.GPG") as MockGPG:
+    with patch("gnupg.GPG") as MockGPG:
         MockGPG.return_value = MagicMock()
         with patch("onilock.run.settings"):
             import importlib
@@ -37,6 +38,39 @@ class TestVersionCommand(unittest.TestCase):
         self.assertIn("1.7.1", result.output)
 
 
+class TestVaultFormatCommand(unittest.TestCase):
+    def test_reports_format_and_codec(self):
+        from onilock.run import app
+
+        engine = MagicMock()
+        engine.format_info.return_value = {"format": "v4", "codec": "orjson"}
+        with patch("onilock.run.get_profile_engine", return_value=engine):
+            result = runner.invoke(app, ["vault-format"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("v4 (binary AEAD AES-GCM), codec: orjson", result.output)
+
+    def test_reports_compression_ratio(self):
+        from onilock.run import app
+
+        engine = MagicMock()
+        engine.format_info.return_value = {
+            "format": "v2",
+            "codec": "json",
+            "compression": "zlib",
+            "ratio": 4.5,
+        }
+        with patch("onilock.run.get_profile_engine", return_value=engine):
+            result = runner.invoke(app, ["vault-format"])
+        self.assertIn("compression: zlib (4.50x)", result.output)
+
+    def test_uninitialized_vault(self):
+        from onilock.run import app
+
+        with patch("onilock.run.get_profile_engine", return_value=None):
+            result = runner.invoke(app, ["vault-format"])
+        self.assertIn("default for new vaults", result.output)
+
+
 class TestGeneratePwdCommand(unittest.TestCase):
     def test_generate_pwd_outputs_password(self):
         from onilock.run import app
@@ -92,6 +126,174 @@ class TestNewCommand(unittest.TestCase):
             )
         mock_new.assert_called_once()
 
+    def test_new_from_file(self):
+        from onilock.run import app
+
+        result_counts = {"added": 2, "weak": 0, "failed": 0}
+        with patch("onilock.run.new_accounts_from", return_value=result_counts) as m:
+            result = runner.invoke(app, ["new", "--from", "-", "--format", "csv"])
+        m.assert_called_once_with("-", "csv")
+        self.assertEqual(result.exit_code, 0)
+
+    def test_new_from_file_with_failed_rows_exits_nonzero(self):
+        from onilock.run import app
+
+        result_counts = {"added": 1, "weak": 0, "failed": 1}
+        with patch("onilock.run.new_accounts_from", return_value=result_counts):
+            with patch("onilock.run.new_account") as mock_new:
+                result = runner.invoke(app, ["new", "--from", "accounts.jsonl"])
+        mock_new.assert_not_called()
+        self.assertEqual(result.exit_code, 1)
+
+
+class TestAuditPasswordsCommand(unittest.TestCase):
+    REPORT = {
+        "policy_version": "v",
+        "summary": {"accounts": 1},
+        "accounts": [{"id": "github", "strength": "weak"}],
+        "similar": [],
+    }
+
+    def test_json_output(self):
+        from onilock.run import app
+
+        with patch("onilock.run.am_audit_passwords", return_value=self.REPORT) as m:
+            result = runner.invoke(app, ["audit-passwords", "--workers", "2"])
+        m.assert_called_once_with(2)
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(json.loads(result.output), self.REPORT)
+
+    def test_jsonl_output(self):
+        from onilock.run import app
+
+        with patch("onilock.run.am_audit_passwords", return_value=self.REPORT):
+            result = runner.invoke(app, ["audit-passwords", "--format", "jsonl"])
+        lines = [json.loads(line) for line in result.output.splitlines()]
+        self.assertEqual(lines[0], {"id": "github", "strength": "weak"})
+        self.assertEqual(
+            lines[1],
+            {"policy_version": "v", "summary": {"accounts": 1}, "similar": []},
+        )
+
+    def test_unknown_format_is_rejected(self):
+        from onilock.run import app
+
+        result = runner.invoke(app, ["audit-passwords", "--format", "xml"])
+        self.assertNotEqual(result.exit_code, 0)
+
+
+class TestKeysRekeyCommand(unittest.TestCase):
+    def test_rekey_reports_counts(self):
+        from onilock.run import app
+
+        result_dict = {
+            "profiles": 2,
+            "reencrypted": 5,
+            "unreadable": 1,
+            "files": 3,
+            "unreadable_files": 1,
+        }
+        with patch("onilock.run.rekey_vault", return_value=result_dict) as m:
+            result = runner.invoke(
+                app, ["keys", "rekey", "--workers", "2", "--no-files"], input="y\n"
+            )
+        m.assert_called_once_with(2, False)
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("5 passwords and 3 files re-encrypted", result.output)
+        self.assertIn("1 passwords could not be decrypted", result.output)
+        self.assertIn("1 files could not be decrypted", result.output)
+
+    def test_rekey_can_be_aborted(self):
+        from onilock.run import app
+
+        with patch("onilock.run.rekey_vault") as m:
+            result = runner.invoke(app, ["keys", "rekey"], input="n\n")
+        m.assert_not_called()
+        self.assertNotEqual(result.exit_code, 0)
+
+
+class TestAgentCommands(unittest.TestCase):
+    STATUS = {
+        "ok": True,
+        "pid": 42,
+        "profile": "work",
+        "vault_dir": "/vault",
+        "timeout": 900.0,
+    }
+
+    def test_status(self):
+        from onilock.run import app
+
+        with patch("onilock.run.agent_client.request", return_value=self.STATUS):
+            result = runner.invoke(app, ["agent", "status"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("pid 42", result.output)
+
+        with patch("onilock.run.agent_client.request", return_value=None):
+            result = runner.invoke(app, ["agent", "status"])
+        self.assertEqual(result.exit_code, 1)
+
+    def test_start_spawns_one_agent(self):
+        from onilock.run import app
+
+        with (
+            patch("onilock.run.agent_client.request", return_value=None),
+            patch("onilock.agent.spawn", return_value=7) as spawn,
+            patch("onilock.run.audit"),
+        ):
+            result = runner.invoke(app, ["agent", "start", "--timeout", "60"])
+        spawn.assert_called_once_with(60.0)
+        self.assertIn("Agent started (pid 7)", result.output)
+
+        with (
+            patch("onilock.run.agent_client.request", return_value=self.STATUS),
+            patch("onilock.agent.spawn") as spawn,
+        ):
+            result = runner.invoke(app, ["agent", "start"])
+        spawn.assert_not_called()
+        self.assertIn("already running", result.output)
+
+    def test_stop(self):
+        from onilock.run import app
+
+        with (
+            patch("onilock.run.agent_client.request", return_value={"ok": True}) as m,
+            patch("onilock.run.audit"),
+        ):
+            result = runner.invoke(app, ["agent", "stop"])
+        m.assert_called_once_with("stop")
+        self.assertIn("Agent stopped", result.output)
+
+
+class TestCorpusCommands(unittest.TestCase):
+    def test_compile_and_check(self):
+        from onilock.run import app
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = os.path.join(tmp_dir, "words.txt")
+            output = os.path.join(tmp_dir, "words.corpus")
+            Path(source).write_text("dragon\nletmein\n")
+
+            result = runner.invoke(app, ["corpus", "compile", source, output])
+            self.assertEqual(result.exit_code, 0)
+            self.assertIn("Compiled 2 entries", result.output)
+
+            check = ["corpus", "check", "--corpus", output]
+            result = runner.invoke(app, check, input="dragon\n")
+            self.assertEqual(result.exit_code, 1)
+            result = runner.invoke(app, check, input="pH$zJ?+k51XM\n")
+            self.assertEqual(result.exit_code, 0)
+
+    def test_compile_rejects_bad_hash_list(self):
+        from onilock.run import app
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = os.path.join(tmp_dir, "hashes.txt")
+            Path(source).write_text("nope\n")
+            output = os.path.join(tmp_dir, "out.corpus")
+            result = runner.invoke(app, ["corpus", "compile", source, output, "--sha1"])
+        self.assertEqual(result.exit_code, 1)
+
 
 class TestAccountsCommand(unittest.TestCase):
     def test_accounts_list_command(self):
@@ -235,10 +437,13 @@ class TestProfilesCommand(unittest.TestCase):
             profile_db = MagicMock()
             profile_db.get_engine.return_value = profile_engine
 
-            with patch("onilock.run.settings") as ms:
-                ms.VAULT_DIR = vault_dir
+            with (
+                patch("onilock.run.settings") as ms,
+                patch("onilock.core.profiles.settings") as profile_settings,
+                patch("onilock.run.data_cipher", return_value=cipher),
+            ):
+                ms.VAULT_DIR = profile_settings.VAULT_DIR = vault_dir
                 ms.BACKUP_DIR = backup_dir
-                ms.SECRET_KEY = secret
                 setup_path = _profile_setup_path("work")
                 setup_path.write_text("setup")
                 with patch(
@@ -380,6 +585,83 @@ class TestExportCommand(unittest.TestCase):
         self.assertIn("exported vault", result.output.lower())
 
 
+class TestEncryptedExports(unittest.TestCase):
+    def test_export_records_its_kdf(self):
+        from onilock.core import kdf
+        from onilock.run import _decrypt_export, _encrypt_export
+
+        params = {"ln": 10, "r": 8, "p": 1}
+        with patch(
+            "onilock.run.kdf.default_export_kdf",
+            return_value=(kdf.get_kdf("scrypt"), params),
+        ):
+            payload = _encrypt_export(b"archive", "passphrase")
+        header = json.loads(payload)
+        self.assertEqual(header["version"], 2)
+        self.assertEqual((header["kdf"], header["kdf_params"]), ("scrypt", params))
+        self.assertEqual(_decrypt_export(payload, "passphrase"), b"archive")
+
+    def test_version_1_exports_still_decrypt(self):
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+        from onilock.run import _decrypt_export
+
+        salt = os.urandom(16)
+        key = PBKDF2HMAC(
+            algorithm=hashes.SHA256(), length=32, salt=salt, iterations=1000
+        ).derive(b"passphrase")
+        payload = {
+            "type": "onilock-export",
+            "version": 1,
+            "kdf": "pbkdf2-sha256",
+            "iterations": 1000,
+            "salt": base64.b64encode(salt).decode(),
+            "data": base64.b64encode(
+                Fernet(base64.urlsafe_b64encode(key)).encrypt(b"archive")
+            ).decode(),
+        }
+        self.assertEqual(
+            _decrypt_export(json.dumps(payload).encode(), "passphrase"), b"archive"
+        )
+
+
+class TestKdfCalibrateCommand(unittest.TestCase):
+    CALIBRATION = {
+        "algorithm": "scrypt",
+        "params": {"ln": 16, "r": 8, "p": 1},
+        "ms": 250.0,
+        "target_ms": 300,
+        "memory_kib": 65536,
+    }
+
+    def test_calibrate_saves_unless_dry_run(self):
+        from onilock.run import app
+
+        with (
+            patch("onilock.run.kdf.calibrate", return_value=self.CALIBRATION) as cal,
+            patch("onilock.run.kdf.save_calibration") as save,
+            patch("onilock.run.audit"),
+        ):
+            result = runner.invoke(
+                app,
+                ["kdf-calibrate", "--algorithm", "scrypt", "--target-ms", "250"],
+            )
+            cal.assert_called_once_with("scrypt", 250.0, 65536)
+            save.assert_called_once_with(self.CALIBRATION)
+            self.assertIn("scrypt ln=16,r=8,p=1: 250 ms", result.output)
+
+            save.reset_mock()
+            runner.invoke(app, ["kdf-calibrate", "--dry-run"])
+            save.assert_not_called()
+
+    def test_unsupported_algorithm_fails(self):
+        from onilock.run import app
+
+        result = runner.invoke(app, ["kdf-calibrate", "--algorithm", "md5"])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("Unknown key derivation function", result.output)
+
+
 class TestRemoveAccountCommand(unittest.TestCase):
     def test_remove_account_command(self):
         from onilock.run import app
@@ -404,6 +686,46 @@ class TestEraseUserDataCommand(unittest.TestCase):
             )
         mock_delete.assert_called_once_with("strongpassword")
 
+    def test_erase_user_data_within_a_session_skips_the_prompt(self):
+        from onilock.run import app
+
+        with (
+            patch("onilock.run.is_unlocked", return_value=True),
+            patch("onilock.run.delete_profile") as mock_delete,
+        ):
+            result = runner.invoke(app, ["erase-user-data"], input="y\n")
+        self.assertNotIn("Master password", result.output)
+        mock_delete.assert_called_once_with(None)
+
+        with (
+            patch("onilock.run.is_unlocked", return_value=False),
+            patch("onilock.run.delete_profile") as mock_delete,
+        ):
+            result = runner.invoke(app, ["erase-user-data"], input="secret\ny\n")
+        mock_delete.assert_called_once_with("secret")
+
+    def test_unlock_and_lock_commands(self):
+        import time
+        from onilock.run import app
+
+        with patch("onilock.run.am_unlock", return_value=time.time() + 600) as mock:
+            result = runner.invoke(
+                app, ["unlock", "--master-password=secret", "--ttl", "600"]
+            )
+        mock.assert_called_once_with("secret", 600.0)
+        self.assertRegex(result.output, r"Unlocked for (10m 0s|9m 59s)")
+
+        with patch("onilock.run.am_unlock", return_value=None):
+            result = runner.invoke(app, ["unlock", "--master-password=secret"])
+        self.assertIn("sessions are disabled", result.output)
+
+        with patch("onilock.run.am_lock", return_value=True):
+            result = runner.invoke(app, ["lock"])
+        self.assertIn("Locked", result.output)
+        with patch("onilock.run.am_lock", return_value=False):
+            result = runner.invoke(app, ["lock"])
+        self.assertIn("Nothing was unlocked", result.output)
+
 
 if __name__ == "__main__":
     unittest.main()
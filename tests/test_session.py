@@ -0,0 +1,144 @@
+"""Tests for session tickets (onilock.core.session) and unlock/lock."""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from cryptography.fernet import Fernet
+
+from onilock.core import session
+from onilock.core.settings import settings
+from onilock.db.database_manager import engine_registry
+
+
+class SessionTestCase(unittest.TestCase):
+    def setUp(self):
+        base = Path(tempfile.mkdtemp(prefix="onilock_session_"))
+        self.addCleanup(shutil.rmtree, base, ignore_errors=True)
+        self.base = base
+        vault_dir = base / "vault"
+        vault_dir.mkdir()
+        for name, value in (
+            ("VAULT_DIR", vault_dir),
+            ("BASE_DIR", base),
+            ("PROFILE_PATH", base / ".profile"),
+            ("SETUP_FILEPATH", str(vault_dir / "setup.oni")),
+            ("SECRET_KEY", Fernet.generate_key().decode()),
+            ("BCRYPT_ROUNDS", 4),
+            ("SESSION_TTL", 300.0),
+        ):
+            patcher = patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(engine_registry.clear)
+
+        patcher = patch.dict(os.environ, {"XDG_RUNTIME_DIR": str(base / "run")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestTickets(SessionTestCase):
+    def test_ticket_is_bound_to_profile_and_credential(self):
+        expires = session.mint("work", "hash-1")
+        self.assertAlmostEqual(expires, time.time() + 300, delta=5)
+        self.assertEqual(session.expires_at("work"), expires)
+        self.assertTrue(session.is_valid("work", "hash-1"))
+        self.assertFalse(session.is_valid("work", "hash-2"))
+        self.assertFalse(session.is_valid("home", "hash-1"))
+
+        path = session.ticket_path("work")
+        self.assertEqual(path.stat().st_mode & 0o777, 0o600)
+        self.assertEqual(path.parent.stat().st_mode & 0o777, 0o700)
+        self.assertNotIn(b"hash-1", path.read_bytes())
+
+    def test_expired_and_revoked_tickets_are_refused(self):
+        session.mint("work", "hash", ttl=0.05)
+        time.sleep(0.1)
+        self.assertFalse(session.is_valid("work", "hash"))
+        self.assertIsNone(session.expires_at("work"))
+
+        session.mint("work", "hash")
+        self.assertTrue(session.revoke("work"))
+        self.assertFalse(session.revoke("work"))
+        self.assertFalse(session.is_valid("work", "hash"))
+
+    def test_tampered_or_foreign_tickets_are_refused(self):
+        session.mint("work", "hash")
+        path = session.ticket_path("work")
+        path.write_bytes(path.read_bytes()[:-4] + b"AAAA")
+        self.assertFalse(session.is_valid("work", "hash"))
+
+        session.mint("work", "hash")
+        with patch.object(settings, "SECRET_KEY", Fernet.generate_key().decode()):
+            self.assertFalse(session.is_valid("work", "hash"))
+
+    def test_disabled_or_shared_directory_mints_nothing(self):
+        self.assertIsNone(session.mint("work", "hash", ttl=0))
+        self.assertFalse(session.ticket_path("work").exists())
+
+        session.ticket_path("work").parent.mkdir(parents=True)
+        os.chmod(session.ticket_path("work").parent, 0o755)
+        self.assertIsNone(session.mint("work", "hash"))
+        self.assertFalse(session.is_valid("work", "hash"))
+
+
+class TestUnlock(SessionTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = patch("onilock.account_manager.audit")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        from onilock.account_manager import initialize
+
+        initialize("master-password")
+
+    def test_verification_starts_a_session(self):
+        from onilock.account_manager import verify_master_password
+
+        self.assertFalse(verify_master_password(None))
+        self.assertTrue(verify_master_password("master-password"))
+        with patch("onilock.core.kdf.verify_password") as verify_password:
+            self.assertTrue(verify_master_password(None))
+        verify_password.assert_not_called()
+        with patch("onilock.account_manager.rate_limit_delay"):
+            self.assertFalse(verify_master_password("wrong"))
+
+    def test_ticket_holds_nothing_derived_from_the_password(self):
+        from onilock.account_manager import verify_master_password
+        from onilock.core.keys import data_cipher
+
+        self.assertTrue(verify_master_password("master-password"))
+        ticket = session.ticket_path(settings.DB_NAME).read_bytes()
+        claims = data_cipher().decrypt(ticket).decode()
+        self.assertEqual(
+            sorted(json.loads(claims)),
+            ["credential", "expires", "profile", "vault"],
+        )
+
+    def test_lock_ends_the_session(self):
+        from onilock.account_manager import is_unlocked, lock, unlock
+
+        self.assertFalse(lock())
+        self.assertIsNotNone(unlock("master-password", ttl=60))
+        self.assertTrue(is_unlocked())
+        with patch("onilock.account_manager.agent_request", return_value=None):
+            self.assertTrue(lock())
+        self.assertFalse(is_unlocked())
+
+    def test_unlock_checks_the_password_even_within_a_session(self):
+        from onilock.account_manager import is_unlocked, unlock
+
+        unlock("master-password")
+        with self.assertRaises(SystemExit):
+            unlock("wrong")
+        self.assertFalse(is_unlocked())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import random
+import string
+import unittest
+
+from cryptography.fernet import Fernet
+
+from onilock.core.similarity import (
+    BANDS,
+    HASHES,
+    THRESHOLD,
+    band,
+    cluster,
+    password_sketch,
+    similarity,
+)
+
+
+class TestPasswordSketch(unittest.TestCase):
+    def test_sketch_is_deterministic_and_keyed(self):
+        key = Fernet.generate_key().decode()
+        self.assertEqual(password_sketch("Summer2023!"), password_sketch("Summer2023!"))
+        self.assertNotEqual(
+            password_sketch("Summer2023!", key), password_sketch("Summer2023!")
+        )
+        self.assertEqual(len(password_sketch("a")), HASHES * 4)
+
+    def test_near_duplicates_are_similar(self):
+        for a, b in (
+            ("correcthorsebattery1", "correcthorsebattery2"),
+            ("myfavouritepassword!2023", "myfavouritepassword!2024"),
+            ("pH$zJ?+k51XM", "pH$zJ?+k51XN"),
+        ):
+            with self.subTest(a=a, b=b):
+                score = similarity(password_sketch(a), password_sketch(b))
+                self.assertGreaterEqual(score, THRESHOLD)
+
+    def test_unrelated_passwords_are_not_similar(self):
+        score = similarity(
+            password_sketch("Summer2023!"), password_sketch("kX9#mP2$vL7@")
+        )
+        self.assertLess(score, THRESHOLD)
+        self.assertEqual(similarity(password_sketch("abc"), ""), 0.0)
+
+    def test_bands_partition_the_sketch(self):
+        sketch = password_sketch("Summer2023!")
+        self.assertEqual("".join(band(sketch, n) for n in range(BANDS)), sketch)
+        self.assertEqual(band("", 3), "")
+
+
+class TestCluster(unittest.TestCase):
+    def test_clusters_near_duplicates_transitively(self):
+        passwords = [
+            "correcthorse2022!",
+            "kX9#mP2$vL7@",
+            "correcthorse2023!",
+            "correcthorse2024!",
+        ]
+        sketches = {p: password_sketch(p) for p in passwords}
+        self.assertEqual(
+            cluster(sketches),
+            [["correcthorse2022!", "correcthorse2023!", "correcthorse2024!"]],
+        )
+
+    def test_random_passwords_do_not_cluster(self):
+        rng = random.Random(7)
+        alphabet = string.ascii_letters + string.digits
+        sketches = {
+            n: password_sketch("".join(rng.choice(alphabet) for _ in range(14)))
+            for n in range(500)
+        }
+        sketches["a"] = password_sketch("correcthorse!1")
+        sketches["b"] = password_sketch("correcthorse!2")
+        self.assertEqual(cluster(sketches), [["a", "b"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""Tests for onilock.core.spawns and the processes commands start."""
+
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from cryptography.fernet import Fernet
+from typer.testing import CliRunner
+
+from onilock.core import spawns
+from onilock.core.settings import settings
+from onilock.db.database_manager import engine_registry
+
+
+class TestSpawns(unittest.TestCase):
+    def tearDown(self):
+        spawns.report()
+
+    def test_counts_processes_per_program(self):
+        spawns.watch()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        subprocess.run(f"{sys.executable} -c pass", shell=True, check=True)
+        program = Path(sys.executable).name
+        self.assertEqual(spawns.counts(), {program: 1, "sh": 1})
+
+        with patch("onilock.core.spawns.logger") as logger:
+            self.assertEqual(spawns.report(), {program: 1, "sh": 1})
+        logger.debug.assert_called_once()
+        message = logger.debug.call_args[0][0]
+        self.assertTrue(message.startswith("Spawned 2 subprocess(es): "))
+        self.assertIn(f"{program} x1", message)
+        self.assertIn("sh x1", message)
+
+        # Stopped by the report.
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        self.assertEqual(spawns.counts(), {program: 1, "sh": 1})
+        self.assertEqual(spawns.report(), {})
+
+    def test_debug_commands_report_on_exit(self):
+        from onilock.run import app
+
+        with patch.object(settings, "DEBUG", True):
+            with patch("onilock.run.spawns") as mock_spawns:
+                with patch("onilock.run.copy_account_password"):
+                    CliRunner().invoke(app, ["copy", "github"])
+        mock_spawns.watch.assert_called_once_with()
+        mock_spawns.report.assert_called_once_with()
+
+
+class TestCopySpawnsNoGpg(unittest.TestCase):
+    def setUp(self):
+        base = Path(tempfile.mkdtemp(prefix="onilock_spawns_"))
+        self.addCleanup(shutil.rmtree, base, ignore_errors=True)
+        vault_dir = base / "vault"
+        vault_dir.mkdir()
+        for name, value in (
+            ("VAULT_DIR", vault_dir),
+            ("BASE_DIR", base),
+            ("PROFILE_PATH", base / ".profile"),
+            ("SETUP_FILEPATH", str(vault_dir / "setup.oni")),
+            ("SECRET_KEY", Fernet.generate_key().decode()),
+            ("BCRYPT_ROUNDS", 4),
+            ("VAULT_FORMAT", "v2"),
+        ):
+            patcher = patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(engine_registry.clear)
+        patcher = patch("onilock.account_manager.audit")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_copy_builds_no_gpg_client(self):
+        from onilock.account_manager import (
+            copy_account_password,
+            initialize,
+            new_account,
+        )
+
+        initialize("master-password")
+        new_account("github", password="pH$zJ?+k51XM")
+        engine_registry.clear()
+
+        with patch("gnupg.GPG") as GPG:
+            with patch("onilock.account_manager.pyperclip.copy") as copy:
+                with patch("onilock.account_manager.multiprocessing.Process"):
+                    with patch("onilock.account_manager.os._exit"):
+                        spawns.watch()
+                        copy_account_password("github")
+        copy.assert_called_once_with("pH$zJ?+k51XM")
+        GPG.assert_not_called()
+        self.assertNotIn("gpg", spawns.counts())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Import-time budget of the CLI, measured with `python -X importtime`."""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Time OniLock's own modules may spend importing `onilock.run`, in
+# microseconds. Third-party modules it cannot avoid (typer, rich, click) are
+# not counted.
+OWN_MODULES_BUDGET_US = 150_000
+# Only imported by the commands that need them.
+DEFERRED = ("keyring", "Crypto", "pydantic", "gnupg")
+
+
+def import_times(module: str, home: Path) -> dict:
+    """Self time in microseconds of every module imported by `module`."""
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if not key.startswith("ONI_") and key != "PYTHONPATH"
+    }
+    env.update(
+        HOME=str(home),
+        ONI_VAULT_DIR=str(home / "vault"),
+        ONI_DB_NAME="startup",
+        PYTHONPATH=str(ROOT),
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(self_us)
+    return times
+
+
+class TestStartup(unittest.TestCase):
+    def setUp(self):
+        self.home = Path(tempfile.mkdtemp(prefix="onilock_startup_"))
+        self.addCleanup(shutil.rmtree, self.home, ignore_errors=True)
+
+    def test_cli_import_is_cheap_and_side_effect_free(self):
+        times = import_times("onilock.run", self.home)
+        self.assertIn("onilock.run", times)
+
+        loaded = {name.split(".")[0] for name in times}
+        for package in DEFERRED:
+            self.assertNotIn(package, loaded)
+
+        own = sum(us for name, us in times.items() if name.startswith("onilock"))
+        self.assertLess(own, OWN_MODULES_BUDGET_US)
+
+        # Neither the keystore nor gpg were touched.
+        self.assertFalse((self.home / ".onilock").exists())
+        self.assertFalse((self.home / ".gnupg").exists())
+
+    def test_agent_client_imports_no_onilock_internals(self):
+        times = import_times("onilock.cli", self.home)
+        own = {name for name in times if name.startswith("onilock")}
+        self.assertEqual(
+            own, {"onilock", "onilock.core", "onilock.core.agent", "onilock.cli"}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
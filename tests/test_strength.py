@@ -0,0 +1,143 @@
+"""Tests for onilock.core.strength."""
+
+import json
+import math
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from onilock.core import strength
+from onilock.core.settings import settings
+from onilock.core.strength import estimate
+from onilock.core.utils import is_password_strong
+
+
+def _patterns(password):
+    return [(m.pattern, m.token) for m in estimate(password).sequence]
+
+
+class TestMatchers(unittest.TestCase):
+    def test_dictionary_with_capitalization_and_year(self):
+        self.assertEqual(
+            _patterns("Password2024!"),
+            [("dictionary", "Password"), ("year", "2024"), ("bruteforce", "!")],
+        )
+
+    def test_l33t_and_reversed(self):
+        self.assertEqual(_patterns("p@ssw0rd"), [("l33t", "p@ssw0rd")])
+        self.assertEqual(_patterns("drowssap"), [("reversed", "drowssap")])
+
+    def test_keyboard_walk(self):
+        self.assertEqual(_patterns("zxcvbnm,./"), [("spatial", "zxcvbnm,./")])
+        self.assertEqual(_patterns("7896321"), [("spatial", "7896321")])
+
+    def test_dates(self):
+        self.assertEqual(_patterns("19900101"), [("date", "19900101")])
+        self.assertEqual(_patterns("1/1/1990"), [("date", "1/1/1990")])
+
+    def test_repeat_and_sequence(self):
+        self.assertEqual(_patterns("abcabcabc"), [("repeat", "abcabcabc")])
+        self.assertEqual(_patterns("aaaaaaaaaaaa"), [("repeat", "aaaaaaaaaaaa")])
+        self.assertEqual(_patterns("lmnopq"), [("sequence", "lmnopq")])
+
+
+class TestEstimate(unittest.TestCase):
+    def test_patterns_are_much_cheaper_than_random(self):
+        predictable = estimate("Password2024!")
+        random = estimate("kX9#mP2$vL7@q")
+        self.assertLess(predictable.guesses_log10, 8)
+        self.assertGreater(random.guesses_log10, 20)
+        self.assertLess(predictable.score, random.score)
+
+    def test_long_keyboard_walks_do_not_overflow(self):
+        for password in ("12" * 2500, "qw" * 2500, "1q" * 2500, "1!" * 2500):
+            with self.subTest(password=password[:4]):
+                result = estimate(password)
+                self.assertTrue(math.isfinite(result.guesses_log10))
+
+        # The walk itself, not only the repeat covering it.
+        graph = strength.tables()["graphs"]["qwerty"]
+        guesses_log10 = strength._spatial_log10(graph, 5000, 4999, 2500)
+        self.assertTrue(math.isfinite(guesses_log10))
+        self.assertGreater(guesses_log10, 1000)
+
+    def test_empty_password(self):
+        self.assertEqual(estimate("").guesses_log10, 0)
+
+    def test_is_password_strong(self):
+        self.assertTrue(is_password_strong("kX9#mP2$vL7@q"))
+        self.assertFalse(is_password_strong("Password2024!"))
+        self.assertFalse(is_password_strong("qwertyuiop12"))
+        self.assertFalse(is_password_strong(" kX9#mP2$vL7@q"))
+
+    def test_is_password_strong_agrees_with_password_health(self):
+        from onilock.core.passwords import password_health
+
+        for password in (
+            "",
+            "kX9#mP2$vL7@q",
+            "Password2024!",
+            "qwertyuiop12",
+            " kX9#mP2$vL7@q",
+            "Tr0ub4dour&3",
+            "correcthorsebatterystaple",
+            "zQ7!fK2#wP9$",
+        ):
+            with self.subTest(password=password):
+                health = password_health(password)
+                self.assertEqual(
+                    is_password_strong(password), not health["reasons"], health
+                )
+
+
+class TestTables(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix="onilock_strength_")
+        strength.tables.cache_clear()
+
+    def tearDown(self):
+        strength.tables.cache_clear()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_tables_are_built_once_and_serialized(self):
+        with patch.object(settings, "CACHE_DIR", self.cache_dir, create=True):
+            built = strength.tables()
+            self.assertEqual(os.listdir(self.cache_dir), ["strength-tables.json"])
+
+            # Loading only stats the wordlists.
+            strength.tables.cache_clear()
+            with (
+                patch.object(strength, "build_tables") as build,
+                patch.object(strength, "_sources") as sources,
+            ):
+                self.assertEqual(strength.tables(), built)
+            build.assert_not_called()
+            sources.assert_not_called()
+
+    def test_corrupt_cache_is_rebuilt(self):
+        with patch.object(settings, "CACHE_DIR", self.cache_dir, create=True):
+            path = strength._tables_path()
+            for content in (
+                b"garbage",
+                b"[]",
+                json.dumps({"format": strength.TABLES_FORMAT}).encode(),
+            ):
+                with self.subTest(content=content):
+                    strength.tables.cache_clear()
+                    path.write_bytes(content)
+                    self.assertIn("graphs", strength.tables())
+                    saved = json.loads(path.read_bytes())
+                    self.assertEqual(saved["version"], strength.TABLES_VERSION)
+
+    def test_changed_wordlists_rebuild_the_cache(self):
+        with patch.object(settings, "CACHE_DIR", self.cache_dir, create=True):
+            strength.tables()
+            strength.tables.cache_clear()
+            with (
+                patch.object(strength, "_sources_stamp", return_value="changed"),
+                patch.object(strength, "build_tables", return_value={}) as build,
+            ):
+                self.assertEqual(strength.tables(), {})
+            build.assert_called_once_with()
@@ -181,7 +181,9 @@ class TestGetSecretKey(unittest.TestCase):
         with patch("onilock.core.utils.keystore") as mock_ks:
             mock_ks.get_password.return_value = None
             result = get_secret_key()
-        # Should have called set_password with a new key
+        # Should have called set_password with a new key, in the transaction
+        # of the lookup
+        mock_ks.transaction.assert_called_once_with()
         mock_ks.set_password.assert_called_once()
         args = mock_ks.set_password.call_args[0]
         # Second arg is the new key